@@ -0,0 +1,222 @@
+"""
+Đối soát phân công GVCN giữa classrooms.homeroom_teacher_id và users.homeroom_class_id (giáo viên).
+
+Đọc giáo viên + lớp bằng 2 truy vấn, tính trạng thái đúng (mỗi lớp tối đa 1 GVCN, mỗi giáo viên
+chủ nhiệm tối đa 1 lớp) trong bộ nhớ, rồi ghi phần chênh lệch bằng 1 bulk_write mỗi collection.
+
+Quy tắc (giữ như sync_homeroom_teachers trước đây):
+  - `assignments` truyền vào (vd phân công đầu năm) được ưu tiên tuyệt đối.
+  - Lớp đã ghi GVCN hợp lệ được giữ; giáo viên khác tự nhận lớp đó -> conflict, bỏ phía giáo viên.
+  - Lớp chưa có GVCN mà nhiều giáo viên cùng nhận -> duplicate, giữ giáo viên tạo mới nhất.
+  - Giáo viên là GVCN của nhiều lớp -> duplicate, giữ lớp giáo viên đang nhận (hoặc lớp đầu tiên).
+  - Tham chiếu tới lớp / giáo viên không tồn tại -> orphan, xóa tham chiếu.
+  - homeroom_teacher_display / homeroom_class lệch với dữ liệu gốc -> ghi lại.
+
+    plan = build_plan(users_coll, classrooms_coll)
+    plan.summary()            # conflicts / duplicates / orphans / số thay đổi
+    apply_plan(plan, users_coll, classrooms_coll)
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from applications.common.display_names import teacher_display
+from applications.common.ids import to_ref
+from applications.common.user_context import invalidate_all_user_contexts
+
+
+TEACHER_FIELDS = {'full_name': 1, 'first_name': 1, 'last_name': 1, 'email': 1,
+                  'homeroom_class_id': 1, 'homeroom_class': 1, 'created_at': 1}
+CLASSROOM_FIELDS = {'full_name': 1, 'name': 1, 'homeroom_teacher_id': 1, 'homeroom_teacher_display': 1}
+
+
+@dataclass
+class HomeroomPlan:
+    # classroom_id -> teacher_id (None: lớp không có GVCN)
+    desired: Dict[str, Optional[str]] = field(default_factory=dict)
+    conflicts: List[dict] = field(default_factory=list)
+    duplicates: List[dict] = field(default_factory=list)
+    orphans: List[dict] = field(default_factory=list)
+    invalid_assignments: List[dict] = field(default_factory=list)
+    classroom_updates: List[UpdateOne] = field(default_factory=list)
+    teacher_updates: List[UpdateOne] = field(default_factory=list)
+    changes: List[dict] = field(default_factory=list)
+    affected_teacher_ids: set = field(default_factory=set)
+
+    def summary(self) -> dict:
+        return {
+            'classrooms': len(self.desired),
+            'assigned': sum(1 for teacher_id in self.desired.values() if teacher_id),
+            'conflicts': self.conflicts,
+            'duplicates': self.duplicates,
+            'orphans': self.orphans,
+            'invalid_assignments': self.invalid_assignments,
+            'changes': self.changes,
+            'classroom_updates': len(self.classroom_updates),
+            'teacher_updates': len(self.teacher_updates),
+        }
+
+
+def _name(doc: dict) -> str:
+    return doc.get('full_name') or doc.get('name') or ''
+
+
+def _resolve(classrooms: Dict[str, dict], teachers: Dict[str, dict],
+             assignments: Dict[str, Optional[str]], plan: HomeroomPlan) -> Dict[str, Optional[str]]:
+    desired: Dict[str, Optional[str]] = {}
+    taken: Dict[str, str] = {}  # teacher_id -> classroom_id
+
+    def assign(classroom_id: str, teacher_id: Optional[str]):
+        desired[classroom_id] = teacher_id
+        if teacher_id:
+            taken[teacher_id] = classroom_id
+
+    # 1. Phân công chỉ định
+    for classroom_id, teacher_id in assignments.items():
+        if classroom_id not in classrooms or (teacher_id and teacher_id not in teachers):
+            plan.invalid_assignments.append({'classroom_id': classroom_id, 'teacher_id': teacher_id})
+        elif teacher_id and teacher_id in taken:
+            plan.invalid_assignments.append({
+                'classroom_id': classroom_id, 'teacher_id': teacher_id,
+                'reason': f'teacher already assigned to {taken[teacher_id]}',
+            })
+        else:
+            assign(classroom_id, teacher_id)
+
+    # Giáo viên nhận lớp (users.homeroom_class_id)
+    claims: Dict[str, List[str]] = {}
+    for teacher_id, teacher in teachers.items():
+        claimed = to_ref(teacher.get('homeroom_class_id'))
+        if not teacher.get('homeroom_class_id'):
+            continue
+        if claimed not in classrooms:
+            plan.orphans.append({'type': 'teacher', 'teacher_id': teacher_id,
+                                 'homeroom_class_id': str(teacher.get('homeroom_class_id'))})
+            continue
+        claims.setdefault(claimed, []).append(teacher_id)
+
+    # 2. Lớp đã ghi GVCN: giữ nếu giáo viên tồn tại và chưa bị lớp khác giữ
+    by_teacher: Dict[str, List[str]] = {}
+    for classroom_id, classroom in classrooms.items():
+        if classroom_id in desired or not classroom.get('homeroom_teacher_id'):
+            continue
+        teacher_id = to_ref(classroom.get('homeroom_teacher_id'))
+        if teacher_id not in teachers:
+            plan.orphans.append({'type': 'classroom', 'classroom_id': classroom_id,
+                                 'homeroom_teacher_id': str(classroom.get('homeroom_teacher_id'))})
+            continue
+        by_teacher.setdefault(teacher_id, []).append(classroom_id)
+    for teacher_id, classroom_ids in by_teacher.items():
+        if teacher_id in taken:
+            continue  # đã được phân công chỉ định sang lớp khác
+        claimed = to_ref(teachers[teacher_id].get('homeroom_class_id'))
+        kept = claimed if claimed in classroom_ids else sorted(classroom_ids, key=lambda c: _name(classrooms[c]))[0]
+        assign(kept, teacher_id)
+        if len(classroom_ids) > 1:
+            plan.duplicates.append({'type': 'teacher_in_many_classrooms', 'teacher_id': teacher_id,
+                                    'kept_classroom_id': kept,
+                                    'dropped_classroom_ids': [c for c in classroom_ids if c != kept]})
+
+    # 3. Lớp chưa có GVCN: lấy từ giáo viên nhận lớp (nhiều người -> giữ người tạo mới nhất)
+    for classroom_id, teacher_ids in claims.items():
+        candidates = []
+        for teacher_id in teacher_ids:
+            if teacher_id not in taken:
+                candidates.append(teacher_id)
+            elif taken[teacher_id] != classroom_id:
+                plan.conflicts.append({'classroom_id': classroom_id, 'teacher_id': teacher_id,
+                                       'teacher_assigned_to': taken[teacher_id]})
+        if classroom_id in desired:
+            current = desired[classroom_id]
+            for teacher_id in candidates:
+                if teacher_id != current:
+                    plan.conflicts.append({'classroom_id': classroom_id, 'teacher_id': teacher_id,
+                                           'classroom_teacher_id': current})
+            continue
+        if not candidates:
+            continue
+        candidates.sort(key=lambda t: str(teachers[t].get('created_at') or ''), reverse=True)
+        assign(classroom_id, candidates[0])
+        if len(candidates) > 1:
+            plan.duplicates.append({'type': 'classroom_claimed_by_many', 'classroom_id': classroom_id,
+                                    'kept_teacher_id': candidates[0], 'dropped_teacher_ids': candidates[1:]})
+
+    for classroom_id in classrooms:
+        desired.setdefault(classroom_id, None)
+    return desired
+
+
+def _diff(classrooms: Dict[str, dict], teachers: Dict[str, dict], plan: HomeroomPlan) -> None:
+    now = datetime.utcnow().isoformat()
+    teacher_classroom = {t: c for c, t in plan.desired.items() if t}
+
+    for classroom_id, teacher_id in plan.desired.items():
+        classroom = classrooms[classroom_id]
+        current = to_ref(classroom.get('homeroom_teacher_id'))
+        display = teacher_display(teachers.get(teacher_id)) if teacher_id else None
+        if current == teacher_id and classroom.get('homeroom_teacher_display') == display:
+            continue
+        plan.classroom_updates.append(UpdateOne(
+            {'_id': classroom['_id']},
+            {'$set': {'homeroom_teacher_id': teacher_id, 'homeroom_teacher_display': display, 'updated_at': now}},
+        ))
+        if current != teacher_id:
+            plan.changes.append({'classroom_id': classroom_id, 'classroom': _name(classroom),
+                                 'from_teacher_id': current, 'to_teacher_id': teacher_id})
+            plan.affected_teacher_ids.update(t for t in (current, teacher_id) if t)
+
+    for teacher_id, teacher in teachers.items():
+        classroom_id = teacher_classroom.get(teacher_id)
+        if classroom_id:
+            class_name = classrooms[classroom_id].get('full_name', '')
+            if teacher.get('homeroom_class_id') == classroom_id and teacher.get('homeroom_class') == class_name:
+                continue
+            update = {'$set': {'homeroom_class_id': classroom_id, 'homeroom_class': class_name, 'updated_at': now}}
+        else:
+            if not teacher.get('homeroom_class_id') and not teacher.get('homeroom_class'):
+                continue
+            update = {'$unset': {'homeroom_class_id': '', 'homeroom_class': ''}, '$set': {'updated_at': now}}
+        plan.teacher_updates.append(UpdateOne({'_id': teacher['_id']}, update))
+        plan.affected_teacher_ids.add(teacher_id)
+
+
+def build_plan(users_coll, classrooms_coll,
+               assignments: Optional[Iterable[Tuple[str, Optional[str]]]] = None) -> HomeroomPlan:
+    """2 truy vấn (giáo viên, lớp) -> HomeroomPlan; chưa ghi gì. assignments: [(classroom_id, teacher_id | None)]."""
+    teachers = {str(doc['_id']): doc for doc in users_coll.find({'role': 'teacher'}, TEACHER_FIELDS)}
+    classrooms = {str(doc['_id']): doc for doc in classrooms_coll.find({}, CLASSROOM_FIELDS)}
+    plan = HomeroomPlan()
+    wanted = {}
+    for classroom_id, teacher_id in assignments or ():
+        ref = to_ref(classroom_id)
+        if ref is None or (teacher_id and to_ref(teacher_id) is None):
+            plan.invalid_assignments.append({'classroom_id': classroom_id, 'teacher_id': teacher_id})
+            continue
+        wanted[ref] = to_ref(teacher_id)
+    plan.desired = _resolve(classrooms, teachers, wanted, plan)
+    _diff(classrooms, teachers, plan)
+    return plan
+
+
+def apply_plan(plan: HomeroomPlan, users_coll, classrooms_coll) -> dict:
+    """1 bulk_write cho classrooms + 1 cho users; có giáo viên bị ảnh hưởng thì làm mới cache UserContext của mọi user."""
+    result = {'classrooms_modified': 0, 'teachers_modified': 0}
+    if plan.classroom_updates:
+        result['classrooms_modified'] = classrooms_coll.bulk_write(plan.classroom_updates, ordered=False).modified_count
+    if plan.teacher_updates:
+        result['teachers_modified'] = users_coll.bulk_write(plan.teacher_updates, ordered=False).modified_count
+    if plan.affected_teacher_ids:
+        invalidate_all_user_contexts()
+    return result
+
+
+def parse_assignments(items: Iterable) -> List[Tuple[str, Optional[str]]]:
+    """[{'classroom_id': ..., 'teacher_id': ... | None}] (payload API / file JSON) -> [(classroom_id, teacher_id)]."""
+    out = []
+    for item in items or ():
+        if isinstance(item, dict) and item.get('classroom_id'):
+            out.append((str(item['classroom_id']), str(item['teacher_id']) if item.get('teacher_id') else None))
+    return out
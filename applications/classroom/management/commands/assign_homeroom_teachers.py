@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
+from applications.classroom.homeroom_reconcile import apply_plan, build_plan
 from applications.common.mongo import get_mongo_collection
-from bson import ObjectId
 import random
 
 
@@ -16,39 +16,37 @@ class Command(BaseCommand):
         dry_run = options['dry_run']
 
         classrooms_coll = get_mongo_collection('classrooms')
-        teachers_coll = get_mongo_collection('teachers')
+        users_coll = get_mongo_collection('users')
 
         # Get classrooms without homeroom teachers
-        classrooms_without_teachers = list(classrooms_coll.find({'homeroom_teacher_id': None}))
-        
-        # Get available teachers
-        teachers = list(teachers_coll.find({}))
-        
+        classrooms_without_teachers = list(classrooms_coll.find({'homeroom_teacher_id': None}, {'full_name': 1}))
+
+        # Get available teachers (not yet homeroom of any class)
+        assigned_ids = {doc['homeroom_teacher_id'] for doc in classrooms_coll.find(
+            {'homeroom_teacher_id': {'$ne': None}}, {'homeroom_teacher_id': 1}
+        )}
+        teachers = [t for t in users_coll.find({'role': 'teacher'}, {'full_name': 1}) if str(t['_id']) not in assigned_ids]
+
         if not teachers:
             self.stdout.write(self.style.WARNING("No teachers found. Please create teachers first."))
             return
-            
+
         if not classrooms_without_teachers:
             self.stdout.write(self.style.WARNING("No classrooms without homeroom teachers found."))
             return
 
-        assigned = 0
-        for i in range(min(count, len(classrooms_without_teachers))):
-            classroom = classrooms_without_teachers[i]
-            teacher = random.choice(teachers)
-            
-            teacher_id = str(teacher['_id'])
-            classroom_id = str(classroom['_id'])
-            
-            if dry_run:
-                self.stdout.write(self.style.WARNING(f"[dry-run] Would assign teacher {teacher.get('full_name', 'Unknown')} ({teacher_id}) to classroom {classroom.get('full_name', 'Unknown')} ({classroom_id})"))
-            else:
-                classrooms_coll.update_one(
-                    {'_id': ObjectId(classroom_id)},
-                    {'$set': {'homeroom_teacher_id': teacher_id}}
-                )
-                assigned += 1
-                self.stdout.write(self.style.SUCCESS(f"Assigned teacher {teacher.get('full_name', 'Unknown')} to classroom {classroom.get('full_name', 'Unknown')}"))
-
-        self.stdout.write(self.style.SUCCESS(f"Done. Assigned {assigned} teachers to classrooms."))
+        picked = random.sample(teachers, min(count, len(teachers), len(classrooms_without_teachers)))
+        assignments = [(str(classroom['_id']), str(teacher['_id']))
+                       for classroom, teacher in zip(classrooms_without_teachers, picked)]
+        plan = build_plan(users_coll, classrooms_coll, assignments)
 
+        names = {str(t['_id']): t.get('full_name', 'Unknown') for t in picked}
+        classroom_names = {str(c['_id']): c.get('full_name', 'Unknown') for c in classrooms_without_teachers}
+        prefix = "[dry-run] Would assign" if dry_run else "Assign"
+        for classroom_id, teacher_id in assignments:
+            self.stdout.write(f"{prefix} teacher {names[teacher_id]} ({teacher_id}) to classroom {classroom_names[classroom_id]} ({classroom_id})")
+
+        if dry_run:
+            return
+        result = apply_plan(plan, users_coll, classrooms_coll)
+        self.stdout.write(self.style.SUCCESS(f"Done. Assigned {len(assignments)} teachers to classrooms ({result['classrooms_modified']} classrooms modified)."))
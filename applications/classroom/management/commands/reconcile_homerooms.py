@@ -0,0 +1,69 @@
+"""
+Đối soát phân công GVCN giữa classrooms và giáo viên (applications.classroom.homeroom_reconcile).
+
+  python manage.py reconcile_homerooms --dry-run
+  python manage.py reconcile_homerooms --assignments phan_cong.json
+
+phan_cong.json: [{"classroom_id": "...", "teacher_id": "..." | null}, ...] (phân công đầu năm, ưu tiên
+hơn dữ liệu hiện có). 2 truy vấn đọc + tối đa 1 bulk_write cho mỗi collection.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.classroom.homeroom_reconcile import apply_plan, build_plan, parse_assignments
+from applications.common.mongo import get_mongo_collection
+
+
+class Command(BaseCommand):
+    help = "Đối soát GVCN: tính conflicts / duplicates / orphans rồi ghi bằng bulk_write"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ in kế hoạch, không ghi')
+        parser.add_argument('--assignments', help='File JSON phân công chỉ định')
+        parser.add_argument('--json', action='store_true', help='In kế hoạch dạng JSON')
+
+    def handle(self, *args, **options):
+        assignments = []
+        if options['assignments']:
+            try:
+                with open(options['assignments'], encoding='utf-8') as fh:
+                    assignments = parse_assignments(json.load(fh))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Không đọc được {options['assignments']}: {exc}")
+
+        users_coll = get_mongo_collection('users')
+        classrooms_coll = get_mongo_collection('classrooms')
+        plan = build_plan(users_coll, classrooms_coll, assignments)
+        summary = plan.summary()
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+        else:
+            self.report(summary)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("[dry-run] Không ghi thay đổi."))
+            return
+        result = apply_plan(plan, users_coll, classrooms_coll)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Modified {result['classrooms_modified']} classrooms, {result['teachers_modified']} teachers."
+        ))
+
+    def report(self, summary):
+        self.stdout.write(f"{summary['classrooms']} classrooms, {summary['assigned']} with a homeroom teacher")
+        for key in ('conflicts', 'duplicates', 'orphans', 'invalid_assignments'):
+            items = summary[key]
+            style = self.style.WARNING if items else (lambda text: text)
+            self.stdout.write(style(f"{key}: {len(items)}"))
+            for item in items:
+                self.stdout.write(f"  {item}")
+        self.stdout.write(f"changes: {len(summary['changes'])}")
+        for change in summary['changes']:
+            self.stdout.write(
+                f"  {change['classroom'] or change['classroom_id']}: "
+                f"{change['from_teacher_id'] or '-'} -> {change['to_teacher_id'] or '-'}"
+            )
+        self.stdout.write(
+            f"{summary['classroom_updates']} classroom update(s), {summary['teacher_updates']} teacher update(s)"
+        )
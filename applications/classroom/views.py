@@ -8,6 +8,14 @@ from django.db.models import Q
 
 # Remove ORM serializers - using MongoDB only
 from applications.common.mongo import get_mongo_collection, to_plain
+from applications.common.query_budget import query_budget
+from applications.common.read_routing import secondary_reads
+from applications.common.user_context import invalidate_user_context
+from applications.common.ids import id_filter, to_object_id, to_object_ids, to_ref
+from applications.common.display_names import homeroom_teacher_display
+from applications.permissions import IsAdminUser
+from applications.student.lookup_index import mark_stale as mark_lookup_stale
+from .homeroom_reconcile import apply_plan, build_plan, parse_assignments
 from bson import ObjectId
 import logging
 from datetime import datetime
@@ -197,8 +205,10 @@ def _mongo_teachers_coll():
     return get_mongo_collection('teachers')
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@secondary_reads
 def mongo_classrooms_dropdown(request):
     """API dropdown cho classrooms - chỉ trả về id và name"""
     try:
@@ -227,8 +237,10 @@ def mongo_classrooms_dropdown(request):
         return server_error(exc)
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([AllowAny])  # Explicitly allow any user
+@secondary_reads
 def mongo_classrooms_dropdown_public(request):
     """Public API dropdown cho classrooms - không cần authentication"""
     try:
@@ -281,7 +293,11 @@ def _normalize_classroom_doc(doc: dict):
     d['full_name'] = d.get('full_name') or d.get('name', '')
     # homeroom teacher: store as string id in DB, normalize to object for FE
     ht = d.get('homeroom_teacher')
-    if ht and isinstance(ht, dict):
+    display = d.pop('homeroom_teacher_display', None)
+    if display and d.get('homeroom_teacher_id'):
+        # Thông tin GVCN đã ghi sẵn trên classroom
+        d['homeroom_teacher'] = {'id': d['homeroom_teacher_id'], **display}
+    elif ht and isinstance(ht, dict):
         pass
     else:
         ht_id = d.get('homeroom_teacher_id')
@@ -297,6 +313,7 @@ def _normalize_classroom_doc(doc: dict):
     return d
 
 
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_classrooms_list(request):
@@ -317,34 +334,25 @@ def mongo_classrooms_list(request):
         page = max(1, int(request.query_params.get('page', '1')))
         page_size = max(1, min(200, int(request.query_params.get('page_size', '20'))))
         skip = (page - 1) * page_size
-        total = _mongo_classrooms_coll().count_documents(query)
-        pipeline = [
-            {'$match': query},
-            {
-                '$lookup': {
-                    'from': 'users',
-                    'let': { 'hid': '$homeroom_teacher_id' },
-                    'pipeline': [
-                        { '$match': { '$expr': { '$and': [
-                            { '$eq': ['$_id', { '$toObjectId': '$$hid' }] },
-                            { '$eq': ['$role', 'teacher'] }
-                        ] } } }
-                    ],
-                    'as': 'teacher_docs'
-                }
-            },
-            { '$sort': { 'full_name': 1 } },
-            { '$skip': skip },
-            { '$limit': page_size }
-        ]
-        docs = list(coll.aggregate(pipeline))
+        total = coll.count_documents(query)
+        docs = list(coll.find(query).sort('full_name', 1).skip(skip).limit(page_size))
+
+        # GVCN đã ghi sẵn (homeroom_teacher_display); lớp dữ liệu cũ chưa có thì 1 truy vấn $in trên _id
+        teacher_ids = to_object_ids(
+            d.get('homeroom_teacher_id') for d in docs if not d.get('homeroom_teacher_display')
+        )
+        teacher_map = {}
+        if teacher_ids:
+            users_coll = get_mongo_collection('users')
+            for tdoc in users_coll.find({'_id': {'$in': teacher_ids}, 'role': 'teacher'}):
+                teacher_map[str(tdoc['_id'])] = tdoc
 
         out = []
         for d in docs:
             nd = _normalize_classroom_doc(d)
-            tdocs = d.get('teacher_docs') or []
-            if tdocs:
-                nd['homeroom_teacher'] = _build_teacher_public_obj(tdocs[0])
+            tdoc = None if d.get('homeroom_teacher_display') else teacher_map.get(to_ref(d.get('homeroom_teacher_id')))
+            if tdoc:
+                nd['homeroom_teacher'] = _build_teacher_public_obj(tdoc)
             out.append(nd)
         return Response({
             'results': out,
@@ -358,26 +366,22 @@ def mongo_classrooms_list(request):
         return server_error(exc)
 
 
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_classrooms_detail(request, id: str):
     try:
         coll = _mongo_classrooms_coll()
-        query = [{'id': id}]
-        # Try to interpret as ObjectId if valid hex
-        try:
-            query.append({'_id': ObjectId(id)})
-        except Exception:
-            pass
-        doc = coll.find_one({'$or': query})
+        doc_filter = id_filter(id)
+        doc = coll.find_one(doc_filter) if doc_filter else None
         if not doc:
             return not_found('Not found')
         out = _normalize_classroom_doc(doc)
         # attach teacher info if possible
-        hid = out.get('homeroom_teacher', {}).get('id') or out.get('homeroom_teacher_id')
-        if hid:
+        hid = to_object_id(out.get('homeroom_teacher_id'))
+        if hid and not doc.get('homeroom_teacher_display'):
             users_coll = get_mongo_collection('users')
-            tdoc = users_coll.find_one({'$or': [{'id': hid}, {'_id': ObjectId(hid)}], 'role': 'teacher'})
+            tdoc = users_coll.find_one({'_id': hid, 'role': 'teacher'})
             if tdoc:
                 out['homeroom_teacher'] = _build_teacher_public_obj(tdoc)
         return Response(out)
@@ -386,6 +390,7 @@ def mongo_classrooms_detail(request, id: str):
         return server_error(exc)
 
 
+@query_budget(5)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_classrooms_create(request):
@@ -393,7 +398,7 @@ def mongo_classrooms_create(request):
         coll = _mongo_classrooms_coll()
         name = (request.data.get('name') or '').strip()
         grade = (request.data.get('grade') or '').strip()
-        homeroom_teacher_id = request.data.get('homeroom_teacher_id')
+        homeroom_teacher_id = to_ref(request.data.get('homeroom_teacher_id'))
         if not name or not grade:
             return bad_request('name and grade are required')
         # build full_name like 10A1 if name is A1
@@ -404,11 +409,14 @@ def mongo_classrooms_create(request):
             'full_name': full_name,
             'grade': grade,
             'homeroom_teacher_id': homeroom_teacher_id if homeroom_teacher_id else None,
+            'homeroom_teacher_display': homeroom_teacher_display(homeroom_teacher_id),
             'student_count': 0,
             'created_at': now,
             'updated_at': now,
         }
         res = coll.insert_one(doc)
+        if homeroom_teacher_id:
+            invalidate_user_context(homeroom_teacher_id)
         inserted = coll.find_one({'_id': res.inserted_id})
         return Response(_normalize_classroom_doc(inserted), status=status.HTTP_201_CREATED)
     except Exception as exc:
@@ -416,6 +424,7 @@ def mongo_classrooms_create(request):
         return server_error(exc)
 
 
+@query_budget(7)  # đổi GVCN: + tên GVCN, ghi users, version UserContext
 @api_view(['PATCH', 'PUT'])
 @permission_classes([IsAuthenticated])
 def mongo_classrooms_update(request, id: str):
@@ -423,12 +432,8 @@ def mongo_classrooms_update(request, id: str):
         coll = _mongo_classrooms_coll()
         
         # Lấy classroom document trước
-        query = [{ 'id': id }]
-        try:
-            query.append({'_id': ObjectId(id)})
-        except Exception:
-            pass
-        doc = coll.find_one({'$or': query})
+        doc_filter = id_filter(id)
+        doc = coll.find_one(doc_filter) if doc_filter else None
         if not doc:
             return not_found('Not found')
         
@@ -438,8 +443,9 @@ def mongo_classrooms_update(request, id: str):
         if 'grade' in request.data:
             updates['grade'] = (request.data.get('grade') or '').strip()
         if 'homeroom_teacher_id' in request.data:
-            htid = request.data.get('homeroom_teacher_id')
-            updates['homeroom_teacher_id'] = htid if htid else None
+            htid = to_ref(request.data.get('homeroom_teacher_id'))
+            updates['homeroom_teacher_id'] = htid
+            updates['homeroom_teacher_display'] = homeroom_teacher_display(htid)
             
             # Cập nhật teacher record với thông tin lớp
             if htid:
@@ -475,6 +481,11 @@ def mongo_classrooms_update(request, id: str):
         if 'name' in updates or 'grade' in updates:
             updates['full_name'] = new_name if str(new_grade) in str(new_name) else f"{new_grade}{new_name}"
         coll.update_one({'_id': doc['_id']}, {'$set': updates})
+        if 'homeroom_teacher_id' in updates:
+            invalidate_user_context(doc.get('homeroom_teacher_id'), updates['homeroom_teacher_id'])
+        if updates.get('full_name', doc.get('full_name')) != doc.get('full_name'):
+            # Tên lớp hiển thị trong chỉ mục tra cứu học sinh
+            mark_lookup_stale()
         updated = coll.find_one({'_id': doc['_id']})
         return Response(_normalize_classroom_doc(updated))
     except Exception as exc:
@@ -482,21 +493,51 @@ def mongo_classrooms_update(request, id: str):
         return server_error(exc)
 
 
+@query_budget(5)
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def mongo_classrooms_delete(request, id: str):
     try:
         coll = _mongo_classrooms_coll()
-        query = [{ 'id': id }]
-        try:
-            query.append({'_id': ObjectId(id)})
-        except Exception:
-            pass
-        doc = coll.find_one({'$or': query})
+        doc_filter = id_filter(id)
+        doc = coll.find_one(doc_filter) if doc_filter else None
         if not doc:
             return Response({'detail': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
         coll.delete_one({'_id': doc['_id']})
+        # Giáo viên chủ nhiệm của lớp bị xóa: cache ngữ cảnh không còn đúng
+        # (ngữ cảnh học sinh lấy từ users.classroom_id, không đổi)
+        invalidate_user_context(doc.get('homeroom_teacher_id'))
+        mark_lookup_stale()
         return Response({'message': 'Deleted'}, status=status.HTTP_204_NO_CONTENT)
     except Exception as exc:
         logging.getLogger(__name__).exception('mongo_classrooms_delete error')
-        return Response({'detail': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'detail': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@query_budget(6)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def mongo_homerooms_reconcile(request):
+    """
+    Đối soát phân công GVCN (classrooms <-> giáo viên) và ghi phần chênh lệch.
+
+    Body (tùy chọn):
+      dry_run: true -> chỉ trả về kế hoạch (conflicts / duplicates / orphans / changes), không ghi
+      assignments: [{"classroom_id": "...", "teacher_id": "..." | null}] -> phân công chỉ định (ưu tiên)
+    """
+    try:
+        payload = request.data or {}
+        assignments = payload.get('assignments') or []
+        if not isinstance(assignments, list):
+            return bad_request('assignments phải là danh sách')
+        dry_run = str(payload.get('dry_run', False)).lower() in ('1', 'true')
+        users_coll = get_mongo_collection('users')
+        classrooms_coll = _mongo_classrooms_coll()
+        plan = build_plan(users_coll, classrooms_coll, parse_assignments(assignments))
+        result = plan.summary()
+        result['dry_run'] = dry_run
+        if not dry_run:
+            result.update(apply_plan(plan, users_coll, classrooms_coll))
+        return ok(result)
+    except Exception as exc:
+        logging.getLogger(__name__).exception('mongo_homerooms_reconcile error')
+        return server_error(exc)
@@ -3,8 +3,10 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from .academic_year import get_current_academic_year_payload
+from .query_budget import query_budget
 
 
+@query_budget(2)
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def current_academic_year(request):
@@ -0,0 +1,588 @@
+"""
+Benchmark các endpoint nóng trên MongoDB thật (mongod local hoặc MONGO_URI đã cấu hình).
+
+- Dữ liệu: synthetic_dataset với seed cố định, sinh vào 1 database riêng cho benchmark.
+- Mỗi case gọi view qua django.test.Client (đi qua URL routing, middleware, JWT auth, DRF).
+- Đo: độ trễ p50 / p95 (ms), số lệnh MongoDB mỗi request (CommandListener gắn vào client
+  singleton), bộ nhớ cấp phát đỉnh của 1 request (tracemalloc, đo ở lượt chạy riêng để
+  không làm lệch số đo thời gian).
+- So sánh với baseline JSON (lưu từ 1 lần chạy trước bằng --save-baseline) để báo regression.
+
+Dùng bởi `manage.py run_benchmarks`.
+"""
+
+import io
+import json
+import math
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+import bcrypt
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, override_settings
+from pymongo import MongoClient, monitoring
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import mongo as mongo_module
+from .indexes import ensure_indexes
+from .query_budget import listener as query_budget_listener
+from .slow_queries import listener as slow_query_listener
+from .synthetic_dataset import DatasetConfig, generate_dataset
+from .tenancy import TOKEN_CLAIM, use_tenant
+
+
+BASELINE_VERSION = 1
+DEFAULT_TOLERANCE = 0.25
+BENCH_ADMIN_EMAIL = 'bench.admin@example.com'
+BENCH_ADMIN_PASSWORD = '123456'
+# Tenant riêng của benchmark: request (TenantMiddleware) và key cache không chạm trường thật khi có TENANTS
+BENCH_TENANT_KEY = 'bench'
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Đếm lệnh MongoDB theo tên lệnh (find, aggregate, update, ...) - an toàn giữa các thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Counter = Counter()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = Counter()
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return Counter(self.counts)
+
+    def started(self, event):
+        with self._lock:
+            self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class BenchmarkFailure(RuntimeError):
+    """Case trả về status không phải 2xx: số đo của đường lỗi không có ý nghĩa cho baseline."""
+
+
+def _ensure_ok(case: 'BenchCase', response) -> None:
+    if not 200 <= response.status_code < 300:
+        body = response.content[:300].decode('utf-8', 'replace')
+        raise BenchmarkFailure(f"{case.name}: status {response.status_code}: {body}")
+
+
+@dataclass
+class BenchCase:
+    name: str
+    path: str
+    method: str = 'get'             # get | post | put | patch | delete (body gửi dạng JSON)
+    params: dict = field(default_factory=dict)
+    body: Optional[dict] = None
+    role: Optional[str] = 'admin'   # None = gọi không đăng nhập
+    # POST multipart: hàm tạo {field: file} mới cho mỗi lần gọi (file upload chỉ đọc được 1 lần)
+    files: Optional[Callable[[], dict]] = None
+    # Chạy trước mỗi lần gọi, không tính vào số đo: đưa dữ liệu về trạng thái ban đầu (case tạo / xóa)
+    setup: Optional[Callable[[], None]] = None
+
+
+@dataclass
+class CaseResult:
+    name: str
+    iterations: int
+    status: int
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+    commands: float
+    command_breakdown: Dict[str, float]
+    peak_kib: float
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_mongod(binary: str = 'mongod', timeout: float = 30.0, replica_set: Optional[str] = None):
+    """
+    Chạy 1 mongod tạm (dbpath tạm, cổng trống), trả về URI; dừng + xóa dữ liệu khi thoát.
+    replica_set: chạy replica set 1 node (để kiểm tra read preference / session), URI có ?replicaSet=.
+    """
+    executable = shutil.which(binary) or binary
+    if not os.path.exists(executable):
+        raise RuntimeError(f'mongod not found: {binary}')
+    dbpath = tempfile.mkdtemp(prefix='bench-mongod-')
+    port = _free_port()
+    args = [executable, '--dbpath', dbpath, '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet']
+    if replica_set:
+        args += ['--replSet', replica_set]
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    uri = f'mongodb://127.0.0.1:{port}/'
+    try:
+        deadline = time.monotonic() + timeout
+        direct = MongoClient(uri, serverSelectionTimeoutMS=500, directConnection=True)
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'mongod exited with code {process.returncode}')
+            try:
+                direct.admin.command('ping')
+                break
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise RuntimeError('mongod did not start in time')
+                time.sleep(0.2)
+        if replica_set:
+            direct.admin.command('replSetInitiate', {
+                '_id': replica_set, 'members': [{'_id': 0, 'host': f'127.0.0.1:{port}'}],
+            })
+            while not direct.admin.command('hello').get('isWritablePrimary'):
+                if time.monotonic() > deadline:
+                    raise RuntimeError('replica set did not elect a primary in time')
+                time.sleep(0.2)
+            uri = f'{uri}?replicaSet={replica_set}'
+        direct.close()
+        yield uri
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(dbpath, ignore_errors=True)
+
+
+@contextmanager
+def instrumented_client(uri: str, counter: CommandCounter):
+    """Thay client singleton trong applications.common.mongo bằng client có CommandListener."""
+    client = MongoClient(uri, event_listeners=[counter, query_budget_listener, slow_query_listener], tlsAllowInvalidCertificates=True)
+    previous = mongo_module._client
+    mongo_module._client = client
+    try:
+        yield client
+    finally:
+        mongo_module._client = previous
+        client.close()
+
+
+def load_dataset(db, config: DatasetConfig, out: Callable[[str], None] = print) -> None:
+    """Sinh lại dữ liệu benchmark (xóa collection cũ) + index + 1 tài khoản admin."""
+    generate_dataset(lambda _index: db, config, drop=True, out=lambda _msg: None)
+    ensure_indexes(db=db)
+    db['users'].insert_one({
+        '_id': ObjectId(), 'username': 'bench.admin', 'email': BENCH_ADMIN_EMAIL,
+        'password_hash': bcrypt.hashpw(BENCH_ADMIN_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8'),
+        'role': 'admin', 'first_name': 'Bench', 'last_name': 'Admin', 'full_name': 'Bench Admin',
+        'status': 'active', 'is_active': True,
+    })
+    out(f"dataset loaded into {db.name}: " + ', '.join(
+        f"{name}={db[name].estimated_document_count()}" for name in ('users', 'classrooms', 'events', 'attendance')
+    ))
+
+
+def build_cases(db) -> List[BenchCase]:
+    """Các case cho endpoint nóng, tham số lấy từ dữ liệu đã sinh (ngày có events gần nhất, lớp đầu tiên)."""
+    classroom = db['classrooms'].find_one({}, sort=[('full_name', 1)])
+    classroom_id = str(classroom['_id'])
+    latest = db['events'].find_one({'classroom_id': classroom_id}, {'date': 1, 'periods': 1}, sort=[('date', -1)])
+    day = latest['date']
+    monday = date.fromisoformat(day) - timedelta(days=date.fromisoformat(day).weekday())
+    week = {'start_date': monday.isoformat(), 'end_date': (monday + timedelta(days=6)).isoformat()}
+    return [
+        BenchCase('mongo_events_optimized_list', '/api/v1/events/', params={'date': day, 'page_size': 20}),
+        BenchCase('mongo_events_public', '/api/v1/events/public', params={'date': day, 'page_size': 20}, role=None),
+        BenchCase('mongo_realtime_rankings', '/api/v1/mongo/week-summaries/rankings/realtime', params=week, role=None),
+        BenchCase('mongo_realtime_classroom_detail', '/api/v1/mongo/week-summaries/rankings/realtime/classroom-detail',
+                  params={'classroom_id': classroom_id, **week}, role=None),
+        BenchCase('mongo_students_list', '/api/v1/students/mongo', params={'classroom_id': classroom_id, 'page_size': 12}),
+        BenchCase('mongo_classrooms_list', '/api/v1/classrooms/mongo', params={'page_size': 20}),
+        # Ghi đè lại đúng nội dung hiện có -> idempotent, chạy lặp được
+        BenchCase('mongo_events_bulk_replace', '/api/v1/events/bulk-replace', method='post',
+                  body={'classroom_id': classroom_id, 'date': day, 'periods': _plain_periods(latest.get('periods') or {})}),
+        BenchCase('mongo_attendance_export', '/api/v1/events/attendance/export',
+                  params={'classroom_id': classroom_id, 'month': int(day[5:7]), 'year': int(day[:4])}),
+    ]
+
+
+# Document cố định cho case ghi / xóa: setup của case tạo lại trước mỗi lần gọi
+BENCH_SCRATCH_DATE = '2000-01-03'   # ngày-lớp riêng, ngoài mọi tuần của dữ liệu giả lập
+BENCH_DAY_ID = ObjectId('0000000000000000000be001')
+BENCH_EVENT_ID = '0000000000000000000be002'
+BENCH_STUDENT_ID = ObjectId('0000000000000000000be003')
+BENCH_TEACHER_ID = ObjectId('0000000000000000000be004')
+BENCH_CLASSROOM_ID = ObjectId('0000000000000000000be005')
+BENCH_EVENT_TYPE_ID = ObjectId('0000000000000000000be006')
+
+
+def build_budget_cases(db) -> List[BenchCase]:
+    """
+    Các case benchmark + 1 case cho mỗi endpoint còn lại có khai báo query_budget.
+
+    Case ghi chạy lặp được: ghi lại đúng nội dung hiện có, hoặc thao tác trên document cố định
+    (BENCH_*) mà setup tạo lại / xóa trước mỗi lần gọi.
+    """
+    from applications.event.day_totals import day_summary, event_points
+    from applications.event.pending_counters import recount_pending
+
+    cases = build_cases(db)
+    base = {c.name: c for c in cases}
+    day = base['mongo_events_bulk_replace'].body['date']
+    classroom_id = base['mongo_events_bulk_replace'].body['classroom_id']
+    week = {k: base['mongo_realtime_rankings'].params[k] for k in ('start_date', 'end_date')}
+    classroom_name = db['classrooms'].find_one({'_id': ObjectId(classroom_id)}, {'name': 1})['name']
+    student = db['users'].find_one({'role': 'student', 'classroom_id': classroom_id}, sort=[('full_name', 1)])
+    student_id = str(student['_id'])
+    event_type = db['event_types'].find_one({'category': 'violation', 'is_active': True}, sort=[('key', 1)])
+    week_summary = db['week_summaries'].find_one({'classroom_id': classroom_id}, {'_id': 1})
+    scratch = {'classroom_id': classroom_id, 'date': BENCH_SCRATCH_DATE}
+    scratch_event = {
+        'event_type_key': event_type['key'], 'student_id': student_id,
+        'points': event_points({'points': event_type.get('default_points', -1)}), 'description': '',
+    }
+
+    def reset_day(status='approved'):
+        periods = {'1': [{**scratch_event, 'event_id': BENCH_EVENT_ID, 'event_type': str(event_type['_id'])}]}
+        db['events'].delete_many(scratch)
+        db['events'].insert_one({
+            '_id': BENCH_DAY_ID, **scratch, 'periods': periods, **day_summary(periods), 'total_events': 1,
+            'approval_status': status, 'approved_by': None, 'approved_by_name': None, 'approved_at': None,
+        })
+        recount_pending([classroom_id])
+
+    def pending_day():
+        reset_day('pending')
+
+    def ensure_template():
+        db['event_template'].update_one({}, {'$setOnInsert': {'name': 'Bench template', 'periods': {}}}, upsert=True)
+
+    def ensure_event_type():
+        db['event_types'].replace_one({'_id': BENCH_EVENT_TYPE_ID}, {
+            'key': 'bench_type', 'name': 'Bench type', 'default_points': 0, 'is_active': False,
+        }, upsert=True)
+
+    def ensure_teacher():
+        db['users'].replace_one({'_id': BENCH_TEACHER_ID}, {
+            'role': 'teacher', 'email': 'bench.teacher@example.com', 'username': 'bench.teacher',
+            'first_name': 'Bench', 'last_name': 'Teacher', 'full_name': 'Bench Teacher', 'status': 'active',
+        }, upsert=True)
+
+    def ensure_classroom():
+        ensure_teacher()
+        db['classrooms'].replace_one({'_id': BENCH_CLASSROOM_ID}, {
+            'name': 'BENCH', 'grade': '12', 'full_name': '12BENCH', 'student_count': 0,
+            'homeroom_teacher_id': str(BENCH_TEACHER_ID),
+        }, upsert=True)
+
+    def ensure_student():
+        db['users'].replace_one({'_id': BENCH_STUDENT_ID}, {
+            'role': 'student', 'email': 'bench.student@example.com', 'student_code': 'BENCH001',
+            'first_name': 'Bench', 'last_name': 'Student', 'full_name': 'Bench Student', 'gender': 'male',
+            'classroom_id': classroom_id,
+        }, upsert=True)
+
+    def forget_created(collection, query):
+        def setup():
+            db[collection].delete_many(query)
+        return setup
+
+    item = {'date': BENCH_SCRATCH_DATE, 'classroom_id': classroom_id, 'period': '1'}
+    return cases + [
+        BenchCase('mongo_events_optimized_detail', '/api/v1/events/detail', params={'date': day, 'classroom_id': classroom_id}),
+        BenchCase('mongo_events_pending', '/api/v1/events/pending', params={'page_size': 20}),
+        BenchCase('mongo_events_pending_counts', '/api/v1/events/pending/counts'),
+        BenchCase('mongo_week_summary_list', '/api/v1/mongo/week-summaries/', params={'classroom_id': classroom_id}),
+        BenchCase('mongo_attendance_stats', '/api/v1/events/attendance/stats', params=week),
+        # Dữ liệu sinh ra đã khớp phân công GVCN -> đối soát không đổi gì, chạy lặp được
+        BenchCase('mongo_homerooms_reconcile', '/api/v1/classrooms/mongo/homerooms/reconcile', method='post', body={}),
+        # Mỗi lần gọi 1 file mới với mã / email chưa tồn tại -> luôn đi hết đường ghi
+        BenchCase('mongo_teachers_import', '/api/v1/teachers/import', method='post', files=_teachers_file),
+        BenchCase('mongo_students_import', '/api/v1/students/import', method='post',
+                  files=lambda: _students_file(classroom_name)),
+
+        BenchCase('healthcheck', '/api/v1/health', role=None),
+        BenchCase('current_academic_year', '/api/v1/mongo/academic-year/current', role=None),
+        BenchCase('slow_queries_report', '/api/v1/perf/slow-queries'),
+        BenchCase('login_with_mongo', '/api/v1/auth/mongo-login', method='post', role=None,
+                  body={'email': BENCH_ADMIN_EMAIL, 'password': BENCH_ADMIN_PASSWORD}),
+        BenchCase('register_with_mongo', '/api/v1/auth/mongo-register', method='post', role=None,
+                  body={'email': 'bench.register@example.com', 'password': BENCH_ADMIN_PASSWORD, 'full_name': 'Bench Register'},
+                  setup=forget_created('users', {'email': 'bench.register@example.com'})),
+
+        BenchCase('mongo_event_types_list', '/api/v1/events/types', role=None),
+        BenchCase('mongo_event_types_template', '/api/v1/events/types/template', role=None, setup=ensure_template),
+        BenchCase('mongo_event_types_detail', f"/api/v1/events/types/{event_type['_id']}"),
+        BenchCase('mongo_event_types_update', f"/api/v1/events/types/{event_type['_id']}/update", method='put',
+                  body={'name': event_type['name']}),
+        BenchCase('mongo_event_types_delete', f'/api/v1/events/types/{BENCH_EVENT_TYPE_ID}/delete', method='delete',
+                  setup=ensure_event_type),
+
+        # Ngày-lớp BENCH_SCRATCH_DATE: tiết 1 có đúng 1 event BENCH_EVENT_ID
+        BenchCase('mongo_events_optimized_create', '/api/v1/events/create', method='post',
+                  body={**scratch, 'periods': {'1': [scratch_event]}}, setup=reset_day),
+        BenchCase('mongo_events_optimized_replace', '/api/v1/events/replace', method='put',
+                  body={**scratch, 'events': [{'period': 1, 'event_type_key': event_type['key'], 'student': student_id}]},
+                  setup=reset_day),
+        BenchCase('mongo_events_bulk_sync', '/api/v1/events/bulk-sync', method='post',
+                  body={**scratch, 'period': '1', 'events': [scratch_event]}, setup=reset_day),
+        BenchCase('mongo_events_approve', '/api/v1/events/approve', method='post',
+                  body={'event_id': str(BENCH_DAY_ID), 'action': 'approve'}, setup=pending_day),
+        BenchCase('mongo_events_approve_bulk', '/api/v1/events/approve/bulk', method='post',
+                  body={'event_ids': [str(BENCH_DAY_ID)], 'action': 'approve'}, setup=pending_day),
+        BenchCase('mongo_events_item_add', '/api/v1/events/items/add', method='post',
+                  body={**item, 'event': scratch_event}, setup=reset_day),
+        BenchCase('mongo_events_item_update', '/api/v1/events/items/update', method='patch',
+                  body={**item, 'event_id': BENCH_EVENT_ID, 'points': -2, 'description': 'bench'}, setup=reset_day),
+        BenchCase('mongo_events_item_remove', '/api/v1/events/items/remove', method='delete',
+                  body={**item, 'event_id': BENCH_EVENT_ID}, setup=reset_day),
+
+        BenchCase('mongo_classrooms_dropdown', '/api/v1/classrooms/mongo/dropdown'),
+        BenchCase('mongo_classrooms_dropdown_public', '/api/v1/classrooms/mongo/dropdown/public', role=None),
+        BenchCase('mongo_classrooms_detail', f'/api/v1/classrooms/mongo/{classroom_id}'),
+        BenchCase('mongo_classrooms_create', '/api/v1/classrooms/mongo/create', method='post',
+                  body={'name': 'BENCHNEW', 'grade': '12'}, setup=forget_created('classrooms', {'name': 'BENCHNEW'})),
+        BenchCase('mongo_classrooms_update', f'/api/v1/classrooms/mongo/{BENCH_CLASSROOM_ID}/update', method='patch',
+                  body={'name': 'BENCH', 'grade': '12', 'homeroom_teacher_id': str(BENCH_TEACHER_ID)}, setup=ensure_classroom),
+        BenchCase('mongo_classrooms_delete', f'/api/v1/classrooms/mongo/{BENCH_CLASSROOM_ID}/delete', method='delete',
+                  setup=ensure_classroom),
+
+        BenchCase('mongo_students_dropdown', '/api/v1/students/mongo/dropdown', params={'classroom_id': classroom_id}),
+        BenchCase('mongo_students_lookup', '/api/v1/students/mongo/lookup', params={'q': student['full_name']}),
+        BenchCase('mongo_students_create', '/api/v1/students/mongo/create', method='post',
+                  body={'email': 'bench.new.student@example.com', 'classroom_id': classroom_id,
+                        'full_name': 'Bench New Student', 'student_code': 'BENCHNEW'},
+                  setup=forget_created('users', {'email': 'bench.new.student@example.com'})),
+        BenchCase('mongo_students_create_by_teacher', '/api/v1/students/mongo/create-by-teacher', method='post', role='teacher',
+                  body={'full_name': student['full_name'], 'email': student['email'], 'classroom_id': classroom_id}),
+        BenchCase('mongo_students_my_classroom', '/api/v1/students/mongo/my-classroom-students', role='teacher'),
+        BenchCase('mongo_students_my_classroom_dropdown', '/api/v1/students/mongo/my-classroom-students/dropdown', role='teacher'),
+        BenchCase('mongo_students_detail', f'/api/v1/students/mongo/{student_id}'),
+        BenchCase('mongo_students_update', f'/api/v1/students/mongo/{BENCH_STUDENT_ID}/update', method='patch',
+                  body={'full_name': 'Bench Student', 'phone': '0900000000'}, setup=ensure_student),
+        BenchCase('mongo_students_delete', f'/api/v1/students/mongo/{BENCH_STUDENT_ID}/delete', method='delete',
+                  setup=ensure_student),
+        BenchCase('mongo_students_import_template', '/api/v1/students/import/template'),
+
+        BenchCase('mongo_teachers_list', '/api/v1/teachers/mongo', params={'page_size': 12}),
+        BenchCase('mongo_teachers_create', '/api/v1/teachers/mongo/create', method='post',
+                  body={'full_name': 'Bench New Teacher', 'email': 'bench.new.teacher@example.com'},
+                  setup=forget_created('users', {'email': 'bench.new.teacher@example.com'})),
+        BenchCase('mongo_teachers_import_template', '/api/v1/teachers/import/template'),
+        BenchCase('mongo_teachers_detail', f'/api/v1/teachers/mongo/{BENCH_TEACHER_ID}', setup=ensure_teacher),
+        BenchCase('mongo_teachers_update', f'/api/v1/teachers/mongo/{BENCH_TEACHER_ID}/update', method='patch',
+                  body={'full_name': 'Bench Teacher', 'subject': 'Toán'}, setup=ensure_teacher),
+        BenchCase('mongo_teachers_delete', f'/api/v1/teachers/mongo/{BENCH_TEACHER_ID}/delete', method='delete',
+                  setup=ensure_teacher),
+
+        BenchCase('mongo_week_summary_detail', f"/api/v1/mongo/week-summaries/{week_summary['_id']}"),
+        BenchCase('mongo_week_milestone', '/api/v1/mongo/week-summaries/milestone'),
+    ]
+
+
+def _excel_file(name: str, header: List[str], rows: List[list]) -> dict:
+    from openpyxl import Workbook
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(header)
+    for row in rows:
+        worksheet.append(row)
+    output = io.BytesIO()
+    workbook.save(output)
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return {'file': SimpleUploadedFile(name, output.getvalue(), content_type=content_type)}
+
+
+def _teachers_file(count: int = 5) -> dict:
+    tag = uuid.uuid4().hex[:8]
+    return _excel_file('bench_teachers.xlsx', ['Họ tên', 'Email', 'Mã giáo viên'], [
+        [f'Giáo Viên {tag} {i}', f'bench.{tag}.{i}@example.com', f'BGV{tag}{i}'] for i in range(count)
+    ])
+
+
+def _students_file(classroom_name: str, count: int = 20) -> dict:
+    tag = uuid.uuid4().hex[:8]
+    return _excel_file('bench_students.xlsx', ['Họ tên', 'Mã học sinh', 'Lớp', 'Giới tính', 'Ngày sinh'], [
+        [f'Học Sinh {tag} {i}', f'BHS{tag}{i}', classroom_name, 'Nam', '2008-01-15'] for i in range(count)
+    ])
+
+
+def _plain_periods(periods: dict) -> dict:
+    return json.loads(json.dumps(periods, default=str))
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    # nearest-rank
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class BenchmarkSuite:
+    def __init__(self, uri: str, db_name: str, iterations: int = 30, warmup: int = 3,
+                 out: Callable[[str], None] = print):
+        self.uri = uri
+        self.db_name = db_name
+        self.iterations = max(1, iterations)
+        self.warmup = max(0, warmup)
+        self.out = out
+        self.counter = CommandCounter()
+
+    def auth_headers(self, db, role: Optional[str]) -> dict:
+        if role is None:
+            return {}
+        if role == 'admin':
+            query = {'email': BENCH_ADMIN_EMAIL}
+        elif role == 'teacher':
+            # GVCN của lớp dùng trong các case: đi hết nhánh phân quyền theo lớp chủ nhiệm
+            classroom = db['classrooms'].find_one({}, {'homeroom_teacher_id': 1}, sort=[('full_name', 1)])
+            query = {'_id': ObjectId(classroom['homeroom_teacher_id'])}
+        else:
+            query = {'role': role}
+        user = db['users'].find_one(query, {'_id': 1})
+        token = AccessToken()
+        token['user_id'] = str(user['_id'])
+        token[TOKEN_CLAIM] = BENCH_TENANT_KEY
+        return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def send(self, client: Client, case: BenchCase, headers: dict):
+        if case.files is not None:
+            return client.post(case.path, data=case.files(), **headers)
+        if case.method == 'get':
+            return client.get(case.path, case.params, **headers)
+        return getattr(client, case.method)(
+            case.path, data=json.dumps(case.body or {}), content_type='application/json', **headers
+        )
+
+    def run_case(self, client: Client, case: BenchCase, headers: dict) -> CaseResult:
+        for _ in range(self.warmup):
+            if case.setup is not None:
+                case.setup()
+            _ensure_ok(case, self.send(client, case, headers))
+
+        timings, totals = [], Counter()
+        status = 0
+        for _ in range(self.iterations):
+            if case.setup is not None:
+                case.setup()
+            self.counter.reset()
+            started = time.perf_counter()
+            response = self.send(client, case, headers)
+            timings.append((time.perf_counter() - started) * 1000.0)
+            _ensure_ok(case, response)
+            totals.update(self.counter.snapshot())
+            status = response.status_code
+
+        if case.setup is not None:
+            case.setup()
+        tracemalloc.start()
+        try:
+            self.send(client, case, headers)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return CaseResult(
+            name=case.name,
+            iterations=self.iterations,
+            status=status,
+            p50_ms=round(_percentile(timings, 50), 2),
+            p95_ms=round(_percentile(timings, 95), 2),
+            mean_ms=round(statistics.fmean(timings), 2),
+            commands=round(sum(totals.values()) / self.iterations, 2),
+            command_breakdown={name: round(count / self.iterations, 2) for name, count in sorted(totals.items())},
+            peak_kib=round(peak / 1024.0, 1),
+        )
+
+    @contextmanager
+    def session(self, config: Optional[DatasetConfig] = None, load: bool = True):
+        """
+        Settings + client Mongo có listener trỏ vào database benchmark; trả về (db, django test Client).
+
+        TENANTS được thay bằng 1 tenant 'bench' duy nhất có db là database benchmark: nếu chỉ đổi MONGO_DB,
+        request vẫn được TenantMiddleware định tuyến tới database của trường đang cấu hình và các case ghi
+        (bulk_replace, import) sẽ ghi vào dữ liệu thật.
+        """
+        hosts = list(settings.ALLOWED_HOSTS) + ['testserver']
+        tenants = json.dumps({BENCH_TENANT_KEY: {'name': 'Benchmark', 'db': self.db_name}})
+        with override_settings(MONGO_URI=self.uri, MONGO_DB=self.db_name, ALLOWED_HOSTS=hosts,
+                               TENANTS=tenants, DEFAULT_TENANT=BENCH_TENANT_KEY), \
+                use_tenant(BENCH_TENANT_KEY), \
+                instrumented_client(self.uri, self.counter) as mongo_client:
+            db = mongo_client[self.db_name]
+            if load:
+                load_dataset(db, config or DatasetConfig(), out=self.out)
+            cache.clear()
+            yield db, Client()
+
+    def run(self, config: Optional[DatasetConfig] = None, only: Optional[List[str]] = None,
+            load: bool = True) -> dict:
+        results = {}
+        with self.session(config, load) as (db, client):
+            for case in build_cases(db):
+                if only and case.name not in only:
+                    continue
+                result = self.run_case(client, case, self.auth_headers(db, case.role))
+                results[case.name] = vars(result)
+                self.out(
+                    f"{case.name:<34} {result.status} p50={result.p50_ms:8.2f}ms p95={result.p95_ms:8.2f}ms "
+                    f"mongo={result.commands:6.1f} cmd/req peak={result.peak_kib:9.1f}KiB"
+                )
+        return {
+            'version': BASELINE_VERSION,
+            'dataset': vars(config) if config is not None else None,
+            'iterations': self.iterations,
+            'results': results,
+        }
+
+
+def compare(baseline: dict, current: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Danh sách regression: p95 / bộ nhớ vượt baseline quá tolerance, hoặc số lệnh Mongo tăng."""
+    regressions = []
+    for name, now in current.get('results', {}).items():
+        before = (baseline.get('results') or {}).get(name)
+        if not before:
+            continue
+        if now['status'] != before['status']:
+            regressions.append(f"{name}: status {before['status']} -> {now['status']}")
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+        if now['commands'] > before['commands']:
+            regressions.append(f"{name}: mongo commands {before['commands']} -> {now['commands']} per request")
+        if now['peak_kib'] > before['peak_kib'] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {before['peak_kib']}KiB -> {now['peak_kib']}KiB")
+    return regressions
+
+
+def read_report(path: str) -> dict:
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def write_report(path: str, report: dict) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2, default=str)
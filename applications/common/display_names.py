@@ -0,0 +1,239 @@
+"""
+Tên hiển thị được ghi sẵn (denormalize) để các API đọc không phải join.
+
+  - event nhúng trong periods: student_name, event_type_name
+  - classroom: homeroom_teacher_display {full_name, first_name, last_name, email}
+
+Ghi: mọi đường ghi events gọi stamp_display_names() trước khi lưu; API đọc nhiều day-document
+bổ sung tên cho dữ liệu cũ bằng stamp_display_names_many() (1 lần tra tên cho cả trang).
+Đổi tên: view cập nhật học sinh / giáo viên / loại sự kiện gọi propagate_*().
+Tên học sinh / loại sự kiện được fan-out bằng 1 update_many dạng pipeline (1 lượt qua events,
+không cần biết trước các key tiết), chạy ở thread nền nên request đổi tên không phải chờ.
+"""
+
+import logging
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .ids import to_object_ids
+from .mongo import get_mongo_collection
+from .tenancy import current_tenant, use_tenant
+
+
+logger = logging.getLogger(__name__)
+
+
+# Tên mặc định khi event_type_key không có trong event_types
+CUSTOM_EVENT_TYPE_NAMES = {'custom_bonus_point': 'Điểm cộng đột xuất'}
+
+
+def _iter_events(periods: dict):
+    if not isinstance(periods, dict):
+        return
+    for period_events in periods.values():
+        if isinstance(period_events, list):
+            for ev in period_events:
+                if isinstance(ev, dict):
+                    yield ev
+
+
+def student_display_name(doc: dict) -> str:
+    return doc.get('full_name') or f"{doc.get('first_name', '')} {doc.get('last_name', '')}".strip()
+
+
+def _student_names(student_ids: Iterable) -> Dict[str, str]:
+    oids = to_object_ids(student_ids)
+    if not oids:
+        return {}
+    users_coll = get_mongo_collection('users')
+    return {
+        str(d['_id']): student_display_name(d)
+        for d in users_coll.find({'_id': {'$in': oids}}, {'full_name': 1, 'first_name': 1, 'last_name': 1})
+    }
+
+
+def _event_type_names(keys: Iterable[str], ids: Iterable) -> Dict[str, str]:
+    """{key hoặc id: name} cho các loại sự kiện."""
+    keys, oids = list(keys), to_object_ids(ids)
+    clauses = []
+    if keys:
+        clauses.append({'key': {'$in': keys}})
+    if oids:
+        clauses.append({'_id': {'$in': oids}})
+    if not clauses:
+        return {}
+    out = {}
+    query = clauses[0] if len(clauses) == 1 else {'$or': clauses}
+    for et in get_mongo_collection('event_types').find(query, {'key': 1, 'name': 1}):
+        name = et.get('name', '')
+        out[str(et['_id'])] = name
+        if et.get('key'):
+            out[et['key']] = name
+    return out
+
+
+def stamp_display_names(periods: dict, only_missing: bool = False) -> dict:
+    """
+    Ghi student_name / event_type_name vào từng event (sửa trực tiếp trên periods).
+
+    only_missing=True: chỉ bổ sung cho event chưa có tên (dùng cho API đọc dữ liệu cũ).
+    """
+    _stamp_events(_iter_events(periods), only_missing)
+    return periods
+
+
+def stamp_display_names_many(periods_maps: Iterable[dict], only_missing: bool = False) -> None:
+    """stamp_display_names() cho nhiều day-document, tra tên 1 lần cho tất cả."""
+    _stamp_events((ev for periods in periods_maps for ev in _iter_events(periods)), only_missing)
+
+
+def _stamp_events(events: Iterable[dict], only_missing: bool) -> None:
+    events = [
+        ev for ev in events
+        if not only_missing or 'student_name' not in ev or 'event_type_name' not in ev
+    ]
+    if not events:
+        return
+
+    student_ids = {str(ev['student_id']) for ev in events if ev.get('student_id')}
+    et_keys = {ev['event_type_key'] for ev in events if ev.get('event_type_key')}
+    et_ids = {str(ev['event_type']) for ev in events if ev.get('event_type') and not ev.get('event_type_key')}
+    student_names = _student_names(student_ids)
+    type_names = _event_type_names(et_keys, et_ids)
+
+    for ev in events:
+        if not only_missing or 'student_name' not in ev:
+            ev['student_name'] = student_names.get(str(ev.get('student_id')), '') if ev.get('student_id') else ''
+        if not only_missing or 'event_type_name' not in ev:
+            key = ev.get('event_type_key')
+            name = type_names.get(key) or type_names.get(str(ev.get('event_type') or ''))
+            if not name and key in CUSTOM_EVENT_TYPE_NAMES:
+                name = ev.get('description') or CUSTOM_EVENT_TYPE_NAMES[key]
+            ev['event_type_name'] = name or ''
+
+
+def teacher_display(teacher_doc: Optional[dict]) -> Optional[dict]:
+    if not teacher_doc:
+        return None
+    full_name = teacher_doc.get('full_name') or ''
+    parts = full_name.split()
+    return {
+        'full_name': full_name,
+        'first_name': teacher_doc.get('first_name') or (' '.join(parts[:-1]) if len(parts) > 1 else full_name),
+        'last_name': teacher_doc.get('last_name') or (parts[-1] if len(parts) > 1 else ''),
+        'email': teacher_doc.get('email') or '',
+    }
+
+
+def homeroom_teacher_display(teacher_id) -> Optional[dict]:
+    """Đọc giáo viên theo id để ghi homeroom_teacher_display lên classroom."""
+    oids = to_object_ids([teacher_id])
+    if not oids:
+        return None
+    return teacher_display(get_mongo_collection('users').find_one(
+        {'_id': oids[0], 'role': 'teacher'}, {'full_name': 1, 'first_name': 1, 'last_name': 1, 'email': 1}
+    ))
+
+
+# --- Fan-out khi đổi tên ---
+
+def _rename_filter(match_field: str, value: str, field: str, name: str) -> dict:
+    """Day-document có event với <match_field> == value mà <field> khác name."""
+    return {'$expr': {'$in': [True, {'$map': {
+        'input': {'$objectToArray': {'$ifNull': ['$periods', {}]}},
+        'as': 'p',
+        'in': {'$in': [True, {'$map': {
+            'input': {'$cond': [{'$isArray': '$$p.v'}, '$$p.v', []]},
+            'as': 'e',
+            'in': {'$and': [
+                {'$eq': [f'$$e.{match_field}', {'$literal': value}]},
+                {'$ne': [f'$$e.{field}', {'$literal': name}]},
+            ]},
+        }}]},
+    }}]}}
+
+
+def _rename_pipeline(match_field: str, value: str, field: str, name: str) -> List[dict]:
+    """Đặt <field> = name cho mọi event có <match_field> == value, trong mọi tiết."""
+    return [{'$set': {'periods': {'$arrayToObject': {'$map': {
+        'input': {'$objectToArray': '$periods'},
+        'as': 'p',
+        'in': {'k': '$$p.k', 'v': {'$cond': [
+            {'$isArray': '$$p.v'},
+            {'$map': {'input': '$$p.v', 'as': 'e', 'in': {'$cond': [
+                {'$eq': [f'$$e.{match_field}', {'$literal': value}]},
+                {'$mergeObjects': ['$$e', {field: {'$literal': name}}]},
+                '$$e',
+            ]}}},
+            '$$p.v',
+        ]}},
+    }}}}}]
+
+
+def _fan_out(match_field: str, value: str, field: str, name: str) -> int:
+    """1 update_many (1 lượt qua events) thay cho aggregate tìm key tiết + 1 update_many mỗi tiết."""
+    return get_mongo_collection('events').update_many(
+        _rename_filter(match_field, value, field, name),
+        _rename_pipeline(match_field, value, field, name),
+    ).modified_count
+
+
+class _FanOutWorker:
+    """Thread nền chạy fan-out đổi tên theo thứ tự gửi, trong ngữ cảnh trường (tenant) của request."""
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, jobs: List[tuple]) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='display-name-fan-out', daemon=True)
+                    self._thread.start()
+        self.queue.put((current_tenant(), jobs))
+
+    def _run(self):
+        while True:
+            tenant, jobs = self.queue.get()
+            try:
+                with use_tenant(tenant):
+                    modified = sum(_fan_out(*job) for job in jobs)
+                logger.debug('display name fan-out %s: %d documents', jobs[0][:2], modified)
+            except Exception:
+                logger.exception('display name fan-out error (%s)', jobs[0][:2])
+            finally:
+                self.queue.task_done()
+
+
+_worker = _FanOutWorker()
+
+
+def _propagate(jobs: List[tuple], wait: bool) -> Optional[int]:
+    if wait:
+        return sum(_fan_out(*job) for job in jobs)
+    _worker.submit(jobs)
+    return None
+
+
+def propagate_student_name(student_id, name: str, wait: bool = False) -> Optional[int]:
+    """wait=False (mặc định): chạy ở thread nền, trả về None; wait=True: chạy ngay, trả về số document."""
+    return _propagate([('student_id', str(student_id), 'student_name', name)], wait)
+
+
+def propagate_event_type_name(event_type_id, event_type_key: Optional[str], name: str,
+                              wait: bool = False) -> Optional[int]:
+    jobs = [('event_type', str(event_type_id), 'event_type_name', name)]
+    if event_type_key:
+        jobs.append(('event_type_key', event_type_key, 'event_type_name', name))
+    return _propagate(jobs, wait)
+
+
+def propagate_teacher_display(teacher_id, display: Optional[dict]) -> int:
+    classrooms_coll = get_mongo_collection('classrooms')
+    return classrooms_coll.update_many(
+        {'homeroom_teacher_id': str(teacher_id)},
+        {'$set': {'homeroom_teacher_display': display}},
+    ).modified_count
@@ -0,0 +1,138 @@
+"""
+Đọc file Excel import theo kiểu streaming.
+
+pd.read_excel() dựng toàn bộ workbook + DataFrame trong bộ nhớ rồi mới lặp bằng iterrows().
+ExcelReader dùng openpyxl read_only=True: các dòng được đọc lần lượt từ file XML nên bộ nhớ
+chỉ phụ thuộc kích thước chunk, không phụ thuộc kích thước file.
+
+    reader = ExcelReader(file, required_columns=['Họ tên', 'Mã học sinh'])
+    if reader.missing_columns():
+        ...
+    for chunk in reader.chunks(parse_row, size=500):
+        # chunk.rows: [(số dòng, giá trị đã parse)], chunk.errors: [{'row', 'error'}]
+        ...
+
+parse_row(row_number, values) -> (item | None, [lỗi]) với values = {tên cột: giá trị ô}.
+File .xls (định dạng cũ) không đọc streaming được, dùng xlrd (không qua pandas).
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+DEFAULT_CHUNK_SIZE = 500
+# Giới hạn số lỗi giữ lại (file lỗi hàng loạt không làm phình response / bộ nhớ)
+MAX_ERRORS = 1000
+
+RowParser = Callable[[int, Dict[str, Any]], Tuple[Optional[Any], List[str]]]
+
+
+class ExcelImportError(ValueError):
+    """File không đọc được (sai định dạng, hỏng, không có header)."""
+
+
+@dataclass
+class Chunk:
+    rows: List[Tuple[int, Any]] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class ExcelReader:
+    def __init__(self, file, required_columns: Sequence[str] = (), sheet: Optional[str] = None):
+        self.file = file
+        self.required_columns = list(required_columns)
+        self.sheet = sheet
+        self.header: List[str] = []
+        self.error_count = 0
+        self._workbook = None
+        self._rows: Optional[Iterator[tuple]] = None
+        self._open()
+
+    def _open(self):
+        name = getattr(self.file, 'name', '') or ''
+        try:
+            if name.lower().endswith('.xls'):
+                self._rows = self._xls_rows()
+            else:
+                from openpyxl import load_workbook
+                self._workbook = load_workbook(self.file, read_only=True, data_only=True)
+                worksheet = self._workbook[self.sheet] if self.sheet else self._workbook.worksheets[0]
+                self._rows = worksheet.iter_rows(values_only=True)
+            header = next(self._rows, None)
+        except ExcelImportError:
+            raise
+        except Exception as exc:
+            self.close()
+            raise ExcelImportError(f'Không thể đọc file Excel: {exc}') from exc
+        if not header or all(_is_blank(cell) for cell in header):
+            self.close()
+            raise ExcelImportError('File Excel không có dòng tiêu đề')
+        self.header = ['' if cell is None else str(cell).strip() for cell in header]
+
+    def _xls_rows(self) -> Iterator[tuple]:
+        import xlrd
+        book = xlrd.open_workbook(file_contents=self.file.read(), on_demand=True)
+        sheet = book.sheet_by_name(self.sheet) if self.sheet else book.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            row = []
+            for cell in sheet.row(index):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype == xlrd.XL_CELL_EMPTY:
+                    row.append(None)
+                else:
+                    row.append(cell.value)
+            yield tuple(row)
+        book.release_resources()
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def missing_columns(self) -> List[str]:
+        present = set(self.header)
+        return [column for column in self.required_columns if column not in present]
+
+    def records(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(số dòng Excel, {tên cột: giá trị}); bỏ qua dòng trống. Chỉ đọc được 1 lần."""
+        rows, self._rows = self._rows, iter(())
+        for offset, row in enumerate(rows):
+            if all(_is_blank(cell) for cell in row):
+                continue
+            yield offset + 2, {column: value for column, value in zip(self.header, row) if column}
+
+    def chunks(self, parse_row: RowParser, size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Chunk]:
+        """Parse + kiểm tra từng dòng, gom thành chunk tối đa `size` dòng (kể cả dòng lỗi)."""
+        chunk = Chunk()
+        count = 0
+        for row_number, values in self.records():
+            item, errors = parse_row(row_number, values)
+            if errors:
+                self.add_errors(chunk.errors, ({'row': row_number, 'error': message} for message in errors))
+            else:
+                chunk.rows.append((row_number, item))
+            count += 1
+            if count >= size:
+                yield chunk
+                chunk, count = Chunk(), 0
+        if count:
+            yield chunk
+
+    def add_errors(self, target: List[dict], errors) -> None:
+        """Thêm lỗi nhưng chỉ giữ tối đa MAX_ERRORS lỗi cho cả file (vẫn đếm đủ)."""
+        for error in errors:
+            if self.error_count < MAX_ERRORS:
+                target.append(error)
+            self.error_count += 1
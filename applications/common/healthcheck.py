@@ -3,11 +3,13 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from applications.common.mongo import get_mongo_client
+from applications.common.query_budget import query_budget
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@query_budget(1)  # ping không tính; +1 nếu gửi kèm token
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def healthcheck(request):
@@ -26,7 +28,7 @@ def healthcheck(request):
         except Exception as e:
             mongo_status = 'error'
             mongo_error = str(e)
-            logger.error(f"MongoDB health check failed: {e}")
+            logger.error("MongoDB health check failed: %s", e)
         
         # Overall status
         overall_status = 'ok' if mongo_status == 'ok' else 'degraded'
@@ -45,7 +47,7 @@ def healthcheck(request):
         return Response(response_data, status=http_status)
     
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return Response({
             'status': 'error',
             'error': str(e)
@@ -0,0 +1,51 @@
+"""
+Quy ước id trong MongoDB.
+
+  - `_id` của mọi document: ObjectId
+  - tham chiếu sang document khác (classroom_id, homeroom_teacher_id, student_id,
+    homeroom_class_id, ...): chuỗi hex 24 ký tự
+
+View nhận id dạng chuỗi từ URL / payload, đổi sang ObjectId bằng to_object_id()
+rồi tra cứu bằng 1 điều kiện bằng trên `_id` (không $or id/_id, không $toObjectId).
+Dữ liệu cũ được chuẩn hóa bằng lệnh `manage.py normalize_mongo_ids`.
+"""
+
+from typing import Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def to_object_id(value) -> Optional[ObjectId]:
+    """ObjectId từ chuỗi hex / ObjectId; None nếu không hợp lệ."""
+    if isinstance(value, ObjectId):
+        return value
+    if not value:
+        return None
+    try:
+        return ObjectId(str(value))
+    except (InvalidId, TypeError):
+        return None
+
+
+def to_ref(value) -> Optional[str]:
+    """Dạng lưu trữ chuẩn của 1 tham chiếu (chuỗi hex); None nếu rỗng / không hợp lệ."""
+    oid = to_object_id(value)
+    return str(oid) if oid else None
+
+
+def to_object_ids(values: Iterable) -> List[ObjectId]:
+    """Danh sách ObjectId hợp lệ (bỏ trùng, giữ thứ tự) cho truy vấn {'_id': {'$in': ...}}."""
+    out, seen = [], set()
+    for value in values:
+        oid = to_object_id(value)
+        if oid and oid not in seen:
+            seen.add(oid)
+            out.append(oid)
+    return out
+
+
+def id_filter(value) -> Optional[dict]:
+    """{'_id': ObjectId(...)} hoặc None nếu id không hợp lệ (view trả 404)."""
+    oid = to_object_id(value)
+    return {'_id': oid} if oid else None
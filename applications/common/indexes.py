@@ -0,0 +1,86 @@
+"""
+Registry các index MongoDB mà các view dựa vào.
+
+Mỗi collection khai báo danh sách index (keys + options). Tạo/cập nhật bằng:
+    python manage.py ensure_mongo_indexes
+
+Index được thay thế (REPLACED_INDEXES) chỉ bị xóa sau khi index mới của collection tạo thành công.
+Index unique trên events (classroom_id, date) không tạo được khi còn day-document trùng:
+chạy `backfill_day_totals` (gộp document trùng) trước.
+"""
+
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from .mongo import get_mongo_db
+
+
+# So khớp email không phân biệt hoa thường; truy vấn phải dùng đúng collation này mới dùng được index email_ci
+EMAIL_COLLATION = {'locale': 'en', 'strength': 2}
+
+INDEXES: Dict[str, List[dict]] = {
+    'events': [
+        # Day-document: đúng 1 document cho mỗi ngày-lớp (upsert của events/items/add dựa vào đây)
+        {'keys': [('classroom_id', ASCENDING), ('date', ASCENDING)], 'name': 'classroom_date_unique', 'unique': True},
+        # Hộp thư chờ duyệt: approval_status + lớp + ngày
+        {'keys': [('approval_status', ASCENDING), ('classroom_id', ASCENDING), ('date', ASCENDING)], 'name': 'approval_classroom_date'},
+        # Danh sách events lọc theo loại tiết (period_kinds), theo lớp hoặc toàn trường
+        {'keys': [('classroom_id', ASCENDING), ('period_kinds', ASCENDING), ('date', DESCENDING)], 'name': 'classroom_kinds_date'},
+        {'keys': [('period_kinds', ASCENDING), ('date', DESCENDING)], 'name': 'kinds_date'},
+        # Xếp hạng realtime: $group day_totals theo niên khóa + trạng thái + khoảng ngày
+        {'keys': [('academic_year', ASCENDING), ('approval_status', ASCENDING), ('date', ASCENDING)], 'name': 'year_approval_date'},
+    ],
+    'classrooms': [
+        # Membership GVCN -> lớp (UserContext)
+        {'keys': [('homeroom_teacher_id', ASCENDING)], 'name': 'homeroom_teacher_id'},
+    ],
+    'users': [
+        # UserContext + danh sách học sinh theo lớp ($facet sort theo full_name)
+        {'keys': [('role', ASCENDING), ('classroom_id', ASCENDING), ('full_name', ASCENDING)], 'name': 'role_classroom_full_name'},
+        # Tìm kiếm không dấu theo tiền tố (multikey trên search_keys)
+        {'keys': [('role', ASCENDING), ('search_keys', ASCENDING)], 'name': 'role_search_keys'},
+        # Đăng nhập + kiểm tra trùng khi import giáo viên ($in email / teacher_code)
+        {'keys': [('email', ASCENDING)], 'name': 'email'},
+        {'keys': [('email', ASCENDING)], 'name': 'email_ci', 'collation': EMAIL_COLLATION},
+        {'keys': [('teacher_code', ASCENDING)], 'name': 'teacher_code'},
+    ],
+    'attendance': [
+        # Điểm danh gọn: 1 document cho mỗi lớp-tháng
+        {'keys': [('classroom_id', ASCENDING), ('month', ASCENDING)], 'name': 'classroom_month_unique', 'unique': True},
+        # Thống kê toàn trường: mọi lớp trong các tháng của khoảng ngày
+        {'keys': [('month', ASCENDING), ('classroom_id', ASCENDING)], 'name': 'month_classroom'},
+    ],
+    'event_pending_counters': [
+        {'keys': [('classroom_id', ASCENDING)], 'name': 'classroom_id_unique', 'unique': True},
+    ],
+}
+
+
+# Index cũ được index mới thay thế: {collection: [tên index]}
+REPLACED_INDEXES: Dict[str, List[str]] = {
+    'events': ['classroom_date'],
+}
+
+
+def index_models(collection: str) -> List[IndexModel]:
+    models = []
+    for spec in INDEXES.get(collection, []):
+        options = {k: v for k, v in spec.items() if k != 'keys'}
+        models.append(IndexModel(spec['keys'], **options))
+    return models
+
+
+def ensure_indexes(collections: Optional[List[str]] = None, db=None) -> Dict[str, List[str]]:
+    """Tạo các index trong registry (idempotent). Trả về {collection: [index names]}."""
+    db = db if db is not None else get_mongo_db()
+    created = {}
+    for collection in collections or list(INDEXES.keys()):
+        models = index_models(collection)
+        if models:
+            created[collection] = db[collection].create_indexes(models)
+            existing = set(db[collection].index_information())
+            for name in REPLACED_INDEXES.get(collection, []):
+                if name in existing:
+                    db[collection].drop_index(name)
+    return created
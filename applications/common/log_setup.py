@@ -0,0 +1,197 @@
+"""
+Cấu hình logging không chặn request thread.
+
+settings.LOGGING_CONFIG trỏ tới `configure_logging`: Django gọi hàm này với settings.LOGGING.
+Các handler ghi thật (console / file) được dựng bằng dictConfig như bình thường, sau đó được
+chuyển ra sau 1 QueueListener (thread nền); logger chỉ còn 1 QueueHandler nên request thread
+chỉ đưa record vào queue, không chờ ghi stdout / file.
+
+- Mức log theo module: LOG_LEVEL (mặc định) + LOG_LEVELS="applications.event=DEBUG,pymongo=WARNING".
+- LOG_FORMAT=json -> mỗi dòng 1 JSON (ts, level, logger, message, view, ...) cho log collector.
+- DEBUG được lấy mẫu: SamplingFilter chỉ cho qua 1 / LOG_DEBUG_SAMPLE_EVERY record của cùng
+  1 dòng log (logger + message template), nên log debug trong vòng lặp không làm ngập output.
+
+Log trong vòng lặp nóng dùng format % lười (không dùng f-string) để khi level tắt thì
+không tốn chi phí format:
+
+    logger.debug("period %s: %d events", period, len(items))
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.config
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Thuộc tính chuẩn của LogRecord, không đưa vào phần "extra" của log JSON
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'view', 'log_route'}
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'applications.event=DEBUG, pymongo=WARNING' -> {'applications.event': 'DEBUG', 'pymongo': 'WARNING'}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class SamplingFilter(logging.Filter):
+    """Chỉ cho qua 1 / every record DEBUG của mỗi dòng log; các level khác luôn qua."""
+
+    def __init__(self, every: int = 100):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counters: Dict[tuple, itertools.count] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, itertools.count())
+        return next(counter) % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'view': getattr(record, 'view', '-'),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        payload.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc_info'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler của 1 logger. prepare() chạy trên request thread: ghép message (args có thể là
+    object không thread-safe), gắn view đang xử lý và tên logger sở hữu handler (route) để
+    listener chuyển record tới đúng handler đích; việc format + ghi diễn ra ở thread nền.
+    """
+
+    def __init__(self, log_queue, route: str):
+        super().__init__(log_queue)
+        self.route = route
+
+    def prepare(self, record):
+        from .slow_queries import current_view
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.view = current_view.get() or '-'
+        record.log_route = self.route
+        return record
+
+
+class _RoutingHandler(logging.Handler):
+    """Handler phía listener: chuyển record tới các handler đích của logger đã đưa nó vào queue."""
+
+    def __init__(self, routes: Dict[str, List[logging.Handler]]):
+        super().__init__()
+        self.routes = routes
+
+    def handle(self, record):
+        for handler in self.routes.get(getattr(record, 'log_route', ''), ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(config: dict) -> None:
+    """LOGGING_CONFIG: dictConfig rồi thay handler của mọi logger đã cấu hình bằng QueueHandler."""
+    global _listener
+    if not config:
+        return
+    config = dict(config)
+    sample_every = config.pop('debug_sample_every', 1)
+    logging.config.dictConfig(config)
+    _stop_listener()
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    sampling = SamplingFilter(sample_every) if sample_every and sample_every > 1 else None
+    routes: Dict[str, List[logging.Handler]] = {}
+    for name in ['root', *config.get('loggers', {})]:
+        logger = logging.getLogger(None if name == 'root' else name)
+        if not logger.handlers:
+            continue
+        routes[name] = list(logger.handlers)
+        queue_handler = _PreformattedQueueHandler(log_queue, name)
+        if sampling is not None:
+            queue_handler.addFilter(sampling)
+        logger.handlers = [queue_handler]
+    if not routes:
+        return
+
+    _listener = logging.handlers.QueueListener(log_queue, _RoutingHandler(routes))
+    _listener.start()
+
+
+# Ghi nốt record còn trong queue khi process thoát
+atexit.register(_stop_listener)
+
+
+def build_logging(level: str = 'INFO', levels: Optional[Dict[str, str]] = None, fmt: str = 'text',
+                  log_file: str = '', debug_sample_every: int = 100) -> dict:
+    """Dựng settings.LOGGING: console (+ file nếu có), mức log mặc định và theo module."""
+    handlers = {
+        'console': {'class': 'logging.StreamHandler', 'formatter': fmt},
+    }
+    if log_file:
+        handlers['file'] = {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': log_file,
+            'formatter': fmt,
+        }
+    loggers = {
+        'django': {'level': 'INFO', 'propagate': True},
+        'pymongo': {'level': 'WARNING', 'propagate': True},
+    }
+    for name, module_level in (levels or {}).items():
+        loggers[name] = {'level': module_level, 'propagate': True}
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'debug_sample_every': debug_sample_every,
+        'formatters': {
+            'text': {'format': '%(asctime)s %(levelname)s [%(name)s] [%(view)s] %(message)s'},
+            'json': {'()': 'applications.common.log_setup.JsonFormatter'},
+        },
+        'handlers': handlers,
+        'root': {'level': level.upper(), 'handlers': list(handlers)},
+        'loggers': loggers,
+    }
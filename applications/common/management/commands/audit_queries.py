@@ -0,0 +1,61 @@
+"""
+Chạy explain('executionStats') cho các truy vấn chính của view (applications/common/query_audit.py).
+
+  python manage.py audit_queries
+  python manage.py audit_queries --only events_list rankings --json audit.json
+  python manage.py audit_queries --db school_bench --fail-on-problems
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.common.mongo import get_mongo_db
+from applications.common.query_audit import (
+    DEFAULT_RATIO_THRESHOLD, audit, format_table, problem_count, sample_values, shapes_by_name,
+)
+
+
+class Command(BaseCommand):
+    help = "Kiểm tra query plan (COLLSCAN, docs examined / returned, gợi ý index) của các truy vấn trong view"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', help='Database (mặc định MONGO_DB)')
+        parser.add_argument('--only', nargs='*', help='Chỉ chạy các shape (tên, tiền tố tên hoặc tên view)')
+        parser.add_argument('--ratio-threshold', type=float, default=DEFAULT_RATIO_THRESHOLD,
+                            help='Cảnh báo khi docs examined / returned vượt ngưỡng')
+        parser.add_argument('--json', help="Ghi kết quả JSON ra file ('-' = stdout, bỏ bảng)")
+        parser.add_argument('--fail-on-problems', action='store_true', help='Exit code khác 0 nếu có cảnh báo')
+
+    def handle(self, *args, **options):
+        db = get_mongo_db(options['db'])
+        shapes = shapes_by_name(options['only'])
+        if not shapes:
+            raise CommandError('Không có shape nào khớp --only')
+        results = audit(db, shapes, ratio_threshold=options['ratio_threshold'])
+        problems = problem_count(results)
+
+        if options['json']:
+            payload = json.dumps({
+                'database': db.name,
+                'samples': sample_values(db),
+                'problems': problems,
+                'results': results,
+            }, ensure_ascii=False, indent=2, default=str)
+            if options['json'] == '-':
+                self.stdout.write(payload)
+                return self._finish(problems, options, quiet=True)
+            with open(options['json'], 'w', encoding='utf-8') as fh:
+                fh.write(payload)
+
+        for line in format_table(results):
+            self.stdout.write(line)
+        self._finish(problems, options)
+
+    def _finish(self, problems, options, quiet=False):
+        if problems and options['fail_on_problems']:
+            raise CommandError(f"{problems} query shape(s) need attention")
+        if quiet:
+            return
+        if problems:
+            self.stdout.write(self.style.WARNING(f"{problems} query shape(s) need attention"))
+        self.stdout.write(self.style.SUCCESS("Done."))
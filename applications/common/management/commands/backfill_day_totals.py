@@ -0,0 +1,103 @@
+"""
+Tính sẵn period_totals / day_totals / period_kinds cho day-document cũ trong 'events'
+(xem applications/event/day_totals.py).
+
+Danh sách events lọc theo period_kinds và xếp hạng realtime cộng day_totals,
+nên document chưa có các field này sẽ không xuất hiện / không được tính điểm cho tới khi chạy lệnh.
+
+Bước đầu: gộp các day-document trùng (classroom_id, date) - sinh ra khi 2 request tạo cùng ngày-lớp
+trước khi có index unique classroom_date_unique - vào document cũ nhất (event trùng event_id chỉ giữ 1),
+xóa các bản còn lại, đếm lại bộ đếm chờ duyệt và dựng lại điểm danh gọn của các ngày bị gộp.
+Sau đó `ensure_mongo_indexes` tạo được index unique.
+"""
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from applications.common.mongo import get_mongo_collection
+from applications.event import attendance_store
+from applications.event.day_totals import day_summary, ensure_event_ids
+from applications.event.pending_counters import recount_pending
+
+
+def _merge_periods(docs) -> dict:
+    merged, seen = {}, set()
+    for doc in docs:
+        periods = ensure_event_ids(doc.get('periods') or {})
+        for key, period_events in periods.items():
+            if not isinstance(period_events, list):
+                continue
+            target = merged.setdefault(key, [])
+            for ev in period_events:
+                if isinstance(ev, dict) and ev['event_id'] in seen:
+                    continue
+                if isinstance(ev, dict):
+                    seen.add(ev['event_id'])
+                target.append(ev)
+    return merged
+
+
+def merge_duplicate_days(events_coll, out=print) -> int:
+    """Gộp day-document trùng (classroom_id, date); trả về số document đã xóa."""
+    groups = events_coll.aggregate([
+        {'$group': {'_id': {'classroom_id': '$classroom_id', 'date': '$date'}, 'ids': {'$push': '$_id'}, 'n': {'$sum': 1}}},
+        {'$match': {'n': {'$gt': 1}}},
+    ], allowDiskUse=True)
+    removed = 0
+    classroom_ids = set()
+    for group in groups:
+        docs = sorted(events_coll.find({'_id': {'$in': group['ids']}}), key=lambda d: d['_id'])
+        keeper, others = docs[0], docs[1:]
+        periods = _merge_periods(docs)
+        update = {
+            'periods': periods,
+            **day_summary(periods),
+            'total_events': sum(len(v) for v in periods.values()),
+        }
+        # Còn bản nào chờ duyệt thì bản gộp phải được duyệt lại
+        if any(doc.get('approval_status') == 'pending' for doc in docs):
+            update.update({'approval_status': 'pending', 'approved_by': None, 'approved_by_name': None, 'approved_at': None})
+        events_coll.update_one({'_id': keeper['_id']}, {'$set': update})
+        removed += events_coll.delete_many({'_id': {'$in': [doc['_id'] for doc in others]}}).deleted_count
+
+        classroom_id, date = group['_id']['classroom_id'], group['_id']['date']
+        classroom_ids.add(classroom_id)
+        if 'attendance' in periods:
+            attendance_store.sync_day(classroom_id, date)
+        out(f"  merged {len(docs)} day-documents of {classroom_id} {date}")
+    if classroom_ids:
+        recount_pending(classroom_ids)
+    return removed
+
+
+class Command(BaseCommand):
+    help = "Tính lại period_totals / day_totals / period_kinds cho day-document trong events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Số document mỗi lần bulk_write')
+        parser.add_argument('--missing-only', action='store_true', help='Chỉ xử lý document chưa có day_totals')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        query = {'day_totals': {'$exists': False}} if options['missing_only'] else {}
+        events_coll = get_mongo_collection('events')
+
+        removed = merge_duplicate_days(events_coll, out=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"[events] removed {removed} duplicate day-documents"))
+
+        updated = 0
+        ops = []
+        for doc in events_coll.find(query, {'periods': 1}, batch_size=batch_size):
+            periods = doc.get('periods') or {}
+            ensure_event_ids(periods)
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {
+                'periods': periods,
+                **day_summary(periods),
+                'total_events': sum(len(v) for v in periods.values() if isinstance(v, list)),
+            }}))
+            if len(ops) >= batch_size:
+                updated += events_coll.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += events_coll.bulk_write(ops, ordered=False).modified_count
+        self.stdout.write(self.style.SUCCESS(f"[events] updated {updated} documents"))
+        self.stdout.write(self.style.SUCCESS("Done."))
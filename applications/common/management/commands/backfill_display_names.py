@@ -0,0 +1,82 @@
+import copy
+
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from applications.common.display_names import stamp_display_names_many, teacher_display
+from applications.common.ids import to_object_ids
+from applications.common.mongo import get_mongo_collection
+
+
+class Command(BaseCommand):
+    help = "Ghi sẵn tên hiển thị: student_name / event_type_name trên events, homeroom_teacher_display trên classrooms"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Số document mỗi lần bulk_write')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        self._classrooms()
+        self._events(batch_size)
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _classrooms(self):
+        classrooms_coll = get_mongo_collection('classrooms')
+        classrooms = list(classrooms_coll.find({'homeroom_teacher_id': {'$nin': [None, '']}}, {'homeroom_teacher_id': 1}))
+        teacher_ids = to_object_ids(c['homeroom_teacher_id'] for c in classrooms)
+        teachers = {
+            str(t['_id']): t for t in get_mongo_collection('users').find(
+                {'_id': {'$in': teacher_ids}, 'role': 'teacher'},
+                {'full_name': 1, 'first_name': 1, 'last_name': 1, 'email': 1}
+            )
+        }
+        ops = [
+            UpdateOne({'_id': c['_id']}, {'$set': {
+                'homeroom_teacher_display': teacher_display(teachers.get(str(c['homeroom_teacher_id'])))
+            }})
+            for c in classrooms
+        ]
+        updated = classrooms_coll.bulk_write(ops, ordered=False).modified_count if ops else 0
+        self.stdout.write(self.style.SUCCESS(f"[classrooms] updated {updated} documents"))
+
+    def _flush(self, events_coll, docs, attempts=5):
+        """
+        Ghi periods đã bổ sung tên, chỉ khi periods chưa đổi kể từ lúc đọc (compare-and-swap như
+        _repair_period_totals): event vừa được thêm / sửa / xóa giữa lúc đọc và ghi không bị ghi đè.
+        Document đã đổi được đọc lại và thử lại.
+        """
+        updated = 0
+        for _ in range(attempts):
+            originals = {doc['_id']: copy.deepcopy(doc.get('periods')) for doc in docs}
+            # Tra tên 1 lần cho cả lô
+            stamp_display_names_many(doc.get('periods') for doc in docs)
+            stamped = {doc['_id']: doc.get('periods') for doc in docs}
+            changed = [_id for _id, periods in stamped.items() if periods and periods != originals[_id]]
+            ops = [UpdateOne({'_id': _id, 'periods': originals[_id]}, {'$set': {'periods': stamped[_id]}}) for _id in changed]
+            if not ops:
+                return updated
+            result = events_coll.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            if result.matched_count == len(ops):
+                return updated
+            docs = [
+                doc for doc in events_coll.find({'_id': {'$in': changed}}, {'periods': 1})
+                if doc.get('periods') != stamped[doc['_id']]
+            ]
+            if not docs:
+                return updated
+        self.stdout.write(self.style.WARNING(f"[events] {len(docs)} documents kept changing, skipped"))
+        return updated
+
+    def _events(self, batch_size):
+        events_coll = get_mongo_collection('events')
+        updated = 0
+        batch = []
+        for doc in events_coll.find({}, {'periods': 1}, batch_size=batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                updated += self._flush(events_coll, batch)
+                batch = []
+        if batch:
+            updated += self._flush(events_coll, batch)
+        self.stdout.write(self.style.SUCCESS(f"[events] updated {updated} documents"))
@@ -0,0 +1,144 @@
+"""
+Kiểm tra ngân sách số lệnh MongoDB (@query_budget) của các endpoint trên dữ liệu giả lập.
+
+  python manage.py check_query_budgets --mongod
+  python manage.py check_query_budgets --db school_bench --no-load
+
+Mỗi endpoint có khai báo ngân sách được đo 2 lần, số lệnh của cả request (kể cả authentication):
+  - cold: cache Django và snapshot cache_versions vừa bị xóa, so với COLD_BUDGETS;
+  - warm: lần gọi ngay sau đó (cache đã đầy), so với BUDGETS.
+Mọi endpoint trong applications/*/urls.py phải có ngân sách hoặc nằm trong EXEMPT (kèm lý do).
+Có endpoint vượt ngân sách, trả về status không phải 2xx (lỗi sớm thì số lệnh đo được vô nghĩa),
+endpoint có ngân sách mà chưa có fixture (build_budget_cases), hoặc endpoint không có ngân sách
+cũng không được miễn -> exit code khác 0.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import get_resolver
+
+from applications.common.benchmarks import BenchmarkSuite, build_budget_cases, local_mongod
+from applications.common.query_budget import BUDGETS, COLD_BUDGETS, count_queries, view_key
+from applications.common.versions import forget_local_versions
+from applications.common.synthetic_dataset import DatasetConfig
+
+
+_LEGACY_SQL = 'API cũ trên Django ORM (SQL), MongoDB chỉ dùng cho authentication'
+
+# Endpoint không khai báo ngân sách: 'module.view_name' -> lý do
+EXEMPT = {
+    'applications.user_management.views.login': _LEGACY_SQL,
+    'applications.user_management.views.register': _LEGACY_SQL,
+    'applications.user_management.views.refresh_token': _LEGACY_SQL,
+    'applications.user_management.views.logout': _LEGACY_SQL,
+    'applications.user_management.views.change_password': _LEGACY_SQL,
+    'applications.user_management.views.user_list': _LEGACY_SQL,
+    'applications.user_management.views.user_profile': _LEGACY_SQL,
+    'applications.user_management.views.update_profile': _LEGACY_SQL,
+    'applications.classroom.views.get_classroom_stats': 'API SQL cũ (model Classroom không còn được import), chưa chuyển sang MongoDB',
+    'applications.week_summary.mongo_views.mongo_test': 'Endpoint thử kết nối, không dùng ở frontend',
+    'applications.week_summary.mongo_views.mongo_debug_events': 'Endpoint debug, không dùng ở frontend',
+}
+
+
+def _url_patterns(patterns, prefix=''):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from _url_patterns(pattern.url_patterns, prefix + str(pattern.pattern))
+        else:
+            yield prefix + str(pattern.pattern), pattern.callback
+
+
+class Command(BaseCommand):
+    help = "Gọi các endpoint có @query_budget trên dữ liệu giả lập và báo endpoint vượt ngân sách lệnh MongoDB"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mongod', nargs='?', const='mongod', help='Chạy mongod tạm (có thể truyền đường dẫn binary)')
+        parser.add_argument('--uri', help='MongoDB URI (mặc định MONGO_URI)')
+        parser.add_argument('--db', help='Database kiểm tra (mặc định <MONGO_DB>_bench)')
+        parser.add_argument('--classes', type=int, default=6)
+        parser.add_argument('--students-per-class', type=int, default=30)
+        parser.add_argument('--days', type=int, default=20)
+        parser.add_argument('--no-load', action='store_true', help='Dùng lại dữ liệu đã có trong database kiểm tra')
+
+    def handle(self, *args, **options):
+        db_name = options['db'] or f"{settings.MONGO_DB or 'school'}_bench"
+        if db_name == settings.MONGO_DB and not options['mongod']:
+            raise CommandError('Không chạy trên database chính (MONGO_DB); dùng --db khác')
+        config = DatasetConfig(
+            classes=max(1, options['classes']),
+            students_per_class=max(1, options['students_per_class']),
+            max_days=max(1, options['days']),
+        )
+        if options['mongod']:
+            try:
+                with local_mongod(options['mongod']) as uri:
+                    exceeded, failed, missing, uncovered = self._check(uri, db_name, config, options)
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        else:
+            uri = options['uri'] or settings.MONGO_URI
+            if not uri:
+                raise CommandError('MONGO_URI chưa được cấu hình (truyền --uri hoặc --mongod)')
+            exceeded, failed, missing, uncovered = self._check(uri, db_name, config, options)
+
+        problems = []
+        if exceeded:
+            problems.append(f"{exceeded} endpoint(s) over their query budget")
+        if failed:
+            problems.append(f"{failed} endpoint(s) returned a non-2xx status")
+        if missing:
+            problems.append(f"{missing} budgeted view(s) without a fixture")
+        if uncovered:
+            problems.append(f"{uncovered} endpoint(s) neither budgeted nor exempt")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _check(self, uri, db_name, config, options):
+        callbacks = {view_key(callback): route for route, callback in _url_patterns(get_resolver().url_patterns)}
+        suite = BenchmarkSuite(uri, db_name, out=self.stdout.write)
+        exceeded = failed = 0
+        checked = set()
+        with suite.session(config, load=not options['no_load']) as (db, client):
+            for case in build_budget_cases(db):
+                key = next((k for k in BUDGETS if k.endswith('.' + case.name)), None)
+                if key is None:
+                    continue
+                headers = suite.auth_headers(db, case.role)
+                checked.add(key)
+                cache.clear()
+                forget_local_versions()
+                over = error = False
+                for phase, budget in (('cold', COLD_BUDGETS[key]), ('warm', BUDGETS[key])):
+                    if case.setup is not None:
+                        case.setup()
+                    with count_queries() as scope:
+                        response = suite.send(client, case, headers)
+                    line = f"{case.name:<34} {phase} {response.status_code} {scope.count:>3} / {budget:<3} commands"
+                    if scope.count > budget:
+                        over = True
+                        detail = ', '.join(f"{name} x{n}" for name, n in scope.commands.most_common())
+                        self.stdout.write(self.style.ERROR(f"{line}  OVER BUDGET: {detail}"))
+                    elif not 200 <= response.status_code < 300:
+                        error = True
+                        self.stdout.write(self.style.ERROR(f"{line}  FAILED: status {response.status_code}"))
+                    else:
+                        self.stdout.write(line)
+                exceeded += over
+                failed += error
+
+        missing = sorted(set(BUDGETS) - checked)
+        for key in missing:
+            self.stdout.write(self.style.ERROR(f"no fixture for budgeted view {key}"))
+        uncovered = sorted(
+            (route, key) for key, route in callbacks.items()
+            if key.startswith('applications.') and key not in BUDGETS and key not in EXEMPT
+        )
+        for route, key in uncovered:
+            self.stdout.write(self.style.ERROR(f"no query budget and not exempt: /{route}  ({key})"))
+        for key in sorted(set(EXEMPT) & set(BUDGETS)):
+            self.stdout.write(self.style.WARNING(f"exempt view has a budget, remove it from EXEMPT: {key}"))
+        for key in sorted(set(EXEMPT) - set(callbacks)):
+            self.stdout.write(self.style.WARNING(f"exempt view is not routed, remove it from EXEMPT: {key}"))
+        return exceeded, failed, len(missing), len(uncovered)
@@ -0,0 +1,109 @@
+"""
+Kiểm tra định tuyến đọc secondary (applications.common.read_routing) trên replica set thật.
+
+  python manage.py check_read_routing --mongod           # replica set 1 node tạm
+  python manage.py check_read_routing --uri "mongodb://...?replicaSet=rs0"
+
+Ghi nhận $readPreference của từng lệnh find gửi đi và kiểm tra:
+  - trong @secondary_reads: secondaryPreferred + maxStalenessSeconds;
+  - user vừa ghi (read-your-writes): primary;
+  - get_mongo_collection(..., read='primary') trong view @secondary_reads: primary;
+  - ngoài view: primary.
+Replica set 1 node không có secondary nên secondaryPreferred vẫn đọc được từ primary.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from pymongo import MongoClient, monitoring
+
+from applications.common import mongo as mongo_module
+from applications.common.benchmarks import local_mongod
+from applications.common.mongo import get_mongo_collection
+from applications.common.read_routing import PRIMARY, mark_recent_write, max_staleness_seconds, secondary_reads
+
+
+class _ReadPreferenceRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.seen = []
+
+    def started(self, event):
+        if event.command_name == 'find':
+            self.seen.append(event.command.get('$readPreference'))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _request(user_id=None):
+    return SimpleNamespace(user=SimpleNamespace(is_authenticated=bool(user_id), id=user_id))
+
+
+@secondary_reads
+def _report_view(request, read=None):
+    return list(get_mongo_collection('routing_check', read=read).find({}).limit(1))
+
+
+class Command(BaseCommand):
+    help = "Kiểm tra @secondary_reads / read-your-writes trên replica set (ghi nhận $readPreference của lệnh find)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mongod', nargs='?', const='mongod', help='Chạy replica set 1 node tạm (có thể truyền đường dẫn binary)')
+        parser.add_argument('--uri', help='MongoDB URI của replica set (mặc định MONGO_URI)')
+        parser.add_argument('--db', help='Database kiểm tra (mặc định <MONGO_DB>_routing)')
+
+    def handle(self, *args, **options):
+        db_name = options['db'] or f"{settings.MONGO_DB or 'school'}_routing"
+        if options['mongod']:
+            try:
+                with local_mongod(options['mongod'], replica_set='rs0') as uri:
+                    failures = self._check(uri, db_name)
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        else:
+            uri = options['uri'] or settings.MONGO_URI
+            if not uri:
+                raise CommandError('MONGO_URI chưa được cấu hình (truyền --uri hoặc --mongod)')
+            failures = self._check(uri, db_name)
+        if failures:
+            raise CommandError(f"{failures} routing check(s) failed")
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _check(self, uri, db_name):
+        recorder = _ReadPreferenceRecorder()
+        client = MongoClient(uri, event_listeners=[recorder])
+        previous = mongo_module._client
+        mongo_module._client = client
+        staleness = max_staleness_seconds()
+        expected_secondary = {'mode': 'secondaryPreferred', 'maxStalenessSeconds': staleness}
+        cases = [
+            ('report view', lambda: _report_view(_request('routing-reader')), expected_secondary),
+            ('report view, user just wrote', lambda: _report_view(_request('routing-writer')), None),
+            ('report view, read=primary hint', lambda: _report_view(_request('routing-reader'), read=PRIMARY), None),
+            ('outside report view', lambda: list(get_mongo_collection('routing_check').find({}).limit(1)), None),
+        ]
+        failures = 0
+        try:
+            with override_settings(MONGO_URI=uri, MONGO_DB=db_name, MONGO_READ_FROM_SECONDARIES=True):
+                if not client.admin.command('hello').get('setName'):
+                    raise CommandError('URI không trỏ tới replica set (thiếu replicaSet=...)')
+                client[db_name].routing_check.insert_one({'check': True})
+                mark_recent_write('routing-writer')
+                for name, call, expected in cases:
+                    recorder.seen.clear()
+                    call()
+                    got = recorder.seen[-1] if recorder.seen else None
+                    if got == expected:
+                        self.stdout.write(f"ok    {name}: {got or 'primary'}")
+                    else:
+                        failures += 1
+                        self.stdout.write(self.style.ERROR(f"FAIL  {name}: expected {expected or 'primary'}, got {got or 'primary'}"))
+                client.drop_database(db_name)
+        finally:
+            mongo_module._client = previous
+            client.close()
+        return failures
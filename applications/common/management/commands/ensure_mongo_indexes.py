@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from applications.common.indexes import INDEXES, ensure_indexes
+from applications.common.mongo import get_mongo_db
+from applications.common.tenancy import configured_tenants, current_tenant, get_tenant
+
+
+class Command(BaseCommand):
+    help = "Tạo các index MongoDB khai báo trong applications/common/indexes.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', action='append', dest='collections', help='Chỉ tạo index cho collection này (có thể lặp lại)')
+        parser.add_argument('--tenant', action='append', dest='tenants', help='Tạo index cho database của trường này (có thể lặp lại; mặc định trường mặc định)')
+        parser.add_argument('--all-tenants', action='store_true', help='Tạo index cho database của mọi trường trong TENANTS')
+
+    def handle(self, *args, **options):
+        collections = options.get('collections') or list(INDEXES.keys())
+        unknown = [c for c in collections if c not in INDEXES]
+        if unknown:
+            self.stdout.write(self.style.WARNING(f"Không có index nào khai báo cho: {', '.join(unknown)}"))
+
+        if options['all_tenants']:
+            tenants = list(configured_tenants().values())
+        elif options.get('tenants'):
+            tenants = [get_tenant(key) for key in options['tenants']]
+            if None in tenants:
+                missing = [key for key, tenant in zip(options['tenants'], tenants) if tenant is None]
+                raise CommandError(f"Không tìm thấy trường: {', '.join(missing)}")
+        else:
+            tenants = [current_tenant()]
+
+        for tenant in tenants:
+            if len(tenants) > 1:
+                self.stdout.write(f"{tenant.key} ({tenant.db_name})")
+            try:
+                created = ensure_indexes([c for c in collections if c in INDEXES], db=get_mongo_db(tenant.db_name))
+            except OperationFailure as exc:
+                if exc.code != 11000:
+                    raise
+                raise CommandError(
+                    f"{tenant.key}: dữ liệu trùng với index unique ({exc}). "
+                    "Với events (classroom_id, date): chạy `manage.py backfill_day_totals` để gộp day-document trùng rồi chạy lại."
+                )
+            for collection, names in created.items():
+                self.stdout.write(self.style.SUCCESS(f"[{collection}] {', '.join(names)}"))
+
+        self.stdout.write(self.style.SUCCESS("Done."))
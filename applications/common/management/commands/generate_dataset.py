@@ -0,0 +1,69 @@
+"""
+Sinh dữ liệu giả lập cả năm học (xem applications/common/synthetic_dataset.py).
+
+  python manage.py generate_dataset --classes 40 --students-per-class 40 --drop
+  python manage.py generate_dataset --schools 3 --db school_bench   # school_bench_school1..3
+
+Nên chạy trên mongod local / database riêng: --drop xóa các collection dữ liệu trước khi sinh.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.common.indexes import ensure_indexes
+from applications.common.mongo import get_mongo_db
+from applications.common.synthetic_dataset import DatasetConfig, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Sinh dữ liệu giả lập (giáo viên, lớp, học sinh, events, điểm danh, tổng kết tuần) cho cả năm học"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=1, help='Số trường (mỗi trường 1 database khi > 1)')
+        parser.add_argument('--classes', type=int, default=40, help='Số lớp mỗi trường')
+        parser.add_argument('--students-per-class', type=int, default=40)
+        parser.add_argument('--periods', type=int, default=7, help='Số tiết mỗi ngày')
+        parser.add_argument('--academic-year', help='Niên khóa YYYY-YYYY (mặc định: niên khóa hiện tại)')
+        parser.add_argument('--days', type=int, default=0, help='Chỉ sinh N ngày học gần nhất (0 = cả năm)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--db', help='Tên database (mặc định MONGO_DB)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số document mỗi lần insert_many')
+        parser.add_argument('--workers', type=int, default=4, help='Số thread ghi song song')
+        parser.add_argument('--drop', action='store_true', help='Xóa các collection dữ liệu trước khi sinh')
+        parser.add_argument('--no-indexes', action='store_true', help='Không tạo index sau khi sinh')
+
+    def handle(self, *args, **options):
+        base_db = options['db'] or settings.MONGO_DB
+        if not base_db:
+            raise CommandError('MONGO_DB chưa được cấu hình (hoặc truyền --db)')
+        schools = max(1, options['schools'])
+        config = DatasetConfig(
+            schools=schools,
+            classes=max(1, options['classes']),
+            students_per_class=max(1, options['students_per_class']),
+            periods_per_day=max(1, options['periods']),
+            academic_year=options['academic_year'],
+            seed=options['seed'],
+            max_days=max(0, options['days']),
+        )
+
+        def db_for_school(index):
+            return get_mongo_db(base_db if schools == 1 else f'{base_db}_school{index}')
+
+        stats = generate_dataset(
+            db_for_school, config,
+            batch_size=max(1, options['batch_size']),
+            workers=max(1, options['workers']),
+            drop=options['drop'],
+            out=self.stdout.write,
+        )
+        for collection, count in sorted(stats.counts.items()):
+            self.stdout.write(f"[{collection}] inserted {count} documents")
+        total = sum(stats.counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {total} documents in {stats.elapsed:.1f}s ({total / stats.elapsed if stats.elapsed else 0:.0f} docs/s)"
+        ))
+
+        if not options['no_indexes']:
+            for index in range(1, schools + 1):
+                created = ensure_indexes(db=db_for_school(index))
+                self.stdout.write(self.style.SUCCESS(f"[school {index}] indexes: {sum(len(v) for v in created.values())}"))
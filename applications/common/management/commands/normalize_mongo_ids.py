@@ -0,0 +1,132 @@
+"""
+Chuẩn hóa tham chiếu id về dạng chuẩn (chuỗi hex, xem applications/common/ids.py):
+
+  - classrooms.homeroom_teacher_id  (ObjectId -> chuỗi, '' -> null, lấy từ homeroom_teacher.id nếu thiếu)
+  - users.classroom_id / users.homeroom_class_id  (ObjectId -> chuỗi)
+  - users (học sinh) thiếu classroom_id: lấy từ collection cũ 'students' (user.id -> classroom.id)
+  - events.classroom_id, week_summaries.classroom_id  (ObjectId -> chuỗi)
+  - events.periods.*.student_id  (ObjectId -> chuỗi)
+
+Chạy lại nhiều lần không sao (chỉ sửa document chưa đúng dạng).
+"""
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from applications.common.ids import to_object_id, to_ref
+from applications.common.mongo import get_mongo_collection
+
+
+# (collection, field) lưu tham chiếu dạng chuỗi
+REFERENCE_FIELDS = [
+    ('classrooms', 'homeroom_teacher_id'),
+    ('users', 'classroom_id'),
+    ('users', 'homeroom_class_id'),
+    ('events', 'classroom_id'),
+    ('week_summaries', 'classroom_id'),
+]
+
+# Đổi student_id dạng ObjectId trong mọi tiết của day-document sang chuỗi
+_PERIOD_STUDENT_IDS_TO_STRING = [{'$set': {'periods': {'$arrayToObject': {'$map': {
+    'input': {'$objectToArray': '$periods'},
+    'as': 'p',
+    'in': {'k': '$$p.k', 'v': {'$cond': [
+        {'$isArray': '$$p.v'},
+        {'$map': {'input': '$$p.v', 'as': 'e', 'in': {'$cond': [
+            {'$eq': [{'$type': '$$e.student_id'}, 'objectId']},
+            {'$mergeObjects': ['$$e', {'student_id': {'$toString': '$$e.student_id'}}]},
+            '$$e',
+        ]}}},
+        '$$p.v',
+    ]}},
+}}}}}]
+
+
+class Command(BaseCommand):
+    help = "Chuẩn hóa homeroom_teacher_id / classroom_id / student_id về chuỗi hex (tham chiếu chuẩn)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ đếm số document cần sửa')
+        parser.add_argument('--batch-size', type=int, default=500, help='Số thao tác mỗi lần bulk_write')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = max(1, options['batch_size'])
+
+        for collection, field in REFERENCE_FIELDS:
+            self._object_ids_to_strings(collection, field)
+        self._empty_homeroom_teacher_ids()
+        self._legacy_homeroom_teachers()
+        self._legacy_student_classrooms()
+        self._event_student_ids()
+
+        self.stdout.write(self.style.SUCCESS("Done." + (" (dry-run)" if self.dry_run else "")))
+
+    def _report(self, label, count):
+        verb = "would update" if self.dry_run else "updated"
+        self.stdout.write(self.style.SUCCESS(f"[{label}] {verb} {count} documents"))
+
+    def _object_ids_to_strings(self, collection, field):
+        coll = get_mongo_collection(collection)
+        query = {field: {'$type': 'objectId'}}
+        if self.dry_run:
+            count = coll.count_documents(query)
+        else:
+            count = coll.update_many(query, [{'$set': {field: {'$toString': f'${field}'}}}]).modified_count
+        self._report(f"{collection}.{field}", count)
+
+    def _empty_homeroom_teacher_ids(self):
+        coll = get_mongo_collection('classrooms')
+        query = {'homeroom_teacher_id': ''}
+        if self.dry_run:
+            count = coll.count_documents(query)
+        else:
+            count = coll.update_many(query, {'$set': {'homeroom_teacher_id': None}}).modified_count
+        self._report("classrooms.homeroom_teacher_id (empty)", count)
+
+    def _bulk(self, coll, ops):
+        if self.dry_run or not ops:
+            return len(ops)
+        modified = 0
+        for start in range(0, len(ops), self.batch_size):
+            modified += coll.bulk_write(ops[start:start + self.batch_size], ordered=False).modified_count
+        return modified
+
+    def _legacy_homeroom_teachers(self):
+        coll = get_mongo_collection('classrooms')
+        ops = []
+        cursor = coll.find(
+            {'homeroom_teacher.id': {'$exists': True}, 'homeroom_teacher_id': {'$in': [None, '']}},
+            {'homeroom_teacher.id': 1},
+        )
+        for doc in cursor:
+            teacher_id = to_ref((doc.get('homeroom_teacher') or {}).get('id'))
+            if teacher_id:
+                ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'homeroom_teacher_id': teacher_id}}))
+        self._report("classrooms.homeroom_teacher.id -> homeroom_teacher_id", self._bulk(coll, ops))
+
+    def _legacy_student_classrooms(self):
+        users_coll = get_mongo_collection('users')
+        ops = []
+        cursor = get_mongo_collection('students').find(
+            {'user.id': {'$exists': True}, 'classroom.id': {'$exists': True}},
+            {'user.id': 1, 'classroom.id': 1},
+        )
+        for doc in cursor:
+            user_oid = to_object_id((doc.get('user') or {}).get('id'))
+            classroom_id = to_ref((doc.get('classroom') or {}).get('id'))
+            if user_oid and classroom_id:
+                ops.append(UpdateOne(
+                    {'_id': user_oid, 'role': 'student', 'classroom_id': {'$in': [None, '']}},
+                    {'$set': {'classroom_id': classroom_id}},
+                ))
+        self._report("students.classroom.id -> users.classroom_id", self._bulk(users_coll, ops))
+
+    def _event_student_ids(self):
+        coll = get_mongo_collection('events')
+        query = {'periods': {'$type': 'object'}}
+        if self.dry_run:
+            count = coll.count_documents(query)
+            self.stdout.write(self.style.SUCCESS(f"[events.periods.*.student_id] would scan {count} documents"))
+            return
+        count = coll.update_many(query, _PERIOD_STUDENT_IDS_TO_STRING).modified_count
+        self._report("events.periods.*.student_id", count)
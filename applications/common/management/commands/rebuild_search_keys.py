@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from applications.common.mongo import get_mongo_collection, get_users_collection
+from applications.common.search_keys import (
+    SEARCH_KEYS_FIELD, STUDENT_SEARCH_FIELDS, TEACHER_SEARCH_FIELDS, search_keys_for,
+)
+
+
+class Command(BaseCommand):
+    help = "Tính lại search_keys (tìm kiếm không dấu) cho học sinh / giáo viên"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Số document mỗi lần bulk_write')
+        parser.add_argument('--missing-only', action='store_true', help='Chỉ xử lý document chưa có search_keys')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        query = {'role': {'$in': ['student', 'teacher']}}
+        if options['missing_only']:
+            query[SEARCH_KEYS_FIELD] = {'$exists': False}
+        projection = {f: 1 for f in set(STUDENT_SEARCH_FIELDS + TEACHER_SEARCH_FIELDS) | {'role'}}
+
+        targets = [(get_users_collection(), query)]
+        # Dữ liệu import cũ còn nằm trong collection 'students'
+        targets.append((get_mongo_collection('students'), {SEARCH_KEYS_FIELD: {'$exists': False}} if options['missing_only'] else {}))
+
+        for coll, coll_query in targets:
+            updated = 0
+            ops = []
+            for doc in coll.find(coll_query, projection, batch_size=batch_size):
+                ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {SEARCH_KEYS_FIELD: search_keys_for(doc)}}))
+                if len(ops) >= batch_size:
+                    updated += coll.bulk_write(ops, ordered=False).modified_count
+                    ops = []
+            if ops:
+                updated += coll.bulk_write(ops, ordered=False).modified_count
+            self.stdout.write(self.style.SUCCESS(f"[{coll.name}] updated {updated} documents"))
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,86 @@
+"""
+Benchmark các endpoint nóng (xem applications/common/benchmarks.py).
+
+  python manage.py run_benchmarks --mongod                      # mongod tạm trên cổng trống
+  python manage.py run_benchmarks --save-baseline benchmarks/baseline.json
+  python manage.py run_benchmarks --baseline benchmarks/baseline.json --tolerance 0.2
+
+Không có --mongod thì dùng MONGO_URI đã cấu hình với database riêng (--db, mặc định <MONGO_DB>_bench);
+database này bị xóa và sinh lại dữ liệu mỗi lần chạy (trừ khi --no-load).
+Có case trả về status không phải 2xx, hoặc có regression so với baseline -> exit code khác 0.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.common.benchmarks import (
+    DEFAULT_TOLERANCE, BenchmarkFailure, BenchmarkSuite, compare, local_mongod, read_report, write_report,
+)
+from applications.common.synthetic_dataset import DatasetConfig
+
+
+class Command(BaseCommand):
+    help = "Đo p50/p95, số lệnh MongoDB và bộ nhớ của các endpoint nóng trên dữ liệu giả lập seed cố định"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mongod', nargs='?', const='mongod', help='Chạy mongod tạm (có thể truyền đường dẫn binary)')
+        parser.add_argument('--uri', help='MongoDB URI (mặc định MONGO_URI)')
+        parser.add_argument('--db', help='Database benchmark (mặc định <MONGO_DB>_bench)')
+        parser.add_argument('--classes', type=int, default=12)
+        parser.add_argument('--students-per-class', type=int, default=40)
+        parser.add_argument('--days', type=int, default=60, help='Số ngày học gần nhất được sinh')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=30, help='Số request đo mỗi endpoint')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='*', help='Chỉ chạy các endpoint (tên view) chỉ định')
+        parser.add_argument('--no-load', action='store_true', help='Dùng lại dữ liệu đã có trong database benchmark')
+        parser.add_argument('--baseline', help='File baseline JSON để so sánh')
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Ngưỡng tăng p95 / bộ nhớ cho phép (0.25 = 25%%)')
+        parser.add_argument('--save-baseline', help='Ghi kết quả lần chạy này thành baseline')
+        parser.add_argument('--json', help='Ghi báo cáo JSON ra file')
+
+    def handle(self, *args, **options):
+        if options['baseline'] and options['save_baseline'] and options['baseline'] == options['save_baseline']:
+            raise CommandError('--baseline và --save-baseline phải là 2 file khác nhau')
+        db_name = options['db'] or f"{settings.MONGO_DB or 'school'}_bench"
+        if db_name == settings.MONGO_DB and not options['mongod']:
+            raise CommandError('Không chạy benchmark trên database chính (MONGO_DB); dùng --db khác')
+        config = DatasetConfig(
+            classes=max(1, options['classes']),
+            students_per_class=max(1, options['students_per_class']),
+            seed=options['seed'],
+            max_days=max(1, options['days']),
+        )
+
+        if options['mongod']:
+            try:
+                with local_mongod(options['mongod']) as uri:
+                    report = self._run(uri, db_name, config, options)
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        else:
+            uri = options['uri'] or settings.MONGO_URI
+            if not uri:
+                raise CommandError('MONGO_URI chưa được cấu hình (truyền --uri hoặc --mongod)')
+            try:
+                report = self._run(uri, db_name, config, options)
+            except BenchmarkFailure as exc:
+                raise CommandError(str(exc))
+
+        if options['json']:
+            write_report(options['json'], report)
+        if options['save_baseline']:
+            write_report(options['save_baseline'], report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['save_baseline']}"))
+
+        if options['baseline']:
+            regressions = compare(read_report(options['baseline']), report, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stdout.write(self.style.ERROR(f"REGRESSION {line}"))
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _run(self, uri, db_name, config, options):
+        suite = BenchmarkSuite(uri, db_name, iterations=options['iterations'], warmup=options['warmup'], out=self.stdout.write)
+        return suite.run(config, only=options['only'], load=not options['no_load'])
@@ -0,0 +1,170 @@
+"""
+Chạy data migration MongoDB theo lô, tiếp tục được khi bị ngắt giữa chừng.
+
+- Migration gồm các bước (MigrationStep); mỗi bước duyệt 1 collection theo _id tăng dần
+  bằng cursor batch_size, transform(doc) trả về update cho document đó hoặc None để bỏ qua.
+- Ghi bằng bulk_write từng lô; sau mỗi lô lưu checkpoint (_id cuối cùng) vào collection
+  'mongo_migrations', nên chạy lại sẽ tiếp tục từ checkpoint thay vì từ đầu.
+- Migration đã xong được đánh dấu 'applied' và bị bỏ qua ở các lần chạy sau (trừ khi force).
+- dry_run: chỉ đếm số document sẽ bị sửa, không ghi; throttle: nghỉ giữa các lô để giảm tải.
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from .mongo import get_mongo_db
+
+
+MIGRATIONS_COLLECTION = 'mongo_migrations'
+
+
+@dataclass
+class MigrationStep:
+    name: str
+    collection: str
+    transform: Callable[[dict], Optional[dict]]
+    query: dict = field(default_factory=dict)
+    projection: Optional[dict] = None
+
+
+@dataclass
+class Migration:
+    name: str
+    steps: List[MigrationStep]
+    description: str = ''
+
+
+@dataclass
+class StepResult:
+    scanned: int = 0
+    modified: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed else 0.0
+
+
+class MigrationRunner:
+    def __init__(self, batch_size: int = 500, dry_run: bool = False, throttle: float = 0.0,
+                 out: Callable[[str], None] = print, db=None):
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.throttle = max(0.0, throttle)
+        self.out = out
+        self.db = db if db is not None else get_mongo_db()
+        self.state = self.db[MIGRATIONS_COLLECTION]
+
+    def status(self, name: str) -> Optional[dict]:
+        return self.state.find_one({'_id': name})
+
+    def reset(self, name: str) -> None:
+        """Xóa trạng thái + checkpoint để chạy lại từ đầu."""
+        self.state.delete_one({'_id': name})
+
+    def run(self, migration: Migration, force: bool = False) -> Dict[str, StepResult]:
+        state = self.status(migration.name) or {}
+        if state.get('status') == 'applied':
+            if not force:
+                self.out(f"[{migration.name}] already applied at {state.get('applied_at')}, skipping")
+                return {}
+            # Chạy lại từ đầu: bỏ checkpoint của lần trước
+            if not self.dry_run:
+                self.reset(migration.name)
+            state = {}
+
+        if not self.dry_run:
+            self.state.update_one(
+                {'_id': migration.name},
+                {
+                    '$set': {'status': 'running', 'description': migration.description, 'updated_at': _now()},
+                    '$setOnInsert': {'started_at': _now(), 'checkpoints': {}},
+                },
+                upsert=True,
+            )
+        checkpoints = state.get('checkpoints') or {}
+        completed = set(state.get('completed_steps') or [])
+
+        results = {}
+        for step in migration.steps:
+            if step.name in completed:
+                self.out(f"[{migration.name}:{step.name}] completed earlier, skipping")
+                continue
+            results[step.name] = self._run_step(migration, step, checkpoints.get(step.name))
+
+        if not self.dry_run:
+            self.state.update_one(
+                {'_id': migration.name},
+                {'$set': {
+                    'status': 'applied',
+                    'applied_at': _now(),
+                    'updated_at': _now(),
+                    **{f'results.{name}': vars(result) for name, result in results.items()},
+                }},
+            )
+        return results
+
+    def _run_step(self, migration: Migration, step: MigrationStep, checkpoint) -> StepResult:
+        label = f"{migration.name}:{step.name}"
+        coll = self.db[step.collection]
+        query = dict(step.query)
+        if checkpoint is not None:
+            query = {'$and': [step.query, {'_id': {'$gt': checkpoint}}]} if step.query else {'_id': {'$gt': checkpoint}}
+            self.out(f"[{label}] resuming after _id={checkpoint}")
+        total = coll.count_documents(query)
+
+        result = StepResult()
+        started = time.monotonic()
+        ops, last_id = [], None
+        cursor = coll.find(query, step.projection, batch_size=self.batch_size).sort('_id', ASCENDING)
+        for doc in cursor:
+            result.scanned += 1
+            last_id = doc['_id']
+            update = step.transform(doc)
+            if update:
+                ops.append(UpdateOne({'_id': doc['_id']}, update))
+            else:
+                result.skipped += 1
+            if result.scanned % self.batch_size == 0:
+                self._flush(migration, step, coll, ops, last_id, result)
+                ops = []
+                result.elapsed = time.monotonic() - started
+                self._progress(label, result, total)
+                if self.throttle:
+                    time.sleep(self.throttle)
+        self._flush(migration, step, coll, ops, last_id, result)
+        result.elapsed = time.monotonic() - started
+        self._progress(label, result, total)
+
+        if not self.dry_run:
+            self.state.update_one({'_id': migration.name}, {'$addToSet': {'completed_steps': step.name}})
+        verb = "would update" if self.dry_run else "updated"
+        self.out(f"[{label}] {verb} {result.modified} documents "
+                 f"(scanned {result.scanned}, skipped {result.skipped}, {result.elapsed:.1f}s)")
+        return result
+
+    def _flush(self, migration: Migration, step: MigrationStep, coll, ops, last_id, result: StepResult) -> None:
+        if self.dry_run:
+            result.modified += len(ops)
+            return
+        if ops:
+            result.modified += coll.bulk_write(ops, ordered=False).modified_count
+        if last_id is not None:
+            self.state.update_one(
+                {'_id': migration.name},
+                {'$set': {f'checkpoints.{step.name}': last_id, 'updated_at': _now()}},
+            )
+
+    def _progress(self, label: str, result: StepResult, total: int) -> None:
+        percent = 100.0 * result.scanned / total if total else 100.0
+        self.out(f"[{label}] {result.scanned}/{total} ({percent:.1f}%) "
+                 f"{result.rate:.0f} docs/s, modified {result.modified}")
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
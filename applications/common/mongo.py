@@ -6,6 +6,11 @@ import threading
 import logging
 import os
 
+from .query_budget import listener as query_budget_listener
+from .slow_queries import listener as slow_query_listener
+from .read_routing import read_preference
+from .tenancy import current_tenant
+
 
 _client_lock = threading.Lock()
 _client: Optional[MongoClient] = None
@@ -26,22 +31,29 @@ def get_mongo_client() -> MongoClient:
                 raise RuntimeError('MONGO_URI is not configured')
             # tlsAllowInvalidCertificates=True only if you use self-signed certs
             logging.getLogger(__name__).info('Initializing MongoClient for uri=%s', uri)
-            _client = MongoClient(uri, tlsAllowInvalidCertificates=True)
+            _client = MongoClient(uri, tlsAllowInvalidCertificates=True, event_listeners=[query_budget_listener, slow_query_listener])
     return _client  # type: ignore
 
 
 def get_mongo_db(db_name: Optional[str] = None):
+    """Không truyền db_name -> database của trường hiện tại (applications.common.tenancy)."""
     if not db_name:
-        db_name = getattr(settings, 'MONGO_DB', None) or os.environ.get('MONGO_DB')
+        db_name = current_tenant().db_name or os.environ.get('MONGO_DB')
     if not db_name:
         raise RuntimeError('MONGO_DB is not configured')
     logging.getLogger(__name__).debug('Selecting MongoDB database=%s', db_name)
     return get_mongo_client()[db_name]
 
 
-def get_mongo_collection(collection: str, db_name: Optional[str] = None):
-    logging.getLogger(__name__).debug('Selecting MongoDB collection=%s db=%s', collection, db_name or getattr(settings, 'MONGO_DB', None))
-    return get_mongo_db(db_name)[collection]
+def get_mongo_collection(collection: str, db_name: Optional[str] = None, read: Optional[str] = None):
+    """read='secondary': đọc secondaryPreferred (xem applications.common.read_routing); mặc định theo view."""
+    db = get_mongo_db(db_name)
+    logging.getLogger(__name__).debug('Selecting MongoDB collection=%s db=%s', collection, db.name)
+    coll = db[collection]
+    preference = read_preference(read)
+    if preference is not None:
+        coll = coll.with_options(read_preference=preference)
+    return coll
 
 
 def get_users_collection():
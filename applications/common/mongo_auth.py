@@ -3,6 +3,7 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth.models import AnonymousUser
 from applications.common.mongo import get_users_collection
+from applications.common.user_context import get_user_context
 import logging
 from bson import ObjectId
 
@@ -20,6 +21,14 @@ class MongoUser:
         self.is_active = doc.get('status') == 'active'
         self.is_authenticated = True
         self.is_anonymous = False
+        self._context = None
+    
+    @property
+    def context(self):
+        """UserContext (lớp chủ nhiệm / lớp của học sinh) - resolve lazily, tối đa 1 lần mỗi request"""
+        if self._context is None:
+            self._context = get_user_context(self)
+        return self._context
     
     def has_perm(self, perm, obj=None):
         return True
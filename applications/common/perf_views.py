@@ -0,0 +1,34 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+
+from applications.permissions import IsAdminUser
+from .mongo import get_mongo_db
+from .query_budget import query_budget
+from .responses import bad_request, ok, server_error
+from .slow_queries import slow_query_report, threshold_ms
+
+
+@query_budget(2)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def slow_queries_report(request):
+    """
+    Lệnh MongoDB chậm (perf_slow_queries) gom theo dạng truy vấn, xếp theo tổng thời gian.
+
+    Query params:
+      hours: chỉ lấy bản ghi trong N giờ gần nhất (mặc định: toàn bộ capped collection)
+      view: lọc theo view (vd applications.event.views.mongo_events_list)
+      limit: số nhóm tối đa (mặc định 50)
+    """
+    try:
+        hours = float(request.query_params['hours']) if request.query_params.get('hours') else None
+        limit = int(request.query_params.get('limit') or 50)
+    except ValueError:
+        return bad_request("hours/limit không hợp lệ")
+    try:
+        groups = slow_query_report(
+            get_mongo_db(), hours=hours, view=request.query_params.get('view') or None, limit=max(1, min(limit, 500)),
+        )
+    except Exception as exc:
+        return server_error(exc)
+    return ok({"threshold_ms": threshold_ms(), "groups": groups})
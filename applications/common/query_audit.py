@@ -0,0 +1,336 @@
+"""
+Kiểm tra query plan của các truy vấn chính trong view.
+
+QUERY_SHAPES là registry các "hình dạng" truy vấn mà view thực sự chạy (filter / sort /
+pipeline), tham số lấy từ dữ liệu có sẵn trong database (sample_values). Mỗi shape được chạy
+`explain` với verbosity executionStats, rồi tổng hợp:
+  - stage của plan thắng (COLLSCAN, IXSCAN + tên index, SORT trong bộ nhớ, ...)
+  - số key / document đã duyệt so với số document trả về
+  - gợi ý index (thứ tự Equality -> Sort -> Range), đối chiếu với registry INDEXES
+
+Dùng bởi `manage.py audit_queries`.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, List, Optional
+
+from applications.common.academic_year import ACADEMIC_YEAR_SETTINGS_KEY
+from applications.common.ids import to_object_ids
+from applications.common.search_keys import prefix_filter
+from applications.event.day_totals import REGULAR_KIND
+
+from .indexes import INDEXES
+from .mongo import get_mongo_db
+
+
+DEFAULT_RATIO_THRESHOLD = 10.0
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$regex', '$ne', '$nin', '$exists'}
+
+
+@dataclass
+class QueryShape:
+    name: str
+    view: str
+    collection: str
+    build: Callable[[dict], dict]
+    op: str = 'find'   # find | count | aggregate
+
+
+def _students_facet(s: dict) -> dict:
+    from applications.student.queries import _page_stages
+    return {'pipeline': [
+        {'$match': {'role': 'student', 'classroom_id': s['classroom_id']}},
+        {'$facet': {
+            'page': _page_stages(1, 12),
+            'total': [{'$count': 'count'}],
+            'gender': [{'$group': {'_id': '$gender', 'count': {'$sum': 1}}}],
+        }},
+    ]}
+
+
+def _rankings(s: dict) -> dict:
+    return {'pipeline': [
+        {'$match': {
+            'date': {'$gte': s['week_start'], '$lte': s['week_end']},
+            'approval_status': 'approved',
+            'academic_year': s['academic_year'],
+        }},
+        {'$group': {
+            '_id': '$classroom_id',
+            'positive_points': {'$sum': '$day_totals.positive_points'},
+            'negative_points': {'$sum': '$day_totals.negative_points'},
+            'total_points': {'$sum': '$day_totals.total_points'},
+        }},
+    ]}
+
+
+QUERY_SHAPES: List[QueryShape] = [
+    # --- events ---
+    QueryShape('events_list.admin', 'mongo_events_optimized_list', 'events',
+               lambda s: {'filter': {'period_kinds': REGULAR_KIND}, 'sort': {'date': -1}, 'limit': 10}),
+    QueryShape('events_list.admin.count', 'mongo_events_optimized_list', 'events',
+               lambda s: {'query': {'period_kinds': REGULAR_KIND}}, op='count'),
+    QueryShape('events_list.teacher', 'mongo_events_optimized_list', 'events',
+               lambda s: {'filter': {'classroom_id': {'$in': s['classroom_ids']}, 'period_kinds': REGULAR_KIND},
+                          'sort': {'date': -1}, 'limit': 10}),
+    QueryShape('events_list.student', 'mongo_events_optimized_list', 'events',
+               lambda s: {'filter': {'classroom_id': s['classroom_id'], 'period_kinds': REGULAR_KIND},
+                          'sort': {'date': -1}, 'limit': 10}),
+    QueryShape('events_list.by_date_sudden', 'mongo_events_optimized_list', 'events',
+               lambda s: {'filter': {'date': s['date'], 'period_kinds': 'violation_sudden'}, 'sort': {'date': -1}, 'limit': 10}),
+    QueryShape('events_detail.day', 'mongo_events_optimized_detail / write paths', 'events',
+               lambda s: {'filter': {'date': s['date'], 'classroom_id': s['classroom_id']}, 'limit': 1}),
+    QueryShape('events_pending.admin', 'mongo_events_pending', 'events',
+               lambda s: {'filter': {'approval_status': 'pending'}, 'sort': {'date': 1}, 'limit': 20}),
+    QueryShape('events_pending.teacher', 'mongo_events_pending', 'events',
+               lambda s: {'filter': {'approval_status': 'pending', 'classroom_id': {'$in': s['classroom_ids']}},
+                          'sort': {'date': 1}, 'limit': 20}),
+    QueryShape('events_public', 'mongo_events_public', 'events',
+               lambda s: {'filter': {'date': s['date']}, 'sort': {'created_at': -1}, 'limit': 10}),
+    QueryShape('events_public.count', 'mongo_events_public', 'events',
+               lambda s: {'query': {'date': s['date']}}, op='count'),
+    QueryShape('rankings.realtime', 'mongo_realtime_rankings', 'events', _rankings, op='aggregate'),
+    QueryShape('rankings.classroom_detail', 'mongo_realtime_classroom_detail', 'events',
+               lambda s: {'filter': {
+                   'date': {'$gte': s['week_start'], '$lte': s['week_end']}, 'approval_status': 'approved',
+                   'classroom_id': s['classroom_id'], 'academic_year': s['academic_year'],
+               }}),
+    QueryShape('event_types.by_key', 'event write paths', 'event_types',
+               lambda s: {'filter': {'key': s['event_type_key']}, 'limit': 1}),
+    # --- attendance ---
+    QueryShape('attendance.month', 'mongo_attendance_export', 'attendance',
+               lambda s: {'filter': {'classroom_id': s['classroom_id'], 'month': s['month']}, 'limit': 1}),
+    QueryShape('attendance.school_months', 'mongo_attendance_stats', 'attendance',
+               lambda s: {'filter': {'month': {'$in': [s['month']]}, 'classroom_id': {'$in': s['classroom_ids']}}}),
+    QueryShape('attendance.export_students', 'mongo_attendance_export', 'users',
+               lambda s: {'filter': {'role': 'student', 'classroom_id': s['classroom_id']}, 'sort': {'full_name': 1}}),
+    # --- users ---
+    QueryShape('students_list.facet', 'mongo_students_list', 'users', _students_facet, op='aggregate'),
+    QueryShape('students_list.classroom_names', 'mongo_students_list', 'classrooms',
+               lambda s: {'filter': {'_id': {'$in': to_object_ids(s['classroom_ids'])}}}),
+    QueryShape('students_list.search', 'mongo_students_list / lookup', 'users',
+               lambda s: {'filter': {'role': 'student', **(prefix_filter(s['search']) or {})},
+                          'sort': {'full_name': 1}, 'limit': 12}),
+    QueryShape('teachers.search', 'teacher list', 'users',
+               lambda s: {'filter': {'role': 'teacher', **(prefix_filter(s['search']) or {})},
+                          'sort': {'full_name': 1}, 'limit': 20}),
+    QueryShape('auth.login_by_email', 'login_with_mongo', 'users',
+               lambda s: {'filter': {'email': s['email']}, 'limit': 1}),
+    QueryShape('user_context.homerooms', 'UserContext', 'classrooms',
+               lambda s: {'filter': {'homeroom_teacher_id': s['teacher_id']}, 'sort': {'full_name': 1}}),
+    # --- classrooms ---
+    QueryShape('classrooms_list', 'mongo_classrooms_list', 'classrooms',
+               lambda s: {'filter': {}, 'sort': {'full_name': 1}, 'limit': 20}),
+    QueryShape('classrooms_list.search', 'mongo_classrooms_list', 'classrooms',
+               lambda s: {'filter': {'full_name': {'$regex': s['classroom_search'], '$options': 'i'}},
+                          'sort': {'full_name': 1}, 'limit': 20}),
+    # --- week summaries ---
+    QueryShape('week_summaries.list', 'mongo_week_summary_list', 'week_summaries',
+               lambda s: {'filter': {'year': s['year'], 'week_number': s['week_number']},
+                          'sort': {'year': -1, 'week_number': -1, 'total_points': -1}}),
+]
+
+
+def sample_values(db) -> dict:
+    """Tham số thật cho các shape: ngày/lớp gần nhất có events, GVCN, email, ..."""
+    event = db['events'].find_one({}, {'date': 1, 'classroom_id': 1, 'academic_year': 1}, sort=[('date', -1)]) or {}
+    day = event.get('date') or date.today().isoformat()
+    monday = date.fromisoformat(day) - timedelta(days=date.fromisoformat(day).weekday())
+    homeroom = db['classrooms'].find_one({'homeroom_teacher_id': {'$nin': [None, '']}}, {'homeroom_teacher_id': 1}) or {}
+    teacher_id = homeroom.get('homeroom_teacher_id') or ''
+    classroom_ids = [str(c['_id']) for c in db['classrooms'].find({}, {'_id': 1}).limit(3)]
+    settings_doc = db['settings'].find_one({'key': ACADEMIC_YEAR_SETTINGS_KEY}) or {}
+    user = db['users'].find_one({'email': {'$nin': [None, '']}}, {'email': 1}) or {}
+    event_type = db['event_types'].find_one({'key': {'$nin': [None, '']}}, {'key': 1}) or {}
+    summary = db['week_summaries'].find_one({}, {'year': 1, 'week_number': 1}) or {}
+    classroom = db['classrooms'].find_one({'_id': homeroom['_id']}, {'full_name': 1}) if homeroom else None
+    iso = monday.isocalendar()
+    return {
+        'date': day,
+        'month': day[:7],
+        'week_start': monday.isoformat(),
+        'week_end': (monday + timedelta(days=6)).isoformat(),
+        'classroom_id': str(event.get('classroom_id') or (classroom_ids[0] if classroom_ids else '')),
+        'classroom_ids': classroom_ids,
+        'teacher_id': str(teacher_id),
+        'academic_year': event.get('academic_year') or settings_doc.get('academic_year') or '',
+        'email': user.get('email') or 'someone@example.com',
+        'event_type_key': event_type.get('key') or 'unknown',
+        'year': summary.get('year') or iso[0],
+        'week_number': summary.get('week_number') or iso[1],
+        'search': 'nguyen',
+        'classroom_search': ((classroom or {}).get('full_name') or '10A1')[:2],
+    }
+
+
+def _command(shape: QueryShape, spec: dict) -> dict:
+    if shape.op == 'aggregate':
+        return {'aggregate': shape.collection, 'pipeline': spec['pipeline'], 'cursor': {}}
+    if shape.op == 'count':
+        return {'count': shape.collection, **spec}
+    return {'find': shape.collection, **spec}
+
+
+def _walk_plan(node: Optional[dict], stages: List[str], indexes: List[str]) -> None:
+    if not isinstance(node, dict):
+        return
+    node = node.get('queryPlan', node)
+    if node.get('stage'):
+        stages.append(node['stage'])
+    if node.get('indexName'):
+        indexes.append(node['indexName'])
+    for key in ('inputStage', 'outerStage', 'innerStage', 'thenStage', 'elseStage'):
+        _walk_plan(node.get(key), stages, indexes)
+    for child in node.get('inputStages') or []:
+        _walk_plan(child, stages, indexes)
+
+
+def summarize_explain(explain: dict) -> dict:
+    """Gom stage / index / số liệu executionStats (find, count và aggregate, kể cả $lookup)."""
+    sections = [explain] if 'queryPlanner' in explain else []
+    sections += [stage['$cursor'] for stage in explain.get('stages') or [] if '$cursor' in stage]
+    stages, indexes = [], []
+    docs = keys = returned = millis = 0
+    for section in sections:
+        _walk_plan((section.get('queryPlanner') or {}).get('winningPlan'), stages, indexes)
+        stats = section.get('executionStats') or {}
+        docs += stats.get('totalDocsExamined', 0)
+        keys += stats.get('totalKeysExamined', 0)
+        returned += stats.get('nReturned', 0)
+        millis += stats.get('executionTimeMillis', 0)
+
+    lookups = []
+    for stage in explain.get('stages') or []:
+        if '$lookup' in stage:
+            used = stage.get('indexesUsed') or []
+            lookups.append({
+                'from': stage['$lookup'].get('from'),
+                'collection_scans': stage.get('collectionScans', 0),
+                'indexes_used': used,
+                'docs_examined': stage.get('totalDocsExamined', 0),
+            })
+            docs += stage.get('totalDocsExamined', 0)
+            if stage.get('collectionScans'):
+                stages.append('COLLSCAN')
+            indexes += used
+    return {
+        'stages': stages,
+        'indexes': sorted(set(indexes)),
+        'collscan': 'COLLSCAN' in stages,
+        'in_memory_sort': any(s in ('SORT', 'SORT_KEY_GENERATOR') for s in stages),
+        'docs_examined': docs,
+        'keys_examined': keys,
+        'returned': returned,
+        'millis': millis,
+        'lookups': lookups,
+    }
+
+
+def _filter_of(shape: QueryShape, spec: dict) -> dict:
+    if shape.op == 'aggregate':
+        first = (spec.get('pipeline') or [{}])[0]
+        return first.get('$match') or {}
+    return spec.get('query' if shape.op == 'count' else 'filter') or {}
+
+
+def suggested_keys(query: dict, sort: Optional[dict] = None) -> List[tuple]:
+    """Index đề xuất theo quy tắc Equality -> Sort -> Range (chỉ xét điều kiện cấp đầu)."""
+    equality, ranges = [], []
+    for field_name, value in query.items():
+        if field_name.startswith('$'):
+            continue
+        if isinstance(value, dict) and any(op in RANGE_OPERATORS for op in value):
+            ranges.append(field_name)
+        else:
+            equality.append(field_name)
+    keys = [(f, 1) for f in equality]
+    for field_name, direction in (sort or {}).items():
+        if field_name not in equality:
+            keys.append((field_name, direction))
+    keys += [(f, 1) for f in ranges if f not in dict(keys)]
+    return keys
+
+
+def _declared_index(collection: str, keys: List[tuple], equality_count: int) -> Optional[str]:
+    """Tên index trong INDEXES có tiền tố gồm các field đề xuất (field equality không phân biệt thứ tự)."""
+    wanted = [k for k, _ in keys]
+    for spec in INDEXES.get(collection, []):
+        fields = [k for k, _ in spec['keys']]
+        if wanted and set(fields[:equality_count]) == set(wanted[:equality_count]) \
+                and fields[equality_count:len(wanted)] == wanted[equality_count:]:
+            return spec.get('name')
+    return None
+
+
+def suggestions(db, shape: QueryShape, spec: dict, summary: dict, ratio_threshold: float) -> List[str]:
+    out = []
+    query = _filter_of(shape, spec)
+    keys = suggested_keys(query, spec.get('sort')) if shape.op == 'find' else suggested_keys(query)
+    equality_count = sum(1 for k, v in query.items()
+                         if not k.startswith('$') and not (isinstance(v, dict) and any(op in RANGE_OPERATORS for op in v)))
+    existing = set(db[shape.collection].index_information().keys())
+
+    if summary['collscan'] or summary['in_memory_sort']:
+        declared = _declared_index(shape.collection, keys, equality_count)
+        if declared and declared not in existing:
+            out.append(f"index '{declared}' is declared in INDEXES but missing: run `manage.py ensure_mongo_indexes`")
+        elif keys:
+            spec_text = ', '.join(f"('{k}', {d})" for k, d in keys)
+            out.append(f"add to INDEXES['{shape.collection}']: [{spec_text}]")
+        elif summary['collscan']:
+            out.append('unfiltered scan: paginate on an indexed sort key or cache the result')
+    if summary['in_memory_sort']:
+        out.append('blocking in-memory SORT: put the sort keys after the equality fields in the index')
+    for lookup in summary['lookups']:
+        if lookup['collection_scans']:
+            out.append(f"$lookup into '{lookup['from']}' scans the collection: match on an indexed field (e.g. _id) "
+                       f"or store the joined value on the document")
+    if shape.op != 'count' and summary['returned'] and \
+            summary['docs_examined'] / summary['returned'] > ratio_threshold:
+        out.append(f"examines {summary['docs_examined']} docs for {summary['returned']} returned: index is not selective")
+    return out
+
+
+def audit(db=None, shapes: Optional[List[QueryShape]] = None,
+          ratio_threshold: float = DEFAULT_RATIO_THRESHOLD) -> List[dict]:
+    db = db if db is not None else get_mongo_db()
+    samples = sample_values(db)
+    results = []
+    for shape in shapes or QUERY_SHAPES:
+        spec = shape.build(samples)
+        row = {'name': shape.name, 'view': shape.view, 'collection': shape.collection, 'op': shape.op}
+        try:
+            explain = db.command({'explain': _command(shape, spec), 'verbosity': 'executionStats'})
+        except Exception as exc:
+            results.append({**row, 'error': str(exc)})
+            continue
+        summary = summarize_explain(explain)
+        results.append({**row, **summary, 'suggestions': suggestions(db, shape, spec, summary, ratio_threshold)})
+    return results
+
+
+def problem_count(results: List[dict]) -> int:
+    return sum(1 for r in results if r.get('error') or r.get('suggestions'))
+
+
+def format_table(results: List[dict]) -> List[str]:
+    lines = [f"{'shape':<32} {'collection':<15} {'plan':<36} {'keys':>7} {'docs':>7} {'ret':>6} {'ms':>5}"]
+    for r in results:
+        if r.get('error'):
+            lines.append(f"{r['name']:<32} {r['collection']:<15} ERROR {r['error']}")
+            continue
+        plan = 'COLLSCAN' if r['collscan'] else ('IXSCAN ' + ','.join(r['indexes']) if r['indexes'] else '/'.join(r['stages'][:2]))
+        if r['in_memory_sort']:
+            plan += ' +SORT'
+        lines.append(f"{r['name']:<32} {r['collection']:<15} {plan[:36]:<36} {r['keys_examined']:>7} "
+                     f"{r['docs_examined']:>7} {r['returned']:>6} {r['millis']:>5}")
+        for suggestion in r['suggestions']:
+            lines.append(f"    -> {suggestion}")
+    return lines
+
+
+def shapes_by_name(names: Optional[List[str]]) -> List[QueryShape]:
+    if not names:
+        return QUERY_SHAPES
+    return [s for s in QUERY_SHAPES if any(s.name == n or s.name.startswith(n + '.') or s.view == n for n in names)]
@@ -0,0 +1,135 @@
+"""
+Ngân sách số lệnh MongoDB cho mỗi request (bắt lỗi N+1 trước khi deploy).
+
+- `listener` (CommandListener) được gắn vào client singleton (applications.common.mongo);
+  chỉ đếm khi đang có scope đang mở trong context hiện tại (contextvar), ngoài ra không làm gì.
+- `count_queries()`: context manager đếm lệnh trong khối with (theo tên lệnh + collection).
+- `query_budget(n)`: context manager / decorator. Đặt phía trên @api_view để tính cả
+  lệnh của authentication / permission:
+
+      @query_budget(6)
+      @api_view(['GET'])
+      @permission_classes([AllowAny])
+      def mongo_events_public(request): ...
+
+  Vượt ngân sách: log warning, hoặc raise QueryBudgetExceeded khi settings.QUERY_BUDGET_STRICT.
+  Ngân sách khai báo bằng decorator được ghi vào BUDGETS; `manage.py check_query_budgets`
+  chạy các endpoint trên dữ liệu giả lập và so với BUDGETS (request đã có cache) và
+  COLD_BUDGETS (request đầu tiên, cache trống: mặc định n + COLD_ALLOWANCE, đổi bằng cold=).
+"""
+
+import functools
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from pymongo import monitoring
+
+
+logger = logging.getLogger(__name__)
+
+# Các lệnh nội bộ của driver, không tính vào ngân sách
+IGNORED_COMMANDS = {'endSessions', 'hello', 'isMaster', 'ismaster', 'ping', 'saslStart', 'saslContinue', 'killCursors'}
+
+# 'module.view_name' -> số lệnh tối đa mỗi request
+BUDGETS: Dict[str, int] = {}
+# 'module.view_name' -> số lệnh tối đa khi cache trống (UserContext, snapshot cache_versions, cache của view)
+COLD_BUDGETS: Dict[str, int] = {}
+COLD_ALLOWANCE = 3
+
+_active_scopes: ContextVar[Tuple['count_queries', ...]] = ContextVar('query_budget_scopes', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class _BudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        scopes = _active_scopes.get()
+        if not scopes or event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        label = f"{event.command_name}:{collection}" if isinstance(collection, str) else event.command_name
+        for scope in scopes:
+            scope.commands[label] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+listener = _BudgetListener()
+
+
+class count_queries:
+    """Đếm lệnh MongoDB phát ra trong khối with (các scope lồng nhau đều được đếm)."""
+
+    def __init__(self):
+        self.commands: Counter = Counter()
+        self._token = None
+
+    @property
+    def count(self) -> int:
+        return sum(self.commands.values())
+
+    def __enter__(self):
+        self._token = _active_scopes.set(_active_scopes.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_scopes.reset(self._token)
+        return False
+
+
+def view_key(view) -> str:
+    """Khóa trong BUDGETS: module + tên view (DRF @api_view giữ __module__/__name__ trên .cls)."""
+    target = getattr(view, 'cls', view)
+    return f"{target.__module__}.{target.__name__}"
+
+
+class query_budget:
+    def __init__(self, max_commands: int, label: Optional[str] = None, strict: Optional[bool] = None,
+                 cold: Optional[int] = None):
+        self.max_commands = max_commands
+        self.cold = cold
+        self.label = label
+        self.strict = strict
+        self._scope = None
+
+    def _is_strict(self) -> bool:
+        if self.strict is not None:
+            return self.strict
+        return bool(getattr(settings, 'QUERY_BUDGET_STRICT', False))
+
+    def __enter__(self):
+        self._scope = count_queries().__enter__()
+        return self._scope
+
+    def __exit__(self, exc_type, exc, tb):
+        scope, self._scope = self._scope, None
+        scope.__exit__(exc_type, exc, tb)
+        if exc_type is None and scope.count > self.max_commands:
+            detail = ', '.join(f"{name} x{n}" for name, n in scope.commands.most_common())
+            message = f"{self.label or 'query budget'}: {scope.count} Mongo commands > budget {self.max_commands} ({detail})"
+            if self._is_strict():
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return False
+
+    def __call__(self, func):
+        key = view_key(func)
+        BUDGETS[key] = self.max_commands
+        COLD_BUDGETS[key] = self.cold if self.cold is not None else self.max_commands + COLD_ALLOWANCE
+        max_commands, label, strict = self.max_commands, self.label or key, self.strict
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Mỗi lần gọi 1 scope mới: an toàn khi nhiều request chạy song song
+            with query_budget(max_commands, label, strict):
+                return func(*args, **kwargs)
+        return wrapper
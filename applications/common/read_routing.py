@@ -0,0 +1,105 @@
+"""
+Định tuyến đọc sang secondary cho các endpoint báo cáo nặng.
+
+- `@secondary_reads`: đặt ngay trên hàm view (dưới @permission_classes) để mọi
+  get_mongo_collection() trong request đọc với secondaryPreferred + maxStalenessSeconds:
+
+      @api_view(['GET'])
+      @permission_classes([IsAuthenticated])
+      @secondary_reads
+      def mongo_realtime_rankings(request): ...
+
+  Hoặc chỉ định từng collection: get_mongo_collection('events', read='secondary').
+- Read-your-writes: ReadYourWritesMiddleware đánh dấu user vừa gửi request ghi (POST/PUT/PATCH/DELETE
+  thành công) trong cache; trong READ_YOUR_WRITES_SECONDS sau đó các đọc của user này vẫn đi primary,
+  nên giáo viên vừa nhập sổ đầu bài không thấy dữ liệu cũ trên báo cáo. Nhiều worker cần cache dùng chung.
+- Tắt (mặc định, MONGO_READ_FROM_SECONDARIES=False) hoặc deployment không có secondary: secondaryPreferred
+  vẫn đọc primary, hành vi như cũ.
+"""
+
+import functools
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from pymongo.read_preferences import SecondaryPreferred
+
+
+PRIMARY = 'primary'
+SECONDARY = 'secondary'
+# Giới hạn dưới của maxStalenessSeconds theo MongoDB
+MIN_MAX_STALENESS_SECONDS = 90
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+_route: ContextVar[Optional[str]] = ContextVar('mongo_read_route', default=None)
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, 'MONGO_READ_FROM_SECONDARIES', False))
+
+
+def max_staleness_seconds() -> int:
+    value = int(getattr(settings, 'MONGO_MAX_STALENESS_SECONDS', MIN_MAX_STALENESS_SECONDS))
+    return max(MIN_MAX_STALENESS_SECONDS, value)
+
+
+def read_your_writes_seconds() -> int:
+    return int(getattr(settings, 'READ_YOUR_WRITES_SECONDS', max_staleness_seconds() + 30))
+
+
+def _recent_write_key(user_id) -> str:
+    return f"mongo_rw:{user_id}"
+
+
+def mark_recent_write(user_id) -> None:
+    if user_id:
+        cache.set(_recent_write_key(user_id), 1, read_your_writes_seconds())
+
+
+def has_recent_write(user_id) -> bool:
+    return bool(user_id) and cache.get(_recent_write_key(user_id)) is not None
+
+
+def read_preference(hint: Optional[str] = None):
+    """Read preference cho 1 lần lấy collection; None -> giữ mặc định của client (primary)."""
+    route = hint or _route.get()
+    if route != SECONDARY or not enabled():
+        return None
+    return SecondaryPreferred(max_staleness=max_staleness_seconds())
+
+
+def _user_id(request) -> Optional[str]:
+    user = getattr(request, 'user', None)
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return None
+    return str(getattr(user, 'id', '') or '') or None
+
+
+def secondary_reads(func):
+    """Decorator cho view chỉ đọc: đọc secondary, trừ khi user vừa ghi (read-your-writes)."""
+
+    @functools.wraps(func)
+    def wrapper(request, *args, **kwargs):
+        route = PRIMARY if has_recent_write(_user_id(request)) else SECONDARY
+        token = _route.set(route)
+        try:
+            return func(request, *args, **kwargs)
+        finally:
+            _route.reset(token)
+    return wrapper
+
+
+class ReadYourWritesMiddleware:
+    """Sau request ghi thành công, ghim các đọc của user đó vào primary trong READ_YOUR_WRITES_SECONDS."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if enabled() and request.method in WRITE_METHODS and response.status_code < 400:
+            # DRF gán user đã xác thực (JWT) ngược lại vào HttpRequest
+            mark_recent_write(_user_id(request))
+        return response
+
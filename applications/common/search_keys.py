@@ -0,0 +1,82 @@
+"""
+Khóa tìm kiếm không dấu cho học sinh / giáo viên.
+
+Mỗi document trong users được ghi thêm mảng `search_keys` (đã bỏ dấu, chữ thường):
+  - họ tên đầy đủ và mọi hậu tố theo từ ("nguyen van an", "van an", "an")
+  - mã học sinh / mã giáo viên, email, môn học (nếu có)
+
+Tìm kiếm dùng regex neo đầu chuỗi ('^nguyen v') trên multikey index
+(role, search_keys) -> index range scan thay vì quét toàn collection.
+"""
+
+import re
+import unicodedata
+from typing import Iterable, List, Optional
+
+
+SEARCH_KEYS_FIELD = 'search_keys'
+
+# Các field dùng để sinh search_keys
+STUDENT_SEARCH_FIELDS = ('full_name', 'student_code', 'email')
+TEACHER_SEARCH_FIELDS = ('full_name', 'teacher_code', 'email', 'subject')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fold(text) -> str:
+    """Bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng: 'Nguyễn  Văn Đạt' -> 'nguyen van dat'."""
+    if text is None:
+        return ''
+    text = str(text).replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(' ', stripped).strip().lower()
+
+
+def _name_suffixes(folded_name: str) -> List[str]:
+    words = folded_name.split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def build_search_keys(doc: dict, fields: Iterable[str]) -> List[str]:
+    """Sinh search_keys từ các field của document (bỏ trùng, giữ thứ tự)."""
+    keys = []
+    for field in fields:
+        value = fold(doc.get(field))
+        if not value:
+            continue
+        if field == 'full_name':
+            keys.extend(_name_suffixes(value))
+        else:
+            keys.append(value)
+    seen = set()
+    return [k for k in keys if not (k in seen or seen.add(k))]
+
+
+def student_search_keys(doc: dict) -> List[str]:
+    return build_search_keys(doc, STUDENT_SEARCH_FIELDS)
+
+
+def teacher_search_keys(doc: dict) -> List[str]:
+    return build_search_keys(doc, TEACHER_SEARCH_FIELDS)
+
+
+def search_keys_for(doc: dict) -> List[str]:
+    if doc.get('role') == 'teacher':
+        return teacher_search_keys(doc)
+    return student_search_keys(doc)
+
+
+def prefix_filter(search: str) -> Optional[dict]:
+    """Điều kiện tìm theo tiền tố trên search_keys; None nếu chuỗi tìm rỗng sau khi fold."""
+    term = fold(search)
+    if not term:
+        return None
+    return {SEARCH_KEYS_FIELD: {'$regex': '^' + re.escape(term)}}
+
+
+def refresh_search_keys(coll, _id) -> None:
+    """Tính lại search_keys cho 1 document sau khi cập nhật các field liên quan."""
+    doc = coll.find_one({'_id': _id}, {f: 1 for f in set(STUDENT_SEARCH_FIELDS + TEACHER_SEARCH_FIELDS) | {'role'}})
+    if doc:
+        coll.update_one({'_id': _id}, {'$set': {SEARCH_KEYS_FIELD: search_keys_for(doc)}})
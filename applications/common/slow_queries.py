@@ -0,0 +1,264 @@
+"""
+Ghi lại các lệnh MongoDB chậm kèm view phát sinh.
+
+- SlowQueryMiddleware đặt tên view đang xử lý vào contextvar `current_view`.
+- `listener` (CommandListener, gắn vào client singleton) đo mọi lệnh; lệnh chạy lâu hơn
+  settings.SLOW_QUERY_THRESHOLD_MS được ghi vào capped collection 'perf_slow_queries':
+
+      {ts, view, command, collection, shape, shape_hash, duration_ms, docs_returned}
+
+  shape là filter / pipeline / sort đã xóa giá trị (chỉ giữ field + toán tử) nên không chứa
+  dữ liệu người dùng và các truy vấn cùng dạng gom được theo shape_hash.
+- Việc ghi chạy ở 1 thread nền (queue), không làm chậm request; queue đầy thì bỏ bớt bản ghi.
+- Bản ghi nằm trong database của chính lệnh chậm, nên mỗi trường (tenant) có perf_slow_queries riêng.
+- slow_query_report() gom theo shape: số lần, p95 / max thời gian, view (endpoint admin).
+"""
+
+import hashlib
+import json
+import logging
+import math
+import queue
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from .query_budget import IGNORED_COMMANDS, view_key
+
+
+SLOW_QUERIES_COLLECTION = 'perf_slow_queries'
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_CAPPED_BYTES = 16 * 1024 * 1024
+QUEUE_SIZE = 1000
+
+# Phần của lệnh được giữ lại (sau khi xóa giá trị) làm shape
+SHAPE_FIELDS = {
+    'find': ('filter', 'sort', 'projection'),
+    'aggregate': ('pipeline',),
+    'count': ('query',),
+    'distinct': ('key', 'query'),
+    'findAndModify': ('query', 'sort'),
+}
+WRITE_FIELDS = {'update': ('updates', 'q'), 'delete': ('deletes', 'q')}
+
+logger = logging.getLogger(__name__)
+
+current_view: ContextVar[Optional[str]] = ContextVar('slow_query_view', default=None)
+
+
+def redact(value):
+    """Giữ cấu trúc (field, toán tử), thay mọi giá trị bằng '?'; mảng chỉ giữ phần tử đầu."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [redact(item) for item in value]
+        return [redact(value[0])] if value else []
+    return '?'
+
+
+def command_shape(command_name: str, command: dict) -> dict:
+    if command_name in WRITE_FIELDS:
+        list_field, query_field = WRITE_FIELDS[command_name]
+        statements = command.get(list_field) or [{}]
+        return {'q': redact(statements[0].get(query_field) or {})}
+    shape = {}
+    for field in SHAPE_FIELDS.get(command_name, ()):
+        if command.get(field) in (None, {}, []):
+            continue
+        # sort / projection / key chỉ có tên field + hướng, không chứa dữ liệu -> giữ nguyên
+        shape[field] = command[field] if field in ('sort', 'projection', 'key') else redact(command[field])
+    return shape
+
+
+def shape_hash(command_name: str, collection: str, shape: dict) -> str:
+    raw = json.dumps([command_name, collection, shape], sort_keys=True, default=str)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def docs_returned(command_name: str, reply: dict) -> Optional[int]:
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    if command_name in ('count', 'update', 'delete', 'insert'):
+        return reply.get('n')
+    if command_name == 'distinct':
+        return len(reply.get('values') or [])
+    return None
+
+
+def threshold_ms() -> float:
+    return float(getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS) or 0)
+
+
+class _Writer:
+    """Thread nền ghi bản ghi vào capped collection (tạo collection ở lần ghi đầu)."""
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ready = set()
+
+    def put(self, db_name: str, record: dict) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slow-query-writer', daemon=True)
+                    self._thread.start()
+        try:
+            self.queue.put_nowait((db_name, record))
+        except queue.Full:
+            pass
+
+    def _collection(self, db_name: str):
+        from .mongo import get_mongo_db
+        db = get_mongo_db(db_name)
+        if db_name not in self._ready:
+            try:
+                db.create_collection(
+                    SLOW_QUERIES_COLLECTION, capped=True,
+                    size=getattr(settings, 'SLOW_QUERY_CAPPED_BYTES', DEFAULT_CAPPED_BYTES),
+                )
+            except CollectionInvalid:
+                pass  # đã tồn tại
+            self._ready.add(db_name)
+        return db[SLOW_QUERIES_COLLECTION]
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            by_db = {}
+            for db_name, record in batch:
+                by_db.setdefault(db_name, []).append(record)
+            for db_name, records in by_db.items():
+                try:
+                    self._collection(db_name).insert_many(records, ordered=False)
+                except Exception:
+                    logger.exception('slow query writer error (%d records dropped)', len(records))
+
+
+class _SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, writer: _Writer):
+        self.writer = writer
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if threshold_ms() <= 0 or event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == SLOW_QUERIES_COLLECTION:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.command, event.database_name, current_view.get())
+
+    def succeeded(self, event):
+        self._finish(event, getattr(event, 'reply', None) or {})
+
+    def failed(self, event):
+        self._finish(event, {})
+
+    def _finish(self, event, reply):
+        with self._lock:
+            started = self._pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        if duration_ms < threshold_ms():
+            return
+        command, db_name, view = started
+        collection = command.get(event.command_name)
+        collection = collection if isinstance(collection, str) else ''
+        shape = command_shape(event.command_name, command)
+        self.writer.put(db_name, {
+            'ts': datetime.now(),
+            'view': view or '',
+            'command': event.command_name,
+            'collection': collection,
+            'shape': json.dumps(shape, sort_keys=True, default=str),
+            'shape_hash': shape_hash(event.command_name, collection, shape),
+            'duration_ms': round(duration_ms, 2),
+            'docs_returned': docs_returned(event.command_name, reply),
+            'failed': not reply,
+        })
+
+
+listener = _SlowQueryListener(_Writer())
+
+
+class SlowQueryMiddleware:
+    """Gắn tên view vào contextvar để listener ghi được lệnh chậm thuộc view nào."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_view.set(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(view_key(view_func))
+        return None
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100.0 * len(ordered)) - 1))]
+
+
+def slow_query_report(db, hours: Optional[float] = None, view: Optional[str] = None, limit: int = 50) -> List[dict]:
+    """Gom bản ghi theo shape_hash: số lần, p95 / max / trung bình thời gian, các view; xếp theo tổng thời gian."""
+    match = {}
+    if hours:
+        match['ts'] = {'$gte': datetime.now() - timedelta(hours=hours)}
+    if view:
+        match['view'] = view
+    rows = db[SLOW_QUERIES_COLLECTION].aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': '$shape_hash',
+            'command': {'$first': '$command'},
+            'collection': {'$first': '$collection'},
+            'shape': {'$first': '$shape'},
+            'views': {'$addToSet': '$view'},
+            'durations': {'$push': '$duration_ms'},
+            'docs_returned': {'$avg': '$docs_returned'},
+            'last_seen': {'$max': '$ts'},
+        }},
+    ])
+    out = []
+    for row in rows:
+        durations = row['durations']
+        out.append({
+            'shape_hash': row['_id'],
+            'command': row['command'],
+            'collection': row['collection'],
+            'shape': json.loads(row['shape']) if row.get('shape') else {},
+            'views': sorted(v for v in row['views'] if v),
+            'count': len(durations),
+            'p95_ms': round(_percentile(durations, 95), 2),
+            'max_ms': round(max(durations), 2),
+            'avg_ms': round(sum(durations) / len(durations), 2),
+            'total_ms': round(sum(durations), 2),
+            'avg_docs_returned': round(row['docs_returned'], 1) if row.get('docs_returned') is not None else None,
+            'last_seen': row['last_seen'].isoformat() if row.get('last_seen') else None,
+        })
+    out.sort(key=lambda r: r['total_ms'], reverse=True)
+    return out[:limit]
+
@@ -0,0 +1,395 @@
+"""
+Sinh dữ liệu giả lập cỡ production cho 1 hoặc nhiều trường (1 database / trường).
+
+Mỗi trường gồm: giáo viên, lớp (khối 10-12, có GVCN), học sinh, loại sự kiện,
+day-document cả năm học (tiết học, vi phạm / điểm cộng đột xuất, điểm danh) với
+trạng thái duyệt thực tế, bản điểm danh gọn theo lớp-tháng, bộ đếm chờ duyệt theo lớp
+và tổng kết tuần.
+
+Dữ liệu được sinh tuần tự với random.Random(seed) (cùng seed -> cùng dữ liệu),
+còn việc ghi chạy song song: các lô insert_many(ordered=False) được đẩy vào thread pool.
+Dùng bởi `manage.py generate_dataset` và bộ benchmark.
+"""
+
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import bcrypt
+from bson import ObjectId
+
+from applications.common.academic_year import get_academic_year_date_range, ACADEMIC_YEAR_SETTINGS_KEY
+from applications.common.display_names import teacher_display
+from applications.common.search_keys import SEARCH_KEYS_FIELD, student_search_keys, teacher_search_keys
+from applications.event.attendance_store import (
+    EXCUSED, UNEXCUSED, encode_day, days_in_month, month_document, put_day_codes,
+)
+from applications.event.day_totals import day_summary
+
+
+DATASET_COLLECTIONS = [
+    'users', 'classrooms', 'event_types', 'events', 'attendance', 'week_summaries', 'settings',
+    'event_pending_counters',
+]
+
+SURNAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Minh', 'Ngọc', 'Thanh', 'Hoàng', 'Gia', 'Quốc', 'Thu', 'Bảo', 'Hữu', 'Khánh', 'Kim', 'Đức']
+GIVEN_NAMES = [
+    'An', 'Bình', 'Châu', 'Dũng', 'Duy', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hiếu', 'Hòa', 'Hùng', 'Huy', 'Khang',
+    'Khoa', 'Lan', 'Linh', 'Long', 'Mai', 'My', 'Nam', 'Nga', 'Ngân', 'Nhi', 'Phát', 'Phúc', 'Phương', 'Quân',
+    'Quỳnh', 'Sơn', 'Tâm', 'Thảo', 'Thịnh', 'Thư', 'Tiến', 'Trâm', 'Trang', 'Trí', 'Trung', 'Tú', 'Tuấn', 'Uyên', 'Vy', 'Yến',
+]
+SUBJECTS = ['Toán', 'Ngữ văn', 'Tiếng Anh', 'Vật lý', 'Hóa học', 'Sinh học', 'Lịch sử', 'Địa lý', 'Tin học', 'GDCD', 'Thể dục']
+
+# (key, tên, điểm mặc định, loại, trọng số xuất hiện)
+EVENT_TYPES = [
+    ('phat_bieu', 'Phát biểu xây dựng bài', 2, 'positive', 30),
+    ('diem_tot', 'Đạt điểm tốt', 5, 'positive', 12),
+    ('noi_chuyen', 'Nói chuyện riêng', -2, 'violation', 25),
+    ('di_tre', 'Đi học trễ', -5, 'violation', 10),
+    ('khong_dong_phuc', 'Không đúng đồng phục', -3, 'violation', 8),
+    ('khong_bai_tap', 'Không làm bài tập', -3, 'violation', 12),
+    ('su_dung_dien_thoai', 'Sử dụng điện thoại', -5, 'violation', 3),
+]
+SUDDEN_VIOLATION_TYPES = [('vi_pham_ky_tuc_xa', 'Vi phạm nội quy ký túc xá', -10), ('gay_mat_trat_tu', 'Gây mất trật tự', -5)]
+SUDDEN_BONUS_TYPES = [('cong_tac_phong_trao', 'Tham gia phong trào', 10), ('nhat_cua_roi', 'Nhặt được của rơi', 5)]
+ATTENDANCE_TYPES = [
+    ('attendance_sp', 'Nghỉ sáng có phép', 0), ('attendance_sk', 'Nghỉ sáng không phép', -2),
+    ('attendance_cp', 'Nghỉ chiều có phép', 0), ('attendance_ck', 'Nghỉ chiều không phép', -2),
+]
+
+
+@dataclass
+class DatasetConfig:
+    schools: int = 1
+    classes: int = 40
+    students_per_class: int = 40
+    periods_per_day: int = 7
+    academic_year: Optional[str] = None
+    seed: int = 42
+    # Xác suất / mật độ (theo ngày-lớp)
+    events_per_period: float = 1.2
+    sudden_violation_rate: float = 0.08
+    sudden_bonus_rate: float = 0.04
+    absence_rate: float = 0.025
+    excused_share: float = 0.6
+    pending_days: int = 14
+    rejected_rate: float = 0.01
+    # Giới hạn số ngày (0 = cả năm học); benchmark dùng tập nhỏ
+    max_days: int = 0
+    today: Optional[date] = None
+
+
+@dataclass
+class DatasetStats:
+    counts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    elapsed: float = 0.0
+
+
+class _ParallelWriter:
+    """Gom document theo collection, đẩy từng lô insert_many vào thread pool (giới hạn số lô đang chờ)."""
+
+    def __init__(self, db, batch_size: int, workers: int, stats: DatasetStats):
+        self.db = db
+        self.batch_size = batch_size
+        self.stats = stats
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = workers * 2
+        self.pending = set()
+        self.buffers: Dict[str, List[dict]] = defaultdict(list)
+
+    def add(self, collection: str, doc: dict) -> None:
+        buffer = self.buffers[collection]
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            self._submit(collection, buffer)
+            self.buffers[collection] = []
+
+    def _submit(self, collection: str, docs: List[dict]) -> None:
+        while len(self.pending) >= self.max_pending:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self.pending.add(self.pool.submit(self.db[collection].insert_many, docs, ordered=False))
+        self.stats.counts[collection] += len(docs)
+
+    def close(self) -> None:
+        for collection, buffer in self.buffers.items():
+            if buffer:
+                self._submit(collection, buffer)
+        self.buffers.clear()
+        for future in self.pending:
+            future.result()
+        self.pool.shutdown()
+
+
+class SchoolGenerator:
+    def __init__(self, config: DatasetConfig, school_index: int, writer: _ParallelWriter,
+                 out: Callable[[str], None] = print):
+        self.config = config
+        self.rng = random.Random(config.seed * 1000 + school_index)
+        self.school_index = school_index
+        self.writer = writer
+        self.out = out
+        self.now = datetime.now().isoformat()
+        self.today = config.today or date.today()
+        self.academic_year = config.academic_year or _academic_year_of(self.today)
+        self.password_hash = bcrypt.hashpw(b'123456', bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+    # --- danh mục ---
+
+    def _name(self):
+        surname = self.rng.choice(SURNAMES)
+        middle = self.rng.choice(MIDDLE_NAMES)
+        given = self.rng.choice(GIVEN_NAMES)
+        return f'{surname} {middle}', given, f'{surname} {middle} {given}'
+
+    def _event_types(self) -> Dict[str, dict]:
+        """Dùng lại loại sự kiện đã có trong database (theo key), chỉ thêm loại còn thiếu."""
+        types = {doc['key']: doc for doc in self.writer.db['event_types'].find({'key': {'$exists': True}})}
+        rows = [(k, n, p, c) for k, n, p, c, _ in EVENT_TYPES]
+        rows += [(k, n, p, 'sudden_violation') for k, n, p in SUDDEN_VIOLATION_TYPES]
+        rows += [(k, n, p, 'sudden_bonus') for k, n, p in SUDDEN_BONUS_TYPES]
+        rows += [(k, n, p, 'attendance') for k, n, p in ATTENDANCE_TYPES]
+        for key, name, points, category in rows:
+            if key in types:
+                continue
+            doc = {
+                '_id': ObjectId(), 'key': key, 'name': name, 'default_points': points, 'category': category,
+                'allowed_roles': ['both'] if category in ('positive', 'violation') else ['teacher'],
+                'is_active': True, 'created_at': self.now, 'updated_at': self.now,
+            }
+            types[key] = doc
+            self.writer.add('event_types', doc)
+        return types
+
+    def _teachers(self, count: int) -> List[dict]:
+        teachers = []
+        for idx in range(1, count + 1):
+            first_name, last_name, full_name = self._name()
+            email = f'gv{self.school_index}.{idx:04d}@example.com'
+            doc = {
+                '_id': ObjectId(), 'username': email.split('@')[0], 'email': email,
+                'password_hash': self.password_hash, 'role': 'teacher',
+                'first_name': first_name, 'last_name': last_name, 'full_name': full_name,
+                'phone': f'09{self.rng.randrange(10 ** 8):08d}', 'status': 'active',
+                'teacher_code': f'GV{self.school_index}{idx:04d}', 'subject': self.rng.choice(SUBJECTS),
+                'created_at': self.now, 'updated_at': self.now,
+            }
+            doc[SEARCH_KEYS_FIELD] = teacher_search_keys(doc)
+            teachers.append(doc)
+            self.writer.add('users', doc)
+        return teachers
+
+    def _classrooms(self, teachers: List[dict]) -> List[dict]:
+        classrooms = []
+        for idx in range(self.config.classes):
+            grade = str(10 + idx % 3)
+            name = f'A{idx // 3 + 1}'
+            teacher = teachers[idx]
+            doc = {
+                '_id': ObjectId(), 'name': name, 'full_name': f'{grade}{name}', 'grade': grade,
+                'homeroom_teacher_id': str(teacher['_id']), 'homeroom_teacher_display': teacher_display(teacher),
+                'student_count': self.config.students_per_class, 'academic_year': self.academic_year,
+                'created_at': self.now, 'updated_at': self.now,
+            }
+            classrooms.append(doc)
+            self.writer.add('classrooms', doc)
+        return classrooms
+
+    def _students(self, classroom: dict, class_index: int) -> List[dict]:
+        students = []
+        for idx in range(1, self.config.students_per_class + 1):
+            first_name, last_name, full_name = self._name()
+            code = f'HS{self.school_index}{class_index:03d}{idx:03d}'
+            doc = {
+                '_id': ObjectId(), 'email': f'{code.lower()}@example.com', 'password_hash': self.password_hash,
+                'role': 'student', 'first_name': first_name, 'last_name': last_name, 'full_name': full_name,
+                'phone': '', 'is_active': True, 'student_code': code,
+                'classroom_id': str(classroom['_id']), 'classroom_name': classroom['name'],
+                'classroom_grade': classroom['grade'], 'gender': self.rng.choice(['male', 'female']),
+                'date_of_birth': date(2010 - int(classroom['grade']) + 10, self.rng.randint(1, 12), self.rng.randint(1, 28)).isoformat(),
+                'address': '', 'parent_phone': '', 'is_special': False, 'academic_year': self.academic_year,
+                'created_at': self.now, 'updated_at': self.now,
+            }
+            doc[SEARCH_KEYS_FIELD] = student_search_keys(doc)
+            students.append(doc)
+            self.writer.add('users', doc)
+        return students
+
+    # --- sự kiện ---
+
+    def _event(self, et: dict, student: dict, session: Optional[str] = None) -> dict:
+        event = {
+            'event_id': str(ObjectId()), 'event_type': str(et['_id']), 'event_type_key': et['key'],
+            'event_type_name': et.get('name', ''), 'student_id': str(student['_id']), 'student_name': student['full_name'],
+            'points': et.get('default_points', 0), 'description': '',
+        }
+        if session:
+            event['session'] = session
+        return event
+
+    def _poisson(self, lam: float) -> int:
+        # Knuth - đủ nhanh với lam nhỏ
+        limit, k, p = pow(2.718281828459045, -lam), 0, 1.0
+        while True:
+            p *= self.rng.random()
+            if p <= limit:
+                return k
+            k += 1
+
+    def _approval(self, day: date, teacher: dict, has_sudden: bool) -> dict:
+        recent = (self.today - day).days < self.config.pending_days
+        if has_sudden or not recent:
+            status = 'rejected' if self.rng.random() < self.config.rejected_rate and not has_sudden else 'approved'
+        else:
+            status = self.rng.choice(['pending', 'pending', 'approved'])
+        decided = status != 'pending'
+        return {
+            'approval_status': status,
+            'approved_by': str(teacher['_id']) if decided else None,
+            'approved_by_name': teacher['full_name'] if decided else None,
+            'approved_at': f'{day.isoformat()}T17:00:00' if decided else None,
+        }
+
+    def _day_document(self, day: date, classroom: dict, students: List[dict], teacher: dict,
+                      types: Dict[str, dict], weighted: List[dict]) -> tuple:
+        cfg = self.config
+        periods = {}
+        for period in range(1, cfg.periods_per_day + 1):
+            count = self._poisson(cfg.events_per_period)
+            if count:
+                periods[str(period)] = [self._event(self.rng.choice(weighted), self.rng.choice(students)) for _ in range(count)]
+        if self.rng.random() < cfg.sudden_violation_rate:
+            key = self.rng.choice(SUDDEN_VIOLATION_TYPES)[0]
+            periods['violation_sudden'] = [self._event(types[key], self.rng.choice(students))]
+        if self.rng.random() < cfg.sudden_bonus_rate:
+            key = self.rng.choice(SUDDEN_BONUS_TYPES)[0]
+            periods['bonus_sudden'] = [self._event(types[key], self.rng.choice(students))]
+
+        codes = {}
+        attendance = []
+        for student in students:
+            morning = afternoon = 0
+            for session in ('morning', 'afternoon'):
+                if self.rng.random() < cfg.absence_rate:
+                    excused = self.rng.random() < cfg.excused_share
+                    key = ('attendance_sp' if excused else 'attendance_sk') if session == 'morning' else \
+                          ('attendance_cp' if excused else 'attendance_ck')
+                    attendance.append(self._event(types[key], student, session))
+                    value = EXCUSED if excused else UNEXCUSED
+                    if session == 'morning':
+                        morning = value
+                    else:
+                        afternoon = value
+            if morning or afternoon:
+                codes[str(student['_id'])] = encode_day(morning, afternoon)
+        if attendance:
+            periods['attendance'] = attendance
+        if not periods:
+            return None, codes
+
+        has_sudden = 'violation_sudden' in periods or 'bonus_sudden' in periods
+        doc = {
+            'date': day.isoformat(), 'classroom_id': str(classroom['_id']), 'periods': periods,
+            'total_events': sum(len(v) for v in periods.values()), **day_summary(periods),
+            'academic_year': self.academic_year,
+            'created_by': str(teacher['_id']), 'created_by_name': teacher['full_name'],
+            'created_at': f'{day.isoformat()}T16:00:00', 'updated_at': f'{day.isoformat()}T16:00:00',
+            **self._approval(day, teacher, has_sudden),
+        }
+        return doc, codes
+
+    def _school_days(self) -> List[date]:
+        start, end = (date.fromisoformat(d) for d in get_academic_year_date_range(self.academic_year))
+        end = min(end, self.today)
+        days, current = [], start
+        while current <= end:
+            if current.weekday() < 6:
+                days.append(current)
+            current += timedelta(days=1)
+        if self.config.max_days:
+            days = days[-self.config.max_days:]
+        return days
+
+    def _week_summary(self, classroom: dict, monday: date, totals: Dict[str, int]) -> dict:
+        iso = monday.isocalendar()
+        return {
+            'classroom_id': str(classroom['_id']), 'week_number': iso[1], 'year': iso[0],
+            'start_date': monday.isoformat(), 'end_date': (monday + timedelta(days=6)).isoformat(),
+            'positive_points': totals['positive_points'], 'negative_points': totals['negative_points'],
+            'total_points': totals['total_points'], 'is_approved': (self.today - monday).days > 7,
+            'academic_year': self.academic_year, 'created_at': self.now, 'updated_at': self.now,
+        }
+
+    def generate(self) -> None:
+        cfg = self.config
+        types = self._event_types()
+        weighted = [types[key] for key, _, _, _, weight in EVENT_TYPES for _ in range(weight)]
+        teachers = self._teachers(cfg.classes + max(1, cfg.classes // 4))
+        classrooms = self._classrooms(teachers)
+        days = self._school_days()
+        start, end = get_academic_year_date_range(self.academic_year)
+        self.writer.db['settings'].replace_one({'key': ACADEMIC_YEAR_SETTINGS_KEY}, {
+            'key': ACADEMIC_YEAR_SETTINGS_KEY, 'academic_year': self.academic_year,
+            'academic_year_start': start, 'academic_year_end': end,
+            'competition_start_date': days[0].isoformat() if days else start,
+            'created_at': self.now, 'updated_at': self.now,
+        }, upsert=True)
+
+        for class_index, classroom in enumerate(classrooms, 1):
+            students = self._students(classroom, class_index)
+            teacher = teachers[class_index - 1]
+            months: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+            weeks: Dict[date, Dict[str, int]] = {}
+            pending = 0
+            for day in days:
+                doc, codes = self._day_document(day, classroom, students, teacher, types, weighted)
+                month = day.strftime('%Y-%m')
+                put_day_codes(months[month], days_in_month(month), day.day - 1, codes)
+                if doc is None:
+                    continue
+                self.writer.add('events', doc)
+                pending += doc['approval_status'] == 'pending'
+                if doc['approval_status'] == 'approved':
+                    week = weeks.setdefault(day - timedelta(days=day.weekday()), defaultdict(int))
+                    for key, value in doc['day_totals'].items():
+                        week[key] += value
+            for month, month_students in months.items():
+                self.writer.add('attendance', month_document(str(classroom['_id']), month, month_students))
+            for monday, totals in weeks.items():
+                self.writer.add('week_summaries', self._week_summary(classroom, monday, totals))
+            if pending:
+                # cùng dạng với pending_counters.recount_pending(): chỉ lớp có document chờ duyệt
+                self.writer.add('event_pending_counters', {
+                    'classroom_id': str(classroom['_id']), 'pending_count': pending, 'updated_at': self.now,
+                })
+            self.out(f"  class {classroom['full_name']} ({class_index}/{len(classrooms)}): {len(days)} days")
+
+
+def _academic_year_of(day: date) -> str:
+    return f'{day.year}-{day.year + 1}' if day.month >= 9 else f'{day.year - 1}-{day.year}'
+
+
+def generate_dataset(db_for_school: Callable[[int], object], config: DatasetConfig, batch_size: int = 1000,
+                     workers: int = 4, drop: bool = False, out: Callable[[str], None] = print) -> DatasetStats:
+    """Sinh dữ liệu cho config.schools trường; db_for_school(i) trả về database của trường thứ i (1-based)."""
+    stats = DatasetStats()
+    started = time.monotonic()
+    for school_index in range(1, config.schools + 1):
+        db = db_for_school(school_index)
+        out(f"[school {school_index}] database={db.name}")
+        if drop:
+            for collection in DATASET_COLLECTIONS:
+                db[collection].drop()
+        writer = _ParallelWriter(db, batch_size, workers, stats)
+        try:
+            SchoolGenerator(config, school_index, writer, out).generate()
+        finally:
+            writer.close()
+    stats.elapsed = time.monotonic() - started
+    return stats
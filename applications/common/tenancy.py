@@ -0,0 +1,207 @@
+"""
+Nhiều trường (tenant) trên 1 deployment, mỗi trường 1 database MongoDB riêng.
+
+settings.TENANTS (env TENANTS, JSON):
+
+    {"lv3": {"name": "TRƯỜNG THPT LAI VUNG 3", "db": "school_lv3", "hosts": ["lv3.example.edu.vn"]},
+     "lv1": {"name": "TRƯỜNG THPT LAI VUNG 1", "db": "school_lv1", "hosts": ["lv1.example.edu.vn"]}}
+
+Rỗng -> 1 tenant 'default' dùng MONGO_DB + SCHOOL_NAME (như trước khi có tenancy).
+`generate_dataset --schools N` sinh sẵn các database <db>_school1..N để khai báo thử.
+
+- TenantMiddleware xác định trường của request: claim 'school' trong JWT -> header X-School -> host;
+  không xác định được -> DEFAULT_TENANT (hoặc tenant mặc định). Token của trường A kèm header / host
+  của trường B -> 403.
+- get_mongo_db() / get_mongo_collection() không truyền db_name -> database của tenant hiện tại,
+  nên truy vấn chỉ chạm dữ liệu của 1 trường.
+- Cache: CACHES KEY_FUNCTION = make_cache_key thêm key tenant vào mọi key Django cache (UserContext,
+  sĩ số lớp, version chỉ mục tra cứu, ...); cache trong process (chỉ mục tra cứu học sinh) tách theo tenant.
+- Index: provision_tenant() tạo index của registry cho database của 1 trường (1 lần / process);
+  `ensure_mongo_indexes --all-tenants` hoặc TENANT_AUTO_PROVISION=True (ở request đầu tiên của trường).
+- Lệnh quản trị chạy trên tenant mặc định; dùng `with use_tenant('lv3'): ...` để chạy cho trường khác.
+"""
+
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Union
+
+from django.conf import settings
+from django.http import JsonResponse
+from pymongo.errors import PyMongoError
+
+
+DEFAULT_TENANT_KEY = 'default'
+TOKEN_CLAIM = 'school'
+DEFAULT_SCHOOL_NAME = 'TRƯỜNG THPT LAI VUNG 3'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Tenant:
+    key: str
+    name: str
+    db_name: str
+    hosts: Tuple[str, ...] = ()
+
+
+_current: ContextVar[Optional[Tenant]] = ContextVar('tenant', default=None)
+_provisioned = set()
+_provision_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _parse_tenants(raw: str) -> Tuple[Tenant, ...]:
+    data = json.loads(raw)
+    tenants = []
+    for key, spec in data.items():
+        spec = spec or {}
+        tenants.append(Tenant(
+            key=str(key),
+            name=spec.get('name') or str(key),
+            db_name=spec.get('db') or f"{getattr(settings, 'MONGO_DB', '') or 'school'}_{key}",
+            hosts=tuple(host.lower() for host in spec.get('hosts') or ()),
+        ))
+    return tuple(tenants)
+
+
+def default_tenant() -> Tenant:
+    """Tenant khi chưa cấu hình TENANTS: MONGO_DB + SCHOOL_NAME (đọc lại settings mỗi lần)."""
+    return Tenant(
+        key=DEFAULT_TENANT_KEY,
+        name=getattr(settings, 'SCHOOL_NAME', None) or DEFAULT_SCHOOL_NAME,
+        db_name=getattr(settings, 'MONGO_DB', None) or '',
+    )
+
+
+def configured_tenants() -> Dict[str, Tenant]:
+    raw = getattr(settings, 'TENANTS', None)
+    if not raw:
+        return {DEFAULT_TENANT_KEY: default_tenant()}
+    if isinstance(raw, dict):
+        raw = json.dumps(raw, sort_keys=True)
+    return {tenant.key: tenant for tenant in _parse_tenants(raw)}
+
+
+def get_tenant(key: Optional[str]) -> Optional[Tenant]:
+    if not key:
+        return None
+    return configured_tenants().get(str(key))
+
+
+def fallback_tenant() -> Tenant:
+    tenants = configured_tenants()
+    key = getattr(settings, 'DEFAULT_TENANT', None)
+    if key and key in tenants:
+        return tenants[key]
+    return tenants.get(DEFAULT_TENANT_KEY) or default_tenant()
+
+
+def current_tenant() -> Tenant:
+    return _current.get() or fallback_tenant()
+
+
+@contextmanager
+def use_tenant(tenant: Union[Tenant, str]):
+    """Chạy khối with trong ngữ cảnh 1 trường (lệnh quản trị, script)."""
+    if not isinstance(tenant, Tenant):
+        key, tenant = tenant, get_tenant(tenant)
+        if tenant is None:
+            raise KeyError(f'Unknown tenant: {key}')
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+
+def tenant_for_host(host: str) -> Optional[Tenant]:
+    host = (host or '').split(':')[0].lower()
+    if not host:
+        return None
+    for tenant in configured_tenants().values():
+        if host in tenant.hosts:
+            return tenant
+    return None
+
+
+def _token_claim(request) -> Optional[str]:
+    """Claim 'school' của access token (đã kiểm tra chữ ký); token lỗi -> None, authentication tự báo lỗi."""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    parts = header.split()
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        return None
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+    try:
+        return AccessToken(parts[1]).get(TOKEN_CLAIM)
+    except TokenError:
+        return None
+
+
+def resolve_tenant(request) -> Tuple[Optional[Tenant], Optional[JsonResponse]]:
+    header_name = 'HTTP_' + getattr(settings, 'TENANT_HEADER', 'X-School').upper().replace('-', '_')
+    header_key = request.META.get(header_name)
+    by_header = get_tenant(header_key)
+    if header_key and by_header is None:
+        return None, JsonResponse({'error': 'Không tìm thấy trường'}, status=404)
+    by_host = tenant_for_host(request.get_host())
+
+    claim = _token_claim(request)
+    if claim:
+        by_token = get_tenant(claim)
+        if by_token is None:
+            return None, JsonResponse({'error': 'Không tìm thấy trường'}, status=404)
+        if any(t is not None and t.key != by_token.key for t in (by_header, by_host)):
+            return None, JsonResponse({'error': 'Token không thuộc trường này'}, status=403)
+        return by_token, None
+    return by_header or by_host or fallback_tenant(), None
+
+
+def provision_tenant(tenant: Tenant, force: bool = False) -> Dict[str, list]:
+    """Tạo index của registry cho database của trường (idempotent, 1 lần / process trừ khi force)."""
+    if not force and tenant.key in _provisioned:
+        return {}
+    from .indexes import ensure_indexes
+    from .mongo import get_mongo_client
+    with _provision_lock:
+        if not force and tenant.key in _provisioned:
+            return {}
+        try:
+            created = ensure_indexes(db=get_mongo_client()[tenant.db_name])
+        except PyMongoError:
+            # vd còn day-document trùng (classroom_id, date): không chặn request, chạy backfill_day_totals
+            # rồi ensure_mongo_indexes --tenant <key>
+            logger.exception('index provisioning failed for tenant %s (%s)', tenant.key, tenant.db_name)
+            created = {}
+        _provisioned.add(tenant.key)
+    logger.info('provisioned indexes for tenant %s (%s)', tenant.key, tenant.db_name)
+    return created
+
+
+class TenantMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tenant, error = resolve_tenant(request)
+        if error is not None:
+            return error
+        request.tenant = tenant
+        token = _current.set(tenant)
+        try:
+            if getattr(settings, 'TENANT_AUTO_PROVISION', False):
+                provision_tenant(tenant)
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+
+
+def make_cache_key(key, key_prefix, version):
+    """CACHES KEY_FUNCTION: tách key cache theo tenant."""
+    return f"{key_prefix}:{version}:{current_tenant().key}:{key}"
@@ -0,0 +1,107 @@
+"""
+Ngữ cảnh phân quyền của user đang đăng nhập.
+
+Gom các truy vấn phân quyền theo role về một chỗ:
+  - giáo viên: các lớp chủ nhiệm (classrooms.homeroom_teacher_id)
+  - học sinh: lớp của học sinh (users.classroom_id)
+
+Dữ liệu dạng cũ (homeroom_teacher.id, students.classroom.id) được đưa về các field
+trên bằng `manage.py normalize_mongo_ids`.
+
+Kết quả được cache theo user id (Django cache) và gắn lazily vào request.user.context.
+Khi phân công GVCN / chuyển lớp của vài user thay đổi, gọi invalidate_user_context(*user_ids);
+thao tác hàng loạt (đối soát GVCN) gọi invalidate_all_user_contexts(). Version của key cache
+(chung + riêng từng user) nằm trong MongoDB (applications.common.versions) nên mọi worker và cả lệnh
+quản trị chạy ở process riêng đều làm mất hiệu lực cache, chậm nhất sau SHARED_VERSION_CHECK_SECONDS,
+kể cả với LocMemCache.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .ids import to_object_id
+from .mongo import get_mongo_collection
+from .versions import bump_member_versions, bump_version, get_member_version, get_version
+
+
+_VERSION_NAME = 'user_context'
+
+
+@dataclass(frozen=True)
+class UserContext:
+    user_id: str
+    role: str
+    homeroom_classroom_ids: Tuple[str, ...] = ()
+    student_classroom_id: Optional[str] = None
+
+    @property
+    def homeroom_classroom_id(self) -> Optional[str]:
+        """Lớp chủ nhiệm đầu tiên (phần lớn giáo viên chỉ chủ nhiệm 1 lớp)."""
+        return self.homeroom_classroom_ids[0] if self.homeroom_classroom_ids else None
+
+    def can_access_classroom(self, classroom_id) -> bool:
+        if self.role == 'teacher':
+            return str(classroom_id) in self.homeroom_classroom_ids
+        if self.role == 'student':
+            return self.student_classroom_id is not None and str(classroom_id) == self.student_classroom_id
+        return True
+
+
+def _ttl() -> int:
+    return getattr(settings, 'USER_CONTEXT_CACHE_TTL', 300)
+
+
+def _cache_key(user_id: str) -> str:
+    return f'user_context:{get_version(_VERSION_NAME)}.{get_member_version(_VERSION_NAME, user_id)}:{user_id}'
+
+
+def _resolve_homeroom_classroom_ids(user_id: str) -> Tuple[str, ...]:
+    docs = get_mongo_collection('classrooms').find(
+        {'homeroom_teacher_id': user_id}, {'_id': 1}
+    ).sort('full_name', 1)
+    return tuple(str(d['_id']) for d in docs)
+
+
+def _resolve_student_classroom_id(user_id: str) -> Optional[str]:
+    oid = to_object_id(user_id)
+    if not oid:
+        return None
+    user_doc = get_mongo_collection('users').find_one({'_id': oid}, {'classroom_id': 1})
+    classroom_id = (user_doc or {}).get('classroom_id')
+    return str(classroom_id) if classroom_id else None
+
+
+def resolve_user_context(user_id: str, role: str) -> UserContext:
+    """Resolve trực tiếp từ MongoDB (không qua cache)."""
+    if role == 'teacher':
+        return UserContext(user_id=user_id, role=role, homeroom_classroom_ids=_resolve_homeroom_classroom_ids(user_id))
+    if role == 'student':
+        return UserContext(user_id=user_id, role=role, student_classroom_id=_resolve_student_classroom_id(user_id))
+    return UserContext(user_id=user_id, role=role)
+
+
+def get_user_context(user) -> UserContext:
+    user_id = str(user.id)
+    role = getattr(user, 'role', 'student')
+    key = _cache_key(user_id)
+    ctx = cache.get(key)
+    if ctx is None or ctx.role != role:
+        ctx = resolve_user_context(user_id, role)
+        cache.set(key, ctx, _ttl())
+    return ctx
+
+
+def invalidate_user_context(*user_ids) -> None:
+    """
+    Làm mất hiệu lực cache ngữ cảnh của các user này ở mọi process (tăng version riêng từng user,
+    key cũ tự hết hạn theo TTL). Cache của user khác giữ nguyên.
+    """
+    bump_member_versions(_VERSION_NAME, user_ids)
+
+
+def invalidate_all_user_contexts() -> None:
+    """Thao tác hàng loạt: tăng version chung, cache ngữ cảnh của mọi user đều được tính lại."""
+    bump_version(_VERSION_NAME)
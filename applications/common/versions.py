@@ -0,0 +1,101 @@
+"""
+Bộ đếm version dùng chung giữa các process (gunicorn worker, lệnh quản trị), lưu trong MongoDB.
+
+Django cache mặc định (LocMemCache) là riêng từng process: tăng version trong cache chỉ có tác dụng ở
+worker đã xử lý request ghi. Các cache cần invalidation giữa mọi worker (UserContext, chỉ mục tra cứu
+học sinh) lấy version ở đây:
+
+    collection 'cache_versions': {_id: '<name>', version: n, members: {'<member>': m}}
+
+- bump_version(name): $inc atomic, process gọi thấy version mới ngay. Xóa luôn members: version chung
+  mới đã làm mất hiệu lực mọi key, nên map không phình mãi.
+- bump_member_versions(name, members): version riêng từng phần tử (vd. từng user) - chỉ key của
+  các phần tử này mất hiệu lực.
+- get_version(name) / get_member_version(name, member): mỗi process đọc lại toàn bộ collection
+  (vài document, 1 lệnh find) tối đa 1 lần / SHARED_VERSION_CHECK_SECONDS; process khác thấy thay đổi
+  chậm nhất sau khoảng đó.
+
+Version tách theo trường (tenant) vì collection nằm trong database của trường.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .mongo import get_mongo_collection
+from .tenancy import current_tenant
+
+
+VERSIONS_COLLECTION = 'cache_versions'
+DEFAULT_CHECK_SECONDS = 2.0
+
+_lock = threading.Lock()
+# tenant key -> (thời điểm đọc, {name: document version})
+_snapshots: Dict[str, Tuple[float, Dict[str, dict]]] = {}
+
+
+def _check_seconds() -> float:
+    return float(getattr(settings, 'SHARED_VERSION_CHECK_SECONDS', DEFAULT_CHECK_SECONDS))
+
+
+def _snapshot() -> Dict[str, dict]:
+    tenant = current_tenant().key
+    now = time.monotonic()
+    fetched = _snapshots.get(tenant)
+    if fetched is not None and now - fetched[0] < _check_seconds():
+        return fetched[1]
+    versions = {doc['_id']: doc for doc in get_mongo_collection(VERSIONS_COLLECTION).find({})}
+    with _lock:
+        _snapshots[tenant] = (now, versions)
+    return versions
+
+
+def get_version(name: str) -> int:
+    """Version hiện tại (0 khi chưa từng bump)."""
+    return int(_snapshot().get(name, {}).get('version') or 0)
+
+
+def get_member_version(name: str, member: str) -> int:
+    """Version riêng của 1 phần tử (0 khi chưa từng bump kể từ lần bump_version gần nhất)."""
+    return int((_snapshot().get(name, {}).get('members') or {}).get(member) or 0)
+
+
+def _remember(name: str, doc: dict) -> None:
+    tenant = current_tenant().key
+    with _lock:
+        fetched_at, versions = _snapshots.get(tenant, (time.monotonic(), {}))
+        _snapshots[tenant] = (fetched_at, {**versions, name: doc})
+
+
+def bump_version(name: str) -> int:
+    doc = get_mongo_collection(VERSIONS_COLLECTION).find_one_and_update(
+        {'_id': name},
+        {'$inc': {'version': 1}, '$unset': {'members': ''}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    _remember(name, doc)
+    return int(doc['version'])
+
+
+def bump_member_versions(name: str, members: Iterable) -> None:
+    """$inc version của các phần tử trong 1 lệnh (id dạng chuỗi, không chứa '.' / '$')."""
+    keys = sorted({str(m) for m in members if m})
+    if not keys:
+        return
+    doc = get_mongo_collection(VERSIONS_COLLECTION).find_one_and_update(
+        {'_id': name},
+        {'$inc': {f'members.{key}': 1 for key in keys}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    _remember(name, doc)
+
+
+def forget_local_versions() -> None:
+    """Bỏ snapshot của process: lần get_version() kế tiếp đọc lại từ MongoDB (đo request khi cache trống)."""
+    with _lock:
+        _snapshots.clear()
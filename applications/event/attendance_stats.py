@@ -0,0 +1,204 @@
+"""
+Thống kê nghỉ học toàn trường, tính vector hóa bằng NumPy / pandas.
+
+Đọc collection 'attendance' (xem attendance_store.py) cho mọi lớp trong khoảng ngày,
+dựng ma trận mã ngày học sinh × ngày (int8) rồi tính một lần cho cả trường:
+  - số buổi nghỉ có phép / không phép của từng học sinh
+  - tỉ lệ nghỉ theo lớp, theo khối, theo thứ trong tuần
+  - danh sách nghỉ học kéo dài (tỉ lệ buổi nghỉ >= ngưỡng)
+
+Ngày học: thứ 2 - thứ 7 trong khoảng (mỗi ngày 2 buổi sáng / chiều).
+Lớp-tháng có điểm danh nhưng chưa có bản gọn không được tính (missing_months); chạy backfill_attendance.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from applications.common.mongo import get_mongo_collection, get_users_collection
+
+from .attendance_store import ATTENDANCE_COLLECTION, EXCUSED, UNEXCUSED
+
+
+SESSIONS_PER_DAY = 2
+DEFAULT_CHRONIC_THRESHOLD = 0.1
+WEEKDAY_NAMES = ['T2', 'T3', 'T4', 'T5', 'T6', 'T7', 'CN']
+
+
+def school_days(start: date, end: date) -> List[date]:
+    days = []
+    current = start
+    while current <= end:
+        if current.weekday() < 6:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def _months(days: List[date]) -> List[str]:
+    return sorted({d.strftime('%Y-%m') for d in days})
+
+
+def _load_month_docs(classroom_ids: List[str], months: List[str]) -> Tuple[List[dict], List[dict]]:
+    """
+    Document lớp-tháng của cả trường: 1 truy vấn $in.
+
+    Không dựng lại bản gọn trong request. Lớp-tháng chưa có document: nếu events có điểm danh thì
+    là "chưa biết" (trả về trong missing, cần `manage.py backfill_attendance --month YYYY-MM`),
+    ngược lại cả lớp có mặt đủ. Trả về (docs, missing).
+    """
+    docs = list(get_mongo_collection(ATTENDANCE_COLLECTION).find(
+        {'month': {'$in': months}, 'classroom_id': {'$in': classroom_ids}},
+        {'classroom_id': 1, 'month': 1, 'students': 1},
+    ))
+    present = {(d['classroom_id'], d['month']) for d in docs}
+    absent_pairs = {(cid, month) for cid in classroom_ids for month in months} - present
+    if not absent_pairs:
+        return docs, []
+    rows = get_mongo_collection('events').aggregate([
+        {'$match': {
+            'classroom_id': {'$in': sorted({cid for cid, _ in absent_pairs})},
+            'date': {'$gte': f'{months[0]}-01', '$lte': f'{months[-1]}-31'},
+            'periods.attendance': {'$exists': True, '$ne': []},
+        }},
+        {'$group': {'_id': {'classroom_id': '$classroom_id', 'month': {'$substr': ['$date', 0, 7]}}}},
+    ])
+    missing = sorted(
+        (row['_id']['classroom_id'], row['_id']['month']) for row in rows
+        if (row['_id']['classroom_id'], row['_id']['month']) in absent_pairs
+    )
+    return docs, [{'classroom_id': cid, 'month': month} for cid, month in missing]
+
+
+def _code_matrix(docs: List[dict], row_of: Dict[str, int], days: List[date]) -> np.ndarray:
+    """Ma trận mã ngày (học sinh × ngày học); học sinh không có mặt trong row_of bị bỏ qua."""
+    matrix = np.zeros((len(row_of), len(days)), dtype=np.int8)
+    columns_by_month: Dict[str, tuple] = {}
+    for col, day in enumerate(days):
+        month_cols = columns_by_month.setdefault(day.strftime('%Y-%m'), ([], []))
+        month_cols[0].append(col)
+        month_cols[1].append(day.day - 1)
+
+    for doc in docs:
+        cols = columns_by_month.get(doc['month'])
+        if not cols:
+            continue
+        pairs = [
+            (row_of[sid], codes) for sid, codes in (doc.get('students') or {}).items()
+            if sid in row_of and isinstance(codes, list)
+        ]
+        if not pairs:
+            continue
+        width = max(len(codes) for _, codes in pairs)
+        block = np.zeros((len(pairs), max(width, max(cols[1]) + 1)), dtype=np.int8)
+        for idx, (_, codes) in enumerate(pairs):
+            block[idx, :len(codes)] = [int(c or 0) for c in codes]
+        rows = np.fromiter((row for row, _ in pairs), dtype=np.intp, count=len(pairs))
+        matrix[np.ix_(rows, cols[0])] = block[:, cols[1]]
+    return matrix
+
+
+def _rate(absent, possible):
+    return np.where(possible > 0, absent / np.maximum(possible, 1), 0.0).round(4)
+
+
+def attendance_report(start: date, end: date, grade=None, chronic_threshold: float = DEFAULT_CHRONIC_THRESHOLD) -> dict:
+    days = school_days(start, end)
+
+    classroom_query = {}
+    if grade not in (None, ''):
+        # grade có thể lưu dạng số hoặc chuỗi
+        values = [grade, int(grade)] if str(grade).isdigit() else [grade]
+        classroom_query['grade'] = {'$in': values}
+    classrooms = list(get_mongo_collection('classrooms').find(classroom_query, {'full_name': 1, 'name': 1, 'grade': 1}))
+    classroom_info = {
+        str(c['_id']): {'name': c.get('full_name') or c.get('name', ''), 'grade': c.get('grade', '')}
+        for c in classrooms
+    }
+    classroom_ids = list(classroom_info.keys())
+
+    students = list(get_users_collection().find(
+        {'role': 'student', 'classroom_id': {'$in': classroom_ids}},
+        {'full_name': 1, 'student_code': 1, 'classroom_id': 1},
+    )) if classroom_ids else []
+    row_of = {str(s['_id']): idx for idx, s in enumerate(students)}
+
+    report = {
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'school_days': len(days),
+        'student_count': len(students),
+        'chronic_threshold': chronic_threshold,
+    }
+    if not students or not days:
+        return {**report, 'totals': {'excused': 0, 'unexcused': 0, 'absent': 0, 'rate': 0.0},
+                'by_class': [], 'by_grade': [], 'by_weekday': [], 'chronic_absence': [], 'missing_months': []}
+
+    docs, missing = _load_month_docs(classroom_ids, _months(days))
+    report['missing_months'] = [
+        {**item, 'classroom_name': classroom_info[item['classroom_id']]['name']} for item in missing
+    ]
+    matrix = _code_matrix(docs, row_of, days)
+    morning, afternoon = np.divmod(matrix, 3)
+    excused_cells = (morning == EXCUSED).astype(np.int16) + (afternoon == EXCUSED)
+    unexcused_cells = (morning == UNEXCUSED).astype(np.int16) + (afternoon == UNEXCUSED)
+    absent_cells = excused_cells + unexcused_cells
+    possible = len(days) * SESSIONS_PER_DAY
+
+    frame = pd.DataFrame({
+        'student_id': list(row_of.keys()),
+        'full_name': [s.get('full_name', '') for s in students],
+        'student_code': [s.get('student_code', '') for s in students],
+        'classroom_id': [str(s.get('classroom_id') or '') for s in students],
+        'excused': excused_cells.sum(axis=1),
+        'unexcused': unexcused_cells.sum(axis=1),
+    })
+    frame['absent'] = frame['excused'] + frame['unexcused']
+    frame['rate'] = (frame['absent'] / possible).round(4)
+    frame['classroom_name'] = frame['classroom_id'].map(lambda cid: classroom_info[cid]['name'])
+    frame['grade'] = frame['classroom_id'].map(lambda cid: classroom_info[cid]['grade'])
+
+    def grouped(key: str) -> pd.DataFrame:
+        out = frame.groupby(key, sort=True).agg(
+            students=('student_id', 'size'), excused=('excused', 'sum'), unexcused=('unexcused', 'sum'), absent=('absent', 'sum'),
+        ).reset_index()
+        out['rate'] = _rate(out['absent'].to_numpy(), out['students'].to_numpy() * possible)
+        return out
+
+    by_class = grouped('classroom_id')
+    by_class.insert(1, 'classroom_name', by_class['classroom_id'].map(lambda cid: classroom_info[cid]['name']))
+    by_grade = grouped('grade')
+
+    weekdays = np.array([d.weekday() for d in days])
+    day_absent = absent_cells.sum(axis=0)
+    by_weekday = pd.DataFrame({'weekday': weekdays, 'absent': day_absent, 'days': 1}).groupby('weekday').sum().reset_index()
+    by_weekday['rate'] = _rate(by_weekday['absent'].to_numpy(), by_weekday['days'].to_numpy() * len(students) * SESSIONS_PER_DAY)
+    by_weekday.insert(1, 'name', by_weekday['weekday'].map(lambda w: WEEKDAY_NAMES[w]))
+
+    chronic = frame[frame['rate'] >= chronic_threshold].sort_values(['rate', 'unexcused'], ascending=False)
+    chronic = chronic[['student_id', 'student_code', 'full_name', 'classroom_id', 'classroom_name', 'excused', 'unexcused', 'absent', 'rate']]
+
+    total_absent = int(frame['absent'].sum())
+    return {
+        **report,
+        'totals': {
+            'excused': int(frame['excused'].sum()),
+            'unexcused': int(frame['unexcused'].sum()),
+            'absent': total_absent,
+            'rate': round(total_absent / (len(students) * possible), 4),
+        },
+        'by_class': _records(by_class),
+        'by_grade': _records(by_grade),
+        'by_weekday': _records(by_weekday),
+        'chronic_absence': _records(chronic),
+    }
+
+
+def _records(frame: pd.DataFrame) -> List[dict]:
+    """DataFrame -> list dict với kiểu Python thuần (JSON)."""
+    return [
+        {key: (value.item() if isinstance(value, np.generic) else value) for key, value in row.items()}
+        for row in frame.to_dict(orient='records')
+    ]
@@ -0,0 +1,220 @@
+"""
+Điểm danh gọn theo lớp-tháng trong collection 'attendance'.
+
+Nguồn ghi vẫn là periods.attendance của day-document trong 'events'; sau mỗi lần ghi,
+write path gọi sync_day(classroom_id, date) để cập nhật bản gọn:
+
+    {classroom_id, month: 'YYYY-MM', days: <số ngày trong tháng>,
+     students: {'<student_id>': [mã ngày 1, mã ngày 2, ...]}, updated_at}
+
+Mã 1 ngày = sáng * 3 + chiều, mỗi buổi: 0 = có mặt, 1 = nghỉ có phép (P), 2 = nghỉ không phép (K).
+Xuất Excel / thống kê nghỉ học chỉ đọc 1 document cho mỗi lớp-tháng.
+Dữ liệu cũ: `manage.py backfill_attendance`; request đọc không ghi bản gọn cho tháng chưa có document.
+"""
+
+import logging
+from calendar import monthrange
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from applications.common.mongo import get_mongo_collection
+from applications.common.read_routing import PRIMARY
+
+
+ATTENDANCE_COLLECTION = 'attendance'
+
+PRESENT, EXCUSED, UNEXCUSED = 0, 1, 2
+
+# event_type_key -> (buổi, trạng thái)
+SESSION_KEYS = {
+    'attendance_sp': ('morning', EXCUSED),
+    'attendance_sk': ('morning', UNEXCUSED),
+    'attendance_cp': ('afternoon', EXCUSED),
+    'attendance_ck': ('afternoon', UNEXCUSED),
+}
+# Mã cũ gộp cả ngày -> (sáng, chiều)
+COMBINED_KEYS = {
+    'attendance_spcp': (EXCUSED, EXCUSED),
+    'attendance_skck': (UNEXCUSED, UNEXCUSED),
+    'attendance_spck': (EXCUSED, UNEXCUSED),
+    'attendance_skcp': (UNEXCUSED, EXCUSED),
+}
+
+_LETTERS = {EXCUSED: 'p', UNEXCUSED: 'k'}
+
+logger = logging.getLogger(__name__)
+
+
+def _attendance_coll():
+    return get_mongo_collection(ATTENDANCE_COLLECTION)
+
+
+def encode_day(morning: int, afternoon: int) -> int:
+    return morning * 3 + afternoon
+
+
+def decode_day(code) -> Tuple[int, int]:
+    """(sáng, chiều) từ mã ngày."""
+    return divmod(int(code or 0), 3)
+
+
+def display_code(code) -> str:
+    """Ký hiệu trên sổ điểm danh: sp, ck, spcp, skcp, ... ('' nếu có mặt)."""
+    morning, afternoon = decode_day(code)
+    return (f's{_LETTERS[morning]}' if morning else '') + (f'c{_LETTERS[afternoon]}' if afternoon else '')
+
+
+def absence_counts(codes: Iterable) -> Tuple[int, int]:
+    """(số buổi nghỉ có phép, số buổi nghỉ không phép) của 1 dãy mã ngày."""
+    excused = unexcused = 0
+    for code in codes:
+        for session in decode_day(code):
+            if session == EXCUSED:
+                excused += 1
+            elif session == UNEXCUSED:
+                unexcused += 1
+    return excused, unexcused
+
+
+def day_codes(attendance_events) -> Dict[str, int]:
+    """{student_id: mã ngày} từ mảng periods.attendance của 1 day-document (bỏ học sinh có mặt)."""
+    sessions = {}
+    for ev in attendance_events or []:
+        if not isinstance(ev, dict):
+            continue
+        student_id = str(ev.get('student_id') or '')
+        key = ev.get('event_type_key') or ''
+        if not student_id:
+            continue
+        morning, afternoon = sessions.get(student_id, (PRESENT, PRESENT))
+        if key in COMBINED_KEYS:
+            morning, afternoon = COMBINED_KEYS[key]
+        elif key in SESSION_KEYS:
+            session, value = SESSION_KEYS[key]
+            if session == 'morning':
+                morning = value
+            else:
+                afternoon = value
+        else:
+            continue
+        sessions[student_id] = (morning, afternoon)
+    return {sid: encode_day(m, a) for sid, (m, a) in sessions.items() if m or a}
+
+
+def month_key(date: str) -> str:
+    return date[:7]
+
+
+def days_in_month(month: str) -> int:
+    year, mon = (int(part) for part in month.split('-'))
+    return monthrange(year, mon)[1]
+
+
+def put_day_codes(students: Dict[str, List[int]], days: int, day_index: int, codes: Dict[str, int]) -> None:
+    for student_id, code in codes.items():
+        row = students.setdefault(student_id, [PRESENT] * days)
+        row[day_index] = code
+
+
+def build_month(classroom_id: str, month: str) -> Dict[str, List[int]]:
+    """Dựng lại bảng mã của 1 lớp-tháng từ periods.attendance trong 'events'."""
+    days = days_in_month(month)
+    students = {}
+    # Luôn đọc primary: bản dựng lại được ghi đè (replace_one), không được dựng từ secondary đang trễ
+    cursor = get_mongo_collection('events', read=PRIMARY).find(
+        {
+            'classroom_id': classroom_id,
+            'date': {'$gte': f'{month}-01', '$lte': f'{month}-{days:02d}'},
+            'periods.attendance': {'$exists': True, '$ne': []},
+        },
+        {'date': 1, 'periods.attendance': 1},
+    )
+    for doc in cursor:
+        put_day_codes(students, days, int(doc['date'][8:10]) - 1, day_codes((doc.get('periods') or {}).get('attendance')))
+    return students
+
+
+def month_document(classroom_id: str, month: str, students: Dict[str, List[int]]) -> dict:
+    return {
+        'classroom_id': classroom_id,
+        'month': month,
+        'days': days_in_month(month),
+        'students': students,
+        'updated_at': datetime.now().isoformat(),
+    }
+
+
+def load_month(classroom_id: str, year: int, month: int) -> Tuple[Dict[str, List[int]], bool]:
+    """
+    {student_id: [mã ngày]} của 1 lớp-tháng - 1 lần đọc có index. Trả về (students, missing).
+
+    Chỉ đọc: tháng chưa có document thì dựng trong bộ nhớ từ events (không ghi lại) và missing = True
+    nếu events có điểm danh - như _load_month_docs, việc dựng bản gọn để cho `manage.py backfill_attendance`.
+    """
+    key = f'{year}-{month:02d}'
+    doc = _attendance_coll().find_one({'classroom_id': classroom_id, 'month': key}, {'students': 1})
+    if doc is not None:
+        return doc.get('students') or {}, False
+    students = build_month(classroom_id, key)
+    return students, bool(students)
+
+
+def _day_attendance(classroom_id: str, date: str):
+    """periods.attendance hiện tại của ngày-lớp (primary: vừa ghi xong)."""
+    doc = get_mongo_collection('events', read=PRIMARY).find_one(
+        {'date': date, 'classroom_id': classroom_id}, {'periods.attendance': 1}
+    )
+    return ((doc or {}).get('periods') or {}).get('attendance')
+
+
+def _sync_day(classroom_id: str, date: str) -> None:
+    month = month_key(date)
+    days = days_in_month(month)
+    day_index = int(date[8:10]) - 1
+    coll = _attendance_coll()
+    doc_filter = {'classroom_id': classroom_id, 'month': month}
+    doc = coll.find_one(doc_filter, {'students': 1})
+    if doc is None:
+        # Tháng chưa có bản gọn: dựng cả tháng từ events (đã chứa lần ghi hiện tại).
+        # $setOnInsert: không ghi đè bản do request khác vừa tạo
+        try:
+            result = coll.update_one(
+                doc_filter, {'$setOnInsert': month_document(classroom_id, month, build_month(classroom_id, month))},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            result = None
+        if result is not None and result.upserted_id is not None:
+            return
+        doc = coll.find_one(doc_filter, {'students': 1}) or {}
+
+    # Đọc lại từ events thay vì tin dữ liệu của nơi gọi: lần ghi cũ hơn không ghi đè được lần mới hơn
+    codes = day_codes(_day_attendance(classroom_id, date))
+    known = set((doc.get('students') or {}).keys())
+    new_ids = [sid for sid in codes if sid not in known]
+    if new_ids:
+        # Học sinh chưa có dòng: tạo dòng toàn 'có mặt' nếu vẫn chưa có (không ghi đè dòng của ngày khác)
+        coll.update_one(doc_filter, [{'$set': {
+            f'students.{sid}': {'$ifNull': [f'$students.{sid}', {'$literal': [PRESENT] * days}]} for sid in new_ids
+        }}])
+    # Chỉ đặt phần tử của ngày này trong từng dòng
+    updates = {f'students.{sid}.{day_index}': codes.get(sid, PRESENT) for sid in known | set(codes)}
+    if updates:
+        updates['updated_at'] = datetime.now().isoformat()
+        coll.update_one(doc_filter, {'$set': updates})
+
+
+def sync_day(classroom_id, date) -> None:
+    """
+    Cập nhật bản gọn sau khi periods.attendance của 1 ngày-lớp được ghi (không làm hỏng request nếu lỗi).
+
+    Mã của ngày được đọc lại từ 'events', chỉ các phần tử students.<id>.<ngày> được ghi.
+    """
+    if not classroom_id or not date or len(str(date)) < 10:
+        return
+    try:
+        _sync_day(str(classroom_id), str(date)[:10])
+    except Exception:
+        logger.exception('attendance sync_day error (%s, %s)', classroom_id, date)
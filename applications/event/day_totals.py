@@ -0,0 +1,123 @@
+"""
+Tổng điểm tính sẵn cho day-document trong collection 'events'.
+
+Mỗi document ngày-lớp mang thêm các field:
+    period_totals: {'<period>': {'positive_points', 'negative_points', 'total_points', 'event_count'}}
+    day_totals:    {'positive_points', 'negative_points', 'total_points', 'event_count'}  (cả ngày)
+    period_kinds:  loại tiết đang có event - 'regular' (tiết học), 'attendance',
+                   'violation_sudden', 'bonus_sudden', 'sudden'
+
+- Khi ghi cả ngày / cả tiết: tính lại bằng day_summary().
+- Khi thêm / sửa / xóa 1 event: cập nhật bằng $inc với totals_inc().
+"""
+
+from typing import Dict, Optional
+
+from bson import ObjectId
+
+
+TOTAL_FIELDS = ('positive_points', 'negative_points', 'total_points', 'event_count')
+
+REGULAR_KIND = 'regular'
+SPECIAL_PERIOD_KINDS = ('attendance', 'violation_sudden', 'bonus_sudden', 'sudden')
+
+
+def period_kind(period_key) -> str:
+    """Tiết học thường -> 'regular'; tiết đặc biệt giữ nguyên key."""
+    key = str(period_key)
+    return key if key in SPECIAL_PERIOD_KINDS else REGULAR_KIND
+
+
+def event_points(event: dict) -> int:
+    try:
+        return int(event.get('points') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def new_event_id() -> str:
+    """Id ổn định (server cấp) cho 1 event nhúng trong periods."""
+    return str(ObjectId())
+
+
+def ensure_event_ids(periods: dict) -> dict:
+    """Gán event_id cho các event chưa có (sửa trực tiếp trên periods)."""
+    if not isinstance(periods, dict):
+        return periods
+    for period_events in periods.values():
+        if not isinstance(period_events, list):
+            continue
+        for ev in period_events:
+            if isinstance(ev, dict) and not ev.get('event_id'):
+                ev['event_id'] = new_event_id()
+    return periods
+
+
+def _empty_totals() -> Dict[str, int]:
+    return {field: 0 for field in TOTAL_FIELDS}
+
+
+def compute_period_totals(periods: dict) -> Dict[str, Dict[str, int]]:
+    """Tính period_totals từ toàn bộ periods của document."""
+    out = {}
+    if not isinstance(periods, dict):
+        return out
+    for period_key, period_events in periods.items():
+        if not isinstance(period_events, list):
+            continue
+        totals = _empty_totals()
+        for ev in period_events:
+            points = event_points(ev)
+            if points > 0:
+                totals['positive_points'] += points
+            elif points < 0:
+                totals['negative_points'] += abs(points)
+            totals['total_points'] += points
+            totals['event_count'] += 1
+        out[str(period_key)] = totals
+    return out
+
+
+def day_summary(periods: dict) -> Dict[str, object]:
+    """period_totals + day_totals + period_kinds cho toàn bộ periods (dùng với $set)."""
+    period_totals = compute_period_totals(periods)
+    day_totals = _empty_totals()
+    kinds = set()
+    for period_key, totals in period_totals.items():
+        for field in TOTAL_FIELDS:
+            day_totals[field] += totals[field]
+        if totals['event_count']:
+            kinds.add(period_kind(period_key))
+    return {
+        'period_totals': period_totals,
+        'day_totals': day_totals,
+        'period_kinds': sorted(kinds),
+    }
+
+
+def totals_inc(period_key, old_points: Optional[int] = None, new_points: Optional[int] = None) -> Dict[str, int]:
+    """
+    Trả về map $inc cho period_totals.<period>, day_totals và total_events.
+
+    old_points=None  -> thêm event mới
+    new_points=None  -> xóa event
+    cả hai khác None -> sửa điểm của event
+    """
+    def split(points):
+        if points is None:
+            return 0, 0, 0, 0
+        return max(points, 0), max(-points, 0), points, 1
+
+    old = split(old_points)
+    new = split(new_points)
+    prefix = f'period_totals.{period_key}'
+    inc = {}
+    for idx, field in enumerate(TOTAL_FIELDS):
+        delta = new[idx] - old[idx]
+        if delta:
+            inc[f'{prefix}.{field}'] = delta
+            inc[f'day_totals.{field}'] = delta
+    count_delta = new[3] - old[3]
+    if count_delta:
+        inc['total_events'] = count_delta
+    return inc
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from pymongo import ReplaceOne
+
+from applications.common.mongo import get_mongo_collection
+from applications.event.attendance_store import (
+    ATTENDANCE_COLLECTION, put_day_codes, day_codes, days_in_month, month_document, month_key,
+)
+
+
+class Command(BaseCommand):
+    help = "Dựng collection 'attendance' (mã điểm danh gọn theo lớp-tháng) từ periods.attendance trong events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Số document lớp-tháng mỗi lần bulk_write')
+        parser.add_argument('--month', help='Chỉ dựng 1 tháng (YYYY-MM)')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        query = {'periods.attendance': {'$exists': True, '$ne': []}}
+        if options['month']:
+            month = options['month']
+            query['date'] = {'$gte': f'{month}-01', '$lte': f'{month}-{days_in_month(month):02d}'}
+
+        attendance_coll = get_mongo_collection(ATTENDANCE_COLLECTION)
+        self.written = 0
+        ops = []
+        current, students = None, {}
+        # Sort theo lớp rồi ngày (index classroom_date_unique) để mỗi lớp-tháng nằm liền nhau
+        cursor = get_mongo_collection('events').find(
+            query, {'classroom_id': 1, 'date': 1, 'periods.attendance': 1}, batch_size=1000
+        ).sort([('classroom_id', 1), ('date', -1)])
+        for doc in cursor:
+            if not doc.get('classroom_id') or len(doc.get('date') or '') < 10:
+                continue
+            group = (str(doc['classroom_id']), month_key(doc['date']))
+            if group != current:
+                if current:
+                    ops.append(self._replace(current, students))
+                current, students = group, {}
+                if len(ops) >= batch_size:
+                    self._flush(attendance_coll, ops)
+                    ops = []
+            put_day_codes(students, days_in_month(group[1]), int(doc['date'][8:10]) - 1,
+                       day_codes((doc.get('periods') or {}).get('attendance')))
+        if current:
+            ops.append(self._replace(current, students))
+        self._flush(attendance_coll, ops)
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {self.written} class-month documents written."))
+
+    def _replace(self, group, students):
+        classroom_id, month = group
+        return ReplaceOne(
+            {'classroom_id': classroom_id, 'month': month},
+            month_document(classroom_id, month, students),
+            upsert=True,
+        )
+
+    def _flush(self, coll, ops):
+        if not ops:
+            return
+        result = coll.bulk_write(ops, ordered=False)
+        self.written += result.upserted_count + result.modified_count
+        self.stdout.write(f"[attendance] {self.written} documents")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from applications.event.pending_counters import recount_pending
+
+
+class Command(BaseCommand):
+    help = "Đếm lại bộ đếm day-document chờ duyệt (event_pending_counters) từ collection events"
+
+    def handle(self, *args, **options):
+        counts = recount_pending()
+        for classroom_id, count in sorted(counts.items()):
+            self.stdout.write(f"{classroom_id}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Done. {len(counts)} classrooms, {sum(counts.values())} pending."))
@@ -6,21 +6,43 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from applications.permissions import IsAdminOrTeacherOrDormSupervisor
-from datetime import datetime, timedelta
-import uuid
+from applications.permissions import IsAdminUser
+from datetime import datetime
+import copy
 import logging
 
 from applications.common.mongo import get_mongo_collection, to_plain
+from applications.common.query_budget import query_budget
+from applications.common.read_routing import secondary_reads
+from applications.common.tenancy import current_tenant
+from applications.common.ids import id_filter, to_object_ids
 from applications.common.responses import ok, created, bad_request, not_found, server_error
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from applications.common.display_names import stamp_display_names, stamp_display_names_many, propagate_event_type_name
+from .day_totals import (
+    REGULAR_KIND, ensure_event_ids, day_summary, totals_inc, new_event_id, event_points, period_kind,
+)
+from .pending_counters import record_approval_transition, recount_pending, get_pending_counts
+from . import attendance_store
 
 logger = logging.getLogger(__name__)
 
+
+def _day_document_conflict():
+    """Index unique (classroom_id, date): request khác vừa tạo day-document của cùng ngày-lớp."""
+    return Response(
+        {'error': 'Sự kiện của ngày-lớp này vừa được tạo bởi request khác, vui lòng tải lại và thử lại'},
+        status=status.HTTP_409_CONFLICT,
+    )
+
 # =============================================================================
 # EVENT TYPES - MongoDB
 # =============================================================================
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([])  # Public API
 def mongo_event_types_list(request):
@@ -59,12 +81,12 @@ def mongo_event_types_list(request):
         logger.exception('mongo_event_types_list error')
         return server_error(exc)
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([])  # Public API
 def mongo_event_types_template(request):
     """Trả nguyên vẹn 1 template (object) từ collection 'event_template'."""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
         tmpl_coll = get_mongo_collection('event_template')
         doc = tmpl_coll.find_one({})
         if not doc:
@@ -74,6 +96,7 @@ def mongo_event_types_template(request):
         logger.exception('mongo_event_types_template error')
         return server_error(exc)
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_event_types_detail(request, pk):
@@ -81,11 +104,8 @@ def mongo_event_types_detail(request, pk):
     try:
         coll = get_mongo_collection('event_types')
         
-        # Tìm theo ID (có thể là string hoặc ObjectId)
-        try:
-            doc = coll.find_one({'_id': ObjectId(pk)})
-        except:
-            doc = coll.find_one({'id': pk})
+        doc_filter = id_filter(pk)
+        doc = coll.find_one(doc_filter) if doc_filter else None
         
         if not doc:
             return not_found('Loại sự kiện không tồn tại')
@@ -96,6 +116,7 @@ def mongo_event_types_detail(request, pk):
         logger.exception('mongo_event_types_detail error')
         return server_error(exc)
 
+@query_budget(3)
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def mongo_event_types_update(request, pk):
@@ -104,10 +125,8 @@ def mongo_event_types_update(request, pk):
         coll = get_mongo_collection('event_types')
         
         # Tìm theo ID
-        try:
-            doc = coll.find_one({'_id': ObjectId(pk)})
-        except:
-            doc = coll.find_one({'id': pk})
+        doc_filter = id_filter(pk)
+        doc = coll.find_one(doc_filter) if doc_filter else None
         
         if not doc:
             return Response({'detail': 'Loại sự kiện không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
@@ -116,10 +135,12 @@ def mongo_event_types_update(request, pk):
         update_data = request.data.copy()
         update_data['updated_at'] = datetime.now().isoformat()
         
-        try:
-            coll.update_one({'_id': ObjectId(pk)}, {'$set': update_data})
-        except:
-            coll.update_one({'id': pk}, {'$set': update_data})
+        coll.update_one({'_id': doc['_id']}, {'$set': update_data})
+        
+        new_name = update_data.get('name')
+        if new_name is not None and new_name != doc.get('name'):
+            # Đổi tên: cập nhật event_type_name đã ghi sẵn trên các event
+            propagate_event_type_name(doc['_id'], update_data.get('key', doc.get('key')), new_name)
         
         return ok({'message': 'Cập nhật loại sự kiện thành công'})
         
@@ -127,6 +148,7 @@ def mongo_event_types_update(request, pk):
         logger.exception('mongo_event_types_update error')
         return server_error(exc)
 
+@query_budget(2)
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def mongo_event_types_delete(request, pk):
@@ -135,12 +157,10 @@ def mongo_event_types_delete(request, pk):
         coll = get_mongo_collection('event_types')
         
         # Tìm và xóa
-        try:
-            result = coll.delete_one({'_id': ObjectId(pk)})
-        except:
-            result = coll.delete_one({'id': pk})
+        doc_filter = id_filter(pk)
+        result = coll.delete_one(doc_filter) if doc_filter else None
         
-        if result.deleted_count == 0:
+        if not result or result.deleted_count == 0:
             return not_found('Loại sự kiện không tồn tại')
         
         return ok({'message': 'Xóa loại sự kiện thành công'})
@@ -153,6 +173,7 @@ def mongo_event_types_delete(request, pk):
 # EVENTS - MongoDB (Optimized for daily storage)
 # =============================================================================
 
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_events_optimized_list(request):
@@ -175,7 +196,7 @@ def mongo_events_optimized_list(request):
         query = {}
         
         # Filter theo role
-        logger.info(f"User role: {user_role}, User ID: {user.id}")
+        logger.debug("events list: role=%s user=%s", user_role, user.id)
 
         if classroom_id:
             query['classroom_id'] = classroom_id
@@ -184,15 +205,13 @@ def mongo_events_optimized_list(request):
 
         if user_role == 'teacher':
             # Teacher chỉ xem events của lớp mình chủ nhiệm
-            classrooms_coll = get_mongo_collection('classrooms')
-            teacher_classrooms = list(classrooms_coll.find({'homeroom_teacher_id': str(user.id)}))
-            teacher_classroom_ids = [str(c['_id']) for c in teacher_classrooms]
-            logger.info(f"Teacher classrooms found: {teacher_classroom_ids}")
+            teacher_classroom_ids = list(user.context.homeroom_classroom_ids)
+            logger.debug("events list: teacher homeroom classrooms %s", teacher_classroom_ids)
             if teacher_classroom_ids:
                 query['classroom_id'] = {'$in': teacher_classroom_ids}
             else:
                 # Nếu teacher không có lớp chủ nhiệm, trả về empty
-                logger.info("Teacher has no homeroom classes, returning empty")
+                logger.debug("events list: teacher has no homeroom classes, returning empty")
                 return Response({
                     'results': [],
                     'count': 0,
@@ -204,33 +223,14 @@ def mongo_events_optimized_list(request):
                 }, status=status.HTTP_200_OK)
         elif user_role == 'student':
             # Student chỉ xem events của lớp mình
-            # Lấy classroom_id trực tiếp từ user document trong collection users
-            users_coll = get_mongo_collection('users')
-            try:
-                user_doc = users_coll.find_one({'_id': ObjectId(user.id)})
-            except:
-                user_doc = users_coll.find_one({'id': str(user.id)})
-            
-            if not user_doc:
-                logger.info("Student user not found, returning empty")
-                return Response({
-                    'results': [],
-                    'count': 0,
-                    'page': page,
-                    'page_size': page_size,
-                    'total_pages': 0,
-                    'next': None,
-                    'previous': None
-                }, status=status.HTTP_200_OK)
-            
-            student_classroom_id = user_doc.get('classroom_id')
-            logger.info(f"Student classroom_id from user doc: {student_classroom_id}")
+            student_classroom_id = user.context.student_classroom_id
+            logger.debug("events list: student classroom_id %s", student_classroom_id)
             
             if student_classroom_id:
                 query['classroom_id'] = student_classroom_id
             else:
                 # Nếu student không có lớp, trả về empty
-                logger.info("Student has no classroom_id, returning empty")
+                logger.debug("events list: student has no classroom_id, returning empty")
                 return Response({
                     'results': [],
                     'count': 0,
@@ -242,62 +242,41 @@ def mongo_events_optimized_list(request):
                 }, status=status.HTTP_200_OK)
         # Admin xem tất cả (không filter)
         
-        logger.info(f"Final query: {query}")
+        # Lọc theo loại tiết bằng field period_kinds (có index), phân trang trực tiếp trên DB:
+        #   include_sudden -> chỉ periods["violation_sudden"]
+        #   include_bonus  -> chỉ periods["bonus_sudden"]
+        #   mặc định       -> hoạt động trong ngày (bỏ attendance / violation_sudden / bonus_sudden / sudden)
+        if include_sudden:
+            kind = 'violation_sudden'
+        elif include_bonus:
+            kind = 'bonus_sudden'
+        else:
+            kind = REGULAR_KIND
+        query['period_kinds'] = kind
+
+        logger.debug("events list query: %s", query)
 
-        # Get all documents matching query (không paginate ngay vì cần filter trước)
-        # Để tối ưu, ta vẫn có thể paginate nhưng sẽ phải load nhiều hơn để đảm bảo có đủ documents sau filter
-        # Tạm thời load nhiều hơn một chút để đảm bảo có đủ kết quả sau filter
-        # Calculate skip
         skip = (page - 1) * page_size
-        # Load thêm một số documents để đảm bảo sau khi filter vẫn có đủ page_size documents
-        load_limit = page_size * 3  # Load gấp 3 lần để đảm bảo có đủ sau filter
-        
-        docs = list(coll.find(query).sort('date', -1).skip(skip).limit(load_limit))
+        total = coll.count_documents(query)
+        docs = list(coll.find(query).sort('date', -1).skip(skip).limit(page_size))
         
         out = []
         for d in docs:
             t = to_plain(d)
             t['created_at'] = t.get('created_at') or ''
             t['updated_at'] = t.get('updated_at') or t['created_at']
-            
-            # Loại bỏ period "attendance", "violation_sudden", "bonus_sudden" khỏi hoạt động trong ngày
-            # Trừ khi include_sudden=True (để hiển thị trang vi phạm đột xuất) hoặc include_bonus=True (để hiển thị trang điểm cộng)
-            periods = t.get('periods', {})
-            if isinstance(periods, dict):
-                if include_sudden:
-                    # Chỉ hiển thị periods["violation_sudden"], loại bỏ các periods khác
-                    filtered_periods = {k: v for k, v in periods.items() if k == 'violation_sudden'}
-                elif include_bonus:
-                    # Chỉ hiển thị periods["bonus_sudden"], loại bỏ các periods khác
-                    filtered_periods = {k: v for k, v in periods.items() if k == 'bonus_sudden'}
-                else:
-                    # Loại bỏ period "attendance", "violation_sudden", "bonus_sudden" (và "sudden" cho backward compatibility) khỏi hoạt động trong ngày
-                    filtered_periods = {k: v for k, v in periods.items() if k not in ['attendance', 'violation_sudden', 'bonus_sudden', 'sudden']}
-                
-                # Chỉ thêm document vào kết quả nếu còn periods sau khi filter
-                if filtered_periods:
-                    t['periods'] = filtered_periods
-                    out.append(t)
-                    # Dừng khi đã có đủ page_size documents
-                    if len(out) >= page_size:
-                        break
-        
-        # Count tổng số documents có events sau khi filter
-        # Để chính xác, ta cần đếm tất cả documents (không paginate)
-        # Nhưng điều này tốn kém, nên ta sẽ estimate dựa trên tỷ lệ
-        # Hoặc đơn giản hơn: chỉ trả về count của page hiện tại
-        filtered_count = len(out)
+            # Chỉ giữ các tiết thuộc loại đang xem
+            periods = t.get('periods') or {}
+            t['periods'] = {k: v for k, v in periods.items() if period_kind(k) == kind}
+            out.append(t)
         
         # Build pagination URLs
         base_url = request.build_absolute_uri().split('?')[0]
         params = request.GET.copy()
-        
-        # Estimate total pages dựa trên tỷ lệ filtered/total trong page này
-        # Nếu có ít hơn page_size documents sau filter, có thể đã hết
-        has_more = len(docs) == load_limit and filtered_count >= page_size
+        total_pages = (total + page_size - 1) // page_size if page_size else 0
         
         next_url = None
-        if has_more:
+        if page < total_pages:
             params['page'] = page + 1
             next_url = f"{base_url}?{params.urlencode()}"
         
@@ -308,10 +287,10 @@ def mongo_events_optimized_list(request):
         
         return Response({
             'results': out,
-            'count': filtered_count,  # Count của page hiện tại sau filter
+            'count': total,
             'page': page,
             'page_size': page_size,
-            'total_pages': 0 if filtered_count == 0 else (page + (1 if has_more else 0)),  # Estimate
+            'total_pages': total_pages,
             'next': next_url,
             'previous': previous_url
         }, status=status.HTTP_200_OK)
@@ -320,13 +299,12 @@ def mongo_events_optimized_list(request):
         logger.exception('mongo_events_optimized_list error')
         return server_error(exc)
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_events_optimized_detail(request):
     """Lấy chi tiết events theo ID hoặc date + classroom_id (trả về 1 object)."""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
         
         event_id = request.query_params.get('id')
         date = request.query_params.get('date')
@@ -357,72 +335,19 @@ def mongo_events_optimized_detail(request):
         
         t = to_plain(d)
         
-        # Enrich periods with student_name and event_type_name
-        from bson import ObjectId
-        students_coll = get_mongo_collection('students')
-        event_types_coll = get_mongo_collection('event_types')
-        
-        # Collect all student IDs and event type keys from periods
-        student_ids = set()
-        event_type_keys = set()
-        periods = t.get('periods', {})
-        
-        for period_events in periods.values():
-            for event in period_events:
-                if event.get('student_id'):
-                    student_ids.add(event['student_id'])
-                if event.get('event_type_key'):
-                    event_type_keys.add(event['event_type_key'])
-        
-        # Batch lookup students
-        student_map = {}
-        if student_ids:
-            object_ids = []
-            for sid in student_ids:
-                try:
-                    object_ids.append(ObjectId(sid))
-                except Exception:
-                    pass
-            
-            for sd in students_coll.find({'_id': {'$in': object_ids}}):
-                student_map[str(sd.get('_id'))] = (
-                    sd.get('user', {}).get('full_name') or
-                    (f"{sd.get('user', {}).get('first_name','')} {sd.get('user', {}).get('last_name','')}".strip())
-                )
-        
-        # Batch lookup event types
-        type_map = {}
-        if event_type_keys:
-            for et in event_types_coll.find({'key': {'$in': list(event_type_keys)}}):
-                type_map[et.get('key')] = et.get('name')
-        
-        for period_num, period_events in periods.items():
-            for event in period_events:
-                # Add student_name
-                if event.get('student_id') and event['student_id'] in student_map:
-                    event['student_name'] = student_map[event['student_id']]
-                
-                # Add event_type_name
-                event_type_key = event.get('event_type_key')
-                if event_type_key:
-                    if event_type_key in type_map:
-                        event['event_type_name'] = type_map[event_type_key]
-                    elif event_type_key == 'custom_bonus_point':
-                        # Điểm cộng đột xuất: sử dụng description làm tên nếu không có trong event_types
-                        event['event_type_name'] = event.get('description', 'Điểm cộng đột xuất')
+        # Tên học sinh / loại sự kiện đã ghi sẵn trên từng event; chỉ bổ sung cho dữ liệu cũ
+        stamp_display_names(t.get('periods', {}), only_missing=True)
         return ok(t)
     except Exception as exc:
         logging.getLogger(__name__).exception('mongo_events_optimized_detail error')
         return server_error(exc)
 
+@query_budget(11)  # 1 ngày-lớp; điểm danh: + 3 lệnh sync_day
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_events_optimized_create(request):
     """Tạo events tối ưu hóa cho 7 tiết học mỗi ngày"""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
-        from datetime import datetime
         
         user = request.user
         events_data = request.data.get('events', [])
@@ -455,17 +380,7 @@ def mongo_events_optimized_create(request):
         # Lấy thông tin học sinh (không cần kiểm tra quyền)
         student_classroom_id = None
         if user.role == 'student':
-            # Lấy classroom_id trực tiếp từ user document trong collection users
-            users_coll = get_mongo_collection('users')
-            try:
-                user_doc = users_coll.find_one({'_id': ObjectId(user.id)})
-            except:
-                user_doc = users_coll.find_one({'id': str(user.id)})
-            
-            if not user_doc:
-                return not_found('Không tìm thấy thông tin học sinh')
-            
-            student_classroom_id = user_doc.get('classroom_id')
+            student_classroom_id = user.context.student_classroom_id
             if not student_classroom_id:
                 return bad_request('Học sinh chưa được phân lớp')
         
@@ -590,6 +505,8 @@ def mongo_events_optimized_create(request):
         
         for key, day_data in events_by_date_class.items():
             # Tạo document cho mỗi ngày-lớp
+            ensure_event_ids(day_data['periods'])
+            stamp_display_names(day_data['periods'])
             total_events = sum(len(period_events) for period_events in day_data['periods'].values())
             
             # Kiểm tra xem có điểm cộng đột xuất hoặc vi phạm đột xuất không
@@ -614,6 +531,7 @@ def mongo_events_optimized_create(request):
                 'classroom_id': day_data['classroom_id'],
                 'periods': day_data['periods'],
                 'total_events': total_events,
+                **day_summary(day_data['periods']),
                 'created_by': str(user.id),
                 'created_by_name': user.full_name or f"{user.first_name} {user.last_name}".strip(),
                 'created_at': datetime.now().isoformat(),
@@ -662,23 +580,28 @@ def mongo_events_optimized_create(request):
                                 key = (student_id, session) if session else (student_id,)
                                 event_map[key] = ev
                             
-                            # Thêm/thay thế events mới
+                            # Thêm/thay thế events mới (giữ nguyên event_id của event bị thay thế)
                             for new_ev in new_events:
                                 student_id = str(new_ev.get('student_id') or new_ev.get('student') or '')
                                 session = new_ev.get('session', '')
                                 key = (student_id, session) if session else (student_id,)
+                                if key in event_map and event_map[key].get('event_id'):
+                                    new_ev['event_id'] = event_map[key]['event_id']
                                 event_map[key] = new_ev
                             
                             # Chuyển lại thành list
                             merged_periods[period_key] = list(event_map.values())
                 
                 # Tính lại total_events sau khi merge
+                ensure_event_ids(merged_periods)
+                stamp_display_names(merged_periods)
                 total_events = sum(len(period_events) for period_events in merged_periods.values())
                 
                 # Cập nhật document hiện có
                 update_data = {
                     'periods': merged_periods,
                     'total_events': total_events,
+                    **day_summary(merged_periods),
                     'updated_at': datetime.now().isoformat(),
                 }
                 
@@ -699,18 +622,30 @@ def mongo_events_optimized_create(request):
                         'approved_at': None,
                     })
                 
-                events_coll.update_one(
+                # Trạng thái cũ lấy từ chính lần ghi (BEFORE), không từ lần đọc trước đó
+                before = events_coll.find_one_and_update(
                     {'_id': existing['_id']},
-                    {'$set': update_data}
+                    {'$set': update_data},
+                    projection={'approval_status': 1},
+                    return_document=ReturnDocument.BEFORE,
                 )
+                if before is not None:
+                    record_approval_transition(
+                        day_data['classroom_id'],
+                        before.get('approval_status'),
+                        update_data.get('approval_status', before.get('approval_status')),
+                    )
                 day_doc['_id'] = existing['_id']
                 day_doc['periods'] = merged_periods
                 day_doc['total_events'] = total_events
             else:
                 # Tạo document mới
                 result = events_coll.insert_one(day_doc)
+                record_approval_transition(day_data['classroom_id'], None, approval_status)
                 day_doc['_id'] = result.inserted_id
             
+            if 'attendance' in day_data['periods']:
+                attendance_store.sync_day(day_data['classroom_id'], day_data['date'])
             created_events.append(to_plain(day_doc))
         
         return created({
@@ -719,18 +654,39 @@ def mongo_events_optimized_create(request):
             'events': created_events
         })
         
+    except DuplicateKeyError:
+        return _day_document_conflict()
     except Exception as exc:
         logger.exception('mongo_events_optimized_create error')
         return server_error(exc)
 
+def _event_types_for(events):
+    """
+    Loại sự kiện cần tra cho 1 payload (event chỉ có key hoặc chỉ có id): 1 truy vấn $in
+    thay vì 1 find_one mỗi event. Trả về ({key: doc}, {id: doc}).
+    """
+    keys, ids = set(), []
+    for ev in events or []:
+        if not isinstance(ev, dict):
+            continue
+        et_id, et_key = ev.get('event_type'), ev.get('event_type_key')
+        if not et_id and et_key and et_key != 'custom_bonus_point':
+            keys.add(et_key)
+        elif et_id and not et_key:
+            ids.append(et_id)
+    clauses = ([{'key': {'$in': sorted(keys)}}] if keys else []) + ([{'_id': {'$in': to_object_ids(ids)}}] if ids else [])
+    if not clauses:
+        return {}, {}
+    docs = list(get_mongo_collection('event_types').find({'$or': clauses}, {'key': 1, 'default_points': 1}))
+    return {d.get('key'): d for d in docs}, {str(d['_id']): d for d in docs}
+
+
+@query_budget(9)  # điểm danh: + 3 lệnh sync_day
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def mongo_events_optimized_replace(request):
     """Thay thế tất cả events cho một ngày-lớp cụ thể"""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
-        from datetime import datetime
         
         user = request.user
         classroom_id = request.data.get('classroom_id') or request.data.get('classroom')
@@ -761,13 +717,7 @@ def mongo_events_optimized_replace(request):
         
         # Tự động lấy lớp của học sinh nếu là student
         if user.role == 'student':
-            students_coll = get_mongo_collection('students')
-            student_doc = students_coll.find_one({'user.id': str(user.id)})
-            
-            if not student_doc:
-                return not_found('Không tìm thấy thông tin học sinh')
-            
-            student_classroom_id = student_doc.get('classroom', {}).get('id')
+            student_classroom_id = user.context.student_classroom_id
             if not student_classroom_id:
                 return bad_request('Học sinh chưa được phân lớp')
             
@@ -777,7 +727,10 @@ def mongo_events_optimized_replace(request):
         
         # Build periods structure (accept both 'periods' and 'events')
         periods = {}
-        et_coll = get_mongo_collection('event_types')
+        types_by_key, types_by_id = _event_types_for(
+            [ev for evs in periods_payload.values() if isinstance(evs, list) for ev in evs]
+            if isinstance(periods_payload, dict) else events_data
+        )
         if isinstance(periods_payload, dict):
             for period_key, events in periods_payload.items():
                 pk = str(period_key)
@@ -790,7 +743,7 @@ def mongo_events_optimized_replace(request):
                     et_key = ev.get('event_type_key')
                     # Xử lý custom_bonus_point: không cần tìm trong event_types collection
                     if not et_id and et_key and et_key != 'custom_bonus_point':
-                        et_doc = et_coll.find_one({'key': et_key})
+                        et_doc = types_by_key.get(et_key)
                         if et_doc:
                             et_id = str(et_doc.get('_id'))
                             ev['event_type'] = et_id
@@ -811,20 +764,16 @@ def mongo_events_optimized_replace(request):
                 et_key = event_data.get('event_type_key')
                 # Xử lý custom_bonus_point: không cần tìm trong event_types collection
                 if not et_id and et_key and et_key != 'custom_bonus_point':
-                    et_doc = et_coll.find_one({'key': et_key})
+                    et_doc = types_by_key.get(et_key)
                     if et_doc:
                         et_id = str(et_doc.get('_id'))
                         event_data['event_type'] = et_id
                         if 'points' not in event_data or event_data.get('points') is None:
                             event_data['points'] = et_doc.get('default_points', 0)
                 if et_id and not et_key:
-                    try:
-                        from bson import ObjectId
-                        et_doc2 = et_coll.find_one({'_id': ObjectId(et_id)})
-                        if et_doc2:
-                            et_key = et_doc2.get('key')
-                    except Exception:
-                        pass
+                    et_doc2 = types_by_id.get(str(et_id))
+                    if et_doc2:
+                        et_key = et_doc2.get('key')
                 event_obj = {
                     'event_type_key': et_key,
                     'student_id': event_data.get('student'),
@@ -837,11 +786,14 @@ def mongo_events_optimized_replace(request):
                 periods[period].append(event_obj)
         
         # Tạo document mới
+        ensure_event_ids(periods)
+        stamp_display_names(periods)
         day_doc = {
             'date': date,
             'classroom_id': classroom_id,
             'periods': periods,
-            'total_events': len(events_data),
+            'total_events': sum(len(period_events) for period_events in periods.values()),
+            **day_summary(periods),
             'created_by': str(user.id),
             'created_by_name': user.full_name or f"{user.first_name} {user.last_name}".strip(),
             'created_at': datetime.now().isoformat(),
@@ -850,17 +802,23 @@ def mongo_events_optimized_replace(request):
         
         # Thay thế document
         events_coll = get_mongo_collection('events')
-        events_coll.replace_one(
+        before = events_coll.find_one_and_replace(
             {'date': date, 'classroom_id': classroom_id},
             day_doc,
+            projection={'approval_status': 1, 'periods.attendance': 1},
             upsert=True
         )
+        record_approval_transition(classroom_id, (before or {}).get('approval_status'), None)
+        if 'attendance' in periods or 'attendance' in ((before or {}).get('periods') or {}):
+            attendance_store.sync_day(classroom_id, date)
         
         return ok({
             'message': f'Đã thay thế {len(events_data)} events cho ngày {date}',
             'events': to_plain(day_doc)
         })
         
+    except DuplicateKeyError:
+        return _day_document_conflict()
     except Exception as exc:
         logger.exception('mongo_events_optimized_replace error')
         return server_error(exc)
@@ -869,14 +827,12 @@ def mongo_events_optimized_replace(request):
 # BULK OPERATIONS - MongoDB
 # =============================================================================
 
+@query_budget(8)  # điểm danh: + 3 lệnh sync_day
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_events_bulk_sync(request):
     """Đồng bộ events cho một period cụ thể"""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
-        from datetime import datetime
         
         user = request.user
         classroom_id = request.data.get('classroom_id')
@@ -897,13 +853,7 @@ def mongo_events_bulk_sync(request):
         
         # Tự động lấy lớp của học sinh nếu là student
         if user.role == 'student':
-            students_coll = get_mongo_collection('students')
-            student_doc = students_coll.find_one({'user.id': str(user.id)})
-            
-            if not student_doc:
-                return Response({'error': 'Không tìm thấy thông tin học sinh'}, status=status.HTTP_404_NOT_FOUND)
-            
-            student_classroom_id = student_doc.get('classroom', {}).get('id')
+            student_classroom_id = user.context.student_classroom_id
             if not student_classroom_id:
                 return Response({'error': 'Học sinh chưa được phân lớp'}, status=status.HTTP_400_BAD_REQUEST)
             
@@ -918,13 +868,20 @@ def mongo_events_bulk_sync(request):
             'classroom_id': classroom_id
         })
         
+        ensure_event_ids({str(period): events_data})
+        stamp_display_names({str(period): events_data})
+        
         if existing_doc:
-            # Cập nhật period cụ thể
+            # Cập nhật period cụ thể, tính lại tổng của tiết và của ngày
+            merged_periods = dict(existing_doc.get('periods', {}))
+            merged_periods[str(period)] = events_data
             events_coll.update_one(
                 {'_id': existing_doc['_id']},
                 {
                     '$set': {
                         f'periods.{period}': events_data,
+                        **day_summary(merged_periods),
+                        'total_events': sum(len(v) for v in merged_periods.values() if isinstance(v, list)),
                         'updated_at': datetime.now().isoformat(),
                     }
                 }
@@ -936,6 +893,7 @@ def mongo_events_bulk_sync(request):
                 'classroom_id': classroom_id,
                 'periods': {str(period): events_data},
                 'total_events': len(events_data),
+                **day_summary({str(period): events_data}),
                 'created_by': str(user.id),
                 'created_by_name': user.full_name or f"{user.first_name} {user.last_name}".strip(),
                 'created_at': datetime.now().isoformat(),
@@ -943,25 +901,28 @@ def mongo_events_bulk_sync(request):
             }
             events_coll.insert_one(day_doc)
         
+        if str(period) == 'attendance':
+            attendance_store.sync_day(classroom_id, date)
+        
         return Response({
             'message': f'Đã đồng bộ {len(events_data)} events cho tiết {period}',
             'period': period,
             'events_count': len(events_data)
         })
         
+    except DuplicateKeyError:
+        return _day_document_conflict()
     except Exception as exc:
         logger.exception('mongo_events_bulk_sync error')
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(12)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_events_bulk_replace(request):
     """Ghi đè toàn bộ events cho một ngày (tất cả 7 tiết)"""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
-        from datetime import datetime
         
         user = request.user
         classroom_id = request.data.get('classroom_id')
@@ -984,13 +945,7 @@ def mongo_events_bulk_replace(request):
         
         # Tự động lấy lớp của học sinh nếu là student
         if user.role == 'student':
-            students_coll = get_mongo_collection('students')
-            student_doc = students_coll.find_one({'user.id': str(user.id)})
-            
-            if not student_doc:
-                return Response({'error': 'Không tìm thấy thông tin học sinh'}, status=status.HTTP_404_NOT_FOUND)
-            
-            student_classroom_id = student_doc.get('classroom', {}).get('id')
+            student_classroom_id = user.context.student_classroom_id
             if not student_classroom_id:
                 return Response({'error': 'Học sinh chưa được phân lớp'}, status=status.HTTP_400_BAD_REQUEST)
             
@@ -1042,8 +997,11 @@ def mongo_events_bulk_replace(request):
                     # Có dữ liệu: giữ lại
                     periods_to_set[period_key] = period_events
             
+            ensure_event_ids(periods_to_set)
+            stamp_display_names(periods_to_set)
             update_data = {
                 'total_events': total_events,
+                **day_summary(periods_to_set),
                 'updated_at': datetime.now().isoformat(),
             }
             
@@ -1089,18 +1047,29 @@ def mongo_events_bulk_replace(request):
             if periods_to_unset:
                 update_operation['$unset'] = {period: '' for period in periods_to_unset}
             
-            events_coll.update_one(
+            before = events_coll.find_one_and_update(
                 {'_id': existing_doc['_id']},
-                update_operation
+                update_operation,
+                projection={'approval_status': 1},
+                return_document=ReturnDocument.BEFORE,
             )
+            if before is not None:
+                record_approval_transition(
+                    classroom_id,
+                    before.get('approval_status'),
+                    update_data.get('approval_status', before.get('approval_status')),
+                )
             action = 'updated'
         else:
             # Tạo document mới
+            ensure_event_ids(periods_data)
+            stamp_display_names(periods_data)
             day_doc = {
                 'date': date,
                 'classroom_id': classroom_id,
                 'periods': periods_data,
                 'total_events': total_events,
+                **day_summary(periods_data),
                 'created_by': str(user.id),
                 'created_by_name': user.full_name or f"{user.first_name} {user.last_name}".strip(),
                 'created_at': datetime.now().isoformat(),
@@ -1111,8 +1080,13 @@ def mongo_events_bulk_replace(request):
                 'approved_at': datetime.now().isoformat() if user.role in ['teacher', 'admin'] else None,
             }
             events_coll.insert_one(day_doc)
+            record_approval_transition(classroom_id, None, approval_status)
             action = 'created'
         
+        # Ghi đè cả ngày: periods.attendance được thay (hoặc bị xóa) cùng các tiết khác
+        if 'attendance' in periods_data or (existing_doc and 'attendance' in (existing_doc.get('periods') or {})):
+            attendance_store.sync_day(classroom_id, date)
+        
         return Response({
             'message': f'Đã {action} {total_events} events cho {len(periods_data)} tiết',
             'total_events': total_events,
@@ -1120,19 +1094,405 @@ def mongo_events_bulk_replace(request):
             'action': action
         })
         
+    except DuplicateKeyError:
+        return _day_document_conflict()
     except Exception as exc:
         logger.exception('mongo_events_bulk_replace error')
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# =============================================================================
+# EVENT ITEMS - MongoDB (thêm/sửa/xóa 1 event theo event_id)
+# =============================================================================
+
+SUDDEN_PERIODS = ['violation_sudden', 'bonus_sudden', 'sudden']
+BULK_APPROVE_MAX_IDS = 500
+EVENT_ITEM_FIELDS = ['event_type', 'event_type_key', 'student_id', 'points', 'description', 'session']
+
+
+def _user_display_name(user):
+    return user.full_name or f"{user.first_name} {user.last_name}".strip()
+
+
+def _item_params(request):
+    """Tham số định danh day-document + tiết (nhận từ body hoặc query string)."""
+    data = request.data if request.data else request.query_params
+    classroom_id = data.get('classroom_id') or data.get('classroom')
+    date = data.get('date')
+    period = data.get('period')
+    return classroom_id, date, (str(period) if period not in (None, '') else None), data
+
+
+def _check_item_permission(user, classroom_id, period_key):
+    """
+    Trả về Response lỗi nếu user không được ghi event vào tiết/lớp này, ngược lại None.
+
+    - Tiết đột xuất: chỉ admin / quản sinh; quản sinh chỉ được ghi tiết đột xuất.
+    - Giáo viên: chỉ lớp mình chủ nhiệm (như mongo_events_approve).
+    - Học sinh: chỉ lớp của mình.
+    """
+    if user.role not in ['admin', 'teacher', 'student', 'dorm_supervisor']:
+        return Response({'error': 'Bạn không có quyền chỉnh sửa sự kiện'}, status=status.HTTP_403_FORBIDDEN)
+    if period_key in SUDDEN_PERIODS and user.role not in ['admin', 'dorm_supervisor']:
+        return Response(
+            {'error': 'Bạn không có quyền tạo/chỉnh sửa vi phạm đột xuất. Chỉ quản sinh mới có quyền này.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if user.role == 'dorm_supervisor' and period_key not in SUDDEN_PERIODS:
+        return Response(
+            {'error': 'Quản sinh chỉ được tạo/chỉnh sửa vi phạm và điểm cộng đột xuất'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if user.role == 'teacher' and not user.context.can_access_classroom(classroom_id):
+        return Response(
+            {'error': 'Bạn chỉ có thể chỉnh sửa sự kiện của lớp mình chủ nhiệm'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if user.role == 'student':
+        if not user.context.student_classroom_id:
+            return bad_request('Học sinh chưa được phân lớp')
+        if not user.context.can_access_classroom(classroom_id):
+            return Response({'error': 'Bạn chỉ có thể chỉnh sửa events của lớp mình'}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+
+def _item_approval_fields(user, period_key):
+    """
+    Trạng thái duyệt sau khi ghi 1 event (cùng quy tắc với mongo_events_optimized_create):
+    - Đột xuất: tự động duyệt
+    - Giáo viên/Admin: tự động duyệt
+    - Học sinh: cần duyệt lại
+    Trả về {} nếu không thay đổi trạng thái duyệt.
+    """
+    now = datetime.now().isoformat()
+    if period_key in SUDDEN_PERIODS or user.role in ['teacher', 'admin']:
+        return {
+            'approval_status': 'approved',
+            'approved_by': str(user.id),
+            'approved_by_name': _user_display_name(user),
+            'approved_at': now,
+        }
+    if user.role == 'student':
+        return {
+            'approval_status': 'pending',
+            'approved_by': None,
+            'approved_by_name': None,
+            'approved_at': None,
+        }
+    return {}
+
+
+def _build_event_item(payload: dict) -> dict:
+    """Chuẩn hóa 1 event nhúng từ payload (map event_type_key -> event_type + điểm mặc định)."""
+    et_id = payload.get('event_type')
+    et_key = payload.get('event_type_key')
+    points = payload.get('points')
+    if not et_id and et_key and et_key != 'custom_bonus_point':
+        et_doc = get_mongo_collection('event_types').find_one({'key': et_key}, {'default_points': 1})
+        if et_doc:
+            et_id = str(et_doc['_id'])
+            if points is None:
+                points = et_doc.get('default_points', 0)
+    event_obj = {
+        'event_id': new_event_id(),
+        'event_type': et_id,
+        'event_type_key': et_key,
+        'student_id': payload.get('student_id') or payload.get('student'),
+        'points': event_points({'points': points}),
+        'description': payload.get('description', ''),
+    }
+    if payload.get('session'):
+        event_obj['session'] = payload.get('session')
+    return event_obj
+
+
+@query_budget(9)  # điểm danh: + 3 lệnh sync_day
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mongo_events_item_add(request):
+    """
+    Thêm 1 event vào một tiết của ngày-lớp bằng $push (không cần gửi lại cả tiết/cả ngày).
+
+    Body: { date, classroom_id, period, event: { event_type_key, student_id, points, description, session } }
+    """
+    try:
+        user = request.user
+        classroom_id, date, period_key, data = _item_params(request)
+        event_payload = data.get('event') or {}
+
+        if not classroom_id or not date or not period_key:
+            return bad_request('Thiếu classroom_id, date hoặc period')
+        if not isinstance(event_payload, dict) or not (event_payload.get('event_type') or event_payload.get('event_type_key')):
+            return bad_request('Thiếu thông tin sự kiện')
+
+        denied = _check_item_permission(user, classroom_id, period_key)
+        if denied:
+            return denied
+
+        event_obj = _build_event_item(event_payload)
+        stamp_display_names({period_key: [event_obj]})
+        now = datetime.now().isoformat()
+        approval = _item_approval_fields(user, period_key)
+
+        set_on_insert = {
+            'created_by': str(user.id),
+            'created_by_name': _user_display_name(user),
+            'created_at': now,
+        }
+        if not approval:
+            set_on_insert.update({'approval_status': 'pending', 'approved_by': None, 'approved_by_name': None, 'approved_at': None})
+
+        events_coll = get_mongo_collection('events')
+        doc_filter = {'date': date, 'classroom_id': classroom_id}
+        update = {
+            '$push': {f'periods.{period_key}': event_obj},
+            '$inc': totals_inc(period_key, new_points=event_obj['points']),
+            '$addToSet': {'period_kinds': period_kind(period_key)},
+            '$set': {'updated_at': now, **approval},
+            '$setOnInsert': set_on_insert,
+        }
+        try:
+            before = events_coll.find_one_and_update(
+                doc_filter, update,
+                projection={'day_totals': 1, 'approval_status': 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # 2 request thêm event đầu tiên của ngày-lớp cùng lúc: request kia vừa tạo document
+            # (index unique classroom_id + date) -> $push lại vào document đó
+            before = events_coll.find_one_and_update(
+                doc_filter, update,
+                projection={'day_totals': 1, 'approval_status': 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if before is None:
+                return Response({'error': 'Ngày-lớp vừa bị thay đổi, vui lòng thử lại'}, status=status.HTTP_409_CONFLICT)
+        old_status = before.get('approval_status') if before is not None else None
+        record_approval_transition(classroom_id, old_status, approval.get('approval_status', old_status or 'pending'))
+        if before is not None and 'day_totals' not in before:
+            _repair_period_totals(events_coll, doc_filter)
+        if period_key == 'attendance':
+            attendance_store.sync_day(classroom_id, date)
+
+        return created({
+            'message': 'Đã thêm sự kiện',
+            'event': event_obj,
+            'event_id': event_obj['event_id'],
+            'period': period_key,
+            'action': 'updated' if before is not None else 'created',
+        })
+
+    except Exception as exc:
+        logger.exception('mongo_events_item_add error')
+        return server_error(exc)
+
+
+@query_budget(9)  # điểm danh: + 3 lệnh sync_day
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def mongo_events_item_update(request):
+    """
+    Sửa 1 event theo event_id bằng positional arrayFilters.
+
+    Body: { date, classroom_id, period, event_id, points?, description?, event_type_key?, student_id?, session? }
+    Trả về 409 nếu event đã bị người khác sửa/xóa giữa lúc đọc và ghi.
+    """
+    try:
+        user = request.user
+        classroom_id, date, period_key, data = _item_params(request)
+        event_id = data.get('event_id')
+
+        if not classroom_id or not date or not period_key or not event_id:
+            return bad_request('Thiếu classroom_id, date, period hoặc event_id')
+
+        denied = _check_item_permission(user, classroom_id, period_key)
+        if denied:
+            return denied
+
+        changes = {field: data.get(field) for field in EVENT_ITEM_FIELDS if field in data}
+        if not changes:
+            return bad_request('Không có thông tin cần cập nhật')
+
+        events_coll = get_mongo_collection('events')
+        doc_filter = {'date': date, 'classroom_id': classroom_id}
+        current = events_coll.find_one(
+            {**doc_filter, f'periods.{period_key}.event_id': event_id},
+            {f'periods.{period_key}.$': 1, 'day_totals': 1, 'approval_status': 1},
+        )
+        if not current:
+            return not_found('Không tìm thấy sự kiện')
+
+        old_event = current['periods'][period_key][0]
+        old_points = event_points(old_event)
+        if 'points' in changes:
+            changes['points'] = event_points({'points': changes['points']})
+        new_points = changes.get('points', old_points)
+        if any(field in changes for field in ('student_id', 'event_type', 'event_type_key')):
+            renamed = {**old_event, **changes}
+            stamp_display_names({period_key: [renamed]})
+            changes['student_name'] = renamed['student_name']
+            changes['event_type_name'] = renamed['event_type_name']
+
+        set_fields = {f'periods.{period_key}.$[ev].{field}': value for field, value in changes.items()}
+        set_fields.update({'updated_at': datetime.now().isoformat(), **_item_approval_fields(user, period_key)})
+        update = {'$set': set_fields}
+        inc = totals_inc(period_key, old_points=old_points, new_points=new_points)
+        if inc:
+            update['$inc'] = inc
+
+        # Chỉ ghi nếu event vẫn y nguyên như lúc đọc (mọi field), tránh lost update khi 2 người sửa cùng lúc
+        before = events_coll.find_one_and_update(
+            {'_id': current['_id'], f'periods.{period_key}': old_event},
+            update,
+            projection={'approval_status': 1},
+            array_filters=[{'ev.event_id': event_id}],
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
+            return Response(
+                {'error': 'Sự kiện vừa được người khác thay đổi, vui lòng tải lại'},
+                status=status.HTTP_409_CONFLICT
+            )
+        old_status = before.get('approval_status')
+        record_approval_transition(classroom_id, old_status, set_fields.get('approval_status', old_status))
+        if 'day_totals' not in current:
+            _repair_period_totals(events_coll, {'_id': current['_id']})
+        if period_key == 'attendance':
+            attendance_store.sync_day(classroom_id, date)
+
+        return ok({
+            'message': 'Đã cập nhật sự kiện',
+            'event': {**old_event, **changes},
+            'event_id': event_id,
+            'period': period_key,
+        })
+
+    except Exception as exc:
+        logger.exception('mongo_events_item_update error')
+        return server_error(exc)
+
+
+@query_budget(10)  # tiết rỗng: + 3 lệnh dọn tiết; điểm danh: + 3 lệnh sync_day
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def mongo_events_item_remove(request):
+    """
+    Xóa 1 event theo event_id bằng $pull.
+
+    Params: date, classroom_id, period, event_id (query string hoặc body)
+    """
+    try:
+        user = request.user
+        classroom_id, date, period_key, data = _item_params(request)
+        event_id = data.get('event_id')
+
+        if not classroom_id or not date or not period_key or not event_id:
+            return bad_request('Thiếu classroom_id, date, period hoặc event_id')
+
+        denied = _check_item_permission(user, classroom_id, period_key)
+        if denied:
+            return denied
+
+        events_coll = get_mongo_collection('events')
+        current = events_coll.find_one(
+            {'date': date, 'classroom_id': classroom_id, f'periods.{period_key}.event_id': event_id},
+            {f'periods.{period_key}.$': 1, 'day_totals': 1, 'approval_status': 1},
+        )
+        if not current:
+            return not_found('Không tìm thấy sự kiện')
+
+        old_event = current['periods'][period_key][0]
+        update = {
+            '$pull': {f'periods.{period_key}': {'event_id': event_id}},
+            '$set': {'updated_at': datetime.now().isoformat(), **_item_approval_fields(user, period_key)},
+        }
+        inc = totals_inc(period_key, old_points=event_points(old_event))
+        if inc:
+            update['$inc'] = inc
+
+        before = events_coll.find_one_and_update(
+            {'_id': current['_id'], f'periods.{period_key}': old_event},
+            update,
+            projection={'approval_status': 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
+            return Response(
+                {'error': 'Sự kiện vừa được người khác thay đổi, vui lòng tải lại'},
+                status=status.HTTP_409_CONFLICT
+            )
+        old_status = before.get('approval_status')
+        record_approval_transition(classroom_id, old_status, update['$set'].get('approval_status', old_status))
+
+        # Tiết không còn event nào -> xóa hẳn tiết (giống bulk-replace với mảng rỗng)
+        emptied = events_coll.update_one(
+            {'_id': current['_id'], f'periods.{period_key}': {'$size': 0}},
+            {'$unset': {f'periods.{period_key}': '', f'period_totals.{period_key}': ''}},
+        )
+        if 'day_totals' not in current:
+            _repair_period_totals(events_coll, {'_id': current['_id']})
+        elif emptied.modified_count:
+            _refresh_period_kinds(events_coll, current['_id'])
+        if period_key == 'attendance':
+            attendance_store.sync_day(classroom_id, date)
+
+        return ok({
+            'message': 'Đã xóa sự kiện',
+            'event_id': event_id,
+            'period': period_key,
+        })
+
+    except Exception as exc:
+        logger.exception('mongo_events_item_remove error')
+        return server_error(exc)
+
+
+def _refresh_period_kinds(events_coll, doc_id):
+    """Tính lại period_kinds từ period_totals sau khi 1 tiết bị xóa hẳn."""
+    doc = events_coll.find_one({'_id': doc_id}, {'period_totals': 1})
+    if not doc:
+        return
+    kinds = {
+        period_kind(key) for key, totals in (doc.get('period_totals') or {}).items()
+        if (totals or {}).get('event_count')
+    }
+    events_coll.update_one({'_id': doc_id}, {'$set': {'period_kinds': sorted(kinds)}})
+
+
+def _repair_period_totals(events_coll, doc_filter, attempts=5):
+    """
+    Document cũ (chưa có day_totals): tính lại toàn bộ sau khi $inc một phần.
+
+    Chỉ ghi nếu periods vẫn y nguyên như lúc đọc (compare-and-swap); có người ghi xen giữa thì đọc lại,
+    nên không ghi đè event vừa được thêm / sửa / xóa.
+    """
+    for _ in range(attempts):
+        doc = events_coll.find_one(doc_filter, {'periods': 1})
+        if not doc:
+            return
+        original = doc.get('periods')
+        periods = copy.deepcopy(original) if isinstance(original, dict) else {}
+        ensure_event_ids(periods)
+        result = events_coll.update_one(
+            {'_id': doc['_id'], 'periods': original},
+            {'$set': {
+                'periods': periods,
+                **day_summary(periods),
+                'total_events': sum(len(v) for v in periods.values() if isinstance(v, list)),
+            }}
+        )
+        if result.matched_count:
+            return
+    logger.warning('period totals repair gave up after %d concurrent writes (%s)', attempts, doc_filter)
+
+
+@query_budget(4)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_events_approve(request):
     """Duyệt events - chỉ admin và giáo viên chủ nhiệm mới có quyền"""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
-        from datetime import datetime
         
         user = request.user
         
@@ -1162,11 +1522,7 @@ def mongo_events_approve(request):
         # Kiểm tra quyền duyệt
         if user.role == 'teacher':
             # Giáo viên chỉ có thể duyệt events của lớp mình chủ nhiệm
-            classrooms_coll = get_mongo_collection('classrooms')
-            teacher_classrooms = classrooms_coll.find({'homeroom_teacher.id': str(user.id)})
-            teacher_classroom_ids = [str(doc['_id']) for doc in teacher_classrooms]
-            
-            if event_doc.get('classroom_id') not in teacher_classroom_ids:
+            if not user.context.can_access_classroom(event_doc.get('classroom_id')):
                 return Response({'error': 'Bạn chỉ có thể duyệt sự kiện của lớp mình chủ nhiệm'}, status=status.HTTP_403_FORBIDDEN)
         
         # Cập nhật approval status
@@ -1178,10 +1534,14 @@ def mongo_events_approve(request):
             'updated_at': datetime.now().isoformat(),
         }
         
-        events_coll.update_one(
+        before = events_coll.find_one_and_update(
             {'_id': ObjectId(event_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'approval_status': 1},
+            return_document=ReturnDocument.BEFORE,
         )
+        if before is not None:
+            record_approval_transition(event_doc.get('classroom_id'), before.get('approval_status'), update_data['approval_status'])
         
         return Response({
             'message': f'Đã {action} sự kiện thành công',
@@ -1196,14 +1556,182 @@ def mongo_events_approve(request):
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(6)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mongo_events_approve_bulk(request):
+    """
+    Duyệt/từ chối nhiều day-document trong 1 lần update_many.
+
+    Body:
+      - action: 'approve' | 'reject' (bắt buộc)
+      - event_ids: [id, ...] (tùy chọn)
+      - classroom_id, start_date, end_date (tùy chọn, phạm vi)
+      - pending_only: mặc định true - chỉ đổi trạng thái các document đang chờ duyệt
+    Giáo viên chỉ duyệt được lớp mình chủ nhiệm (ràng buộc nằm ngay trong filter).
+    """
+    try:
+        user = request.user
+
+        if user.role not in ['admin', 'teacher']:
+            return Response({'error': 'Bạn không có quyền duyệt sự kiện'}, status=status.HTTP_403_FORBIDDEN)
+
+        data = request.data or {}
+        action = data.get('action')
+        event_ids = data.get('event_ids') or []
+        classroom_id = data.get('classroom_id')
+        start_date = data.get('start_date')
+        end_date = data.get('end_date')
+        pending_only = str(data.get('pending_only', True)).lower() not in ['false', '0']
+
+        if action not in ['approve', 'reject']:
+            return bad_request('Action không hợp lệ')
+        if not isinstance(event_ids, list):
+            return bad_request('event_ids phải là danh sách')
+        if len(event_ids) > BULK_APPROVE_MAX_IDS:
+            return bad_request(f'Tối đa {BULK_APPROVE_MAX_IDS} sự kiện mỗi lần duyệt')
+        if user.role == 'admin' and not (event_ids or classroom_id or start_date or end_date):
+            return bad_request('Cần có event_ids hoặc phạm vi (classroom_id, start_date, end_date)')
+
+        query = {}
+        if event_ids:
+            try:
+                query['_id'] = {'$in': [ObjectId(eid) for eid in event_ids]}
+            except Exception:
+                return bad_request('ID không hợp lệ')
+        if start_date or end_date:
+            query['date'] = {}
+            if start_date:
+                query['date']['$gte'] = start_date
+            if end_date:
+                query['date']['$lte'] = end_date
+        if pending_only:
+            query['approval_status'] = 'pending'
+
+        if user.role == 'teacher':
+            teacher_classroom_ids = list(user.context.homeroom_classroom_ids)
+            if classroom_id and classroom_id not in teacher_classroom_ids:
+                return Response({'error': 'Bạn chỉ có thể duyệt sự kiện của lớp mình chủ nhiệm'}, status=status.HTTP_403_FORBIDDEN)
+            query['classroom_id'] = classroom_id if classroom_id else {'$in': teacher_classroom_ids}
+        elif classroom_id:
+            query['classroom_id'] = classroom_id
+
+        now = datetime.now().isoformat()
+        update_data = {
+            'approval_status': 'approved' if action == 'approve' else 'rejected',
+            'approved_by': str(user.id),
+            'approved_by_name': user.full_name or f"{user.first_name} {user.last_name}".strip(),
+            'approved_at': now,
+            'updated_at': now,
+        }
+
+        events_coll = get_mongo_collection('events')
+        affected_classroom_ids = events_coll.distinct('classroom_id', {**query, 'approval_status': 'pending'})
+        result = events_coll.update_many(query, {'$set': update_data})
+        recount_pending(affected_classroom_ids)
+
+        return Response({
+            'message': f'Đã {action} {result.modified_count} sự kiện',
+            'action': action,
+            'approval_status': update_data['approval_status'],
+            'matched_count': result.matched_count,
+            'modified_count': result.modified_count,
+            'approved_by': update_data['approved_by_name'],
+            'approved_at': update_data['approved_at'],
+        })
+
+    except Exception as exc:
+        logger.exception('mongo_events_approve_bulk error')
+        return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mongo_events_pending_counts(request):
+    """Số day-document chờ duyệt theo lớp (badge) - đọc từ bộ đếm, không quét events"""
+    try:
+        user = request.user
+        if user.role not in ['admin', 'teacher']:
+            return Response({'error': 'Bạn không có quyền duyệt sự kiện'}, status=status.HTTP_403_FORBIDDEN)
+
+        classroom_ids = list(user.context.homeroom_classroom_ids) if user.role == 'teacher' else None
+        counts = get_pending_counts(classroom_ids)
+        return Response({
+            'total': sum(counts.values()),
+            'by_classroom': counts,
+        })
+
+    except Exception as exc:
+        logger.exception('mongo_events_pending_counts error')
+        return server_error(exc)
+
+
+@query_budget(5)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mongo_events_pending(request):
+    """
+    Hộp thư chờ duyệt: danh sách day-document có approval_status='pending'.
+
+    Query params: classroom_id, start_date, end_date, page, page_size
+    Giáo viên chỉ thấy lớp mình chủ nhiệm, admin thấy tất cả.
+    """
+    try:
+        user = request.user
+        if user.role not in ['admin', 'teacher']:
+            return Response({'error': 'Bạn không có quyền duyệt sự kiện'}, status=status.HTTP_403_FORBIDDEN)
+
+        classroom_id = request.query_params.get('classroom_id')
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        page = max(1, int(request.query_params.get('page', 1)))
+        page_size = max(1, min(100, int(request.query_params.get('page_size', 20))))
+
+        query = {'approval_status': 'pending'}
+        if user.role == 'teacher':
+            classroom_ids = list(user.context.homeroom_classroom_ids)
+            if classroom_id and classroom_id not in classroom_ids:
+                return Response({'error': 'Bạn chỉ có thể duyệt sự kiện của lớp mình chủ nhiệm'}, status=status.HTTP_403_FORBIDDEN)
+            query['classroom_id'] = classroom_id if classroom_id else {'$in': classroom_ids}
+        elif classroom_id:
+            query['classroom_id'] = classroom_id
+        if start_date or end_date:
+            query['date'] = {}
+            if start_date:
+                query['date']['$gte'] = start_date
+            if end_date:
+                query['date']['$lte'] = end_date
+
+        events_coll = get_mongo_collection('events')
+        total = events_coll.count_documents(query)
+        docs = events_coll.find(
+            query,
+            {
+                'date': 1, 'classroom_id': 1, 'total_events': 1, 'period_totals': 1,
+                'created_by': 1, 'created_by_name': 1, 'created_at': 1, 'updated_at': 1, 'approval_status': 1,
+            }
+        ).sort([('date', 1)]).skip((page - 1) * page_size).limit(page_size)
+
+        return Response({
+            'results': [to_plain(d) for d in docs],
+            'count': total,
+            'page': page,
+            'page_size': page_size,
+            'total_pages': (total + page_size - 1) // page_size,
+        })
+
+    except Exception as exc:
+        logger.exception('mongo_events_pending error')
+        return server_error(exc)
+
+
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([AllowAny])  # Public API - không cần authentication
 def mongo_events_public(request):
     """Public API để xem sự kiện toàn trường - không cần authentication"""
     try:
-        from applications.common.mongo import get_mongo_collection, to_plain
-        from bson import ObjectId
-        from datetime import datetime
         
         # Lấy parameters
         date = request.GET.get('date')
@@ -1215,7 +1743,6 @@ def mongo_events_public(request):
         # Query events
         events_coll = get_mongo_collection('events')
         classrooms_coll = get_mongo_collection('classrooms')
-        users_coll = get_mongo_collection('users')
         
         # Build query
         query = {
@@ -1226,42 +1753,41 @@ def mongo_events_public(request):
         if classroom_id and classroom_id != 'all':
             query['classroom_id'] = classroom_id
         
-        print(f"Public API - Final query: {query}")
-        print(f"Public API - Date filter: {date}")
-        print(f"Public API - Classroom filter: {classroom_id}")
-        
         # Pagination parameters
         page = int(request.query_params.get('page', 1))
         page_size = int(request.query_params.get('page_size', 10))
         page_size = min(page_size, 100)  # Limit max page size to 100
         
-        print(f"Public API - Pagination params: page={page}, page_size={page_size}")
-        print(f"Public API - Query: {query}")
-        
         # Count total documents
         total_count = events_coll.count_documents(query)
         total_pages = (total_count + page_size - 1) // page_size
         
-        print(f"Public API - Total count: {total_count}, Total pages: {total_pages}")
-        
         # Calculate skip
         skip = (page - 1) * page_size
         
-        print(f"Public API - Skip: {skip}, Limit: {page_size}")
-        
         # Get paginated results
         cursor = events_coll.find(query).sort('created_at', -1).skip(skip).limit(page_size)
         event_docs = list(cursor)
+        logger.debug(
+            "events public: query=%s page=%s page_size=%s total=%s returned=%d",
+            query, page, page_size, total_count, len(event_docs),
+        )
         
-        print(f"Public API - Retrieved {len(event_docs)} documents")
-        print(f"Public API - First few doc IDs: {[str(doc.get('_id', 'no_id')) for doc in event_docs[:3]]}")
-        print(f"Public API - Query executed: {query}")
-        print(f"Public API - Skip: {skip}, Limit: {page_size}")
-        
-        # Debug: Check if we're getting more than expected
-        if len(event_docs) > page_size:
-            print(f"Public API - WARNING: Got {len(event_docs)} docs but limit was {page_size}")
+        # Thông tin lớp của cả trang: 1 truy vấn $in
+        classroom_map = {}
+        classroom_oids = to_object_ids(doc.get('classroom_id') for doc in event_docs)
+        if classroom_oids:
+            for classroom_doc in classrooms_coll.find({'_id': {'$in': classroom_oids}}, {'name': 1, 'full_name': 1, 'grade': 1}):
+                classroom_map[str(classroom_doc['_id'])] = {
+                    'id': str(classroom_doc['_id']),
+                    'name': classroom_doc.get('name', ''),
+                    'full_name': classroom_doc.get('full_name', ''),
+                    'grade': classroom_doc.get('grade', '')
+                }
         
+        # student_name / event_type_name đã ghi sẵn trên event; chỉ bổ sung cho dữ liệu cũ (1 lần tra tên cho cả trang)
+        stamp_display_names_many((event_doc.get('periods') for event_doc in event_docs), only_missing=True)
+
         # Process events
         processed_events = []
         event_counter = 0  # Counter for unique IDs
@@ -1269,16 +1795,7 @@ def mongo_events_public(request):
             event_plain = to_plain(event_doc)
             
             # Lấy thông tin classroom
-            classroom_info = None
-            if event_plain.get('classroom_id'):
-                classroom_doc = classrooms_coll.find_one({'_id': ObjectId(event_plain['classroom_id'])})
-                if classroom_doc:
-                    classroom_info = {
-                        'id': str(classroom_doc['_id']),
-                        'name': classroom_doc.get('name', ''),
-                        'full_name': classroom_doc.get('full_name', ''),
-                        'grade': classroom_doc.get('grade', '')
-                    }
+            classroom_info = classroom_map.get(str(event_plain.get('classroom_id')))
             
             # Process periods để tạo individual events
             periods = event_plain.get('periods', {})
@@ -1289,15 +1806,10 @@ def mongo_events_public(request):
                     # Lấy thông tin student nếu có
                     student_info = None
                     if event.get('student_id'):
-                        student_doc = users_coll.find_one({
-                            '_id': ObjectId(event['student_id']),
-                            'role': 'student'
-                        })
-                        if student_doc:
-                            student_info = {
-                                'id': str(student_doc['_id']),
-                                'full_name': student_doc.get('full_name', '')
-                            }
+                        student_info = {
+                            'id': str(event['student_id']),
+                            'full_name': event.get('student_name', '')
+                        }
                     
                     # Tạo event object với unique ID
                     event_id = event.get('id', f"event_{event_counter}")
@@ -1316,7 +1828,8 @@ def mongo_events_public(request):
                         'event_type': event.get('event_type', ''),
                         'points': event.get('points', 0),
                         'created_at': event_plain.get('created_at', ''),
-                        'period': int(period_num),
+                        # Tiết học là số; key khác (attendance, violation_sudden, bonus_sudden) giữ nguyên chuỗi
+                        'period': int(period_num) if str(period_num).isdigit() else period_num,
                         'approval_status': event_plain.get('approval_status', 'approved'),
                         'approved_by': event_plain.get('approved_by'),
                         'approved_by_name': event_plain.get('approved_by_name'),
@@ -1357,96 +1870,76 @@ def mongo_events_public(request):
         logger.exception('mongo_events_public error')
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def derive_attendance_type(morning: str, afternoon: str) -> str:
-    """
-    Suy luận loại nghỉ từ morning và afternoon.
-    Returns: attendance code (legacy format hoặc session-based)
-    """
-    has_morning = morning and morning in ['attendance_sp', 'attendance_sk']
-    has_afternoon = afternoon and afternoon in ['attendance_cp', 'attendance_ck']
-    
-    if has_morning and has_afternoon:
-        # Nghỉ cả ngày
-        if morning == 'attendance_sp' and afternoon == 'attendance_cp':
-            return 'attendance_spcp'
-        elif morning == 'attendance_sk' and afternoon == 'attendance_ck':
-            return 'attendance_skck'
-        elif morning == 'attendance_sp' and afternoon == 'attendance_ck':
-            return 'attendance_spck'
-        elif morning == 'attendance_sk' and afternoon == 'attendance_cp':
-            return 'attendance_skcp'
-    elif has_morning:
-        return morning  # SP hoặc SK
-    elif has_afternoon:
-        return afternoon  # CP hoặc CK
-    
-    return ''
-
-def get_absence_periods_from_sessions(morning: str, afternoon: str) -> int:
-    """Tính số buổi nghỉ từ morning và afternoon"""
-    periods = 0
-    if morning and morning in ['attendance_sp', 'attendance_sk']:
-        periods += 1
-    if afternoon and afternoon in ['attendance_cp', 'attendance_ck']:
-        periods += 1
-    return periods
-
-def get_excused_unexcused_periods(morning: str, afternoon: str) -> dict:
-    """Tính số buổi có phép và không phép"""
-    excused = 0
-    unexcused = 0
-    
-    if morning == 'attendance_sp':
-        excused += 1
-    elif morning == 'attendance_sk':
-        unexcused += 1
-    
-    if afternoon == 'attendance_cp':
-        excused += 1
-    elif afternoon == 'attendance_ck':
-        unexcused += 1
-    
-    return {'excused': excused, 'unexcused': unexcused}
-
-def get_absence_periods(attendance_code: str) -> int:
+
+ATTENDANCE_STATS_MAX_DAYS = 366
+
+
+@query_budget(6)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def mongo_attendance_stats(request):
     """
-    Calculate number of absence periods (sessions) from attendance code.
-    1 day = 2 periods (morning + afternoon)
-    Full day absence = 2 periods, Half day absence = 1 period
+    Thống kê nghỉ học toàn trường trong 1 request (thay cho xuất từng lớp).
+
+    Params: start_date, end_date (YYYY-MM-DD, mặc định tháng hiện tại), grade, chronic_threshold (0 - 1, mặc định 0.1)
+    Lớp-tháng chưa có bản điểm danh gọn được liệt kê trong missing_months (chạy backfill_attendance), không dựng trong request.
     """
-    # Full day absence: 2 periods
-    # spck = sáng có phép + chiều không phép = 2 buổi
-    # skcp = sáng không phép + chiều có phép = 2 buổi
-    if attendance_code in ['attendance_spcp', 'attendance_skck', 
-                          'attendance_spck', 'attendance_skcp']:
-        return 2
-    # Half day absence: 1 period
-    if attendance_code in ['attendance_sp', 'attendance_cp', 'attendance_sk', 'attendance_ck']:
-        return 1
-    return 0
+    try:
+        from .attendance_stats import DEFAULT_CHRONIC_THRESHOLD, attendance_report
+
+        today = datetime.now().date()
+        try:
+            start = datetime.strptime(request.query_params.get('start_date') or today.replace(day=1).isoformat(), '%Y-%m-%d').date()
+            end = datetime.strptime(request.query_params.get('end_date') or today.isoformat(), '%Y-%m-%d').date()
+            threshold = float(request.query_params.get('chronic_threshold', DEFAULT_CHRONIC_THRESHOLD))
+        except ValueError:
+            return bad_request('start_date / end_date / chronic_threshold không hợp lệ')
+        if not 0 <= threshold <= 1:
+            return bad_request('chronic_threshold phải trong khoảng 0 - 1')
+        if end < start or (end - start).days >= ATTENDANCE_STATS_MAX_DAYS:
+            return bad_request(f'Khoảng ngày không hợp lệ (tối đa {ATTENDANCE_STATS_MAX_DAYS} ngày)')
+
+        return ok(attendance_report(start, end, grade=request.query_params.get('grade'), chronic_threshold=threshold))
+
+    except Exception as exc:
+        logger.exception('mongo_attendance_stats error')
+        return server_error(exc)
 
+
+@query_budget(8)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@secondary_reads
 def mongo_attendance_export(request):
-    """Xuất điểm danh ra file Excel theo template"""
+    """
+    Xuất điểm danh ra file Excel theo template.
+    Lớp-tháng chưa có bản điểm danh gọn: header X-Attendance-Missing-Month (chạy backfill_attendance), không ghi trong request.
+    """
     try:
         from django.http import HttpResponse
         from calendar import monthrange
         import io
         from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-        from openpyxl.utils import get_column_letter
+        from openpyxl.styles import Font, Alignment, Border, Side
         
         classroom_id = request.query_params.get('classroom_id')
-        month = int(request.query_params.get('month', datetime.now().month))
-        year = int(request.query_params.get('year', datetime.now().year))
+        try:
+            month = int(request.query_params.get('month', datetime.now().month))
+            year = int(request.query_params.get('year', datetime.now().year))
+        except ValueError:
+            return bad_request('month / year không hợp lệ')
+        if not 1 <= month <= 12 or not 2000 <= year <= 2100:
+            return bad_request('month / year không hợp lệ')
         
         if not classroom_id:
             return bad_request('classroom_id là bắt buộc')
+        classroom_filter = id_filter(classroom_id)
+        if not classroom_filter:
+            return bad_request('classroom_id không hợp lệ')
         
         # Get classroom info
         classrooms_coll = get_mongo_collection('classrooms')
-        classroom = classrooms_coll.find_one({'_id': ObjectId(classroom_id)})
+        classroom = classrooms_coll.find_one(classroom_filter)
         if not classroom:
             return not_found('Không tìm thấy lớp học')
         
@@ -1457,75 +1950,11 @@ def mongo_attendance_export(request):
             'classroom_id': classroom_id
         }).sort('full_name', 1))
         
-        # Get attendance data for the month
-        events_coll = get_mongo_collection('events')
-        start_date = f"{year}-{month:02d}-01"
-        days_in_month = monthrange(year, month)[1]
-        end_date = f"{year}-{month:02d}-{days_in_month:02d}"
-        
-        attendance_data = {}
-        events = events_coll.find({
-            'classroom_id': classroom_id,
-            'date': {'$gte': start_date, '$lte': end_date},
-            'periods.attendance': {'$exists': True, '$ne': []}
-        })
-        
-        for event_doc in events:
-            date = event_doc.get('date')
-            attendance_events = event_doc.get('periods', {}).get('attendance', [])
-            if date not in attendance_data:
-                attendance_data[date] = {}
-            
-            # Group attendance events by student_id to handle session-based data
-            student_sessions = {}
-            for att_event in attendance_events:
-                student_id = att_event.get('student_id')
-                # Convert ObjectId to string if needed
-                if student_id and hasattr(student_id, '__str__'):
-                    student_id = str(student_id)
-                else:
-                    student_id = str(student_id) if student_id else ''
-                
-                if not student_id:
-                    continue
-                
-                event_type_key = att_event.get('event_type_key', '')
-                session = att_event.get('session', 'morning')  # Default to morning if not specified
-                
-                if student_id not in student_sessions:
-                    student_sessions[student_id] = {'morning': '', 'afternoon': ''}
-                
-                # Map to morning/afternoon based on session or event type
-                if session == 'morning' or event_type_key in ['attendance_sp', 'attendance_sk']:
-                    student_sessions[student_id]['morning'] = event_type_key
-                elif session == 'afternoon' or event_type_key in ['attendance_cp', 'attendance_ck']:
-                    student_sessions[student_id]['afternoon'] = event_type_key
-                else:
-                    # Legacy format - try to derive from event_type_key
-                    legacy_map = {
-                        'attendance_spcp': {'morning': 'attendance_sp', 'afternoon': 'attendance_cp'},
-                        'attendance_skck': {'morning': 'attendance_sk', 'afternoon': 'attendance_ck'},
-                        'attendance_spck': {'morning': 'attendance_sp', 'afternoon': 'attendance_ck'},
-                        'attendance_skcp': {'morning': 'attendance_sk', 'afternoon': 'attendance_cp'},
-                    }
-                    if event_type_key in legacy_map:
-                        mapped = legacy_map[event_type_key]
-                        student_sessions[student_id]['morning'] = mapped['morning']
-                        student_sessions[student_id]['afternoon'] = mapped['afternoon']
-                    else:
-                        # Fallback: store as-is (legacy single code)
-                        attendance_data[date][student_id] = event_type_key
-            
-            # Derive attendance type from sessions for each student
-            for student_id, sessions in student_sessions.items():
-                morning = sessions.get('morning', '')
-                afternoon = sessions.get('afternoon', '')
-                
-                if morning or afternoon:
-                    # Use helper function to derive attendance type
-                    derived_type = derive_attendance_type(morning, afternoon)
-                    if derived_type:
-                        attendance_data[date][student_id] = derived_type
+        # Mã điểm danh cả tháng: 1 document lớp-tháng trong collection 'attendance'
+        # Chưa có document: dựng tạm trong bộ nhớ, báo qua header (cần chạy backfill_attendance)
+        month_codes, month_missing = attendance_store.load_month(classroom_id, year, month)
+        if month_missing:
+            logger.warning('attendance month %s-%02d of %s missing, run backfill_attendance', year, month, classroom_id)
         
         # Create Excel workbook
         wb = Workbook()
@@ -1555,7 +1984,7 @@ def mongo_attendance_export(request):
         ws['G1'].alignment = center_align
         
         ws.merge_cells('A2:F2')
-        ws['A2'] = 'TRƯỜNG THPT LAI VUNG 3'
+        ws['A2'] = current_tenant().name
         ws['A2'].font = header_font
         ws['A2'].alignment = center_align
         
@@ -1705,68 +2134,16 @@ def mongo_attendance_export(request):
             
             # Write attendance for each day (only actual days in month)
             col = 4
-            total_absence_periods = 0  # Total absence periods (sessions), not days
-            total_excused_periods = 0   # Total excused absence periods
-            total_unexcused_periods = 0 # Total unexcused absence periods
-            
-            # Map attendance code to display
-            code_map = {
-                'attendance_spcp': 'spcp',
-                'attendance_sp': 'sp',
-                'attendance_cp': 'cp',
-                'attendance_skck': 'skck',
-                'attendance_sk': 'sk',
-                'attendance_ck': 'ck',
-                'attendance_spck': 'spck',
-                'attendance_skcp': 'skcp'
-            }
-            
+            codes = (month_codes.get(student_id) or [])[:days_in_month]
             for day in range(1, days_in_month + 1):
-                date_str = f"{year}-{month:02d}-{day:02d}"
-                attendance_code = attendance_data.get(date_str, {}).get(student_id, '')
-                
-                # Write attendance code if exists
-                if attendance_code:
-                    display_code = code_map.get(attendance_code, '')
-                    ws.cell(row=row, column=col, value=display_code).border = border
-                    if display_code:
-                        # Calculate absence periods (sessions) for this day
-                        periods = get_absence_periods(attendance_code)
-                        total_absence_periods += periods
-                        
-                        # Count excused and unexcused periods
-                        # For legacy codes, use direct mapping
-                        # For session-based codes, derive from sessions if needed
-                        if attendance_code in ['attendance_spcp', 'attendance_skck', 'attendance_spck', 'attendance_skcp']:
-                            # Legacy full-day codes
-                            if attendance_code == 'attendance_spcp':
-                                total_excused_periods += 2
-                            elif attendance_code == 'attendance_skck':
-                                total_unexcused_periods += 2
-                            elif attendance_code == 'attendance_spck':
-                                # Sáng có phép + chiều không phép = 1 buổi có phép + 1 buổi không phép
-                                total_excused_periods += 1
-                                total_unexcused_periods += 1
-                            elif attendance_code == 'attendance_skcp':
-                                # Sáng không phép + chiều có phép = 1 buổi không phép + 1 buổi có phép
-                                total_unexcused_periods += 1
-                                total_excused_periods += 1
-                        else:
-                            # Session-based codes (SP, SK, CP, CK) - use helper function
-                            # Since we already derived the type, we can use direct mapping
-                            if attendance_code == 'attendance_sp':
-                                total_excused_periods += 1
-                            elif attendance_code == 'attendance_sk':
-                                total_unexcused_periods += 1
-                            elif attendance_code == 'attendance_cp':
-                                total_excused_periods += 1
-                            elif attendance_code == 'attendance_ck':
-                                total_unexcused_periods += 1
-                else:
-                    # Empty cell
-                    ws.cell(row=row, column=col, value='').border = border
+                code = codes[day - 1] if day <= len(codes) else 0
+                ws.cell(row=row, column=col, value=attendance_store.display_code(code)).border = border
                 col += 1
             
+            # Số buổi nghỉ (1 ngày = 2 buổi sáng/chiều): có phép (P), không phép (K)
+            total_excused_periods, total_unexcused_periods = attendance_store.absence_counts(codes)
+            total_absence_periods = total_excused_periods + total_unexcused_periods
+            
             # Summary columns - TS Buổi nghỉ (total absence periods)
             ws.cell(row=row, column=col, value=total_absence_periods).border = border  # TS (total periods)
             ws.cell(row=row, column=col+1, value=total_excused_periods).border = border  # P (excused periods)
@@ -1793,6 +2170,8 @@ def mongo_attendance_export(request):
         )
         filename = f'diem_danh_{classroom_name}_{month}_{year}.xlsx'
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if month_missing:
+            response['X-Attendance-Missing-Month'] = f'{year}-{month:02d}'
         return response
         
     except Exception as exc:
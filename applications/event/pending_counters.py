@@ -0,0 +1,82 @@
+"""
+Bộ đếm số day-document đang chờ duyệt theo lớp.
+
+Collection 'event_pending_counters': {classroom_id, pending_count, updated_at}
+được cập nhật bởi chính các write path đổi approval_status, để badge "chờ duyệt"
+chỉ tốn 1 lần đọc có index.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from applications.common.mongo import get_mongo_collection
+
+
+COUNTERS_COLLECTION = 'event_pending_counters'
+
+
+def _counters_coll():
+    return get_mongo_collection(COUNTERS_COLLECTION)
+
+
+def record_approval_transition(classroom_id, old_status: Optional[str], new_status: Optional[str]) -> None:
+    """
+    Tăng/giảm bộ đếm khi 1 document chuyển vào/ra trạng thái 'pending'.
+
+    old_status phải là trạng thái ngay trước chính lần ghi (find_one_and_update với ReturnDocument.BEFORE),
+    không phải từ 1 lần find_one trước đó: 2 request duyệt cùng lúc khi đó chỉ 1 request thấy 'pending'.
+    """
+    delta = int(new_status == 'pending') - int(old_status == 'pending')
+    if not delta or not classroom_id:
+        return
+    _counters_coll().update_one(
+        {'classroom_id': str(classroom_id)},
+        {'$inc': {'pending_count': delta}, '$set': {'updated_at': datetime.now().isoformat()}},
+        upsert=True,
+    )
+
+
+def recount_pending(classroom_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Đếm lại từ collection 'events' (dùng sau update_many hoặc để sửa lệch bộ đếm)."""
+    match = {'approval_status': 'pending'}
+    ids = [str(cid) for cid in classroom_ids] if classroom_ids is not None else None
+    if ids is not None:
+        if not ids:
+            return {}
+        match['classroom_id'] = {'$in': ids}
+
+    counts = {
+        str(row['_id']): row['count']
+        for row in get_mongo_collection('events').aggregate([
+            {'$match': match},
+            {'$group': {'_id': '$classroom_id', 'count': {'$sum': 1}}},
+        ])
+        if row['_id']
+    }
+
+    now = datetime.now().isoformat()
+    targets = ids if ids is not None else list(counts.keys())
+    ops = [
+        UpdateOne({'classroom_id': cid}, {'$set': {'pending_count': counts.get(cid, 0), 'updated_at': now}}, upsert=True)
+        for cid in targets
+    ]
+    if ops:
+        _counters_coll().bulk_write(ops, ordered=False)
+    if ids is None:
+        _counters_coll().update_many(
+            {'classroom_id': {'$nin': targets}},
+            {'$set': {'pending_count': 0, 'updated_at': now}},
+        )
+    return {cid: counts.get(cid, 0) for cid in targets}
+
+
+def get_pending_counts(classroom_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    query = {'pending_count': {'$gt': 0}}
+    if classroom_ids is not None:
+        query['classroom_id'] = {'$in': [str(cid) for cid in classroom_ids]}
+    return {
+        doc['classroom_id']: doc.get('pending_count', 0)
+        for doc in _counters_coll().find(query, {'classroom_id': 1, 'pending_count': 1})
+    }
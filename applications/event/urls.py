@@ -17,10 +17,19 @@ urlpatterns = [
     path('bulk-sync', mongo_views.mongo_events_bulk_sync, name='events-bulk-sync'),
     path('bulk-replace', mongo_views.mongo_events_bulk_replace, name='events-bulk-replace'),
     path('approve', mongo_views.mongo_events_approve, name='events-approve'),
+    path('approve/bulk', mongo_views.mongo_events_approve_bulk, name='events-approve-bulk'),
+    path('pending', mongo_views.mongo_events_pending, name='events-pending'),
+    path('pending/counts', mongo_views.mongo_events_pending_counts, name='events-pending-counts'),
+    
+    # Event Items APIs - thêm/sửa/xóa 1 event theo event_id
+    path('items/add', mongo_views.mongo_events_item_add, name='events-item-add'),
+    path('items/update', mongo_views.mongo_events_item_update, name='events-item-update'),
+    path('items/remove', mongo_views.mongo_events_item_remove, name='events-item-remove'),
     
     # Public Events API (không cần authentication)
     path('public', mongo_views.mongo_events_public, name='events-public'),
     
     # Attendance Export API
     path('attendance/export', mongo_views.mongo_attendance_export, name='attendance-export'),
+    path('attendance/stats', mongo_views.mongo_attendance_stats, name='attendance-stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Import học sinh từ Excel theo từng chunk (ExcelReader, applications.common.excel_import).
+
+Mỗi chunk: 1 truy vấn $in kiểm tra mã học sinh đã tồn tại, insert_many cho users và students,
+1 bulk_write cộng student_count cho các lớp; thay cho 4-5 lệnh MongoDB mỗi dòng trước đây.
+Danh sách lớp (ít) được đọc 1 lần cho cả file. Dòng lỗi được bỏ qua và báo theo số dòng;
+dry_run chỉ kiểm tra (kể cả lớp / mã trùng) mà không ghi.
+
+Ghi lỗi 1 phần (BulkWriteError, vd unique index khi 2 lần import chạy song song): dòng lỗi được báo
+theo số dòng, chỉ ghi students cho user đã ghi được (user mồ côi bị xóa lại), student_count và
+success_count chỉ tính document thực sự được ghi.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from applications.common.excel_import import Chunk, ExcelReader
+from applications.common.search_keys import student_search_keys, SEARCH_KEYS_FIELD
+
+
+REQUIRED_COLUMNS = ['Họ tên', 'Mã học sinh', 'Lớp', 'Giới tính', 'Ngày sinh']
+PREVIEW_ROWS = 20
+
+
+@dataclass
+class StudentRow:
+    full_name: str
+    student_code: str
+    classroom_name: str
+    gender: str
+    date_of_birth: str
+
+
+@dataclass
+class ImportSummary:
+    success_count: int = 0
+    valid_count: int = 0
+    errors: List[dict] = field(default_factory=list)
+    preview: List[dict] = field(default_factory=list)
+
+
+def _text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_row(row_number: int, values: Dict[str, object]) -> Tuple[Optional[StudentRow], List[str]]:
+    full_name = ' '.join(_text(values.get('Họ tên')).split())
+    student_code = _text(values.get('Mã học sinh'))
+    classroom_name = _text(values.get('Lớp'))
+    if not full_name or not student_code or not classroom_name:
+        return None, ['Thiếu thông tin bắt buộc']
+    gender = _text(values.get('Giới tính')).lower()
+    birth_date = values.get('Ngày sinh')
+    return StudentRow(
+        full_name=full_name,
+        student_code=student_code,
+        classroom_name=classroom_name,
+        gender='male' if gender in ['nam', 'male', 'm'] else 'female',
+        date_of_birth=birth_date.strftime('%Y-%m-%d') if hasattr(birth_date, 'strftime') else _text(birth_date),
+    ), []
+
+
+def _documents(item: StudentRow, classroom: dict, now: str) -> Tuple[dict, dict]:
+    parts = item.full_name.split()
+    user_data = {
+        'first_name': parts[0] if parts else '',
+        'last_name': ' '.join(parts[1:]) if len(parts) > 1 else '',
+        'full_name': item.full_name,
+        'email': f'{item.student_code}@student.local',
+        'role': 'student',
+        'student_code': item.student_code,
+        'classroom_id': str(classroom['_id']),
+        'is_active': True,
+        'created_at': now,
+        'updated_at': now
+    }
+    user_data[SEARCH_KEYS_FIELD] = student_search_keys(user_data)
+    student_data = {
+        'first_name': user_data['first_name'],
+        'last_name': user_data['last_name'],
+        'full_name': user_data['full_name'],
+        'email': user_data['email'],
+        'role': 'student',
+        'phone': '',
+        'created_at': now,
+        'updated_at': now,
+
+        # Student-specific fields
+        'student_code': item.student_code,
+        'classroom_id': str(classroom['_id']),
+        'classroom_name': classroom['name'],
+        'classroom_grade': classroom.get('grade', ''),
+        'gender': item.gender,
+        'date_of_birth': item.date_of_birth,
+        'address': '',
+        'parent_phone': '',
+        'is_special': False,
+    }
+    student_data[SEARCH_KEYS_FIELD] = student_search_keys(student_data)
+    return user_data, student_data
+
+
+def _insert_many(coll, docs: List[dict]) -> Dict[int, str]:
+    """insert_many(ordered=False) -> {vị trí document ghi lỗi: thông báo}; document ghi được có _id."""
+    try:
+        coll.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        return {err['index']: err.get('errmsg', 'Lỗi ghi') for err in exc.details.get('writeErrors', [])}
+    return {}
+
+
+class StudentImporter:
+    def __init__(self, users_coll, students_coll, classrooms_coll, dry_run: bool = False):
+        self.users = users_coll
+        self.students = students_coll
+        self.classrooms_coll = classrooms_coll
+        self.dry_run = dry_run
+        self.classrooms = {doc['name']: doc for doc in classrooms_coll.find({}, {'name': 1, 'grade': 1})}
+        self.seen_codes = set()
+        self.summary = ImportSummary()
+
+    def run(self, reader: ExcelReader, chunk_size: int) -> ImportSummary:
+        for chunk in reader.chunks(parse_row, size=chunk_size):
+            self.summary.errors.extend(chunk.errors)
+            self._import_chunk(reader, chunk)
+        return self.summary
+
+    def _import_chunk(self, reader: ExcelReader, chunk: Chunk) -> None:
+        codes = [item.student_code for _, item in chunk.rows]
+        existing = {
+            doc['student_code']
+            for doc in self.students.find({'student_code': {'$in': codes}}, {'student_code': 1})
+        } if codes else set()
+
+        errors = []
+        accepted: List[Tuple[int, StudentRow, dict]] = []
+        for row_number, item in chunk.rows:
+            classroom = self.classrooms.get(item.classroom_name)
+            if classroom is None:
+                errors.append({'row': row_number, 'error': f'Không tìm thấy lớp: {item.classroom_name}'})
+            elif item.student_code in existing or item.student_code in self.seen_codes:
+                errors.append({'row': row_number, 'error': f'Mã học sinh đã tồn tại: {item.student_code}'})
+            else:
+                self.seen_codes.add(item.student_code)
+                accepted.append((row_number, item, classroom))
+                if len(self.summary.preview) < PREVIEW_ROWS:
+                    self.summary.preview.append({'row': row_number, **vars(item)})
+        reader.add_errors(self.summary.errors, errors)
+        self.summary.valid_count += len(accepted)
+        if self.dry_run or not accepted:
+            return
+
+        now = datetime.now().isoformat()
+        pairs = [_documents(item, classroom, now) for _, item, classroom in accepted]
+        write_errors = []
+
+        failed_users = _insert_many(self.users, [user for user, _ in pairs])
+        written = [i for i in range(len(accepted)) if i not in failed_users]
+        write_errors += [{'row': accepted[i][0], 'error': message} for i, message in failed_users.items()]
+
+        failed_students = _insert_many(self.students, [pairs[i][1] for i in written]) if written else {}
+        if failed_students:
+            orphans = [pairs[written[j]][0]['_id'] for j in failed_students]
+            self.users.delete_many({'_id': {'$in': orphans}})
+            write_errors += [{'row': accepted[written[j]][0], 'error': message} for j, message in failed_students.items()]
+            written = [i for j, i in enumerate(written) if j not in failed_students]
+
+        if write_errors:
+            write_errors.sort(key=lambda e: e['row'])
+            reader.add_errors(self.summary.errors, write_errors)
+        if not written:
+            return
+        per_class = Counter(accepted[i][2]['_id'] for i in written)
+        self.classrooms_coll.bulk_write(
+            [UpdateOne({'_id': _id}, {'$inc': {'student_count': n}}) for _id, n in per_class.items()],
+            ordered=False,
+        )
+        self.summary.success_count += len(written)
@@ -0,0 +1,245 @@
+"""
+Chỉ mục tra cứu học sinh toàn trường, giữ trong bộ nhớ của từng process (1 chỉ mục / trường).
+
+Dùng cho giám thị ký túc xá (ghi vi phạm đột xuất cho học sinh mọi lớp):
+  - tìm theo tiền tố mã học sinh / tên không dấu bằng bisect trên danh sách khóa đã sort
+  - tìm gần đúng (gõ sai chính tả) bằng difflib trên tập từ của tên
+
+Phiên bản: mỗi lần ghi học sinh, view gọi upsert_student()/remove_student()/mark_stale()
+(đổi tên / xóa lớp cũng gọi mark_stale() để cập nhật tên lớp).
+Process ghi cập nhật tăng dần chỉ mục của mình và tăng version chung; version nằm trong MongoDB
+(applications.common.versions) chứ không trong Django cache, vì LocMemCache mặc định là riêng từng
+worker. Các process khác thấy version khác (chậm nhất sau SHARED_VERSION_CHECK_SECONDS) sẽ rebuild
+(1 lần find với projection) ở lần tra cứu kế tiếp.
+"""
+
+import bisect
+import difflib
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from applications.common.mongo import get_mongo_collection, get_users_collection
+from applications.common.search_keys import fold
+from applications.common.tenancy import current_tenant
+from applications.common.versions import bump_version, get_version
+
+
+_VERSION_NAME = 'student_lookup'
+
+_PROJECTION = {'full_name': 1, 'student_code': 1, 'classroom_id': 1}
+
+
+@dataclass(frozen=True)
+class StudentEntry:
+    id: str
+    student_code: str
+    full_name: str
+    folded_name: str
+    classroom_id: str
+    classroom_name: str
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'student_code': self.student_code,
+            'full_name': self.full_name,
+            'classroom_id': self.classroom_id,
+            'classroom_name': self.classroom_name,
+        }
+
+
+def _entry_keys(entry: StudentEntry) -> List[str]:
+    keys = []
+    if entry.student_code:
+        keys.append(fold(entry.student_code))
+    words = entry.folded_name.split(' ') if entry.folded_name else []
+    keys.extend(' '.join(words[i:]) for i in range(len(words)))
+    return keys
+
+
+class StudentLookupIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[str, StudentEntry] = {}
+        self._keys: List[Tuple[str, str]] = []          # (khóa, student_id) đã sort
+        self._tokens: Dict[str, set] = {}               # từ trong tên -> {student_id}
+        self._classroom_names: Dict[str, str] = {}
+        self.version: Optional[int] = None
+
+    # --- build / cập nhật ---
+
+    def _load_classroom_names(self) -> None:
+        self._classroom_names = {
+            str(c['_id']): c.get('full_name') or c.get('name', '')
+            for c in get_mongo_collection('classrooms').find({}, {'full_name': 1, 'name': 1})
+        }
+
+    def _make_entry(self, doc: dict) -> StudentEntry:
+        classroom_id = str(doc.get('classroom_id') or '')
+        full_name = doc.get('full_name') or ''
+        return StudentEntry(
+            id=str(doc['_id']),
+            student_code=str(doc.get('student_code') or ''),
+            full_name=full_name,
+            folded_name=fold(full_name),
+            classroom_id=classroom_id,
+            classroom_name=self._classroom_names.get(classroom_id, ''),
+        )
+
+    def _add(self, entry: StudentEntry) -> None:
+        self._entries[entry.id] = entry
+        for key in _entry_keys(entry):
+            bisect.insort(self._keys, (key, entry.id))
+        for token in entry.folded_name.split(' '):
+            if token:
+                self._tokens.setdefault(token, set()).add(entry.id)
+
+    def _discard(self, student_id: str) -> None:
+        entry = self._entries.pop(student_id, None)
+        if entry is None:
+            return
+        for key in _entry_keys(entry):
+            pos = bisect.bisect_left(self._keys, (key, entry.id))
+            if pos < len(self._keys) and self._keys[pos] == (key, entry.id):
+                del self._keys[pos]
+        for token in entry.folded_name.split(' '):
+            ids = self._tokens.get(token)
+            if ids is not None:
+                ids.discard(entry.id)
+                if not ids:
+                    del self._tokens[token]
+
+    def rebuild(self, version: int) -> None:
+        with self._lock:
+            self._entries, self._keys, self._tokens = {}, [], {}
+            self._load_classroom_names()
+            for doc in get_users_collection().find({'role': 'student'}, _PROJECTION):
+                entry = self._make_entry(doc)
+                self._entries[entry.id] = entry
+            keys = []
+            for entry in self._entries.values():
+                keys.extend((key, entry.id) for key in _entry_keys(entry))
+                for token in entry.folded_name.split(' '):
+                    if token:
+                        self._tokens.setdefault(token, set()).add(entry.id)
+            keys.sort()
+            self._keys = keys
+            self.version = version
+
+    def upsert(self, doc: dict) -> None:
+        with self._lock:
+            classroom_id = str(doc.get('classroom_id') or '')
+            if classroom_id and classroom_id not in self._classroom_names:
+                self._load_classroom_names()
+            self._discard(str(doc['_id']))
+            self._add(self._make_entry(doc))
+
+    def remove(self, student_id: str) -> None:
+        with self._lock:
+            self._discard(str(student_id))
+
+    # --- tra cứu ---
+
+    def _prefix_ids(self, term: str, limit: int) -> List[str]:
+        out = []
+        pos = bisect.bisect_left(self._keys, (term, ''))
+        while pos < len(self._keys) and len(out) < limit:
+            key, student_id = self._keys[pos]
+            if not key.startswith(term):
+                break
+            if student_id not in out:
+                out.append(student_id)
+            pos += 1
+        return out
+
+    def _fuzzy_ids(self, term: str, limit: int) -> List[str]:
+        """Mỗi từ trong chuỗi tìm khớp gần đúng với 1 từ trong tên; xếp theo độ giống."""
+        candidates = None
+        for word in term.split(' '):
+            matched = set()
+            for token in difflib.get_close_matches(word, self._tokens.keys(), n=10, cutoff=0.75):
+                matched |= self._tokens[token]
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+        scored = sorted(
+            candidates,
+            key=lambda sid: -difflib.SequenceMatcher(None, term, self._entries[sid].folded_name).ratio(),
+        )
+        return scored[:limit]
+
+    def lookup(self, query: str, limit: int = 20, classroom_id: Optional[str] = None, fuzzy: bool = True) -> List[dict]:
+        term = fold(query)
+        if not term:
+            return []
+        with self._lock:
+            # Lấy dư khi lọc theo lớp để vẫn đủ `limit` kết quả
+            scan_limit = limit if not classroom_id else limit * 20
+            ids = self._prefix_ids(term, scan_limit)
+            if fuzzy and len(ids) < limit:
+                ids += [sid for sid in self._fuzzy_ids(term, scan_limit) if sid not in ids]
+            entries = [self._entries[sid] for sid in ids if sid in self._entries]
+        if classroom_id:
+            entries = [e for e in entries if e.classroom_id == str(classroom_id)]
+        return [e.as_dict() for e in entries[:limit]]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Mỗi trường (tenant) 1 chỉ mục; version chung nằm trong database của từng trường
+_indexes: Dict[str, StudentLookupIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _local_index() -> StudentLookupIndex:
+    key = current_tenant().key
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(key, StudentLookupIndex())
+    return index
+
+
+def _shared_version() -> int:
+    return get_version(_VERSION_NAME)
+
+
+def _bump_version() -> int:
+    return bump_version(_VERSION_NAME)
+
+
+def get_lookup_index() -> StudentLookupIndex:
+    """Chỉ mục của process hiện tại; rebuild nếu version chung đã đổi."""
+    index = _local_index()
+    version = _shared_version()
+    if index.version != version:
+        index.rebuild(version)
+    return index
+
+
+def _apply_local(change) -> None:
+    """Áp dụng thay đổi tăng dần nếu chỉ mục local đang mới nhất, rồi tăng version chung."""
+    index = _local_index()
+    current = _shared_version()
+    new_version = _bump_version()
+    # Chỉ áp dụng tại chỗ khi không có process nào khác ghi xen giữa
+    if index.version == current and new_version == current + 1:
+        change(index)
+        index.version = new_version
+
+
+def upsert_student(doc: dict) -> None:
+    if doc.get('role', 'student') != 'student' or not doc.get('_id'):
+        return
+    _apply_local(lambda index: index.upsert(doc))
+
+
+def remove_student(student_id) -> None:
+    _apply_local(lambda index: index.remove(student_id))
+
+
+def mark_stale() -> None:
+    """Ghi hàng loạt (import), đổi tên / xóa lớp: mọi process rebuild ở lần tra cứu kế tiếp."""
+    _bump_version()
@@ -0,0 +1,171 @@
+"""
+Truy vấn danh sách học sinh (collection users, role=student).
+
+Một aggregation $facet trả về cùng lúc:
+  - page:   trang hiện tại (đã sort/skip/limit)
+  - total:  tổng số học sinh khớp bộ lọc
+  - gender: số lượng theo giới tính
+classroom_name của trang được lấy sau đó bằng 1 truy vấn _id $in trên classrooms (index _id),
+thay cho $lookup phải $convert classroom_id (chuỗi) sang ObjectId cho từng dòng.
+
+Chế độ cached-count: với danh sách 1 lớp không lọc (không search/gender),
+total + số nam/nữ được cache theo lớp (Django cache) và chỉ chạy facet `page`.
+Các đường ghi học sinh gọi invalidate_student_counts() khi sĩ số lớp thay đổi.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from applications.common.ids import to_object_ids
+from applications.common.mongo import get_mongo_collection, to_plain
+from applications.common.search_keys import prefix_filter, SEARCH_KEYS_FIELD
+
+
+_COUNTS_VERSION_KEY = 'student_counts:version'
+
+
+def search_filter(search: str) -> dict:
+    """Tìm theo tiền tố không dấu trên search_keys (index range scan)."""
+    return prefix_filter(search) or {}
+
+
+def _page_stages(page: int, page_size: int) -> List[dict]:
+    return [
+        {'$sort': {'full_name': 1, '_id': 1}},
+        {'$skip': (page - 1) * page_size},
+        {'$limit': page_size},
+    ]
+
+
+def attach_classroom_names(docs: List[dict]) -> List[dict]:
+    """Gán classroom_name cho các học sinh của trang bằng 1 truy vấn $in (classroom_id chuẩn là chuỗi hex)."""
+    ids = to_object_ids(d.get('classroom_id') for d in docs)
+    names = {
+        str(c['_id']): c.get('full_name') or c.get('name') or ''
+        for c in get_mongo_collection('classrooms').find({'_id': {'$in': ids}}, {'full_name': 1, 'name': 1})
+    } if ids else {}
+    for d in docs:
+        d['classroom_name'] = names.get(str(d.get('classroom_id') or ''), '')
+    return docs
+
+
+def _gender_counts(buckets: List[dict]) -> Tuple[int, int]:
+    by_gender = {b.get('_id'): b.get('count', 0) for b in buckets}
+    return by_gender.get('male', 0), by_gender.get('female', 0)
+
+
+def facet_student_page(
+    coll,
+    base_query: dict,
+    page: int,
+    page_size: int,
+    filter_query: Optional[dict] = None,
+    with_counts: bool = True,
+    with_classroom_names: bool = True,
+) -> Dict:
+    """
+    Chạy 1 aggregation cho trang học sinh.
+
+    base_query   - điều kiện chung (role, lớp); số nam/nữ được đếm trên tập này
+    filter_query - điều kiện thêm (search, gender) chỉ áp dụng cho page/total
+    with_counts  - False: chỉ lấy trang (dùng khi counts đã có trong cache)
+
+    Trả về {'docs', 'total', 'male_count', 'female_count'} (total/counts = None khi with_counts=False).
+    """
+    filtered = [{'$match': filter_query}] if filter_query else []
+    facets = {'page': filtered + _page_stages(page, page_size)}
+    if with_counts:
+        facets['total'] = filtered + [{'$count': 'count'}]
+        facets['gender'] = [{'$group': {'_id': '$gender', 'count': {'$sum': 1}}}]
+
+    pipeline = [{'$match': base_query}, {'$facet': facets}]
+    result = next(coll.aggregate(pipeline), {}) or {}
+
+    docs = result.get('page', [])
+    if with_classroom_names:
+        attach_classroom_names(docs)
+    out = {'docs': docs, 'total': None, 'male_count': None, 'female_count': None}
+    if with_counts:
+        total_rows = result.get('total') or []
+        out['total'] = total_rows[0]['count'] if total_rows else 0
+        out['male_count'], out['female_count'] = _gender_counts(result.get('gender') or [])
+    return out
+
+
+# --- Cached counts cho danh sách 1 lớp không lọc ---
+
+def _counts_ttl() -> int:
+    return getattr(settings, 'STUDENT_COUNTS_CACHE_TTL', 300)
+
+
+def _counts_key(classroom_id: str) -> str:
+    version = cache.get(_COUNTS_VERSION_KEY)
+    if version is None:
+        cache.add(_COUNTS_VERSION_KEY, 1, None)
+        version = cache.get(_COUNTS_VERSION_KEY) or 1
+    return f'student_counts:{version}:{classroom_id}'
+
+
+def get_cached_counts(classroom_id: str) -> Optional[Dict[str, int]]:
+    return cache.get(_counts_key(str(classroom_id)))
+
+
+def set_cached_counts(classroom_id: str, total: int, male_count: int, female_count: int) -> None:
+    cache.set(
+        _counts_key(str(classroom_id)),
+        {'total': total, 'male_count': male_count, 'female_count': female_count},
+        _counts_ttl(),
+    )
+
+
+def invalidate_student_counts(*classroom_ids) -> None:
+    """Xóa counts đã cache của các lớp; không truyền lớp -> xóa toàn bộ."""
+    ids = [str(cid) for cid in classroom_ids if cid]
+    if ids:
+        cache.delete_many([_counts_key(cid) for cid in ids])
+        return
+    try:
+        cache.incr(_COUNTS_VERSION_KEY)
+    except ValueError:
+        cache.set(_COUNTS_VERSION_KEY, 2, None)
+
+
+def student_page(
+    coll,
+    base_query: dict,
+    page: int,
+    page_size: int,
+    filter_query: Optional[dict] = None,
+    cached_counts_for: Optional[str] = None,
+    with_classroom_names: bool = True,
+) -> Dict:
+    """
+    facet_student_page() + cached-count mode.
+
+    cached_counts_for - classroom_id: dùng/ghi counts đã cache của lớp (chỉ dùng
+    khi không có filter_query, vì counts cache là của cả lớp).
+    """
+    use_cache = bool(cached_counts_for) and not filter_query
+    if use_cache:
+        counts = get_cached_counts(cached_counts_for)
+        if counts is not None:
+            res = facet_student_page(coll, base_query, page, page_size, with_counts=False,
+                                     with_classroom_names=with_classroom_names)
+            res.update(counts)
+            return res
+
+    res = facet_student_page(coll, base_query, page, page_size, filter_query=filter_query,
+                             with_classroom_names=with_classroom_names)
+    if use_cache:
+        set_cached_counts(cached_counts_for, res['total'], res['male_count'], res['female_count'])
+    return res
+
+
+def plain_student(doc: dict) -> dict:
+    t = to_plain(doc)
+    t.pop(SEARCH_KEYS_FIELD, None)
+    t['created_at'] = t.get('created_at') or ''
+    t['updated_at'] = t.get('updated_at') or t['created_at']
+    return t
@@ -7,6 +7,7 @@ urlpatterns = [
     # Mongo students only (remove SQL endpoints)
     path('mongo', views.mongo_students_list, name='mongo-students-list'),
     path('mongo/dropdown', views.mongo_students_dropdown, name='mongo-students-dropdown'),
+    path('mongo/lookup', views.mongo_students_lookup, name='mongo-students-lookup'),
     path('mongo/create', views.mongo_students_create, name='mongo-students-create'),
     path('mongo/create-by-teacher', views.mongo_students_create_by_teacher, name='mongo-students-create-by-teacher'),
     path('mongo/my-classroom-students', views.mongo_students_my_classroom, name='mongo-students-my-classroom'),
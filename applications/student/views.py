@@ -25,6 +25,16 @@ from .serializers import (
     MongoStudentUpdateSerializer
 )
 from applications.common.mongo import get_mongo_collection, to_plain
+from applications.common.query_budget import query_budget
+from applications.common.read_routing import secondary_reads
+from applications.common.user_context import invalidate_user_context
+from applications.common.display_names import propagate_student_name
+from applications.common.search_keys import student_search_keys, refresh_search_keys, SEARCH_KEYS_FIELD
+from .queries import search_filter, student_page, plain_student, invalidate_student_counts
+from .lookup_index import get_lookup_index, upsert_student, remove_student, mark_stale
+from . import importer as student_importer
+from applications.common.excel_import import DEFAULT_CHUNK_SIZE, ExcelImportError, ExcelReader
+from applications.permissions import IsAdminOrTeacherOrDormSupervisor
 from bson import ObjectId
 
 
@@ -35,6 +45,15 @@ def _mongo_users_coll():
     return get_mongo_collection(coll)
 
 
+def _cached_counts_enabled(request) -> bool:
+    """Cached-count mode: ?count_mode=cached hoặc bật mặc định bằng STUDENT_LIST_CACHED_COUNTS."""
+    mode = request.query_params.get('count_mode')
+    if mode:
+        return mode == 'cached'
+    return getattr(settings, 'STUDENT_LIST_CACHED_COUNTS', False)
+
+
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_students_list(request):
@@ -51,13 +70,7 @@ def mongo_students_list(request):
             query['gender'] = gender
         if search:
             # basic regex OR on user fields and student_code
-            query['$or'] = [
-                {'full_name': {'$regex': search, '$options': 'i'}},
-                {'first_name': {'$regex': search, '$options': 'i'}},
-                {'last_name': {'$regex': search, '$options': 'i'}},
-                {'student_code': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}},
-            ]
+            query.update(search_filter(search))
 
         # Pagination
         page = int(request.query_params.get('page', 1))
@@ -65,70 +78,16 @@ def mongo_students_list(request):
         page = max(1, page)
         page_size = max(1, min(200, page_size))
 
-        total_count = coll.count_documents(query)
-        skip_count = (page - 1) * page_size
-
-        # Calculate gender stats
-        male_count = coll.count_documents({**query, 'gender': 'male'})
-        female_count = coll.count_documents({**query, 'gender': 'female'})
-
-        docs = list(coll.find(query).sort('full_name', 1).skip(skip_count).limit(page_size))
-
-        # Get all unique classroom_ids to populate classroom_name
-        classroom_ids = set()
-        classroom_id_to_str = {}  # Map original classroom_id to string version
-        for d in docs:
-            classroom_id = d.get('classroom_id')
-            if classroom_id:
-                # Convert to string for consistent mapping
-                classroom_id_str = str(classroom_id) if not isinstance(classroom_id, str) else classroom_id
-                classroom_ids.add(classroom_id_str)
-                # Store mapping from original to string
-                if isinstance(classroom_id, ObjectId):
-                    classroom_id_to_str[str(classroom_id)] = str(classroom_id)
-                else:
-                    classroom_id_to_str[classroom_id] = classroom_id
-        
-        # Fetch classroom names
-        classrooms_coll = get_mongo_collection('classrooms')
-        classroom_map = {}
-        if classroom_ids:
-            # Convert string IDs to ObjectId for query
-            object_ids = []
-            for cid in classroom_ids:
-                try:
-                    if ObjectId.is_valid(cid):
-                        object_ids.append(ObjectId(cid))
-                except:
-                    pass
-            
-            if object_ids:
-                classroom_docs = classrooms_coll.find({'_id': {'$in': object_ids}})
-                for cd in classroom_docs:
-                    cd_plain = to_plain(cd)
-                    classroom_id_str = cd_plain.get('id', '')
-                    classroom_name = cd_plain.get('full_name') or cd_plain.get('name', '')
-                    # Map both string and ObjectId versions
-                    classroom_map[classroom_id_str] = classroom_name
-                    # Also map ObjectId version if different
-                    if str(cd.get('_id')) != classroom_id_str:
-                        classroom_map[str(cd.get('_id'))] = classroom_name
-
-        out = []
-        for d in docs:
-            t = to_plain(d)
-            # ensure created_at/updated_at
-            t['created_at'] = t.get('created_at') or ''
-            t['updated_at'] = t.get('updated_at') or t['created_at']
-            # Populate classroom_name from classroom_id
-            classroom_id = t.get('classroom_id')
-            if classroom_id:
-                # Convert to string for lookup
-                classroom_id_str = str(classroom_id) if not isinstance(classroom_id, str) else classroom_id
-                t['classroom_name'] = classroom_map.get(classroom_id_str, '')
-            else:
-                t['classroom_name'] = ''
-            out.append(t)
+        # 1 aggregation: trang + total + nam/nữ; classroom_name bằng 1 truy vấn $in
+        unfiltered_classroom = classroom_id and classroom_id != 'all' and not search and gender not in ('male', 'female')
+        res = student_page(
+            coll, query, page, page_size,
+            cached_counts_for=classroom_id if unfiltered_classroom and _cached_counts_enabled(request) else None,
+        )
+        total_count = res['total']
+        male_count = res['male_count']
+        female_count = res['female_count']
+        out = [plain_student(d) for d in res['docs']]
 
         return Response({
             'results': out,
@@ -144,6 +103,7 @@ def mongo_students_list(request):
         return server_error(exc)
 
 
+@query_budget(5)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_students_create_by_teacher(request):
@@ -217,6 +177,7 @@ def mongo_students_create_by_teacher(request):
         return server_error(exc)
 
 
+@query_budget(8)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_students_create(request):
@@ -276,8 +237,10 @@ def mongo_students_create(request):
             'parent_phone': payload.get('parent_phone', ''),
             'is_special': False,
         }
+        doc[SEARCH_KEYS_FIELD] = student_search_keys(doc)
         
         res = coll.insert_one(doc)
+        upsert_student(doc)
         inserted = to_plain(coll.find_one({'_id': res.inserted_id}))
         
         # Cập nhật student_count trong classroom
@@ -285,6 +248,7 @@ def mongo_students_create(request):
             {'_id': ObjectId(classroom_id)},
             {'$inc': {'student_count': 1}}
         )
+        invalidate_student_counts(classroom_id)
         
         return Response(inserted, status=status.HTTP_201_CREATED)
     except Exception as exc:
@@ -292,6 +256,7 @@ def mongo_students_create(request):
         return server_error(exc)
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_students_detail(request, id: str):
@@ -307,6 +272,7 @@ def mongo_students_detail(request, id: str):
         return server_error(exc)
 
 
+@query_budget(7)  # đổi tên: search_keys + chỉ mục tra cứu
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def mongo_students_update(request, id: str):
@@ -315,52 +281,70 @@ def mongo_students_update(request, id: str):
         payload = request.data or {}
         updates = {}
         if 'full_name' in payload:
-            updates.setdefault('user', {})
-            updates['user']['full_name'] = (payload.get('full_name') or '').strip()
+            updates['full_name'] = (payload.get('full_name') or '').strip()
         if 'first_name' in payload:
-            updates.setdefault('user', {})
-            updates['user']['first_name'] = payload.get('first_name') or ''
+            updates['first_name'] = payload.get('first_name') or ''
         if 'last_name' in payload:
-            updates.setdefault('user', {})
-            updates['user']['last_name'] = payload.get('last_name') or ''
+            updates['last_name'] = payload.get('last_name') or ''
         if 'student_code' in payload:
             updates['student_code'] = payload.get('student_code')
         if 'classroom_id' in payload:
             updates['classroom.id'] = payload.get('classroom_id')
+            updates['classroom_id'] = payload.get('classroom_id')
         if 'gender' in payload:
             updates['gender'] = payload.get('gender')
         if 'email' in payload:
             email = payload.get('email')
-            if email and coll.find_one({'user.email': email, '_id': {'$ne': ObjectId(id)}}):
+            if email and coll.find_one({'email': email, '_id': {'$ne': ObjectId(id)}}):
                 return bad_request('Email đã tồn tại')
-            updates.setdefault('user', {})
-            updates['user']['email'] = email
+            updates['email'] = email
         if 'phone' in payload:
             updates['phone'] = payload.get('phone')
         if not updates:
             return bad_request('No updates provided')
         updates['updated_at'] = datetime.now().isoformat()
-        coll.update_one({'_id': ObjectId(id)}, {'$set': updates})
-        return mongo_students_detail(request, id)
+        before = coll.find_one_and_update(
+            {'_id': ObjectId(id)}, {'$set': updates}, projection={'classroom_id': 1}
+        )
+        if any(f in updates for f in ('full_name', 'student_code', 'email')):
+            refresh_search_keys(coll, ObjectId(id))
+        if 'full_name' in updates:
+            # Đổi tên: cập nhật student_name đã ghi sẵn trên các event
+            propagate_student_name(id, updates['full_name'])
+        if any(f in updates for f in ('full_name', 'student_code', 'classroom_id')):
+            current = coll.find_one({'_id': ObjectId(id)}, {'full_name': 1, 'student_code': 1, 'classroom_id': 1, 'role': 1})
+            if current:
+                upsert_student(current)
+        if 'classroom_id' in updates:
+            invalidate_user_context(id)
+        if before and ('classroom_id' in updates or 'gender' in updates):
+            invalidate_student_counts(before.get('classroom_id'), updates.get('classroom_id'))
+        # Đọc lại trực tiếp: mongo_students_detail là @api_view GET, không gọi lồng được
+        return Response(to_plain(coll.find_one({'_id': ObjectId(id)})))
     except Exception as exc:
         logging.getLogger(__name__).exception('mongo_students_update error')
         return server_error(exc)
 
 
+@query_budget(4)
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def mongo_students_delete(request, id: str):
     try:
         coll = _mongo_users_coll()
-        res = coll.delete_one({'_id': ObjectId(id)})
-        if res.deleted_count == 0:
+        deleted = coll.find_one_and_delete({'_id': ObjectId(id)}, projection={'classroom_id': 1})
+        if not deleted:
             return not_found('Student not found')
+        invalidate_user_context(id)
+        invalidate_student_counts(deleted.get('classroom_id'))
+        remove_student(id)
         return Response({'message': 'Đã xóa học sinh (Mongo) thành công'})
     except Exception as exc:
         logging.getLogger(__name__).exception('mongo_students_delete error')
         return server_error(exc)
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_students_my_classroom(request):
@@ -380,39 +364,13 @@ def mongo_students_my_classroom(request):
         classroom_id = None
         classroom_info = None
         
-        if user.role == 'teacher':
-            # Tìm lớp mà giáo viên này là chủ nhiệm
-            user_id_str = str(user.id)
-            logging.getLogger(__name__).info(f"Looking for teacher with Django user_id: {user_id_str}")
-            
-            # Tìm teacher document trong users collection
-            teacher_doc = students_coll.find_one({'email': user.email, 'role': 'teacher'})
-            
-            if teacher_doc:
-                teacher_id = str(teacher_doc['_id'])
-                logging.getLogger(__name__).info(f"Found teacher doc: {teacher_doc}")
-                
-                # Tìm classroom với teacher_id này
-                classroom_doc = classrooms_coll.find_one({'homeroom_teacher_id': teacher_id})
-                if classroom_doc:
-                    classroom_id = str(classroom_doc['_id'])
-                    classroom_info = {
-                        'id': classroom_id,
-                        'name': classroom_doc.get('name', ''),
-                        'full_name': classroom_doc.get('full_name', ''),
-                        'grade': classroom_doc.get('grade', ''),
-                    }
-                    logging.getLogger(__name__).info(f"Found classroom: {classroom_info}")
-                else:
-                    logging.getLogger(__name__).warning(f"No classroom found for teacher_id: {teacher_id}")
+        if user.role in ('teacher', 'student'):
+            # Lớp chủ nhiệm (giáo viên) hoặc lớp của học sinh, lấy từ ngữ cảnh user
+            if user.role == 'teacher':
+                classroom_id = user.context.homeroom_classroom_id
             else:
-                logging.getLogger(__name__).warning(f"No teacher doc found for email: {user.email}")
-        elif user.role == 'student':
-            # Tìm lớp của học sinh này
-            student_doc = students_coll.find_one({'email': user.email, 'role': 'student'})
-            if student_doc and student_doc.get('classroom_id'):
-                classroom_id = student_doc['classroom_id']
-                # Lấy thông tin classroom
+                classroom_id = user.context.student_classroom_id
+            if classroom_id:
                 classroom_doc = classrooms_coll.find_one({'_id': ObjectId(classroom_id)})
                 if classroom_doc:
                     classroom_info = {
@@ -421,6 +379,9 @@ def mongo_students_my_classroom(request):
                         'full_name': classroom_doc.get('full_name', ''),
                         'grade': classroom_doc.get('grade', ''),
                     }
+                    logging.getLogger(__name__).info(f"Found classroom: {classroom_info}")
+            else:
+                logging.getLogger(__name__).warning(f"No classroom found for user: {user.email}")
         
         if not classroom_id:
             if user.role == 'teacher':
@@ -453,20 +414,15 @@ def mongo_students_my_classroom(request):
         # Lấy học sinh trong lớp
         query = {'classroom_id': classroom_id, 'role': 'student'}
         
-        # Apply filters
+        # Apply filters (số nam/nữ vẫn tính trên cả lớp)
         search = request.query_params.get('search')
         gender = request.query_params.get('gender')
         
+        filters = {}
         if gender in ('male', 'female'):
-            query['gender'] = gender
+            filters['gender'] = gender
         if search:
-            query['$or'] = [
-                {'full_name': {'$regex': search, '$options': 'i'}},
-                {'first_name': {'$regex': search, '$options': 'i'}},
-                {'last_name': {'$regex': search, '$options': 'i'}},
-                {'student_code': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}},
-            ]
+            filters.update(search_filter(search))
         
         # Pagination
         page = int(request.query_params.get('page', 1))
@@ -474,24 +430,23 @@ def mongo_students_my_classroom(request):
         page = max(1, page)
         page_size = max(1, min(200, page_size))
         
-        total_count = students_coll.count_documents(query)
-        skip_count = (page - 1) * page_size
-        
-        docs = list(students_coll.find(query).sort('full_name', 1).skip(skip_count).limit(page_size))
+        res = student_page(
+            students_coll, query, page, page_size,
+            filter_query=filters or None,
+            cached_counts_for=classroom_id if _cached_counts_enabled(request) else None,
+            with_classroom_names=False,
+        )
+        total_count = res['total']
+        male_count = res['male_count']
+        female_count = res['female_count']
         
         out = []
-        for d in docs:
-            t = to_plain(d)
-            t['created_at'] = t.get('created_at') or ''
-            t['updated_at'] = t.get('updated_at') or t['created_at']
+        for d in res['docs']:
+            t = plain_student(d)
             # Thêm thông tin có account hay không
             t['has_account'] = bool(t.get('password_hash'))
             out.append(t)
         
-        # Calculate gender counts for the entire class (not just current page)
-        male_count = students_coll.count_documents({'classroom_id': classroom_id, 'role': 'student', 'gender': 'male'})
-        female_count = students_coll.count_documents({'classroom_id': classroom_id, 'role': 'student', 'gender': 'female'})
-        
         result = {
             'classroom': classroom_info,
             'results': out,
@@ -511,8 +466,10 @@ def mongo_students_my_classroom(request):
         return server_error(exc)
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@secondary_reads
 def mongo_students_dropdown(request):
     """API dropdown cho students - chỉ trả về id, name, full_name"""
     try:
@@ -548,8 +505,34 @@ def mongo_students_dropdown(request):
         return server_error(exc)
 
 
+@query_budget(2, cold=6)  # cold: dựng lại chỉ mục (find + getMore)
+@api_view(['GET'])
+@permission_classes([IsAdminOrTeacherOrDormSupervisor])
+def mongo_students_lookup(request):
+    """Tra cứu nhanh học sinh toàn trường theo mã / tên (không dấu, cho phép gõ sai) - dùng chỉ mục trong bộ nhớ"""
+    try:
+        q = (request.query_params.get('q') or '').strip()
+        if not q:
+            return Response({'results': [], 'count': 0})
+        try:
+            limit = max(1, min(50, int(request.query_params.get('limit', 20))))
+        except (TypeError, ValueError):
+            limit = 20
+        classroom_id = request.query_params.get('classroom_id') or None
+        fuzzy = request.query_params.get('fuzzy', 'true').lower() != 'false'
+        
+        index = get_lookup_index()
+        results = index.lookup(q, limit=limit, classroom_id=classroom_id, fuzzy=fuzzy)
+        return Response({'results': results, 'count': len(results), 'index_version': index.version})
+    except Exception as exc:
+        logging.getLogger(__name__).exception('mongo_students_lookup error')
+        return server_error(exc)
+
+
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@secondary_reads
 def mongo_students_my_classroom_dropdown(request):
     """API dropdown cho my classroom students - chỉ trả về id, name, full_name"""
     try:
@@ -557,29 +540,12 @@ def mongo_students_my_classroom_dropdown(request):
         if not hasattr(user, 'id'):
             return bad_request('User not authenticated')
         
-        # Lấy thông tin teacher/student
-        users_coll = get_mongo_collection('users')
-        user_doc = users_coll.find_one({'_id': ObjectId(user.id)})
-        if not user_doc:
-            return not_found('User not found')
-        
-        user_data = to_plain(user_doc)
-        
         # Tìm classroom của user
         classroom_id = None
-        if user_data.get('role') == 'teacher':
-            # Tìm lớp chủ nhiệm
-            classrooms_coll = get_mongo_collection('classrooms')
-            classroom_doc = classrooms_coll.find_one({'homeroom_teacher_id': user_data.get('id')})
-            if classroom_doc:
-                classroom_id = to_plain(classroom_doc).get('id')
-        elif user_data.get('role') == 'student':
-            # Lấy classroom_id từ student record
-            students_coll = get_mongo_collection('students')
-            student_doc = students_coll.find_one({'user.id': user_data.get('id')})
-            if student_doc:
-                classroom_data = to_plain(student_doc).get('classroom', {})
-                classroom_id = classroom_data.get('id')
+        if user.role == 'teacher':
+            classroom_id = user.context.homeroom_classroom_id
+        elif user.role == 'student':
+            classroom_id = user.context.student_classroom_id
         
         if not classroom_id:
             return bad_request('No classroom found for user')
@@ -610,10 +576,15 @@ def mongo_students_my_classroom_dropdown(request):
         return server_error(exc)
 
 
+@query_budget(8)  # file 1 chunk; mỗi chunk thêm: kiểm tra mã + 2 insert_many + bulk_write student_count
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_students_import(request):
-    """Import học sinh từ file Excel vào MongoDB"""
+    """
+    Import học sinh từ file Excel vào MongoDB (đọc streaming theo chunk).
+
+    ?dry_run=true: kiểm tra toàn bộ file (cột, lớp, mã trùng) và trả về lỗi + vài dòng xem trước, không ghi.
+    """
     try:
         if 'file' not in request.FILES:
             return bad_request('Không tìm thấy file')
@@ -624,132 +595,50 @@ def mongo_students_import(request):
         if not file.name.endswith(('.xlsx', '.xls')):
             return bad_request('Chỉ chấp nhận file Excel (.xlsx, .xls)')
         
-        # Đọc file Excel
         try:
-            df = pd.read_excel(file)
-        except Exception as e:
-            return bad_request(f'Không thể đọc file Excel: {str(e)}')
-        
-        # Kiểm tra cột bắt buộc
-        required_columns = ['Họ tên', 'Mã học sinh', 'Lớp', 'Giới tính', 'Ngày sinh']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return bad_request(f'Thiếu các cột bắt buộc: {", ".join(missing_columns)}')
-        
-        # Kết nối MongoDB
-        students_coll = get_mongo_collection('students')
-        classrooms_coll = get_mongo_collection('classrooms')
-        users_coll = get_mongo_collection('users')
-        
-        success_count = 0
-        error_count = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                # Lấy thông tin từ Excel
-                full_name = str(row['Họ tên']).strip()
-                student_code = str(row['Mã học sinh']).strip()
-                classroom_name = str(row['Lớp']).strip()
-                gender = str(row['Giới tính']).strip().lower()
-                birth_date = row['Ngày sinh']
-                
-                # Validate dữ liệu
-                if not full_name or not student_code or not classroom_name:
-                    errors.append({
-                        'row': index + 2,  # +2 vì Excel bắt đầu từ 1 và có header
-                        'error': 'Thiếu thông tin bắt buộc'
-                    })
-                    error_count += 1
-                    continue
-                
-                # Tìm classroom
-                classroom = classrooms_coll.find_one({'name': classroom_name})
-                if not classroom:
-                    errors.append({
-                        'row': index + 2,
-                        'error': f'Không tìm thấy lớp: {classroom_name}'
-                    })
-                    error_count += 1
-                    continue
-                
-                # Kiểm tra học sinh đã tồn tại
-                existing_student = students_coll.find_one({'student_code': student_code})
-                if existing_student:
-                    errors.append({
-                        'row': index + 2,
-                        'error': f'Mã học sinh đã tồn tại: {student_code}'
-                    })
-                    error_count += 1
-                    continue
-                
-                # Tạo user cho học sinh
-                user_data = {
-                    'first_name': full_name.split()[0] if full_name.split() else '',
-                    'last_name': ' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else '',
-                    'full_name': full_name,
-                    'email': f'{student_code}@student.local',
-                    'role': 'student',
-                    'is_active': True,
-                    'created_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                }
-                
-                user_result = users_coll.insert_one(user_data)
-                user_id = str(user_result.inserted_id)
-                
-                # Tạo user với role = 'student' và các field student-specific
-                student_data = {
-                    'first_name': user_data['first_name'],
-                    'last_name': user_data['last_name'],
-                    'full_name': user_data['full_name'],
-                    'email': user_data['email'],
-                    'role': 'student',
-                    'phone': '',
-                    'created_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat(),
-                    
-                    # Student-specific fields
-                    'student_code': student_code,
-                    'classroom_id': str(classroom['_id']),
-                    'classroom_name': classroom['name'],
-                    'classroom_grade': classroom.get('grade', ''),
-                    'gender': 'male' if gender in ['nam', 'male', 'm'] else 'female',
-                    'date_of_birth': birth_date.strftime('%Y-%m-%d') if hasattr(birth_date, 'strftime') else str(birth_date),
-                    'address': '',
-                    'parent_phone': '',
-                    'is_special': False,
-                }
-                
-                students_coll.insert_one(student_data)
-                
-                # Cập nhật student_count trong classroom
-                classrooms_coll.update_one(
-                    {'_id': classroom['_id']},
-                    {'$inc': {'student_count': 1}}
-                )
-                
-                success_count += 1
-                
-            except Exception as e:
-                errors.append({
-                    'row': index + 2,
-                    'error': f'Lỗi xử lý: {str(e)}'
-                })
-                error_count += 1
-        
-        return ok({
-            'success_count': success_count,
-            'error_count': error_count,
-            'errors': errors,
-            'message': f'Import hoàn thành: {success_count} thành công, {error_count} lỗi'
-        })
+            reader = ExcelReader(file, required_columns=student_importer.REQUIRED_COLUMNS)
+        except ExcelImportError as e:
+            return bad_request(str(e))
+        
+        with reader:
+            missing_columns = reader.missing_columns()
+            if missing_columns:
+                return bad_request(f'Thiếu các cột bắt buộc: {", ".join(missing_columns)}')
+            
+            dry_run = request.query_params.get('dry_run', 'false').lower() == 'true'
+            importer = student_importer.StudentImporter(
+                get_mongo_collection('users'),
+                get_mongo_collection('students'),
+                get_mongo_collection('classrooms'),
+                dry_run=dry_run,
+            )
+            summary = importer.run(reader, getattr(settings, 'EXCEL_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        
+        if summary.success_count:
+            invalidate_student_counts()
+            mark_stale()
+        
+        body = {
+            'success_count': summary.success_count,
+            'error_count': reader.error_count,
+            'errors': summary.errors,
+            'message': f'Import hoàn thành: {summary.success_count} thành công, {reader.error_count} lỗi'
+        }
+        if dry_run:
+            body.update({
+                'dry_run': True,
+                'valid_count': summary.valid_count,
+                'preview': summary.preview,
+                'message': f'Kiểm tra xong: {summary.valid_count} dòng hợp lệ, {reader.error_count} lỗi'
+            })
+        return ok(body)
         
     except Exception as exc:
         logging.getLogger(__name__).exception('mongo_students_import error')
         return server_error(str(exc))
 
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_students_import_template(request):
@@ -0,0 +1,263 @@
+"""
+Import giáo viên từ Excel vào MongoDB (collection users, role = 'teacher').
+
+Các bước:
+  1. Đọc streaming (ExcelReader) + kiểm tra toàn bộ dòng (bắt buộc, định dạng email, trùng trong file) trước khi ghi gì.
+  2. Kiểm tra email (không phân biệt hoa thường, index email_ci) / mã giáo viên đã tồn tại bằng truy vấn $in.
+  3. Có lỗi -> không ghi gì, trả về danh sách lỗi theo dòng.
+  4. Băm mật khẩu bằng bcrypt trong thread pool dùng chung của process (bcrypt nhả GIL khi băm,
+     ~0.2-0.3s / mật khẩu); số thread giới hạn bởi TEACHER_IMPORT_HASH_WORKERS.
+     Không dùng process pool: fork gunicorn worker giữa request không an toàn.
+  5. Ghi tất cả bằng 1 lệnh insert_many.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import bcrypt
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+
+from applications.common.indexes import EMAIL_COLLATION
+from applications.common.search_keys import teacher_search_keys, SEARCH_KEYS_FIELD
+
+
+# Tên cột trong file -> field; chấp nhận cả tên cột của template cũ (tiếng Anh)
+COLUMNS = {
+    'Họ tên': 'full_name',
+    'Email': 'email',
+    'Mã giáo viên': 'teacher_code',
+    'Môn dạy': 'subject',
+    'Số điện thoại': 'phone',
+    'Mật khẩu': 'password',
+    'full_name': 'full_name',
+    'email': 'email',
+    'teacher_code': 'teacher_code',
+    'subject': 'subject',
+    'phone': 'phone',
+    'password': 'password',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    # template cũ có cột username: hệ thống đăng nhập bằng email nên username phải là email
+    'username': 'username',
+}
+# field bắt buộc -> tên cột hiển thị trong thông báo lỗi
+REQUIRED_FIELDS = {'full_name': 'Họ tên', 'email': 'Email', 'teacher_code': 'Mã giáo viên'}
+TEMPLATE_COLUMNS = ['Họ tên', 'Email', 'Mã giáo viên', 'Môn dạy', 'Số điện thoại', 'Mật khẩu']
+DEFAULT_PASSWORD = '123456'
+MIN_PASSWORD_LENGTH = 6
+
+PREVIEW_ROWS = 20
+
+# Ít mật khẩu thì băm ngay trong request, không cần chuyển sang thread pool
+POOL_MIN_PASSWORDS = 8
+DEFAULT_HASH_WORKERS = 4
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+@dataclass
+class TeacherRow:
+    row: int  # số dòng trong Excel (header là dòng 1)
+    full_name: str
+    email: str
+    teacher_code: str
+    subject: str = ''
+    phone: str = ''
+    password: str = DEFAULT_PASSWORD
+
+
+@dataclass
+class ImportResult:
+    rows: List[TeacherRow] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+    inserted_ids: List[str] = field(default_factory=list)
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:  # NaN (ô trống khi đọc bằng pandas)
+            return ''
+        if value.is_integer():
+            value = int(value)
+    return str(value).strip()
+
+
+def missing_columns(header: Iterable[str]) -> List[str]:
+    fields = {COLUMNS.get(str(name).strip()) for name in header}
+    if 'first_name' in fields or 'last_name' in fields:
+        fields.add('full_name')
+    if 'username' in fields:
+        fields.add('email')
+    return [column for name, column in REQUIRED_FIELDS.items() if name not in fields]
+
+
+def parse_row(row_number: int, values: Dict[str, object]) -> Tuple[Optional[TeacherRow], List[str]]:
+    """values: {tên cột: giá trị ô} -> (TeacherRow | None, danh sách lỗi của dòng)."""
+    data = {}
+    for column, value in values.items():
+        name = COLUMNS.get(str(column).strip())
+        if name:
+            data[name] = _cell(value)
+    if not data.get('full_name'):
+        data['full_name'] = ' '.join(p for p in (data.get('first_name'), data.get('last_name')) if p)
+    data['email'] = (data.get('email') or '').lower()
+    username = (data.get('username') or '').lower()
+    errors = []
+    if username and not data['email']:
+        data['email'] = username
+    elif username and username != data['email']:
+        errors.append(f"username phải trùng Email (đăng nhập bằng email): {data['username']}")
+
+    errors += [f'Thiếu {column}' for name, column in REQUIRED_FIELDS.items() if not data.get(name)]
+    if data['email'] and not EMAIL_RE.match(data['email']):
+        errors.append(f"Email không hợp lệ: {data['email']}")
+    password = data.get('password') or DEFAULT_PASSWORD
+    if len(password) < MIN_PASSWORD_LENGTH:
+        errors.append(f'Mật khẩu phải có ít nhất {MIN_PASSWORD_LENGTH} ký tự')
+    if errors:
+        return None, errors
+    return TeacherRow(
+        row=row_number,
+        full_name=' '.join(data['full_name'].split()),
+        email=data['email'],
+        teacher_code=data['teacher_code'],
+        subject=data.get('subject', ''),
+        phone=data.get('phone', ''),
+        password=password,
+    ), []
+
+
+def check_duplicates(coll, rows: List[TeacherRow]) -> List[dict]:
+    """
+    Trùng trong file + đã tồn tại trong users.
+
+    Email trong file đã được chuyển về chữ thường nhưng email đã lưu có thể có chữ hoa (tạo từ form,
+    dữ liệu cũ): truy vấn email dùng collation không phân biệt hoa thường (index email_ci), nên tách
+    riêng với truy vấn mã giáo viên (index teacher_code, collation mặc định).
+    """
+    errors = []
+    seen_emails: Dict[str, int] = {}
+    seen_codes: Dict[str, int] = {}
+    for item in rows:
+        if item.email in seen_emails:
+            errors.append({'row': item.row, 'error': f'Email trùng với dòng {seen_emails[item.email]}: {item.email}'})
+        seen_emails.setdefault(item.email, item.row)
+        if item.teacher_code in seen_codes:
+            errors.append({'row': item.row, 'error': f'Mã giáo viên trùng với dòng {seen_codes[item.teacher_code]}: {item.teacher_code}'})
+        seen_codes.setdefault(item.teacher_code, item.row)
+    if not rows:
+        return errors
+
+    existing_emails = {
+        (doc.get('email') or '').lower()
+        for doc in coll.find({'email': {'$in': list(seen_emails)}}, {'email': 1}, collation=EMAIL_COLLATION)
+    }
+    existing_codes = {
+        doc.get('teacher_code')
+        for doc in coll.find({'teacher_code': {'$in': list(seen_codes)}}, {'teacher_code': 1})
+    }
+    for item in rows:
+        if item.email in existing_emails:
+            errors.append({'row': item.row, 'error': f'Email đã tồn tại: {item.email}'})
+        if item.teacher_code in existing_codes:
+            errors.append({'row': item.row, 'error': f'Mã giáo viên đã tồn tại: {item.teacher_code}'})
+    return errors
+
+
+def _hash_password(raw: str) -> str:
+    return bcrypt.hashpw(raw.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _hash_workers() -> int:
+    configured = getattr(settings, 'TEACHER_IMPORT_HASH_WORKERS', None) or DEFAULT_HASH_WORKERS
+    return max(1, min(int(configured), os.cpu_count() or 1))
+
+
+def _hash_pool() -> ThreadPoolExecutor:
+    """Thread pool tạo lần đầu cần dùng, dùng chung cho mọi request của process."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_hash_workers(), thread_name_prefix='bcrypt')
+    return _pool
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Băm song song trong thread pool dùng chung (bcrypt nhả GIL trong lúc băm)."""
+    if _hash_workers() == 1 or len(passwords) < POOL_MIN_PASSWORDS:
+        return [_hash_password(raw) for raw in passwords]
+    return list(_hash_pool().map(_hash_password, passwords))
+
+
+def build_document(item: TeacherRow, password_hash: str, now: str) -> dict:
+    parts = item.full_name.split()
+    doc = {
+        'username': item.email,
+        'email': item.email,
+        'password_hash': password_hash,
+        'role': 'teacher',
+        'first_name': ' '.join(parts[:-1]) if len(parts) > 1 else item.full_name,
+        'last_name': parts[-1] if len(parts) > 1 else '',
+        'full_name': item.full_name,
+        'phone': item.phone,
+        'status': 'active',
+        'created_at': now,
+        'updated_at': now,
+
+        # Teacher-specific fields
+        'teacher_code': item.teacher_code,
+        'subject': item.subject,
+    }
+    doc[SEARCH_KEYS_FIELD] = teacher_search_keys(doc)
+    return doc
+
+
+def validate_rows(coll, records: Iterable[Tuple[int, Dict[str, object]]]) -> ImportResult:
+    """Kiểm tra toàn bộ dòng mà không ghi gì. records: (số dòng Excel, {tên cột: giá trị}), vd ExcelReader.records()."""
+    result = ImportResult()
+    for row_number, values in records:
+        if not any(_cell(v) for v in values.values()):
+            continue  # dòng trống
+        item, row_errors = parse_row(row_number, values)
+        if row_errors:
+            result.errors.extend({'row': row_number, 'error': message} for message in row_errors)
+        else:
+            result.rows.append(item)
+    result.errors.extend(check_duplicates(coll, result.rows))
+    result.errors.sort(key=lambda e: e['row'])
+    return result
+
+
+def import_teachers(coll, records: Iterable[Tuple[int, Dict[str, object]]], dry_run: bool = False) -> ImportResult:
+    """Kiểm tra hết rồi mới ghi: có lỗi (hoặc dry_run) -> không ghi document nào."""
+    result = validate_rows(coll, records)
+    if result.errors or dry_run or not result.rows:
+        return result
+    hashes = hash_passwords([item.password for item in result.rows])
+    now = datetime.now().isoformat()
+    docs = [build_document(item, password_hash, now) for item, password_hash in zip(result.rows, hashes)]
+    try:
+        res = coll.insert_many(docs, ordered=False)
+        result.inserted_ids = [str(_id) for _id in res.inserted_ids]
+    except BulkWriteError as exc:
+        # Chỉ xảy ra khi có unique index và import song song cùng dữ liệu
+        failed = {err['index'] for err in exc.details.get('writeErrors', [])}
+        result.inserted_ids = [str(doc['_id']) for i, doc in enumerate(docs) if i not in failed]
+        result.errors.extend(
+            {'row': result.rows[err['index']].row, 'error': err.get('errmsg', 'Lỗi ghi')}
+            for err in exc.details.get('writeErrors', [])
+        )
+    return result
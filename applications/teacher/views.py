@@ -17,8 +17,17 @@ from bson import ObjectId
 
 # Remove ORM model imports - using MongoDB only
 from applications.common.mongo import get_mongo_collection, to_plain
+from applications.common.indexes import EMAIL_COLLATION
+from applications.common.query_budget import query_budget
+from applications.common.user_context import invalidate_user_context
+from applications.common.display_names import propagate_teacher_display, teacher_display
+from applications.common.search_keys import teacher_search_keys, refresh_search_keys, prefix_filter, SEARCH_KEYS_FIELD
 import bcrypt
 
+from applications.permissions import IsAdminUser
+from applications.common.excel_import import ExcelImportError, ExcelReader
+from . import importer as teacher_importer
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -203,206 +212,80 @@ def teacher_stats(request):
     return Response(stats)
 
 
+@query_budget(6)
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def teacher_import_excel(request):
-    """API import giáo viên từ file Excel"""
-    if 'file' not in request.FILES:
-        return Response(
-            {'error': 'Không tìm thấy file'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    file = request.FILES['file']
-    
-    # Validate file type
-    if not file.name.endswith(('.xlsx', '.xls')):
-        return Response(
-            {'error': 'File phải là định dạng Excel (.xlsx hoặc .xls)'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
+@permission_classes([IsAuthenticated, IsAdminUser])
+def mongo_teachers_import(request):
+    """
+    Import giáo viên từ file Excel vào MongoDB.
+
+    Kiểm tra toàn bộ file trước (bắt buộc, email, trùng trong file / đã tồn tại); có lỗi thì
+    không ghi gì và trả về lỗi theo dòng. ?dry_run=true chỉ kiểm tra, không ghi.
+    """
     try:
-        # Read Excel file
-        if file.name.endswith('.xlsx'):
-            df = pd.read_excel(file, engine='openpyxl')
-        else:
-            df = pd.read_excel(file, engine='xlrd')
-        
-        # Validate required columns
-        required_columns = ['username', 'email', 'password', 'first_name', 'last_name', 'teacher_code']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            return Response(
-                {'error': f'Thiếu các cột bắt buộc: {", ".join(missing_columns)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Process data
-        success_count = 0
-        error_count = 0
-        errors = []
-        success_data = []
-        
-        for index, row in df.iterrows():
-            row_number = index + 2  # Excel row number (1-based, +1 for header)
-            
-            try:
-                # Prepare data
-                data = {
-                    'username': str(row['username']).strip(),
-                    'email': str(row['email']).strip(),
-                    'password': str(row['password']).strip(),
-                    'first_name': str(row['first_name']).strip(),
-                    'last_name': str(row['last_name']).strip(),
-                    'teacher_code': str(row['teacher_code']).strip(),
-                    'subject': str(row.get('subject', '')).strip()
-                }
-                
-                # Validate data
-                serializer = TeacherImportSerializer(data=data)
-                if serializer.is_valid():
-                    with transaction.atomic():
-                        # Create user
-                        user_data = {
-                            'username': data['username'],
-                            'email': data['email'],
-                            'password': make_password(data['password']),
-                            'first_name': data['first_name'],
-                            'last_name': data['last_name'],
-                            'role': 'teacher'
-                        }
-                        user = User.objects.create(**user_data)
-                        
-                        # Create teacher
-                        teacher_data = {
-                            'user': user,
-                            'teacher_code': data['teacher_code'],
-                            'subject': data['subject']
-                        }
-                        teacher = Teacher.objects.create(**teacher_data)
-                    
-                    success_count += 1
-                    success_data.append({
-                        'row': row_number,
-                        'username': data['username'],
-                        'teacher_code': data['teacher_code'],
-                        'full_name': f"{data['first_name']} {data['last_name']}"
-                    })
-                else:
-                    error_count += 1
-                    errors.append({
-                        'row': row_number,
-                        'errors': serializer.errors
-                    })
-                    
-            except Exception as e:
-                error_count += 1
-                errors.append({
-                    'row': row_number,
-                    'errors': {'general': f'Lỗi xử lý: {str(e)}'}
-                })
-        
-        result = {
-            'success_count': success_count,
-            'error_count': error_count,
-            'errors': errors,
-            'success_data': success_data
+        if 'file' not in request.FILES:
+            return bad_request('Không tìm thấy file')
+        file = request.FILES['file']
+        if not file.name.endswith(('.xlsx', '.xls')):
+            return bad_request('Chỉ chấp nhận file Excel (.xlsx, .xls)')
+        try:
+            reader = ExcelReader(file)
+        except ExcelImportError as e:
+            return bad_request(str(e))
+
+        with reader:
+            missing = teacher_importer.missing_columns(reader.header)
+            if missing:
+                return bad_request(f'Thiếu các cột bắt buộc: {", ".join(missing)}')
+
+            dry_run = request.query_params.get('dry_run', 'false').lower() == 'true'
+            result = teacher_importer.import_teachers(_mongo_users_coll(), reader.records(), dry_run=dry_run)
+
+        body = {
+            'success_count': len(result.inserted_ids),
+            'valid_count': len(result.rows),
+            'error_count': len(result.errors),
+            'errors': result.errors,
+            'dry_run': dry_run,
         }
-        
-        return Response(result)
-        
-    except Exception as e:
-        return Response(
-            {'error': f'Lỗi đọc file Excel: {str(e)}'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        if dry_run:
+            body['preview'] = [
+                {'row': item.row, 'full_name': item.full_name, 'email': item.email,
+                 'teacher_code': item.teacher_code, 'subject': item.subject}
+                for item in result.rows[:teacher_importer.PREVIEW_ROWS]
+            ]
+        if result.errors and not result.inserted_ids:
+            return bad_request('File có lỗi, chưa import giáo viên nào', details=body)
+        body['message'] = f'Import hoàn thành: {len(result.inserted_ids)} giáo viên'
+        return ok(body)
+    except Exception as exc:
+        logging.getLogger(__name__).exception('mongo_teachers_import error')
+        return server_error(exc)
 
 
+@query_budget(1)
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def teacher_import_template(request):
-    """API tải template Excel cho import giáo viên"""
-    # Create sample data
-    sample_data = [
-        {
-            'username': 'teacher1',
-            'email': 'teacher1@school.edu.vn',
-            'password': 'password123',
-            'first_name': 'Nguyễn',
-            'last_name': 'Văn A',
-            'teacher_code': 'GV001',
-            'subject': 'Toán'
-        },
-        {
-            'username': 'teacher2',
-            'email': 'teacher2@school.edu.vn',
-            'password': 'password123',
-            'first_name': 'Trần',
-            'last_name': 'Thị B',
-            'teacher_code': 'GV002',
-            'subject': 'Văn'
-        },
-        {
-            'username': 'teacher3',
-            'email': 'teacher3@school.edu.vn',
-            'password': 'password123',
-            'first_name': 'Lê',
-            'last_name': 'Văn C',
-            'teacher_code': 'GV003',
-            'subject': 'Anh'
-        }
-    ]
-    
-    # Create DataFrame
-    df = pd.DataFrame(sample_data)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Teachers', index=False)
-        
-        # Get the workbook and worksheet
-        workbook = writer.book
-        worksheet = writer.sheets['Teachers']
-        
-        # Add instructions
-        instructions = [
-            'HƯỚNG DẪN IMPORT GIÁO VIÊN',
-            '',
-            '1. Các cột bắt buộc:',
-            '   - username: Tên đăng nhập (không được trùng)',
-            '   - email: Email (không được trùng)',
-            '   - password: Mật khẩu',
-            '   - first_name: Tên',
-            '   - last_name: Họ',
-            '   - teacher_code: Mã giáo viên (không được trùng)',
-            '',
-            '2. Các cột tùy chọn:',
-            '   - subject: Môn dạy',
-            '',
-            '3. Lưu ý:',
-            '   - Không được để trống các cột bắt buộc',
-            '   - Username, email, teacher_code phải là duy nhất',
-            '   - Password nên có ít nhất 6 ký tự',
-            ''
-        ]
-        
-        # Add instructions to worksheet
-        for i, instruction in enumerate(instructions):
-            worksheet.cell(row=i+1, column=len(df.columns)+2, value=instruction)
-    
-    output.seek(0)
-    
-    # Create response
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="teacher_import_template_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-    
-    return response
+@permission_classes([IsAuthenticated, IsAdminUser])
+def mongo_teachers_import_template(request):
+    """Tải template Excel cho import giáo viên"""
+    try:
+        df = pd.DataFrame([
+            ['Nguyễn Văn A', 'nguyenvana@school.edu.vn', 'GV001', 'Toán', '0901234567', '123456'],
+            ['Trần Thị B', 'tranthib@school.edu.vn', 'GV002', 'Văn', '', ''],
+        ], columns=teacher_importer.TEMPLATE_COLUMNS)
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name='Giáo viên', index=False)
+        output.seek(0)
+        response = HttpResponse(
+            output.getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = 'attachment; filename="template_import_giao_vien.xlsx"'
+        return response
+    except Exception as exc:
+        logging.getLogger(__name__).exception('mongo_teachers_import_template error')
+        return server_error(exc)
 
 
 # --- Mongo-backed teachers ---
@@ -429,6 +312,7 @@ def _gen_username(email: str, teacher_code: str) -> str:
     return f"{base}{datetime.now().strftime('%H%M%S')}"
 
 
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_teachers_list(request):
@@ -446,14 +330,8 @@ def mongo_teachers_list(request):
         if subject:
             query['subject'] = subject
         if search:
-            query['$or'] = [
-                {'full_name': {'$regex': search, '$options': 'i'}},
-                {'first_name': {'$regex': search, '$options': 'i'}},
-                {'last_name': {'$regex': search, '$options': 'i'}},
-                {'teacher_code': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}},
-                {'subject': {'$regex': search, '$options': 'i'}},
-            ]
+            # Tìm theo tiền tố không dấu trên search_keys (index range scan)
+            query.update(prefix_filter(search) or {})
 
         total_count = coll.count_documents(query)
         skip_count = (page - 1) * page_size
@@ -493,6 +371,7 @@ def mongo_teachers_list(request):
         return server_error(exc)
 
 
+@query_budget(4)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mongo_teachers_create(request):
@@ -507,7 +386,7 @@ def mongo_teachers_create(request):
             return bad_request('full_name là bắt buộc')
         # Unique email check (if provided)
         if email:
-            if coll.find_one({'email': email}):
+            if coll.find_one({'email': email}, collation=EMAIL_COLLATION):
                 return bad_request('Email đã tồn tại')
         teacher_code = _generate_teacher_code(full_name)
         # Create unified user document with teacher-specific fields
@@ -529,6 +408,7 @@ def mongo_teachers_create(request):
             'teacher_code': teacher_code,
             'subject': subject,
         }
+        doc[SEARCH_KEYS_FIELD] = teacher_search_keys(doc)
         res = coll.insert_one(doc)
         inserted = to_plain(coll.find_one({'_id': res.inserted_id}))
         full_name = inserted.get('full_name') or ''
@@ -557,6 +437,7 @@ def mongo_teachers_create(request):
 
 # --- Mongo-backed teachers (detail & update) ---
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_teachers_detail(request, id: str):
@@ -591,6 +472,7 @@ def mongo_teachers_detail(request, id: str):
         return server_error(exc)
 
 
+@query_budget(9)  # đổi tên / email: + tên GVCN trên classrooms
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def mongo_teachers_update(request, id: str):
@@ -604,7 +486,7 @@ def mongo_teachers_update(request, id: str):
             updates['subject'] = payload.get('subject')
         if 'email' in payload:
             email = payload.get('email')
-            if email and coll.find_one({'email': email, '_id': {'$ne': ObjectId(id)}}):
+            if email and coll.find_one({'email': email, '_id': {'$ne': ObjectId(id)}}, collation=EMAIL_COLLATION):
                 return bad_request('Email đã tồn tại')
             updates['email'] = email
         if 'phone' in payload:
@@ -613,6 +495,12 @@ def mongo_teachers_update(request, id: str):
             return bad_request('No updates provided')
         updates['updated_at'] = datetime.now().isoformat()
         coll.update_one({'_id': ObjectId(id)}, {'$set': updates})
+        if any(f in updates for f in ('full_name', 'email', 'subject')):
+            refresh_search_keys(coll, ObjectId(id))
+        if 'full_name' in updates or 'email' in updates:
+            # Đổi tên / email: cập nhật thông tin GVCN đã ghi sẵn trên classroom
+            propagate_teacher_display(id, teacher_display(coll.find_one({'_id': ObjectId(id)})))
+        invalidate_user_context(id)
         # Sync user snapshot if present
         doc = to_plain(coll.find_one({'_id': ObjectId(id)}))
         user_id = doc.get('user_id')
@@ -626,7 +514,7 @@ def mongo_teachers_update(request, id: str):
                 user_updates['first_name'] = ' '.join(parts[:-1]) if len(parts) > 1 else updates['full_name']
                 user_updates['last_name'] = parts[-1] if len(parts) > 1 else ''
             if 'email' in updates:
-                if updates['email'] and users.find_one({'email': updates['email'], '_id': {'$ne': ObjectId(user_id)}}):
+                if updates['email'] and users.find_one({'email': updates['email'], '_id': {'$ne': ObjectId(user_id)}}, collation=EMAIL_COLLATION):
                     return Response({'detail': 'Email đã tồn tại (users)'}, status=status.HTTP_400_BAD_REQUEST)
                 user_updates['email'] = updates['email']
             if user_updates:
@@ -641,6 +529,7 @@ def mongo_teachers_update(request, id: str):
         return server_error(exc)
 
 
+@query_budget(3)
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def mongo_teachers_delete(request, id: str):
@@ -649,6 +538,7 @@ def mongo_teachers_delete(request, id: str):
         res = coll.delete_one({'_id': ObjectId(id)})
         if res.deleted_count == 0:
             return not_found('Teacher not found')
+        invalidate_user_context(id)
         return Response({'message': 'Đã xóa giáo viên (Mongo) thành công'})
     except Exception as exc:
         logging.getLogger(__name__).exception('mongo_teachers_delete error')
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from applications.common.healthcheck import healthcheck
 from applications.common.academic_year_views import current_academic_year
+from applications.common.perf_views import slow_queries_report
 
 urlpatterns = [
     # Health check endpoint (public, no auth required)
@@ -8,6 +9,9 @@ urlpatterns = [
     
     # Academic year config
     path('mongo/academic-year/current', current_academic_year, name='current-academic-year'),
+
+    # Performance (admin)
+    path('perf/slow-queries', slow_queries_report, name='perf-slow-queries'),
     
     # User Management (Mongo auth)
     path('', include('applications.user_management.urls')),
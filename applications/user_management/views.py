@@ -13,13 +13,16 @@ from .serializers import (
 )
 from applications.permissions import IsAdminUser
 from applications.common.mongo import get_users_collection
+from applications.common.query_budget import query_budget
 from applications.common.responses import ok, created, bad_request, unauthorized, server_error
+from applications.common.tenancy import TOKEN_CLAIM, current_tenant
 import bcrypt
 import logging
 
 User = get_user_model()
 
 
+@query_budget(1)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @authentication_classes([])
@@ -76,6 +79,7 @@ def login_with_mongo(request):
         refresh['user_id'] = str(doc['_id'])
         refresh['email'] = doc.get('email', '')
         refresh['role'] = doc.get('role', 'user')
+        refresh[TOKEN_CLAIM] = current_tenant().key
         
         response_data = {
             'access_token': str(refresh.access_token),
@@ -100,6 +104,7 @@ def login_with_mongo(request):
         return server_error(exc)
 
 
+@query_budget(2)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @authentication_classes([])
@@ -161,6 +166,7 @@ def register_with_mongo(request):
         refresh['user_id'] = str(doc['_id'])
         refresh['email'] = doc.get('email', '')
         refresh['role'] = doc.get('role', 'user')
+        refresh[TOKEN_CLAIM] = current_tenant().key
         
         response_data = {
             'access_token': str(refresh.access_token),
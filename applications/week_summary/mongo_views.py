@@ -10,6 +10,10 @@ from datetime import datetime, timedelta
 import logging
 
 from applications.common.mongo import get_mongo_collection, to_plain
+from applications.common.query_budget import query_budget
+from applications.common.read_routing import secondary_reads
+from applications.common.ids import id_filter, to_object_ids
+from applications.common.display_names import stamp_display_names_many
 from applications.common.responses import ok, created, bad_request, not_found, server_error
 from applications.common.academic_year import get_academic_year_settings
 from bson import ObjectId
@@ -18,6 +22,27 @@ from .mongo_serializers import ClassroomDetailResponseSerializer
 
 logger = logging.getLogger(__name__)
 
+
+def _homeroom_teacher_map(classroom_docs):
+    """{homeroom_teacher_id: thông tin GVCN} cho các lớp - 1 truy vấn $in trên users._id"""
+    teacher_ids = to_object_ids(c.get('homeroom_teacher_id') for c in classroom_docs)
+    if not teacher_ids:
+        return {}
+    users_coll = get_mongo_collection('users')
+    return {
+        str(t['_id']): {
+            'id': str(t['_id']),
+            'full_name': t.get('full_name', ''),
+            'first_name': t.get('first_name', ''),
+            'last_name': t.get('last_name', ''),
+        }
+        for t in users_coll.find(
+            {'_id': {'$in': teacher_ids}, 'role': 'teacher'},
+            {'full_name': 1, 'first_name': 1, 'last_name': 1}
+        )
+    }
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_test(request):
@@ -75,8 +100,10 @@ def mongo_debug_events(request):
         logger.exception('mongo_debug_events error')
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@secondary_reads
 def mongo_realtime_rankings(request):
     """Compute rankings in real-time from MongoDB events for a given week/year or date range."""
     try:
@@ -121,99 +148,44 @@ def mongo_realtime_rankings(request):
             'academic_year': get_academic_year_settings().academic_year,
         }
         
-        # Get all events in date range
-        events = list(events_coll.find(query))
-        
-        # Debug logging
-        logger.info(f"Query: {query}")
-        logger.info(f"Found {len(events)} events")
-        logger.info(f"Date range: {start_dt.strftime('%Y-%m-%d')} to {end_dt.strftime('%Y-%m-%d')}")
-        
-        # Aggregate by classroom
-        classroom_stats = {}
-        
-        for event_doc in events:
-            classroom_id = event_doc.get('classroom_id')
-            periods = event_doc.get('periods', {})
-            
-            logger.info(f"Processing event doc: classroom_id={classroom_id}, periods={list(periods.keys())}")
-            
-            if not classroom_id:
-                continue
-                
-            if classroom_id not in classroom_stats:
-                classroom_stats[classroom_id] = {
-                    'positive_points': 0,
-                    'negative_points': 0,
-                    'total_points': 0
-                }
-            
-            # Process all periods in this event document
-            for period_num, period_events in periods.items():
-                logger.info(f"Processing period {period_num} with {len(period_events)} events")
-                
-                for period_event in period_events:
-                    points = period_event.get('points', 0)
-                    event_type = period_event.get('event_type_key', '')
-                    student_id = period_event.get('student_id')
-                    
-                    logger.info(f"Period event: {event_type}, student_id={student_id}, points={points}")
-                    
-                    if points > 0:
-                        classroom_stats[classroom_id]['positive_points'] += points
-                        logger.info(f"Added positive points: {points}")
-                    elif points < 0:
-                        classroom_stats[classroom_id]['negative_points'] += abs(points)  # Store as positive number
-                        logger.info(f"Added negative points: {abs(points)}")
-                    
-                    classroom_stats[classroom_id]['total_points'] += points
-                    logger.info(f"Total points for {classroom_id}: {classroom_stats[classroom_id]['total_points']}")
-        
-        # Debug: Log classroom stats
-        logger.info(f"Classroom stats: {classroom_stats}")
-        
-        # Get classroom details
-        classrooms_coll = get_mongo_collection('classrooms')
+        # Cộng dồn day_totals (tính sẵn trên mỗi day-document) theo lớp ngay trên MongoDB
+        pipeline = [
+            {'$match': query},
+            {'$group': {
+                '_id': '$classroom_id',
+                'positive_points': {'$sum': '$day_totals.positive_points'},
+                'negative_points': {'$sum': '$day_totals.negative_points'},
+                'total_points': {'$sum': '$day_totals.total_points'},
+            }},
+        ]
+        classroom_stats = {row['_id']: row for row in events_coll.aggregate(pipeline) if row['_id']}
+        logger.info("Realtime rankings %s..%s: %d classrooms", query['date']['$gte'], query['date']['$lte'], len(classroom_stats))
+        
+        # Thông tin lớp + GVCN: 1 truy vấn $in cho mỗi collection
+        classroom_docs = list(get_mongo_collection('classrooms').find(
+            {'_id': {'$in': to_object_ids(classroom_stats.keys())}},
+            {'full_name': 1, 'homeroom_teacher_id': 1}
+        ))
+        teachers = _homeroom_teacher_map(classroom_docs)
         rankings = []
         
-        for classroom_id, stats in classroom_stats.items():
-            logger.info(f"Processing classroom {classroom_id}: {stats}")
-            try:
-                classroom_doc = classrooms_coll.find_one({'_id': ObjectId(classroom_id)})
-                if not classroom_doc:
-                    continue
-                
-                # Get homeroom teacher info from users collection
-                homeroom_teacher = None
-                homeroom_teacher_id = classroom_doc.get('homeroom_teacher_id')
-                if homeroom_teacher_id:
-                    users_coll = get_mongo_collection('users')
-                    teacher_doc = users_coll.find_one({'_id': ObjectId(homeroom_teacher_id), 'role': 'teacher'})
-                    if teacher_doc:
-                        homeroom_teacher = {
-                            'id': str(teacher_doc['_id']),
-                            'full_name': teacher_doc.get('full_name', ''),
-                            'first_name': teacher_doc.get('first_name', ''),
-                            'last_name': teacher_doc.get('last_name', '')
-                        }
-                
-                rankings.append({
-                    'id': f"realtime_{classroom_id}",
-                    'classroom': {
-                        'id': str(classroom_doc['_id']),
-                        'full_name': classroom_doc.get('full_name', ''),
-                        'homeroom_teacher': homeroom_teacher
-                    },
-                    'week_number': int(week_number) if week_number else start_dt.isocalendar()[1],
-                    'year': int(year) if year else start_dt.year,
-                    'positive_points': stats['positive_points'],
-                    'negative_points': stats['negative_points'],
-                    'total_points': stats['total_points'],
-                    'is_approved': True,
-                })
-            except Exception as e:
-                logger.error(f"Error processing classroom {classroom_id}: {e}")
-                continue
+        for classroom_doc in classroom_docs:
+            classroom_id = str(classroom_doc['_id'])
+            stats = classroom_stats[classroom_id]
+            rankings.append({
+                'id': f"realtime_{classroom_id}",
+                'classroom': {
+                    'id': classroom_id,
+                    'full_name': classroom_doc.get('full_name', ''),
+                    'homeroom_teacher': teachers.get(classroom_doc.get('homeroom_teacher_id'))
+                },
+                'week_number': int(week_number) if week_number else start_dt.isocalendar()[1],
+                'year': int(year) if year else start_dt.year,
+                'positive_points': stats['positive_points'],
+                'negative_points': stats['negative_points'],
+                'total_points': stats['total_points'],
+                'is_approved': True,
+            })
         
         # Sort by total points descending
         rankings.sort(key=lambda r: r['total_points'], reverse=True)
@@ -229,6 +201,7 @@ def mongo_realtime_rankings(request):
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def mongo_realtime_classroom_detail(request):
@@ -271,8 +244,6 @@ def mongo_realtime_classroom_detail(request):
 
         events_coll = get_mongo_collection('events')
         classrooms_coll = get_mongo_collection('classrooms')
-        users_coll = get_mongo_collection('users')
-        event_types_coll = get_mongo_collection('event_types')
 
         query = {
             'date': {
@@ -287,11 +258,8 @@ def mongo_realtime_classroom_detail(request):
         events = list(events_coll.find(query))
 
         # Lấy tên lớp
-        classroom_doc = None
-        try:
-            classroom_doc = classrooms_coll.find_one({'_id': ObjectId(classroom_id)})
-        except Exception:
-            classroom_doc = classrooms_coll.find_one({'id': classroom_id})
+        classroom_filter = id_filter(classroom_id)
+        classroom_doc = classrooms_coll.find_one(classroom_filter) if classroom_filter else None
 
         classroom_name = classroom_doc.get('full_name', '') if classroom_doc else ''
 
@@ -300,9 +268,8 @@ def mongo_realtime_classroom_detail(request):
         total_negative = 0
         total_points = 0
 
-        # Cache tránh query lặp
-        event_type_cache = {}
-        student_cache = {}
+        # Tên học sinh / loại sự kiện đã ghi sẵn trên event; chỉ bổ sung (1 lần $in) cho dữ liệu cũ
+        stamp_display_names_many((event_doc.get('periods') for event_doc in events), only_missing=True)
 
         for event_doc in events:
             date_str = event_doc.get('date')
@@ -317,7 +284,6 @@ def mongo_realtime_classroom_detail(request):
                 for ev in period_events:
                     points = ev.get('points', 0)
                     et_key = ev.get('event_type_key', '')
-                    et_id = ev.get('event_type')
                     student_id = ev.get('student_id') or ev.get('student')
 
                     if points > 0:
@@ -326,41 +292,8 @@ def mongo_realtime_classroom_detail(request):
                         total_negative += abs(points)
                     total_points += points
 
-                    # Lấy thông tin loại sự kiện
-                    et_name = ''
-                    cache_key = et_key or et_id
-                    if cache_key:
-                        if cache_key in event_type_cache:
-                            et_name = event_type_cache[cache_key]
-                        else:
-                            et_query = {}
-                            if et_key:
-                                et_query['key'] = et_key
-                            if et_id:
-                                try:
-                                    et_query['_id'] = ObjectId(et_id)
-                                except Exception:
-                                    et_query['id'] = et_id
-                            if et_query:
-                                et_doc = event_types_coll.find_one(et_query)
-                                if et_doc:
-                                    et_name = et_doc.get('name', '') or et_doc.get('title', '')
-                                    event_type_cache[cache_key] = et_name
-
-                    # Lấy thông tin học sinh
-                    student_name = ''
-                    if student_id:
-                        sid = str(student_id)
-                        if sid in student_cache:
-                            student_name = student_cache[sid]
-                        else:
-                            try:
-                                stu_doc = users_coll.find_one({'_id': ObjectId(student_id)})
-                            except Exception:
-                                stu_doc = users_coll.find_one({'id': student_id})
-                            if stu_doc:
-                                student_name = stu_doc.get('full_name') or f"{stu_doc.get('first_name', '')} {stu_doc.get('last_name', '')}".strip()
-                                student_cache[sid] = student_name
+                    et_name = ev.get('event_type_name', '')
+                    student_name = ev.get('student_name', '') if student_id else ''
 
                     detailed_events.append({
                         'date': date_str,
@@ -395,8 +328,10 @@ def mongo_realtime_classroom_detail(request):
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@secondary_reads
 def mongo_week_summary_list(request):
     """API lấy danh sách tổng kết tuần từ MongoDB"""
     try:
@@ -411,21 +346,14 @@ def mongo_week_summary_list(request):
         # Role-based filtering
         if user.role == 'student':
             # Get student's classroom
-            students_coll = get_mongo_collection('students')
-            student_doc = students_coll.find_one({'user.id': str(user.id)})
-            if not student_doc:
-                return Response([])
-            
-            student_classroom_id = student_doc.get('classroom', {}).get('id')
+            student_classroom_id = user.context.student_classroom_id
             if not student_classroom_id:
                 return Response([])
             
             query['classroom_id'] = student_classroom_id
         elif user.role == 'teacher':
             # Get classrooms where user is homeroom teacher
-            classrooms_coll = get_mongo_collection('classrooms')
-            teacher_classrooms = classrooms_coll.find({'homeroom_teacher.id': str(user.id)})
-            classroom_ids = [str(doc['_id']) for doc in teacher_classrooms]
+            classroom_ids = list(user.context.homeroom_classroom_ids)
             if classroom_ids:
                 query['classroom_id'] = {'$in': classroom_ids}
             else:
@@ -455,28 +383,23 @@ def mongo_week_summary_list(request):
             ('total_points', -1)
         ]))
         
+        # Classrooms + GVCN của tất cả summaries: mỗi loại 1 truy vấn $in trên _id
+        classrooms_coll = get_mongo_collection('classrooms')
+        classroom_map = {
+            str(c['_id']): c for c in classrooms_coll.find(
+                {'_id': {'$in': to_object_ids(d.get('classroom_id') for d in week_summaries)}}
+            )
+        }
+        teacher_map = _homeroom_teacher_map(classroom_map.values())
+        
         # Convert to response format
         result = []
         for doc in week_summaries:
-            # Get classroom details
-            classrooms_coll = get_mongo_collection('classrooms')
-            classroom_doc = classrooms_coll.find_one({'_id': ObjectId(doc['classroom_id'])})
-            
+            classroom_doc = classroom_map.get(str(doc.get('classroom_id')))
             if not classroom_doc:
                 continue
             
-            # Get homeroom teacher info
-            homeroom_teacher = None
-            if classroom_doc.get('homeroom_teacher'):
-                teachers_coll = get_mongo_collection('teachers')
-                teacher_doc = teachers_coll.find_one({'user.id': classroom_doc['homeroom_teacher']['id']})
-                if teacher_doc:
-                    homeroom_teacher = {
-                        'id': teacher_doc['user']['id'],
-                        'full_name': teacher_doc['user'].get('full_name', ''),
-                        'first_name': teacher_doc['user'].get('first_name', ''),
-                        'last_name': teacher_doc['user'].get('last_name', '')
-                    }
+            homeroom_teacher = teacher_map.get(classroom_doc.get('homeroom_teacher_id'))
             
             result.append({
                 'id': str(doc['_id']),
@@ -503,6 +426,7 @@ def mongo_week_summary_list(request):
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mongo_week_summary_detail(request, id):
@@ -526,17 +450,7 @@ def mongo_week_summary_detail(request, id):
             return Response({'error': 'Classroom not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Get homeroom teacher info
-        homeroom_teacher = None
-        if classroom_doc.get('homeroom_teacher'):
-            teachers_coll = get_mongo_collection('teachers')
-            teacher_doc = teachers_coll.find_one({'user.id': classroom_doc['homeroom_teacher']['id']})
-            if teacher_doc:
-                homeroom_teacher = {
-                    'id': teacher_doc['user']['id'],
-                    'full_name': teacher_doc['user'].get('full_name', ''),
-                    'first_name': teacher_doc['user'].get('first_name', ''),
-                    'last_name': teacher_doc['user'].get('last_name', '')
-                }
+        homeroom_teacher = _homeroom_teacher_map([classroom_doc]).get(classroom_doc.get('homeroom_teacher_id'))
         
         result = {
             'id': str(doc['_id']),
@@ -563,6 +477,7 @@ def mongo_week_summary_detail(request, id):
         return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(3)
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def mongo_week_milestone(request):
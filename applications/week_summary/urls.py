@@ -10,12 +10,10 @@ urlpatterns = [
     
     # Week Summary CRUD - MongoDB
     path('', mongo_views.mongo_week_summary_list, name='week-summary-list'),
+    path('milestone', mongo_views.mongo_week_milestone, name='week-milestone'),  # trước '<str:id>'
     path('<str:id>', mongo_views.mongo_week_summary_detail, name='week-summary-detail'),
     
     # Rankings API - MongoDB
     path('rankings/realtime', mongo_views.mongo_realtime_rankings, name='realtime-rankings'),
     path('rankings/realtime/classroom-detail', mongo_views.mongo_realtime_classroom_detail, name='realtime-classroom-detail'),
-    
-    # Week Milestone API
-    path('milestone', mongo_views.mongo_week_milestone, name='week-milestone'),
 ] 
\ No newline at end of file
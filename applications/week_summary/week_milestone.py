@@ -47,10 +47,11 @@ class WeekMilestoneManager:
         return milestone_doc
     
     @staticmethod
-    def get_current_week_number():
-        """Lấy số tuần hiện tại (tính từ mốc)"""
+    def get_current_week_number(milestone=None):
+        """Lấy số tuần hiện tại (tính từ mốc; truyền milestone đã đọc để không đọc lại)"""
         
-        milestone = WeekMilestoneManager.get_or_create_week_milestone()
+        if milestone is None:
+            milestone = WeekMilestoneManager.get_or_create_week_milestone()
         
         if not milestone:
             return 1
@@ -80,7 +81,7 @@ class WeekMilestoneManager:
             'milestone_year': milestone['year'],
             'current_week': current_week,
             'current_year': current_year,
-            'week_number': WeekMilestoneManager.get_current_week_number()
+            'week_number': WeekMilestoneManager.get_current_week_number(milestone)
         }
     
     @staticmethod
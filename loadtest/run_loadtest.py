@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+"""
+Load test hỗn hợp mô phỏng lưu lượng 1 ngày học, chạy độc lập với Django (chỉ dùng thư viện chuẩn).
+
+Kịch bản (loadtest/scenarios/*.json) gồm các nhóm người dùng ảo chạy song song:
+  - login:        đăng nhập dồn dập đầu giờ (POST /auth/mongo-login)
+  - bulk_replace: lớp trưởng đăng nhập rồi ghi sổ sau mỗi tiết (POST /events/bulk-replace)
+  - poll:         màn hình / bảng tin gọi định kỳ các endpoint công khai (public, rankings, ...)
+
+Báo cáo: throughput, p50/p95/p99 theo endpoint, tỉ lệ lỗi, số request đang xử lý (in-flight),
+độ bận ước tính theo định luật Little (tổng thời gian phục vụ / thời gian chạy) so với số worker,
+và độ trễ của probe /health (tăng mạnh khi worker gunicorn đã bão hòa và request phải xếp hàng).
+
+Tài khoản theo quy ước của `manage.py generate_dataset` (mật khẩu 123456):
+  học sinh hs{school}{class:03d}{student:03d}@example.com, giáo viên gv{school}.{idx:04d}@example.com
+
+  python manage.py generate_dataset --classes 40 --days 20 --drop
+  gunicorn school_management.wsgi --workers 3 &
+  python loadtest/run_loadtest.py loadtest/scenarios/school_day.json --workers 3
+  python loadtest/run_loadtest.py loadtest/scenarios/morning_peak.json --scale 2 --json out.json
+"""
+
+import argparse
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+PROBE_NAME = 'probe:health'
+
+
+def percentile(samples, percent):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100.0 * len(ordered)) - 1))]
+
+
+class Stats:
+    """Thu thập kết quả từ mọi thread: latency theo endpoint, mã lỗi, số request đang chạy."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.service_time = 0.0
+        self.timeline = []   # (giây thứ, số request xong, in-flight, thời gian phục vụ trong giây đó)
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self, name, status, elapsed, counted=True):
+        with self.lock:
+            self.in_flight -= 1
+            self.latencies[name].append(elapsed)
+            if status == 0 or status >= 400:
+                self.errors[name][status] += 1
+            if counted:
+                self.service_time += elapsed
+
+
+class HttpClient:
+    def __init__(self, base_url, stats, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+
+    def call(self, name, method, path, params=None, body=None, token=None, counted=True):
+        url = self.base_url + path + ('?' + urlencode(params) if params else '')
+        headers = {'Accept': 'application/json'}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        status, payload = 0, None
+        self.stats.begin()
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, data=data, headers=headers, method=method), timeout=self.timeout) as resp:
+                status, raw = resp.status, resp.read()
+        except HTTPError as exc:
+            status, raw = exc.code, exc.read()
+        except (URLError, socket.timeout, ConnectionError, OSError):
+            raw = b''
+        elapsed = time.perf_counter() - started
+        self.stats.end(name, status, elapsed, counted)
+        if raw:
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                payload = None
+        return status, payload
+
+
+def render(value, context):
+    """Thay {today}, {monday}, ... trong tham số kịch bản."""
+    if isinstance(value, str):
+        return value.format(**context)
+    if isinstance(value, dict):
+        return {k: render(v, context) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render(v, context) for v in value]
+    return value
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, runner, group, index):
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.group = group
+        self.index = index
+        self.rng = random.Random(f"{runner.seed}:{group['name']}:{index}")
+        self.token = None
+
+    # --- tiện ích ---
+
+    @property
+    def client(self):
+        return self.runner.client
+
+    def alive(self):
+        return time.monotonic() < self.runner.deadline and not self.runner.stop.is_set()
+
+    def pause(self, seconds):
+        if seconds > 0:
+            jitter = self.group.get('jitter', 0.2)
+            self.runner.stop.wait(seconds * self.rng.uniform(1 - jitter, 1 + jitter))
+
+    def account(self):
+        accounts = self.runner.scenario.get('accounts', {})
+        classes = max(1, int(accounts.get('classes', 40)))
+        students = max(1, int(accounts.get('students_per_class', 40)))
+        pattern = self.group.get('account') or accounts.get('student_email', 'hs1{classroom:03d}{student:03d}@example.com')
+        if self.group.get('task') == 'bulk_replace':
+            # 1 lớp trưởng / lớp: học sinh số 1 của lớp thứ index
+            email = pattern.format(classroom=self.index % classes + 1, student=1, index=self.index + 1)
+        else:
+            email = pattern.format(classroom=self.index // students % classes + 1, student=self.index % students + 1, index=self.index + 1)
+        return email, accounts.get('password', '123456')
+
+    def login(self):
+        email, password = self.account()
+        status, payload = self.client.call('login', 'POST', '/auth/mongo-login', body={'email': email, 'password': password})
+        self.token = (payload or {}).get('access_token') if status == 200 else None
+        return self.token is not None
+
+    # --- các loại tác vụ ---
+
+    def run(self):
+        ramp = float(self.group.get('ramp_seconds', 0))
+        users = max(1, self.group['_users'])
+        self.runner.stop.wait(self.runner.start_delay(self.group) + ramp * self.index / users)
+        if not self.alive():
+            return
+        try:
+            getattr(self, f"task_{self.group['task']}")()
+        except Exception as exc:   # không để 1 user ảo làm dừng cả bài test
+            self.runner.note_failure(self.group['name'], exc)
+
+    def task_login(self):
+        for _ in range(int(self.group.get('iterations', 1))):
+            if not self.alive():
+                return
+            if self.login():
+                for request in self.group.get('after_login', []):
+                    self.get(request)
+            self.pause(float(self.group.get('think_seconds', 0)))
+
+    def task_poll(self):
+        if self.group.get('authenticated') and not self.login():
+            return
+        interval = float(self.group.get('interval_seconds', 5))
+        while self.alive():
+            for request in self.group.get('requests', []):
+                self.get(request)
+            self.pause(interval)
+
+    def task_bulk_replace(self):
+        if not self.login():
+            return
+        status, payload = self.client.call(
+            'my_classroom', 'GET', '/students/mongo/my-classroom-students', params={'page_size': 200}, token=self.token,
+        )
+        classroom = (payload or {}).get('classroom') or {}
+        students = [s['id'] for s in (payload or {}).get('results', []) if s.get('id')]
+        status, types = self.client.call('event_types', 'GET', '/events/types', token=self.token)
+        event_types = [t for t in (types or {}).get('data', []) if t.get('category') in ('positive', 'violation')]
+        if not classroom.get('id') or not students or not event_types:
+            self.runner.note_failure(self.group['name'], RuntimeError('monitor setup failed (classroom/students/event types)'))
+            return
+
+        day = self.runner.context['today']
+        periods_per_day = int(self.group.get('periods_per_day', 7))
+        events_per_period = float(self.group.get('events_per_period', 2))
+        interval = float(self.group.get('interval_seconds', 45))
+        periods = {}
+        period = 0
+        while self.alive():
+            period = period % periods_per_day + 1
+            if period == 1:
+                periods = {}
+            count = max(0, int(self.rng.gauss(events_per_period, 1)))
+            periods[str(period)] = [self._event(self.rng.choice(event_types), self.rng.choice(students)) for _ in range(count)]
+            self.client.call(
+                'bulk_replace', 'POST', '/events/bulk-replace', token=self.token,
+                body={'classroom_id': classroom['id'], 'date': day, 'periods': periods},
+            )
+            self.pause(interval)
+
+    def _event(self, event_type, student_id):
+        return {
+            'event_type': event_type.get('id'),
+            'event_type_key': event_type.get('key'),
+            'student_id': student_id,
+            'points': event_type.get('default_points', 0),
+            'description': '',
+        }
+
+    def get(self, request):
+        params = render(request.get('params', {}), self.runner.context)
+        self.client.call(request['name'], request.get('method', 'GET'), request['path'],
+                         params=params, token=self.token if request.get('auth', True) else None)
+
+
+class Runner:
+    def __init__(self, scenario, base_url, scale, duration, timeout, seed, workers, probe_interval):
+        self.scenario = scenario
+        self.stats = Stats()
+        self.client = HttpClient(base_url, self.stats, timeout)
+        self.scale = scale
+        self.duration = duration
+        self.seed = seed
+        self.workers = workers
+        self.probe_interval = probe_interval
+        self.stop = threading.Event()
+        self.failures = defaultdict(list)
+        self.failures_lock = threading.Lock()
+        today = date.fromisoformat(scenario['date']) if scenario.get('date') else date.today()
+        monday = today - timedelta(days=today.weekday())
+        self.context = {'today': today.isoformat(), 'monday': monday.isoformat(),
+                        'sunday': (monday + timedelta(days=6)).isoformat()}
+        self.deadline = 0.0
+        self.started = 0.0
+
+    def start_delay(self, group):
+        return float(group.get('start_seconds', 0))
+
+    def note_failure(self, group, exc):
+        with self.failures_lock:
+            self.failures[group].append(str(exc))
+
+    def _sampler(self):
+        last_count, last_service = 0, 0.0
+        second = 0
+        while not self.stop.wait(1.0):
+            second += 1
+            with self.stats.lock:
+                count = sum(len(v) for k, v in self.stats.latencies.items() if k != PROBE_NAME)
+                service = self.stats.service_time
+                in_flight = self.stats.in_flight
+            self.stats.timeline.append((second, count - last_count, in_flight, service - last_service))
+            last_count, last_service = count, service
+
+    def _probe(self):
+        while not self.stop.wait(self.probe_interval):
+            self.client.call(PROBE_NAME, 'GET', '/health', counted=False)
+
+    def idle_probe(self, samples=5):
+        for _ in range(samples):
+            self.client.call('probe:idle', 'GET', '/health', counted=False)
+        return percentile(self.stats.latencies.pop('probe:idle', []), 50)
+
+    def run(self):
+        idle_health = self.idle_probe()
+        users = []
+        for group in self.scenario['groups']:
+            group['_users'] = max(1, int(round(group.get('users', 1) * self.scale)))
+            users.extend(VirtualUser(self, group, index) for index in range(group['_users']))
+
+        self.started = time.monotonic()
+        self.deadline = self.started + self.duration
+        helpers = [threading.Thread(target=self._sampler, daemon=True), threading.Thread(target=self._probe, daemon=True)]
+        for thread in helpers + users:
+            thread.start()
+        try:
+            for thread in users:
+                thread.join(max(0.0, self.deadline - time.monotonic()) + self.client.timeout + 1)
+        except KeyboardInterrupt:
+            print('interrupted, stopping ...', file=sys.stderr)
+        self.stop.set()
+        elapsed = time.monotonic() - self.started
+        return self.report(elapsed, idle_health, len(users))
+
+    def report(self, elapsed, idle_health, user_count):
+        stats = self.stats
+        endpoints = {}
+        total = errors = 0
+        for name, samples in sorted(stats.latencies.items()):
+            failed = sum(stats.errors[name].values())
+            endpoints[name] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                'errors': failed,
+                'error_rate': round(failed / len(samples), 4) if samples else 0.0,
+                'status_codes': {str(code): n for code, n in sorted(stats.errors[name].items())},
+                'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 99) * 1000, 1),
+                'max_ms': round(max(samples) * 1000, 1) if samples else 0.0,
+            }
+            if name != PROBE_NAME:
+                total += len(samples)
+                errors += failed
+
+        busy = stats.service_time / elapsed if elapsed else 0.0
+        peak_busy = max((service for _, _, _, service in stats.timeline), default=0.0)
+        probe = stats.latencies.get(PROBE_NAME, [])
+        probe_p95 = percentile(probe, 95)
+        saturation = {
+            'workers': self.workers,
+            'max_in_flight': stats.max_in_flight,
+            'avg_busy': round(busy, 2),
+            'peak_busy': round(peak_busy, 2),
+            'utilization': round(busy / self.workers, 3) if self.workers else None,
+            'peak_utilization': round(peak_busy / self.workers, 3) if self.workers else None,
+            'health_idle_ms': round(idle_health * 1000, 1),
+            'health_p95_ms': round(probe_p95 * 1000, 1),
+            'queueing': bool(probe) and probe_p95 > max(5 * idle_health, 0.05),
+        }
+        return {
+            'scenario': self.scenario.get('name'),
+            'base_url': self.client.base_url,
+            'scale': self.scale,
+            'virtual_users': user_count,
+            'duration_s': round(elapsed, 1),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'endpoints': endpoints,
+            'saturation': saturation,
+            'timeline': [
+                {'second': s, 'completed': n, 'in_flight': f, 'busy': round(b, 2)} for s, n, f, b in stats.timeline
+            ],
+            'user_failures': {group: msgs[:5] + ([f'... {len(msgs) - 5} more'] if len(msgs) > 5 else [])
+                              for group, msgs in self.failures.items()},
+        }
+
+
+def print_report(report):
+    print(f"\nScenario {report['scenario']} x{report['scale']} against {report['base_url']}: "
+          f"{report['virtual_users']} virtual users, {report['duration_s']}s")
+    print(f"{'endpoint':<18} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  status")
+    for name, row in report['endpoints'].items():
+        codes = ' '.join(f'{code}x{n}' for code, n in row['status_codes'].items())
+        print(f"{name:<18} {row['requests']:>7} {row['rps']:>8.1f} {row['error_rate'] * 100:>5.1f}% "
+              f"{row['p50_ms']:>7.0f}ms {row['p95_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms {row['max_ms']:>6.0f}ms  {codes}")
+    print(f"\ntotal {report['requests']} requests, {report['throughput_rps']} req/s, "
+          f"error rate {report['error_rate'] * 100:.2f}%")
+    sat = report['saturation']
+    line = f"in-flight max {sat['max_in_flight']}, busy avg {sat['avg_busy']} / peak {sat['peak_busy']}"
+    if sat['workers']:
+        line += (f" -> utilization of {sat['workers']} workers: avg {sat['utilization'] * 100:.0f}%, "
+                 f"peak {sat['peak_utilization'] * 100:.0f}%")
+    print(line)
+    print(f"/health idle {sat['health_idle_ms']}ms, under load p95 {sat['health_p95_ms']}ms"
+          + (" -> requests are queueing (workers saturated)" if sat['queueing'] else ''))
+    for group, messages in report['user_failures'].items():
+        print(f"[{group}] {len(messages)} virtual user failure(s): {messages[0]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mixed-workload load test (xem docstring đầu file)')
+    parser.add_argument('scenario', help='File kịch bản JSON')
+    parser.add_argument('--base-url', help='Mặc định: base_url trong kịch bản hoặc http://localhost:8000/api/v1')
+    parser.add_argument('--scale', type=float, default=1.0, help='Nhân số user ảo của mọi nhóm')
+    parser.add_argument('--duration', type=float, help='Thời gian chạy (giây), ghi đè kịch bản')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Timeout mỗi request (giây)')
+    parser.add_argument('--workers', type=int, default=0, help='Số worker gunicorn của server (GUNICORN_WORKERS) để tính độ bận')
+    parser.add_argument('--probe-interval', type=float, default=1.0, help='Chu kỳ probe /health (giây)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Ghi báo cáo JSON (kèm timeline theo giây) ra file')
+    args = parser.parse_args(argv)
+
+    with open(args.scenario, encoding='utf-8') as fh:
+        scenario = json.load(fh)
+    runner = Runner(
+        scenario,
+        base_url=args.base_url or scenario.get('base_url') or 'http://localhost:8000/api/v1',
+        scale=max(0.01, args.scale),
+        duration=args.duration or float(scenario.get('duration_seconds', 60)),
+        timeout=args.timeout,
+        seed=args.seed,
+        workers=max(0, args.workers),
+        probe_interval=max(0.1, args.probe_interval),
+    )
+    report = runner.run()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+    return 1 if report['error_rate'] > float(scenario.get('max_error_rate', 0.01)) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,11 +7,16 @@ Collections:
   - week_milestones
   - classrooms
   - users (students)
+
+Chạy theo lô qua applications/common/migration_runner.py: đọc bằng cursor,
+ghi bằng bulk_write, lưu checkpoint theo _id (chạy lại sẽ tiếp tục từ chỗ dừng).
+
+  python migrations/add_academic_year.py [--dry-run] [--batch-size 500] [--throttle 0.2] [--force]
 """
 
+import argparse
 import os
 import sys
-from datetime import datetime
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if BASE_DIR not in sys.path:
@@ -23,132 +28,96 @@ import django  # type: ignore
 
 django.setup()
 
-from applications.common.mongo import get_mongo_collection  # noqa: E402
 from applications.common.academic_year import (  # noqa: E402
   get_academic_year_from_date,
   get_current_academic_year,
 )
+from applications.common.migration_runner import (  # noqa: E402
+  Migration,
+  MigrationRunner,
+  MigrationStep,
+)
+
+
+MISSING = {"academic_year": {"$exists": False}}
+
+
+def _set_year(ay):
+  return {"$set": {"academic_year": ay}}
+
+
+def _year_from_created_at(doc, current_ay):
+  # classroom / học sinh thường không có date rõ, dùng created_at nếu có
+  created_at = doc.get("created_at")
+  if created_at:
+    try:
+      return get_academic_year_from_date(created_at.split("T")[0])
+    except Exception:
+      return current_ay
+  return current_ay
+
 
+def event_year(doc):
+  date_str = doc.get("date")
+  if not date_str:
+    return None
+  return _set_year(get_academic_year_from_date(date_str))
 
-def migrate_events() -> int:
-  coll = get_mongo_collection("events")
-  docs = list(coll.find({"academic_year": {"$exists": False}}))
-  migrated = 0
-  for doc in docs:
-    date_str = doc.get("date")
-    if not date_str:
-      continue
-    ay = get_academic_year_from_date(date_str)
-    coll.update_one({"_id": doc["_id"]}, {"$set": {"academic_year": ay}})
-    migrated += 1
-  print(f"[events] migrated {migrated} documents")
-  return migrated
-
-
-def migrate_week_summaries() -> int:
-  coll = get_mongo_collection("week_summaries")
-  docs = list(coll.find({"academic_year": {"$exists": False}}))
-  migrated = 0
-  for doc in docs:
-    # ưu tiên lấy từ start_date nếu có, fallback current_year/current_week
-    date_str = doc.get("start_date") or doc.get("date")
-    if not date_str:
-      # fallback: dùng current academic year
-      ay = get_current_academic_year()
-    else:
-      ay = get_academic_year_from_date(date_str)
-    coll.update_one({"_id": doc["_id"]}, {"$set": {"academic_year": ay}})
-    migrated += 1
-  print(f"[week_summaries] migrated {migrated} documents")
-  return migrated
-
-
-def migrate_week_milestones() -> int:
-  coll = get_mongo_collection("week_milestones")
-  docs = list(coll.find({"academic_year": {"$exists": False}}))
-  migrated = 0
-  for doc in docs:
-    date_str = doc.get("start_date")
-    if not date_str:
-      ay = get_current_academic_year()
-    else:
-      ay = get_academic_year_from_date(date_str)
-    coll.update_one({"_id": doc["_id"]}, {"$set": {"academic_year": ay}})
-    migrated += 1
-  print(f"[week_milestones] migrated {migrated} documents")
-  return migrated
-
-
-def migrate_classrooms() -> int:
-  coll = get_mongo_collection("classrooms")
-  docs = list(coll.find({"academic_year": {"$exists": False}}))
-  migrated = 0
+
+def week_summary_year(doc, current_ay):
+  # ưu tiên lấy từ start_date nếu có, fallback current academic year
+  date_str = doc.get("start_date") or doc.get("date")
+  return _set_year(get_academic_year_from_date(date_str) if date_str else current_ay)
+
+
+def week_milestone_year(doc, current_ay):
+  date_str = doc.get("start_date")
+  return _set_year(get_academic_year_from_date(date_str) if date_str else current_ay)
+
+
+def build_migration() -> Migration:
   current_ay = get_current_academic_year()
-  for doc in docs:
-    # classroom thường không có date rõ, dùng created_at nếu có
-    created_at = doc.get("created_at")
-    if created_at:
-      try:
-        date_str = created_at.split("T")[0]
-        ay = get_academic_year_from_date(date_str)
-      except Exception:
-        ay = current_ay
-    else:
-      ay = current_ay
-    coll.update_one({"_id": doc["_id"]}, {"$set": {"academic_year": ay}})
-    migrated += 1
-  print(f"[classrooms] migrated {migrated} documents")
-  return migrated
-
-
-def migrate_users_students() -> int:
-  coll = get_mongo_collection("users")
-  docs = list(
-    coll.find(
-      {
-        "role": "student",
-        "academic_year": {"$exists": False},
-      }
-    )
+  return Migration(
+    name="add_academic_year",
+    description="Gắn academic_year cho events, week_summaries, week_milestones, classrooms, users (students)",
+    steps=[
+      MigrationStep("events", "events", event_year, MISSING, {"date": 1}),
+      MigrationStep(
+        "week_summaries", "week_summaries",
+        lambda doc: week_summary_year(doc, current_ay), MISSING, {"start_date": 1, "date": 1},
+      ),
+      MigrationStep(
+        "week_milestones", "week_milestones",
+        lambda doc: week_milestone_year(doc, current_ay), MISSING, {"start_date": 1},
+      ),
+      MigrationStep(
+        "classrooms", "classrooms",
+        lambda doc: _set_year(_year_from_created_at(doc, current_ay)), MISSING, {"created_at": 1},
+      ),
+      MigrationStep(
+        "users(students)", "users",
+        lambda doc: _set_year(_year_from_created_at(doc, current_ay)),
+        {"role": "student", **MISSING}, {"created_at": 1},
+      ),
+    ],
   )
-  migrated = 0
-  current_ay = get_current_academic_year()
-  for doc in docs:
-    created_at = doc.get("created_at")
-    if created_at:
-      try:
-        date_str = created_at.split("T")[0]
-        ay = get_academic_year_from_date(date_str)
-      except Exception:
-        ay = current_ay
-    else:
-      ay = current_ay
-    coll.update_one({"_id": doc["_id"]}, {"$set": {"academic_year": ay}})
-    migrated += 1
-  print(f"[users(students)] migrated {migrated} documents")
-  return migrated
 
 
 def main():
+  parser = argparse.ArgumentParser(description="Academic Year Migration")
+  parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không ghi")
+  parser.add_argument("--batch-size", type=int, default=500, help="Số document mỗi lô (cursor + bulk_write)")
+  parser.add_argument("--throttle", type=float, default=0.0, help="Số giây nghỉ giữa các lô")
+  parser.add_argument("--force", action="store_true", help="Chạy lại kể cả khi đã applied")
+  args = parser.parse_args()
+
   print("=== Academic Year Migration ===")
-  start = datetime.now()
-  e = migrate_events()
-  ws = migrate_week_summaries()
-  wm = migrate_week_milestones()
-  c = migrate_classrooms()
-  u = migrate_users_students()
-  elapsed = datetime.now() - start
+  runner = MigrationRunner(batch_size=args.batch_size, dry_run=args.dry_run, throttle=args.throttle)
+  results = runner.run(build_migration(), force=args.force)
   print("--- Summary ---")
-  print(f"events: {e}")
-  print(f"week_summaries: {ws}")
-  print(f"week_milestones: {wm}")
-  print(f"classrooms: {c}")
-  print(f"users(students): {u}")
-  print(f"elapsed: {elapsed}")
+  for name, result in results.items():
+    print(f"{name}: {result.modified} (scanned {result.scanned}, {result.rate:.0f} docs/s)")
 
 
 if __name__ == "__main__":
   main()
-
-
-
@@ -14,6 +14,8 @@ from pathlib import Path
 from datetime import timedelta
 from decouple import config
 
+from applications.common.log_setup import build_logging, parse_levels
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,8 +53,11 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'applications.common.tenancy.TenantMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'applications.common.slow_queries.SlowQueryMiddleware',
+    'applications.common.read_routing.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'school_management.urls'
@@ -181,6 +186,13 @@ CORS_ALLOWED_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-school',
+]
+
+# Header frontend được đọc (xuất điểm danh báo lớp-tháng chưa có bản gọn)
+CORS_EXPOSE_HEADERS = [
+    'content-disposition',
+    'x-attendance-missing-month',
 ]
 
 # Mongo configuration (decouple reads from .env or OS env)
@@ -188,6 +200,65 @@ MONGO_URI = config('MONGO_URI', default='')
 MONGO_DB = config('MONGO_DB', default='')
 MONGO_USERS_COLLECTION = config('MONGO_USERS_COLLECTION', default='users')
 
+# Nhiều trường (applications.common.tenancy): JSON {"<key>": {"name": ..., "db": ..., "hosts": [...]}}
+# Rỗng -> 1 trường dùng MONGO_DB + SCHOOL_NAME. Trường được xác định theo claim 'school' của token, header TENANT_HEADER, host
+TENANTS = config('TENANTS', default='')
+DEFAULT_TENANT = config('DEFAULT_TENANT', default='')
+TENANT_HEADER = config('TENANT_HEADER', default='X-School')
+SCHOOL_NAME = config('SCHOOL_NAME', default='TRƯỜNG THPT LAI VUNG 3')
+# Tạo index cho database của trường ở request đầu tiên (mỗi process); tắt thì chạy ensure_mongo_indexes --all-tenants
+TENANT_AUTO_PROVISION = config('TENANT_AUTO_PROVISION', default=False, cast=bool)
+
+# Cache (mặc định LocMemCache theo process; đặt CACHE_BACKEND/CACHE_LOCATION để dùng cache chung giữa các worker)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='school-management'),
+        # Key cache tách theo trường
+        'KEY_FUNCTION': 'applications.common.tenancy.make_cache_key',
+    }
+}
+
+# Thời gian cache ngữ cảnh phân quyền của user (giây)
+USER_CONTEXT_CACHE_TTL = config('USER_CONTEXT_CACHE_TTL', default=300, cast=int)
+
+# Version cache dùng chung giữa các worker (applications.common.versions, lưu trong MongoDB):
+# mỗi process đọc lại tối đa 1 lần / khoảng này (giây) -> độ trễ tối đa của invalidation giữa các worker
+SHARED_VERSION_CHECK_SECONDS = config('SHARED_VERSION_CHECK_SECONDS', default=2.0, cast=float)
+
+# Danh sách học sinh: cache sĩ số / số nam-nữ của lớp khi xem không lọc (?count_mode=cached để bật theo request)
+STUDENT_LIST_CACHED_COUNTS = config('STUDENT_LIST_CACHED_COUNTS', default=False, cast=bool)
+STUDENT_COUNTS_CACHE_TTL = config('STUDENT_COUNTS_CACHE_TTL', default=300, cast=int)
+
+# Ngân sách số lệnh MongoDB mỗi request (@query_budget): True -> vượt ngân sách thì raise (CI / dev), False -> chỉ log warning
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+
+# Ghi lệnh MongoDB chậm hơn ngưỡng (ms) vào capped collection perf_slow_queries (0 -> tắt)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=int)
+SLOW_QUERY_CAPPED_BYTES = config('SLOW_QUERY_CAPPED_BYTES', default=16 * 1024 * 1024, cast=int)
+
+# Đọc secondary cho endpoint báo cáo (@secondary_reads): secondaryPreferred + maxStalenessSeconds (>= 90)
+# User vừa ghi thì đọc primary trong READ_YOUR_WRITES_SECONDS (cần CACHE_BACKEND dùng chung khi chạy nhiều worker)
+MONGO_READ_FROM_SECONDARIES = config('MONGO_READ_FROM_SECONDARIES', default=False, cast=bool)
+MONGO_MAX_STALENESS_SECONDS = config('MONGO_MAX_STALENESS_SECONDS', default=90, cast=int)
+READ_YOUR_WRITES_SECONDS = config('READ_YOUR_WRITES_SECONDS', default=120, cast=int)
+
+# Import Excel: số dòng mỗi chunk (đọc streaming, kiểm tra + ghi theo chunk)
+EXCEL_IMPORT_CHUNK_SIZE = config('EXCEL_IMPORT_CHUNK_SIZE', default=500, cast=int)
+# Import giáo viên: số thread băm bcrypt dùng chung mỗi process (không vượt quá số CPU)
+TEACHER_IMPORT_HASH_WORKERS = config('TEACHER_IMPORT_HASH_WORKERS', default=4, cast=int)
+
+# Logging: ghi qua QueueListener (thread nền), mức log theo module, log DEBUG được lấy mẫu
+# LOG_LEVELS="applications.event=DEBUG,pymongo=WARNING"; LOG_FORMAT=text|json; LOG_FILE rỗng -> chỉ console
+LOGGING_CONFIG = 'applications.common.log_setup.configure_logging'
+LOGGING = build_logging(
+    level=config('LOG_LEVEL', default='INFO'),
+    levels=parse_levels(config('LOG_LEVELS', default='')),
+    fmt=config('LOG_FORMAT', default='text'),
+    log_file=config('LOG_FILE', default=''),
+    debug_sample_every=config('LOG_DEBUG_SAMPLE_EVERY', default=100, cast=int),
+)
+
 # Custom Authentication Backend for MongoDB
 AUTHENTICATION_BACKENDS = [
     'applications.common.mongo_auth.MongoJWTAuthentication',